@@ -0,0 +1,73 @@
+"""
+Dados compartilhados do POST /chat/batch.
+
+As perguntas são classificadas antes; aqui as necessidades de dados são
+agrupadas por janela (start, end) e cada janela vira UMA leitura com todos
+os parâmetros pedidos (aget_telemetry_ranges), mais no máximo uma busca da
+última leitura. As respostas saem desses dados pelo mesmo caminho do /chat:
+BatchTelemetry tem a interface da SpeculativePrefetch (start/end, latest,
+claim_range, discard).
+"""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+from app.models import DeviceLatest, WaterParameter
+from app.telemetry_repository import aget_latest_state, aget_telemetry_ranges
+from app.telemetry_series import TelemetrySeries
+
+
+class BatchTelemetry:
+    def __init__(self, device_id: str, site_id: str, start: datetime, end: datetime) -> None:
+        self.device_id = device_id
+        self.site_id = site_id
+        # janela padrão (24h) das perguntas sem período explícito
+        self.start = start
+        self.end = end
+        self._want_latest = False
+        self._windows: Dict[Tuple[datetime, datetime], Set[WaterParameter]] = {}
+        self._latest: Optional[DeviceLatest] = None
+        self._series: Dict[Tuple[WaterParameter, datetime, datetime], TelemetrySeries] = {}
+
+    def need_latest(self) -> None:
+        self._want_latest = True
+
+    def need_range(self, param: WaterParameter, start: datetime, end: datetime) -> None:
+        self._windows.setdefault((start, end), set()).add(param)
+
+    @property
+    def reads(self) -> int:
+        """
+        Leituras que fetch() faz (uma por janela, mais a última leitura).
+        """
+        return len(self._windows) + int(self._want_latest)
+
+    async def fetch(self) -> None:
+        windows = list(self._windows.items())
+        results = await asyncio.gather(
+            *(
+                aget_telemetry_ranges(self.device_id, self.site_id, params, start, end)
+                for (start, end), params in windows
+            ),
+            self._fetch_latest(),
+        )
+        for ((start, end), _), by_param in zip(windows, results):
+            for param, series in by_param.items():
+                self._series[(param, start, end)] = series
+
+    async def _fetch_latest(self) -> None:
+        if self._want_latest:
+            self._latest = await aget_latest_state(self.device_id, self.site_id)
+
+    async def latest(self) -> Optional[DeviceLatest]:
+        return self._latest
+
+    async def claim_range(
+        self, param: WaterParameter, start: datetime, end: datetime
+    ) -> Optional[TelemetrySeries]:
+        return self._series.get((param, start, end))
+
+    def discard(self) -> None:
+        pass
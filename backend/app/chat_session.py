@@ -0,0 +1,289 @@
+"""
+Memória de conversa do /chat por session_id.
+
+- ChatSession: as últimas MAX_HISTORY_MESSAGES mensagens (deque com
+  maxlen: a mais antiga sai sozinha) e a última intenção resolvida, que
+  resolve_followup usa para completar "e ontem?" / "e a turbidez?" sem LLM
+- SessionStore: LRU + TTL em memória (sessões paradas há mais de
+  SESSION_TTL_SECONDS somem; acima de SESSION_MAX_SESSIONS sai a menos
+  usada) e, opcionalmente, um backend:
+  - sqlite: sobrevive a reinícios; a memória fica na frente (write-through)
+  - redis (ou compatível, ex: Valkey/KeyDB): compartilhado entre
+    instâncias, então sem cópia local; o TTL é o EXPIRE da chave
+- compact_history: histórico enviado à LLM cortado em
+  CHAT_HISTORY_TOKEN_BUDGET tokens (estimados), das mais recentes para as
+  mais antigas, cada mensagem com no máximo CHAT_HISTORY_MESSAGE_MAX_TOKENS:
+  o prompt não cresce com a conversa
+
+Duas requisições simultâneas da mesma sessão: vale a última gravação.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, Optional, Protocol, Tuple
+
+from app.config import Settings
+from app.models import QueryIntent, QueryIntentType
+
+# (papel, texto); papel "human" ou "ai", como o MessagesPlaceholder do LangChain aceita
+HistoryMessage = Tuple[str, str]
+
+# aproximação sem tokenizer: ~4 caracteres por token em PT-BR nos modelos do Ollama
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def compact_history(
+    messages: Iterable[HistoryMessage], budget_tokens: int, message_max_tokens: int
+) -> List[HistoryMessage]:
+    """
+    Mensagens mais recentes que cabem em budget_tokens, na ordem original;
+    as longas são cortadas em message_max_tokens (com "…").
+    """
+    out: List[HistoryMessage] = []
+    used = 0
+    max_chars = message_max_tokens * CHARS_PER_TOKEN
+    for role, text in reversed(list(messages)):
+        if len(text) > max_chars:
+            text = text[: max_chars - 1].rstrip() + "…"
+        cost = estimate_tokens(text)
+        if used + cost > budget_tokens:
+            break
+        out.append((role, text))
+        used += cost
+    out.reverse()
+    return out
+
+
+class ChatSession:
+    __slots__ = ("session_id", "messages", "last_intent", "updated_at")
+
+    def __init__(self, session_id: str, max_messages: int) -> None:
+        self.session_id = session_id
+        self.messages: Deque[HistoryMessage] = deque(maxlen=max_messages)
+        self.last_intent: Optional[QueryIntent] = None
+        self.updated_at = time.time()
+
+    def record(self, question: str, answer: str, intent: QueryIntent) -> None:
+        self.messages.append(("human", question))
+        self.messages.append(("ai", answer))
+        # ajuda geral não tem parâmetro/período para levar adiante
+        if intent.intent != QueryIntentType.GENERAL_HELP:
+            self.last_intent = intent.model_copy()
+        self.updated_at = time.time()
+
+    def to_data(self) -> Dict:
+        return {
+            "messages": [list(m) for m in self.messages],
+            "last_intent": self.last_intent.model_dump(mode="json") if self.last_intent else None,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_data(cls, session_id: str, data: Dict, max_messages: int) -> "ChatSession":
+        session = cls(session_id, max_messages)
+        session.messages.extend((role, text) for role, text in data.get("messages", ()))
+        if data.get("last_intent"):
+            session.last_intent = QueryIntent.model_validate(data["last_intent"])
+        session.updated_at = data.get("updated_at", session.updated_at)
+        return session
+
+
+class SessionBackend(Protocol):
+    # shared = True: outras instâncias gravam, então nada fica em memória local
+    shared: bool
+
+    async def load(self, session_id: str) -> Optional[Dict]: ...
+
+    async def save(self, session_id: str, data: Dict, ttl_seconds: float) -> None: ...
+
+    async def delete(self, session_id: str) -> None: ...
+
+
+class SqliteSessionBackend:
+    """
+    Uma linha JSON por sessão. As operações são curtas e feitas sob um lock
+    (como o IntentCache); as expiradas são apagadas a cada PURGE_EVERY gravações.
+    """
+
+    shared = False
+    PURGE_EVERY = 200
+
+    def __init__(self, path: str) -> None:
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chat_sessions ("
+            " session_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    async def load(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM chat_sessions WHERE session_id = ? AND expires_at >= ?",
+                (session_id, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def save(self, session_id: str, data: Dict, ttl_seconds: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO chat_sessions (session_id, data, expires_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data, ensure_ascii=False), now + ttl_seconds),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._db.execute("DELETE FROM chat_sessions WHERE expires_at < ?", (now,))
+            self._db.commit()
+
+    async def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+            self._db.commit()
+
+
+class RedisSessionBackend:
+    """
+    Uma chave por sessão com EXPIRE = TTL (o próprio servidor expira; com
+    maxmemory-policy allkeys-lru ele também descarta as menos usadas).
+    """
+
+    shared = True
+    KEY_PREFIX = "aquamonitor:session:"
+
+    def __init__(self, url: str) -> None:
+        # pacote opcional: só é exigido com SESSION_STORE=redis
+        try:
+            from redis import asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("SESSION_STORE=redis exige o pacote redis (pip install redis)") from e
+        self._client = aioredis.Redis.from_url(url)
+
+    async def load(self, session_id: str) -> Optional[Dict]:
+        raw = await self._client.get(self.KEY_PREFIX + session_id)
+        return json.loads(raw) if raw else None
+
+    async def save(self, session_id: str, data: Dict, ttl_seconds: float) -> None:
+        await self._client.set(
+            self.KEY_PREFIX + session_id,
+            json.dumps(data, ensure_ascii=False),
+            ex=max(1, int(ttl_seconds)),
+        )
+
+    async def delete(self, session_id: str) -> None:
+        await self._client.delete(self.KEY_PREFIX + session_id)
+
+
+class SessionStore:
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        ttl_seconds: float = 1800,
+        max_messages: int = 10,
+        backend: Optional[SessionBackend] = None,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.backend = backend
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "loaded": 0, "evictions": 0, "expirations": 0}
+
+    @property
+    def _local(self) -> bool:
+        return self.backend is None or not self.backend.shared
+
+    def _cached(self, session_id: str) -> Optional[ChatSession]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and time.time() - session.updated_at > self.ttl_seconds:
+                del self._sessions[session_id]
+                self._counts["expirations"] += 1
+                session = None
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                self._counts["hits"] += 1
+            return session
+
+    def _keep(self, session: ChatSession) -> None:
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._sessions.move_to_end(session.session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._counts["evictions"] += 1
+
+    async def get(self, session_id: str) -> ChatSession:
+        """
+        Sessão existente ou uma nova vazia (só é guardada no save).
+        """
+        if self._local:
+            session = self._cached(session_id)
+            if session is not None:
+                return session
+        data = await self.backend.load(session_id) if self.backend is not None else None
+        with self._lock:
+            if data is None:
+                self._counts["misses"] += 1
+            else:
+                self._counts["loaded"] += 1
+        if data is None:
+            return ChatSession(session_id, self.max_messages)
+        session = ChatSession.from_data(session_id, data, self.max_messages)
+        if self._local:
+            self._keep(session)
+        return session
+
+    async def save(self, session: ChatSession) -> None:
+        if self._local:
+            self._keep(session)
+        if self.backend is not None:
+            await self.backend.save(session.session_id, session.to_data(), self.ttl_seconds)
+
+    async def record(self, session: ChatSession, question: str, answer: str, intent: QueryIntent) -> None:
+        session.record(question, answer, intent)
+        await self.save(session)
+
+    async def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self.backend is not None:
+            await self.backend.delete(session_id)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            out: Dict[str, float] = dict(self._counts)
+            out["size"] = len(self._sessions)
+        total = out["hits"] + out["loaded"] + out["misses"]
+        out["hit_rate"] = (out["hits"] + out["loaded"]) / total if total else 0.0
+        return out
+
+
+def create_session_store(s: Settings) -> SessionStore:
+    kind = s.SESSION_STORE
+    if kind == "memory":
+        backend: Optional[SessionBackend] = None
+    elif kind == "sqlite":
+        backend = SqliteSessionBackend(s.SESSION_SQLITE_PATH)
+    elif kind == "redis":
+        backend = RedisSessionBackend(s.SESSION_REDIS_URL)
+    else:
+        raise ValueError(f"SESSION_STORE desconhecido: {kind!r}")
+    return SessionStore(
+        max_sessions=s.SESSION_MAX_SESSIONS,
+        ttl_seconds=s.SESSION_TTL_SECONDS,
+        max_messages=s.MAX_HISTORY_MESSAGES,
+        backend=backend,
+    )
@@ -0,0 +1,126 @@
+"""
+Framing do POST /chat/stream e medição do tempo até o primeiro byte (TTFB).
+
+Dois formatos, escolhidos pelo Accept:
+- SSE (padrão): "event: token" com {"text": ...}, depois "event: done" com
+  {"response": ChatResponse, "ttfb_ms": ...}; em falha, "event: error"
+- NDJSON (Accept: application/x-ndjson): uma linha por frame, com "type"
+  igual ao nome do evento
+
+Perguntas de telemetria usam o mesmo protocolo: um único "token" com a
+resposta inteira e o "done".
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional
+
+from app.models import ChatResponse
+
+logger = logging.getLogger(__name__)
+
+SSE_MEDIA_TYPE = "text/event-stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_ndjson(accept: str) -> bool:
+    return NDJSON_MEDIA_TYPE in accept.lower()
+
+
+def frame(event: str, payload: Dict[str, Any], ndjson: bool) -> str:
+    if ndjson:
+        return json.dumps({"type": event, **payload}, ensure_ascii=False) + "\n"
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+class StreamTimings:
+    """
+    TTFB (início da requisição -> primeiro token) e duração total das
+    últimas `window` respostas, separadas por intent.
+    """
+
+    def __init__(self, window: int = 1000) -> None:
+        self._lock = threading.Lock()
+        self._ttfb: Dict[str, Deque[float]] = {}
+        self._total: Dict[str, Deque[float]] = {}
+        self._window = window
+        self.errors = 0
+
+    def record(self, intent: str, ttfb: Optional[float], total: float) -> None:
+        with self._lock:
+            if ttfb is not None:
+                self._ttfb.setdefault(intent, deque(maxlen=self._window)).append(ttfb)
+            self._total.setdefault(intent, deque(maxlen=self._window)).append(total)
+
+    def record_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {"errors": self.errors}
+            for intent, totals in self._total.items():
+                ttfb = sorted(self._ttfb.get(intent, ()))
+                total = sorted(totals)
+                out[intent] = {
+                    "count": len(total),
+                    "ttfb_p50_ms": _pct(ttfb, 0.50),
+                    "ttfb_p95_ms": _pct(ttfb, 0.95),
+                    "total_p50_ms": _pct(total, 0.50),
+                    "total_p95_ms": _pct(total, 0.95),
+                }
+            return out
+
+
+def _pct(sorted_values, q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[int(q * (len(sorted_values) - 1))] * 1e3
+
+
+chat_stream_stats = StreamTimings()
+
+
+async def single_token(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+async def stream_chat(
+    tokens: AsyncIterator[str],
+    make_response: Callable[[str], ChatResponse],
+    intent: str,
+    started: float,
+    ndjson: bool,
+) -> AsyncIterator[str]:
+    """
+    Repassa cada token assim que chega e fecha com o ChatResponse montado a
+    partir do texto completo. `started` é o perf_counter() do início da requisição.
+    """
+    parts = []
+    ttfb: Optional[float] = None
+    try:
+        async for token in tokens:
+            if not token:
+                continue
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+            parts.append(token)
+            yield frame("token", {"text": token}, ndjson)
+
+        response = make_response("".join(parts))
+        yield frame(
+            "done",
+            {"response": response.model_dump(mode="json"), "ttfb_ms": ttfb * 1e3 if ttfb is not None else None},
+            ndjson,
+        )
+    except Exception:
+        # o status HTTP já foi enviado: a falha vai como frame
+        logger.exception("falha no /chat/stream (intent=%s)", intent)
+        chat_stream_stats.record_error()
+        yield frame("error", {"detail": "Falha ao gerar a resposta. Tente novamente."}, ndjson)
+        return
+    chat_stream_stats.record(intent, ttfb, time.perf_counter() - started)
@@ -11,10 +11,104 @@ class Settings:
         "FIRESTORE_TELEMETRY_COLLECTION", "telemetry"
     )
 
+    # Índice da última leitura por device/site, mantido na ingestão
+    FIRESTORE_LATEST_COLLECTION: str = os.getenv("FIRESTORE_LATEST_COLLECTION", "devices_latest")
+
+    # Backend de telemetria: "firestore" ou "sqlite" (embarcado, sem credenciais)
+    TELEMETRY_STORE: str = os.getenv("TELEMETRY_STORE", "firestore").strip().lower()
+    TELEMETRY_SQLITE_PATH: str = os.getenv("TELEMETRY_SQLITE_PATH", "telemetry.sqlite3")
+
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     OLLAMA_MODEL_NAME: str = os.getenv("OLLAMA_MODEL_NAME", "qwen2:0.5b")
+    # Quanto tempo o Ollama mantém o modelo carregado após cada chamada
+    OLLAMA_KEEP_ALIVE: str = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+    # Pré-carrega chains e modelo em segundo plano depois que o servidor sobe
+    OLLAMA_WARMUP_ENABLED: bool = os.getenv("OLLAMA_WARMUP_ENABLED", "false").lower() == "true"
+
+    # Memória de conversa do /chat por session_id (ver chat_session.py): "memory", "sqlite" ou
+    # "redis" (pacote redis opcional); sessões paradas há SESSION_TTL_SECONDS são descartadas
+    MAX_HISTORY_MESSAGES: int = int(os.getenv("MAX_HISTORY_MESSAGES", "10"))
+    SESSION_STORE: str = os.getenv("SESSION_STORE", "memory").strip().lower()
+    SESSION_MAX_SESSIONS: int = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+    SESSION_TTL_SECONDS: float = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+    SESSION_SQLITE_PATH: str = os.getenv("SESSION_SQLITE_PATH", "sessions.sqlite3")
+    SESSION_REDIS_URL: str = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+    # Histórico enviado à LLM: limite em tokens (estimados) do total e de cada mensagem
+    CHAT_HISTORY_TOKEN_BUDGET: int = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "400"))
+    CHAT_HISTORY_MESSAGE_MAX_TOKENS: int = int(os.getenv("CHAT_HISTORY_MESSAGE_MAX_TOKENS", "120"))
+
+    # Cache local de séries de telemetria (ver telemetry_cache.py)
+    TELEMETRY_CACHE_ENABLED: bool = os.getenv("TELEMETRY_CACHE_ENABLED", "true").lower() == "true"
+    TELEMETRY_CACHE_MAX_BYTES: int = int(os.getenv("TELEMETRY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    TELEMETRY_CACHE_REFRESH_SECONDS: float = float(os.getenv("TELEMETRY_CACHE_REFRESH_SECONDS", "30"))
+
+    # Leituras idênticas e simultâneas no store viram uma só (ver single_flight.py); início e
+    # fim do intervalo são arredondados nessa granularidade para formar a chave
+    SINGLE_FLIGHT_ENABLED: bool = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+    SINGLE_FLIGHT_GRANULARITY_SECONDS: float = float(os.getenv("SINGLE_FLIGHT_GRANULARITY_SECONDS", "5"))
+
+    # Após esse tempo o índice da última leitura é relido do store (outras instâncias gravam)
+    LATEST_INDEX_TTL_SECONDS: float = float(os.getenv("LATEST_INDEX_TTL_SECONDS", "30"))
+    # on_snapshot na coleção de telemetria para indexar o que o firmware grava direto nela;
+    # ligar numa instância só (o listener recebe todos os envios da coleção)
+    LATEST_INDEX_WATCH_ENABLED: bool = os.getenv("LATEST_INDEX_WATCH_ENABLED", "false").lower() == "true"
+    # Sem o watch, cada par é conferido contra a coleção no máximo uma vez nesse intervalo
+    LATEST_INDEX_VERIFY_SECONDS: float = float(os.getenv("LATEST_INDEX_VERIFY_SECONDS", "300"))
+
+    # GET /fleet/ranking: shards (device/site) consultados ao mesmo tempo e limite de cada um
+    FLEET_MAX_CONCURRENCY: int = int(os.getenv("FLEET_MAX_CONCURRENCY", "128"))
+    FLEET_SHARD_TIMEOUT_SECONDS: float = float(os.getenv("FLEET_SHARD_TIMEOUT_SECONDS", "10"))
+
+    # Busca especulativa de telemetria em paralelo à classificação de intenção
+    SPECULATIVE_PREFETCH_ENABLED: bool = os.getenv("SPECULATIVE_PREFETCH_ENABLED", "true").lower() == "true"
+
+    # Classificador por regras antes da LLM (ver intent_rules.py)
+    FAST_INTENT_ENABLED: bool = os.getenv("FAST_INTENT_ENABLED", "true").lower() == "true"
+    FAST_INTENT_THRESHOLD: float = float(os.getenv("FAST_INTENT_THRESHOLD", "0.8"))
+
+    # Cache de classify_intent (ver intent_cache.py); SQLITE_PATH vazio = só memória
+    INTENT_CACHE_ENABLED: bool = os.getenv("INTENT_CACHE_ENABLED", "true").lower() == "true"
+    INTENT_CACHE_MAX_ENTRIES: int = int(os.getenv("INTENT_CACHE_MAX_ENTRIES", "1000"))
+    INTENT_CACHE_TTL_SECONDS: float = float(os.getenv("INTENT_CACHE_TTL_SECONDS", str(6 * 3600)))
+    INTENT_CACHE_SQLITE_PATH: str = os.getenv("INTENT_CACHE_SQLITE_PATH", "")
+
+    # Ingestão em lote (POST /telemetry/batch) com buffer write-behind
+    INGEST_WRITE_BEHIND_ENABLED: bool = os.getenv("INGEST_WRITE_BEHIND_ENABLED", "true").lower() == "true"
+    INGEST_FLUSH_SIZE: int = int(os.getenv("INGEST_FLUSH_SIZE", "500"))
+    INGEST_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("INGEST_FLUSH_INTERVAL_SECONDS", "2"))
+    INGEST_MAX_PENDING: int = int(os.getenv("INGEST_MAX_PENDING", "10000"))
+
+    # Telemetria ao vivo (SSE/WebSocket) com um on_snapshot por device/site
+    STREAM_COALESCE_SECONDS: float = float(os.getenv("STREAM_COALESCE_SECONDS", "0.25"))
+    STREAM_BUFFER_SIZE: int = int(os.getenv("STREAM_BUFFER_SIZE", "32"))
+    STREAM_KEEPALIVE_SECONDS: float = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))
+
+    # GET /metrics (Prometheus) e profiling sob demanda (header X-Profile, ver request_profiler.py)
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    PROFILE_ENABLED: bool = os.getenv("PROFILE_ENABLED", "false").lower() == "true"
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+    # GET /telemetry/history: pontos por parâmetro depois da redução (LTTB/min-max)
+    HISTORY_DEFAULT_POINTS: int = int(os.getenv("HISTORY_DEFAULT_POINTS", "1000"))
+    HISTORY_MAX_POINTS: int = int(os.getenv("HISTORY_MAX_POINTS", "2000"))
+
+    # Alertas avaliados na ingestão (ver telemetry_alerts.py)
+    ALERTS_ENABLED: bool = os.getenv("ALERTS_ENABLED", "true").lower() == "true"
+    ALERT_RULES_PATH: str = os.getenv("ALERT_RULES_PATH", "")
+    ALERT_MIN_DURATION_SECONDS: float = float(os.getenv("ALERT_MIN_DURATION_SECONDS", "60"))
+    ALERT_SINKS: str = os.getenv("ALERT_SINKS", "log")
+    ALERT_WEBHOOK_URL: str = os.getenv("ALERT_WEBHOOK_URL", "")
+    ALERT_QUEUE_SIZE: int = int(os.getenv("ALERT_QUEUE_SIZE", "1000"))
+
+    # Broker MQTT (o mesmo do firmware)
+    MQTT_BROKER_HOST: str = os.getenv("MQTT_BROKER_HOST", "broker.hivemq.com")
+    MQTT_BROKER_PORT: int = int(os.getenv("MQTT_BROKER_PORT", "1883"))
 
-    MAX_HISTORY_MESSAGES: int = 10
+    # POST /devices/{device_id}/measure: um comando por dispositivo para pedidos simultâneos
+    MEASURE_TIMEOUT_SECONDS: float = float(os.getenv("MEASURE_TIMEOUT_SECONDS", "45"))
+    MEASURE_COALESCE_SECONDS: float = float(os.getenv("MEASURE_COALESCE_SECONDS", "10"))
+    MEASURE_CLOCK_SKEW_SECONDS: float = float(os.getenv("MEASURE_CLOCK_SKEW_SECONDS", "5"))
 
 @lru_cache
 def get_settings() -> Settings:
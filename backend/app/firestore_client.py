@@ -1,10 +1,28 @@
-from google.cloud import firestore
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
 from app.config import get_settings
 
+if TYPE_CHECKING:
+    from google.cloud import firestore
+
 
 settings = get_settings()
 
+# o SDK do Firestore (grpc, protobuf...) só é importado quando um cliente é criado
+
 def get_firestore_client() -> firestore.Client:
+    from google.cloud import firestore
+
     if settings.FIRESTORE_PROJECT_ID:
         return firestore.Client(project=settings.FIRESTORE_PROJECT_ID)
     return firestore.Client()
+
+
+def get_async_firestore_client() -> firestore.AsyncClient:
+    from google.cloud import firestore
+
+    if settings.FIRESTORE_PROJECT_ID:
+        return firestore.AsyncClient(project=settings.FIRESTORE_PROJECT_ID)
+    return firestore.AsyncClient()
@@ -0,0 +1,126 @@
+"""
+Cache dos resultados de classify_intent, chaveado pela forma normalizada
+da mensagem (sem acentos, pontuação ou espaços extras, e com números por
+extenso convertidos em dígitos).
+
+- LRU + TTL em memória
+- persistência opcional em SQLite (sobrevive a reinícios)
+- sempre devolve um QueryIntent NOVO, porque o /chat altera intent.parameter
+"""
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.intent_rules import normalize_numbers, normalize_text
+from app.models import QueryIntent
+
+
+def cache_key(message: str) -> str:
+    """
+    "Como está o pH nos últimos TRÊS dias?!" -> "como esta o ph nos ultimos 3 dias"
+    """
+    t = normalize_text(message)
+    t = re.sub(r"[^\w°]+", " ", t)
+    t = normalize_numbers(t)
+    return re.sub(r"\s+", " ", t).strip()
+
+
+class IntentCache:
+    """
+    Seguro para uso concorrente (threads e event loop): as operações em
+    memória e no SQLite são curtas e feitas sob um único lock.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 6 * 3600,
+        sqlite_path: str = "",
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+        self._db: Optional[sqlite3.Connection] = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS intent_cache ("
+                " key TEXT PRIMARY KEY, intent TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._load()
+
+    def _load(self) -> None:
+        min_created = time.time() - self.ttl_seconds
+        self._db.execute("DELETE FROM intent_cache WHERE created_at < ?", (min_created,))
+        rows = self._db.execute(
+            "SELECT key, intent, created_at FROM intent_cache ORDER BY created_at DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        for key, intent, created_at in reversed(rows):
+            self._entries[key] = (created_at, json.loads(intent))
+        self._db.commit()
+
+    def get(self, message: str) -> Optional[QueryIntent]:
+        key = cache_key(message)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self._counts["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._counts["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counts["hits"] += 1
+            data = entry[1]
+        # cópia nova a cada acerto
+        return QueryIntent.model_validate(data)
+
+    def put(self, message: str, intent: QueryIntent) -> None:
+        # datas absolutas dependem de "quando" a pergunta foi feita: não cacheamos
+        if intent.start is not None or intent.end is not None:
+            return
+        key = cache_key(message)
+        data = intent.model_dump(mode="json")
+        created_at = time.time()
+        with self._lock:
+            self._entries[key] = (created_at, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._counts["evictions"] += 1
+                if self._db is not None:
+                    self._db.execute("DELETE FROM intent_cache WHERE key = ?", (old_key,))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO intent_cache (key, intent, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(data), created_at),
+                )
+                self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM intent_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            out: Dict[str, float] = dict(self._counts)
+            out["size"] = len(self._entries)
+        total = out["hits"] + out["misses"]
+        out["hit_rate"] = out["hits"] / total if total else 0.0
+        return out
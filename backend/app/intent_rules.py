@@ -0,0 +1,260 @@
+"""
+Classificador determinístico (regras/regex) para as perguntas mais comuns.
+
+Roda em microssegundos e devolve um QueryIntent + confiança. O /chat só
+chama a LLM quando a confiança fica abaixo de FAST_INTENT_THRESHOLD.
+
+resolve_followup completa perguntas de continuação ("e ontem?", "e a
+turbidez?") com a intenção anterior da sessão, também sem LLM.
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional, Tuple
+
+from app.models import QueryIntent, QueryIntentType, WaterParameter
+
+
+class FastIntentResult(NamedTuple):
+    intent: Optional[QueryIntent]
+    confidence: float
+
+
+def normalize_text(text: str) -> str:
+    """
+    minúsculas, sem acentos e com espaços colapsados.
+    """
+    t = unicodedata.normalize("NFKD", text.lower())
+    t = "".join(c for c in t if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", t).strip()
+
+
+_PARAM_PATTERNS: List[Tuple[WaterParameter, re.Pattern]] = [
+    (WaterParameter.PH, re.compile(r"\bp\s?h\b")),
+    (WaterParameter.TEMPERATURE, re.compile(r"\btemp(eratura)?s?\b|°c|\bgraus?\b|\bquente\b|\bfria\b")),
+    (WaterParameter.TURBIDITY, re.compile(r"\bturbidez\b|\bturv[ao]\b|\bntu\b")),
+    (WaterParameter.TDS, re.compile(r"\btds\b|\bcondutividade\b|\bppm\b|\bsolidos dissolvidos\b")),
+]
+
+_NUMBER_WORDS = {
+    "um": 1, "uma": 1, "dois": 2, "duas": 2, "tres": 3, "quatro": 4, "cinco": 5,
+    "seis": 6, "sete": 7, "oito": 8, "nove": 9, "dez": 10, "quinze": 15,
+    "vinte": 20, "trinta": 30, "sessenta": 60,
+}
+_NUM = r"(\d+|" + "|".join(_NUMBER_WORDS) + r")"
+_NUMBER_WORD_RE = re.compile(r"\b(" + "|".join(_NUMBER_WORDS) + r")\b")
+
+
+def normalize_numbers(text: str) -> str:
+    """
+    Números por extenso em dígitos ("ultimos tres dias" -> "ultimos 3 dias").
+    Espera texto já passado por normalize_text.
+    """
+    return _NUMBER_WORD_RE.sub(lambda m: str(_NUMBER_WORDS[m.group(1)]), text)
+
+# (padrão, multiplicador do número capturado) ou (padrão, dias fixos)
+_DAYS_BY_NUMBER: List[Tuple[re.Pattern, int]] = [
+    (re.compile(r"\bultim[oa]s\s+" + _NUM + r"\s+dias?\b"), 1),
+    (re.compile(r"\b" + _NUM + r"\s+dias?\b"), 1),
+    (re.compile(r"\bultim[oa]s\s+" + _NUM + r"\s+semanas?\b"), 7),
+]
+_DAYS_FIXED: List[Tuple[re.Pattern, int]] = [
+    (re.compile(r"\b(ultima|essa|esta|nesta|nessa|da|na)\s+semana\b"), 7),
+    (re.compile(r"\b(ultimo|esse|este|neste|nesse)\s+mes\b"), 30),
+    (re.compile(r"\bhoje\b|\b24 ?h(oras)?\b|\bultimo dia\b"), 1),
+]
+
+# (intent, padrão) — a ordem define a prioridade em caso de empate
+_INTENT_PATTERNS: List[Tuple[QueryIntentType, re.Pattern]] = [
+    (QueryIntentType.COMPARE_PERIODS, re.compile(
+        r"\bcompar\w*|\bvs\.?\b|\bversus\b|\bem relacao a(o)? (ontem|semana)\b"
+    )),
+    (QueryIntentType.TREND, re.compile(
+        r"\btendencia\b|\btende\b|\bsubindo\b|\bdescendo\b|\bcaindo\b|\baumentando\b"
+        r"|\bdiminuindo\b|\bbaixando\b|\bevolu\w+"
+    )),
+    (QueryIntentType.IDEAL_CHECK, re.compile(
+        r"\bideal\b|\bfaixa\b|\brecomendad\w+|\badequad\w+|\bnormal\b"
+        r"|\besta (ok|bom|boa|certo|certa)\b|\bpode(m)? (os )?peixes\b"
+    )),
+    (QueryIntentType.MAX_VALUE, re.compile(r"\bmaior\b|\bmaxim[oa]\b|\bmais alt[oa]\b|\bpico\b")),
+    (QueryIntentType.MIN_VALUE, re.compile(r"\bmenor\b|\bminim[oa]\b|\bmais baix[oa]\b")),
+    (QueryIntentType.AVG_VALUE, re.compile(r"\bmedia\b|\bmedio\b|\bem media\b")),
+    (QueryIntentType.PERIOD_STATUS, re.compile(
+        r"\bresumo\b|\bcomo (foi|esteve|ficou|se comportou)\b|\bhistorico\b|\bao longo\b"
+    )),
+    (QueryIntentType.LATEST_STATUS, re.compile(
+        r"\bultim[oa]\b|\bagora\b|\batual(mente)?\b|\bneste momento\b|\bcomo esta\b"
+        r"|\bqual (e )?(o|a) (valor (do|da) )?(p\s?h|temperatura|turbidez|tds)\b|\bleitura\b"
+    )),
+]
+
+_GENERAL_HELP = re.compile(
+    r"^(oi|ola|opa|bom dia|boa tarde|boa noite|e ai|hey|hello)\b"
+    r"|\bquem e voce\b|\bo que voce (faz|sabe)\b|\bcomo (te )?us(o|ar)\b|\bajuda\b"
+    r"|\bo que (e|significa|sao)\b|\bpara que serve\b|\bobrigad[oa]\b|\bvaleu\b"
+)
+
+_CONCEPTUAL = re.compile(r"\bo que (e|significa|sao)\b|\bpara que serve\b")
+
+# datas explícitas/relativas e períodos de calendário ("mês passado" não são os últimos 30
+# dias, "semana passada" não são os últimos 7, "de manhã" não é o dia todo): a LLM preenche
+# start/end, as regras só sabem "últimos N dias"
+_EXPLICIT_PERIOD = re.compile(
+    r"\bontem\b|\banteontem\b|\b\d{1,2}/\d{1,2}\b|\bentre\b|\bde \d{1,2} ?h?\w* (a|ate)\b"
+    r"|\bpassad[oa]s?\b|\bmes(es)?\b|\bmanha\b|\b(de|a|na|pela|esta|essa|nesta|nessa) tarde\b"
+    r"|(?<!\bboa )\bnoite\b|\bmadrugada\b|\b(fim|final) de semana\b"
+    r"|\b(segunda|terca|quarta|quinta|sexta)(-feira)?\b|\bsabado\b|\bdomingo\b"
+    r"|\b(janeiro|fevereiro|marco|abril|maio|junho|julho|agosto|setembro|outubro|novembro|dezembro)\b"
+)
+
+_NEEDS_PARAMETER = (
+    QueryIntentType.AVG_VALUE,
+    QueryIntentType.MAX_VALUE,
+    QueryIntentType.MIN_VALUE,
+    QueryIntentType.TREND,
+    QueryIntentType.IDEAL_CHECK,
+)
+
+
+def needs_parameter(intent: QueryIntentType) -> bool:
+    """
+    Intenções que só se respondem com um parâmetro (média, máxima, tendência...).
+    """
+    return intent in _NEEDS_PARAMETER
+
+
+def extract_parameter(norm: str) -> Optional[WaterParameter]:
+    found = [p for p, rx in _PARAM_PATTERNS if rx.search(norm)]
+    # mais de um parâmetro na mesma pergunta: deixamos para a LLM
+    return found[0] if len(found) == 1 else None
+
+
+def extract_days(norm: str) -> Optional[int]:
+    for rx, multiplier in _DAYS_BY_NUMBER:
+        m = rx.search(norm)
+        if m:
+            raw = m.group(1)
+            n = (int(raw) if raw.isdigit() else _NUMBER_WORDS[raw]) * multiplier
+            # mesmo limite de QueryIntent.days
+            return n if 1 <= n <= 60 else None
+    for rx, days in _DAYS_FIXED:
+        if rx.search(norm):
+            return days
+    return None
+
+
+def classify_intent_fast(text: str) -> FastIntentResult:
+    norm = normalize_text(text)
+    if not norm:
+        return FastIntentResult(None, 0.0)
+
+    param = extract_parameter(norm)
+    days = extract_days(norm)
+    matched = [it for it, rx in _INTENT_PATTERNS if rx.search(norm)]
+
+    # cumprimento sem pista de consulta a dados, ou pergunta conceitual
+    if _GENERAL_HELP.search(norm) and (not matched or _CONCEPTUAL.search(norm)):
+        return FastIntentResult(QueryIntent(intent=QueryIntentType.GENERAL_HELP), 0.95)
+
+    if not matched:
+        # só o parâmetro ("pH?", "temperatura da água"): pergunta de agora
+        if param is not None and len(norm.split()) <= 4 and not _EXPLICIT_PERIOD.search(norm):
+            return FastIntentResult(
+                QueryIntent(intent=QueryIntentType.LATEST_STATUS, parameter=param), 0.8
+            )
+        return FastIntentResult(None, 0.0)
+
+    # "últimos X dias" casa com "último"; não é latest_status se houver período
+    if days is not None and QueryIntentType.LATEST_STATUS in matched and len(matched) > 1:
+        matched.remove(QueryIntentType.LATEST_STATUS)
+    if days is not None and matched == [QueryIntentType.LATEST_STATUS]:
+        matched = [QueryIntentType.PERIOD_STATUS]
+
+    intent_type = matched[0]
+    confidence = 0.95 if len(matched) == 1 else 0.7
+    if intent_type in _NEEDS_PARAMETER and param is None:
+        confidence -= 0.1
+    if intent_type == QueryIntentType.COMPARE_PERIODS or _EXPLICIT_PERIOD.search(norm):
+        confidence = min(confidence, 0.6)
+
+    intent = QueryIntent(
+        intent=intent_type,
+        parameter=param,
+        days=None if intent_type == QueryIntentType.LATEST_STATUS else days,
+    )
+    return FastIntentResult(intent, round(confidence, 2))
+
+
+# "e ontem?", "e a turbidez?", "e a máxima?", "mas e nos últimos 7 dias?"
+_FOLLOWUP = re.compile(r"^(mas )?e( quanto a| sobre)?\b")
+_FOLLOWUP_MAX_WORDS = 6
+_CALENDAR_DAYS: List[Tuple[re.Pattern, int]] = [
+    (re.compile(r"\banteontem\b"), 2),
+    (re.compile(r"\bontem\b"), 1),
+]
+
+
+def looks_like_followup(text: str) -> bool:
+    norm = normalize_text(text)
+    return bool(_FOLLOWUP.match(norm)) and len(norm.split()) <= _FOLLOWUP_MAX_WORDS
+
+
+def _calendar_day(norm: str, now: datetime) -> Optional[Tuple[datetime, datetime]]:
+    # ontem/anteontem: o dia inteiro (meia-noite a meia-noite, horário local)
+    for rx, back in _CALENDAR_DAYS:
+        if rx.search(norm):
+            start = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=back)
+            return start, start + timedelta(days=1)
+    return None
+
+
+def resolve_followup(
+    text: str, previous: QueryIntent, now: Optional[datetime] = None
+) -> Optional[QueryIntent]:
+    """
+    Continuação da pergunta anterior: o que a mensagem traz (parâmetro,
+    período, estatística) substitui o que vinha de `previous`, o resto
+    continua. Também aceita só o parâmetro como resposta ao "qual
+    parâmetro?". None = não é continuação (segue a classificação normal).
+    """
+    norm = normalize_text(text)
+    words = len(norm.split())
+    param = extract_parameter(norm)
+
+    if not (_FOLLOWUP.match(norm) and words <= _FOLLOWUP_MAX_WORDS):
+        if (
+            param is not None
+            and words <= 3
+            and previous.parameter is None
+            and previous.intent in _NEEDS_PARAMETER
+        ):
+            return previous.model_copy(update={"parameter": param})
+        return None
+
+    now = now or datetime.now().astimezone()
+    days = extract_days(norm)
+    day = _calendar_day(norm, now)
+    matched = [it for it, rx in _INTENT_PATTERNS if rx.search(norm)]
+    if days is not None or day is not None:
+        matched = [it for it in matched if it != QueryIntentType.LATEST_STATUS]
+    if param is None and days is None and day is None and not matched:
+        return None
+
+    intent = previous.model_copy()
+    if matched:
+        intent.intent = matched[0]
+    elif (days is not None or day is not None) and intent.intent == QueryIntentType.LATEST_STATUS:
+        # "qual o pH agora?" -> "e ontem?": resumo do período
+        intent.intent = QueryIntentType.PERIOD_STATUS
+    if param is not None:
+        intent.parameter = param
+    if day is not None:
+        intent.start, intent.end, intent.days = day[0], day[1], None
+    elif days is not None:
+        intent.start, intent.end, intent.days = None, None, days
+    if intent.intent == QueryIntentType.LATEST_STATUS:
+        intent.start, intent.end, intent.days = None, None, None
+    return intent
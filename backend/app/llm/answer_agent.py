@@ -1,14 +1,20 @@
-from langchain_ollama import ChatOllama
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+import asyncio
+import threading
+from typing import AsyncIterator, Sequence, Tuple
 
 from app.config import get_settings
 from app.llm.prompts import load_water_prompt
+from app.metrics import timed
 
 settings = get_settings()
 
 
 def build_general_help_chain():
+    # LangChain/Ollama só são importados aqui (custam ~1 s no cold start)
+    from langchain_ollama import ChatOllama
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    from langchain_core.output_parsers import StrOutputParser
+
     system_template = """
 {water_prompt}
 
@@ -21,23 +27,76 @@ Não inclua JSON, nem "resumo dos dados".
 """
 
     prompt = ChatPromptTemplate.from_messages(
-        [("system", system_template), ("human", "{user_question}")]
+        [
+            ("system", system_template),
+            MessagesPlaceholder("history", optional=True),
+            ("human", "{user_question}"),
+        ]
     )
 
     llm = ChatOllama(
         model=settings.OLLAMA_MODEL_NAME,
         base_url=settings.OLLAMA_BASE_URL,
         temperature=0.2,
+        keep_alive=settings.OLLAMA_KEEP_ALIVE,
     )
 
     return prompt | llm | StrOutputParser()
 
 
-_general_help_chain = build_general_help_chain()
+_general_help_chain = None
+_general_help_chain_lock = threading.Lock()
+
+
+def get_general_help_chain():
+    """
+    Chain criada no primeiro uso (thread-safe).
+    """
+    global _general_help_chain
+    if _general_help_chain is None:
+        with _general_help_chain_lock:
+            if _general_help_chain is None:
+                _general_help_chain = build_general_help_chain()
+    return _general_help_chain
 
 
+async def aget_general_help_chain():
+    # a primeira construção importa LangChain: fora do event loop
+    return _general_help_chain or await asyncio.to_thread(get_general_help_chain)
+
+
+@timed("generate_general_help_answer")
 def generate_general_help_answer(user_question: str) -> str:
     water_prompt = load_water_prompt()
-    return _general_help_chain.invoke(
+    return get_general_help_chain().invoke(
         {"water_prompt": water_prompt, "user_question": user_question}
     )
+
+
+@timed("generate_general_help_answer")
+async def agenerate_general_help_answer(
+    user_question: str, history: Sequence[Tuple[str, str]] = ()
+) -> str:
+    """
+    history: mensagens anteriores já compactadas (chat_session.compact_history).
+    """
+    water_prompt = load_water_prompt()
+    chain = await aget_general_help_chain()
+    return await chain.ainvoke(
+        {"water_prompt": water_prompt, "user_question": user_question, "history": list(history)}
+    )
+
+
+async def astream_general_help_answer(
+    user_question: str, history: Sequence[Tuple[str, str]] = ()
+) -> AsyncIterator[str]:
+    """
+    Mesma resposta de agenerate_general_help_answer, entregue em pedaços
+    conforme o Ollama gera os tokens.
+    """
+    water_prompt = load_water_prompt()
+    chain = await aget_general_help_chain()
+    async for chunk in chain.astream(
+        {"water_prompt": water_prompt, "user_question": user_question, "history": list(history)}
+    ):
+        yield chunk
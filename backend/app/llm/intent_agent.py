@@ -1,14 +1,20 @@
-from langchain_ollama import ChatOllama
-from langchain_core.prompts import ChatPromptTemplate
+import asyncio
+import threading
+from typing import Sequence, Tuple
 
 from app.config import get_settings
 from app.llm.prompts import load_water_prompt
+from app.metrics import timed
 from app.models import QueryIntent
 
 settings = get_settings()
 
 
 def build_intent_chain():
+    # LangChain/Ollama só são importados aqui (custam ~1 s no cold start)
+    from langchain_ollama import ChatOllama
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
     system_prompt = """
 {water_prompt}
 
@@ -51,7 +57,8 @@ INTENTS (escolha UM):
 
 - compare_periods:
   - "compare hoje vs ontem", "essa semana vs semana passada"
-  - parameter recomendado
+  - parameter recomendado (sem parameter, compara os quatro)
+  - days = duração de cada período (hoje vs ontem: days=1; semana vs semana passada: days=7)
 
 REGRAS DE OURO (não quebre):
 1) NÃO invente datas.
@@ -66,12 +73,16 @@ REGRAS DE OURO (não quebre):
    - turbidez -> turbidity
    - condutividade/tds -> tds
 
+Se houver mensagens anteriores da conversa, a pergunta pode ser continuação delas
+("e ontem?", "e a turbidez?"): mantenha o que não mudou (parameter, período, intent).
+
 Retorne APENAS o JSON.
 """
 
     prompt = ChatPromptTemplate.from_messages(
         [
             ("system", system_prompt),
+            MessagesPlaceholder("history", optional=True),
             ("human", "{user_question}"),
         ]
     )
@@ -80,17 +91,51 @@ Retorne APENAS o JSON.
         model=settings.OLLAMA_MODEL_NAME,
         base_url=settings.OLLAMA_BASE_URL,
         temperature=0.0,  # mais determinístico
+        keep_alive=settings.OLLAMA_KEEP_ALIVE,
     )
 
     chain = prompt | llm.with_structured_output(QueryIntent)
     return chain
 
 
-_intent_chain = build_intent_chain()
+_intent_chain = None
+_intent_chain_lock = threading.Lock()
+
+
+def get_intent_chain():
+    """
+    Chain criada no primeiro uso (thread-safe).
+    """
+    global _intent_chain
+    if _intent_chain is None:
+        with _intent_chain_lock:
+            if _intent_chain is None:
+                _intent_chain = build_intent_chain()
+    return _intent_chain
+
 
+async def aget_intent_chain():
+    # a primeira construção importa LangChain: fora do event loop
+    return _intent_chain or await asyncio.to_thread(get_intent_chain)
 
+
+@timed("classify_intent")
 def classify_intent(user_question: str) -> QueryIntent:
     water_prompt = load_water_prompt()
-    return _intent_chain.invoke(
+    return get_intent_chain().invoke(
         {"user_question": user_question, "water_prompt": water_prompt}
     )
+
+
+@timed("classify_intent")
+async def aclassify_intent(
+    user_question: str, history: Sequence[Tuple[str, str]] = ()
+) -> QueryIntent:
+    """
+    history: mensagens anteriores já compactadas (chat_session.compact_history).
+    """
+    water_prompt = load_water_prompt()
+    chain = await aget_intent_chain()
+    return await chain.ainvoke(
+        {"user_question": user_question, "water_prompt": water_prompt, "history": list(history)}
+    )
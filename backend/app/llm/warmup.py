@@ -0,0 +1,41 @@
+"""
+Aquecimento opcional (OLLAMA_WARMUP_ENABLED), disparado depois que o servidor
+sobe: constrói as chains fora do caminho do primeiro /chat e pede ao Ollama
+para carregar o modelo, que fica em memória por OLLAMA_KEEP_ALIVE.
+"""
+import asyncio
+import logging
+import time
+
+from app.config import get_settings
+from app.llm.answer_agent import aget_general_help_chain
+from app.llm.intent_agent import aget_intent_chain
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+async def warm_up() -> None:
+    t0 = time.perf_counter()
+    await asyncio.gather(aget_intent_chain(), aget_general_help_chain())
+    chains_s = time.perf_counter() - t0
+
+    import httpx
+
+    try:
+        async with httpx.AsyncClient(base_url=settings.OLLAMA_BASE_URL, timeout=120.0) as client:
+            # /api/generate sem prompt só carrega o modelo
+            r = await client.post(
+                "/api/generate",
+                json={"model": settings.OLLAMA_MODEL_NAME, "keep_alive": settings.OLLAMA_KEEP_ALIVE},
+            )
+            r.raise_for_status()
+    except httpx.HTTPError as e:
+        logger.warning("aquecimento do Ollama falhou (%s); o modelo carrega na primeira pergunta", e)
+        return
+    logger.info(
+        "aquecimento concluído: chains em %.2f s, modelo %s carregado em %.2f s",
+        chains_s,
+        settings.OLLAMA_MODEL_NAME,
+        time.perf_counter() - t0 - chains_s,
+    )
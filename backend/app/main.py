@@ -1,21 +1,128 @@
-from typing import Any, Dict, Optional
+import asyncio
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Sequence, Tuple, Union
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import ValidationError
 
-from app.models import ChatRequest, ChatResponse, QueryIntentType, WaterParameter
-from app.llm.intent_agent import classify_intent
-from app.llm.answer_agent import generate_general_help_answer
+from app.models import (
+    ChatBatchRequest,
+    ChatBatchResponse,
+    ChatRequest,
+    ChatResponse,
+    AlertEvent,
+    DeviceLatest,
+    FleetRankingResponse,
+    MeasureResponse,
+    PARAMETER_LABELS,
+    QueryIntent,
+    QueryIntentType,
+    TelemetryBatchRequest,
+    TelemetryBatchResponse,
+    TelemetryHistoryResponse,
+    WaterParameter,
+)
+from app.intent_rules import classify_intent_fast, looks_like_followup, needs_parameter, resolve_followup
+from app.intent_cache import IntentCache
+from app.chat_session import ChatSession, HistoryMessage, compact_history, create_session_store
+from app.llm.intent_agent import aclassify_intent
+from app.llm.answer_agent import agenerate_general_help_answer, astream_general_help_answer
+from app.llm.warmup import warm_up
 from app.telemetry_repository import (
-    get_latest_telemetry,
-    get_telemetry_range,
-    summarize_series,
-    extreme_in_series,
+    aget_latest_state,
+    aget_telemetry_range,
+    aget_telemetry_ranges,
+    alist_latest_states,
+    latest_index,
+    query_flights,
+    asummarize_range,
+    aextreme_in_range,
+    atrend_range,
+    change_point_in_series,
+    compare_windows,
     trend_in_series,
     default_period,
+    extreme_in_series,
+    latest_in_series,
+    normalize_param,
+    summarize_series,
+    TelemetrySeries,
+    watch_latest_index,
+)
+from app.config import get_settings
+from app.metrics import ChatTracking, registry as metrics_registry, track_chat
+from app.request_profiler import ProfilerMiddleware
+from app.speculative_prefetch import SpeculativePrefetch, speculation_stats
+from app.telemetry_ingest import (
+    IngestUnavailable,
+    build_documents,
+    ingest_decoded,
+    ingest_documents,
+    write_buffer,
+)
+from app.telemetry_wire import decode_batches
+from app.telemetry_fleet import FLEET_METRICS, fleet_ranking
+from app.telemetry_downsample import DOWNSAMPLE_METHODS, encode_history, history_payload
+from app.telemetry_stream import stream_hub
+from app.telemetry_alerts import alert_dispatcher, alert_engine, alert_rules
+from app.measure_bridge import MeasureTimeout, measure_bridge
+from app.chat_batch import BatchTelemetry
+from app.chat_stream import (
+    NDJSON_MEDIA_TYPE,
+    SSE_MEDIA_TYPE,
+    chat_stream_stats,
+    single_token,
+    stream_chat,
+    wants_ndjson,
 )
 
-app = FastAPI(title="AquaBot Chat Backend", version="1.1.2")
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# dados buscados antes da resposta: especulação do /chat ou plano do /chat/batch
+TelemetryPrefetch = Union[SpeculativePrefetch, BatchTelemetry]
+
+intent_cache = IntentCache(
+    max_entries=settings.INTENT_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.INTENT_CACHE_TTL_SECONDS,
+    sqlite_path=settings.INTENT_CACHE_SQLITE_PATH,
+)
+
+session_store = create_session_store(settings)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.INGEST_WRITE_BEHIND_ENABLED:
+        write_buffer.start()
+    alert_dispatcher.start()
+    stop_index_watch = None
+    if settings.LATEST_INDEX_WATCH_ENABLED:
+        # sem credenciais o servidor ainda sobe; o índice segue conferido por par
+        # (LATEST_INDEX_VERIFY_SECONDS)
+        try:
+            stop_index_watch = watch_latest_index()
+        except Exception:
+            logger.warning("watch do índice da última leitura não iniciado", exc_info=True)
+    # em segundo plano: o servidor (e o /health) já respondem enquanto aquece
+    warmup = asyncio.create_task(warm_up()) if settings.OLLAMA_WARMUP_ENABLED else None
+    yield
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+    # grava o que ainda estiver no buffer antes de encerrar
+    await write_buffer.stop()
+    await alert_dispatcher.stop()
+    if stop_index_watch is not None:
+        stop_index_watch()
+
+
+app = FastAPI(title="AquaBot Chat Backend", version="1.1.2", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,14 +132,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Faixas "típicas"
-IDEAL = {
-    WaterParameter.PH: {"min": 6.5, "max": 8.5, "unit": "pH"},
-    WaterParameter.TEMPERATURE: {"min": 20.0, "max": 30.0, "unit": "°C"},
-    WaterParameter.TURBIDITY: {"min": 0.0, "max": 10.0, "unit": "NTU"},
-    WaterParameter.TDS: {"min": 0.0, "max": 500.0, "unit": "ppm"},
-}
+if settings.PROFILE_ENABLED:
+    app.add_middleware(ProfilerMiddleware, out_dir=settings.PROFILE_DIR, sample_rate=settings.PROFILE_SAMPLE_RATE)
 
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
 
 def infer_parameter_from_text(text: str) -> Optional[WaterParameter]:
     """
@@ -65,29 +168,561 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/stats/speculation")
+def speculation():
+    return speculation_stats.snapshot()
+
+
+@app.get("/stats/intent-cache")
+def intent_cache_stats():
+    return intent_cache.stats()
+
+
+MSGPACK_CONTENT_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+@app.post(
+    "/telemetry/batch",
+    response_model=TelemetryBatchResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"title": "TelemetryBatchRequest", "type": "object"}},
+                "application/msgpack": {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    },
+)
+async def telemetry_batch(request: Request):
+    """
+    JSON (TelemetryBatchRequest) ou MessagePack (ver telemetry_wire.py),
+    conforme o Content-Type.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    body = await request.body()
+
+    if content_type in MSGPACK_CONTENT_TYPES:
+        try:
+            batches = decode_batches(body)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        return await _ingest_or_503(ingest_decoded(batches))
+
+    try:
+        req = TelemetryBatchRequest.model_validate_json(body)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    try:
+        docs = build_documents(req)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return await _ingest_or_503(ingest_documents(docs, [r.seq for r in req.readings]))
+
+
+async def _ingest_or_503(ingest: Awaitable[TelemetryBatchResponse]) -> TelemetryBatchResponse:
+    try:
+        return await ingest
+    except IngestUnavailable as e:
+        # nada foi aceito; o reenvio grava nos mesmos IDs
+        retry_after = str(max(1, math.ceil(settings.INGEST_FLUSH_INTERVAL_SECONDS)))
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": retry_after})
+
+
+@app.get(
+    "/telemetry/history",
+    response_model=TelemetryHistoryResponse,
+    responses={200: {"content": {"application/msgpack": {"schema": {"type": "string", "format": "binary"}}}}},
+)
+async def telemetry_history(
+    request: Request,
+    device_id: str,
+    site_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    parameter: Optional[List[str]] = Query(None),
+    max_points: Optional[int] = None,
+    method: str = "lttb",
+):
+    """
+    Histórico para gráficos e PDF: uma leitura do intervalo (a mesma das
+    consultas do /chat) e, por parâmetro, no máximo max_points pontos (LTTB
+    ou envelope min/max, ver telemetry_downsample.py). Colunar: t em epoch
+    ms e v. MessagePack com Accept: application/msgpack.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise HTTPException(status_code=422, detail=f"method deve ser um de {', '.join(DOWNSAMPLE_METHODS)}")
+    max_points = min(max_points or settings.HISTORY_DEFAULT_POINTS, settings.HISTORY_MAX_POINTS)
+    if max_points < 3:
+        raise HTTPException(status_code=422, detail="max_points deve ser >= 3")
+
+    params = list(WaterParameter)
+    if parameter:
+        params = [normalize_param(name) for name in parameter]
+        if None in params:
+            raise HTTPException(status_code=422, detail=f"parâmetro desconhecido em {parameter}")
+    # sem fuso = horário local, como em to_epoch_ns
+    end = end.astimezone() if end is not None else datetime.now().astimezone()
+    start = start.astimezone() if start is not None else end - timedelta(days=1)
+    if start > end:
+        raise HTTPException(status_code=422, detail="start deve ser anterior a end")
+
+    series_by_param = await aget_telemetry_ranges(device_id, site_id, params, start, end)
+    # LTTB é um laço por bucket: fora do event loop
+    payload = await asyncio.to_thread(
+        history_payload, device_id, site_id, start, end, series_by_param, max_points, method
+    )
+    if any(t in request.headers.get("accept", "").lower() for t in MSGPACK_CONTENT_TYPES):
+        return Response(encode_history(payload), media_type="application/msgpack")
+    return payload
+
+
+@app.get("/stats/ingest")
+def ingest_stats():
+    return write_buffer.stats()
+
+
+@app.get("/telemetry/stream")
+async def telemetry_stream(device_id: str, site_id: str):
+    """
+    Server-sent events com cada nova leitura do par (evento "telemetry").
+    """
+
+    async def events():
+        async with stream_hub.subscription(device_id, site_id) as sub:
+            while True:
+                doc = await sub.next(timeout=settings.STREAM_KEEPALIVE_SECONDS)
+                if doc is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: telemetry\nid: {doc.id}\ndata: {doc.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/telemetry/ws")
+async def telemetry_ws(websocket: WebSocket, device_id: str, site_id: str):
+    await websocket.accept()
+    async with stream_hub.subscription(device_id, site_id) as sub:
+        # receive() só serve para perceber o fechamento; mensagens do cliente são ignoradas
+        received = asyncio.create_task(websocket.receive())
+        nxt: Optional[asyncio.Task] = None
+        try:
+            while True:
+                if nxt is None:
+                    nxt = asyncio.create_task(sub.next())
+                done, _ = await asyncio.wait({nxt, received}, return_when=asyncio.FIRST_COMPLETED)
+                if received in done:
+                    if received.result()["type"] == "websocket.disconnect":
+                        break
+                    received = asyncio.create_task(websocket.receive())
+                if nxt in done:
+                    await websocket.send_text(nxt.result().model_dump_json())
+                    nxt = None
+        except WebSocketDisconnect:
+            pass
+        finally:
+            received.cancel()
+            if nxt is not None:
+                nxt.cancel()
+
+
+@app.get("/stats/stream")
+def stream_stats():
+    return stream_hub.stats()
+
+
+@app.get("/alerts", response_model=List[AlertEvent])
+def recent_alerts(device_id: Optional[str] = None, site_id: Optional[str] = None, limit: int = 50):
+    """
+    Eventos de alerta mais recentes (abertos e resolvidos), do mais novo para o mais antigo.
+    """
+    events = [
+        e for e in reversed(alert_dispatcher.recent)
+        if (device_id is None or e.device_id == device_id) and (site_id is None or e.site_id == site_id)
+    ]
+    return events[:limit]
+
+
+@app.get("/alerts/active")
+def active_alerts():
+    return alert_engine.active()
+
+
+@app.get("/alerts/rules")
+def alert_rules_config():
+    return alert_rules.describe()
+
+
+@app.get("/stats/alerts")
+def alert_stats():
+    return {**alert_engine.stats(), **alert_dispatcher.stats()}
+
+
+@app.get("/devices/latest", response_model=List[DeviceLatest])
+async def devices_latest():
+    """
+    Última leitura de cada parâmetro de todos os devices/sites (índice
+    mantido na ingestão, ver telemetry_latest.py).
+    """
+    return await alist_latest_states()
+
+
+@app.get("/fleet/ranking", response_model=FleetRankingResponse)
+async def fleet_ranking_endpoint(
+    parameter: str,
+    metric: str = "avg",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    site_id: Optional[str] = None,
+    order: str = "desc",
+    limit: Optional[int] = None,
+):
+    """
+    Um parâmetro em todos os devices/sites (ou só os de site_id), ordenado
+    pela métrica: os shards são consultados em paralelo (ver
+    telemetry_fleet.py). Sem start/end, as últimas 24 h.
+    """
+    param = normalize_param(parameter)
+    if param is None:
+        raise HTTPException(status_code=422, detail=f"parâmetro desconhecido: {parameter}")
+    if metric not in FLEET_METRICS:
+        raise HTTPException(status_code=422, detail=f"metric deve ser um de {', '.join(FLEET_METRICS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=422, detail="order deve ser asc ou desc")
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=422, detail="limit deve ser >= 1")
+    end = end.astimezone() if end is not None else datetime.now().astimezone()
+    start = start.astimezone() if start is not None else end - timedelta(days=1)
+    if start > end:
+        raise HTTPException(status_code=422, detail="start deve ser anterior a end")
+    return await fleet_ranking(param, start, end, metric, site_id, order == "desc", limit)
+
+
+@app.post("/devices/{device_id}/measure", response_model=MeasureResponse)
+async def measure_now(device_id: str, site_id: str):
+    """
+    Pede uma medição ao dispositivo (MQTT) e devolve a leitura resultante.
+    Pedidos simultâneos do mesmo par compartilham um único comando (ver
+    measure_bridge.py).
+    """
+    try:
+        result = await measure_bridge.measure(device_id, site_id)
+    except MeasureTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    return MeasureResponse(
+        requested_at=result.requested_at,
+        coalesced=result.coalesced,
+        waiters=result.waiters,
+        reading=result.reading,
+    )
+
+
+@app.get("/stats/measure")
+def measure_stats():
+    return measure_bridge.stats()
+
+
+@app.get("/stats/latest-index")
+def latest_index_stats():
+    return latest_index.stats()
+
+
+@app.get("/stats/single-flight")
+def single_flight_stats():
+    return query_flights.stats()
+
+
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-    intent = classify_intent(req.message)
+async def chat(req: ChatRequest):
+    with track_chat("chat") as tracking:
+        spec = _speculate(req)
+        try:
+            session = await session_store.get(req.session_id)
+            intent = await _classify_request(req, session)
+            tracking.intent = intent.intent.value
+            response = await _answer(req, intent, spec, session)
+        finally:
+            if spec is not None:
+                spec.discard()
+        await session_store.record(session, req.message, response.answer, intent)
+        return response
+
+
+@app.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch(req: ChatBatchRequest):
+    """
+    Várias perguntas sobre o mesmo device/site: classificação concorrente,
+    uma leitura por janela de tempo servindo todos os parâmetros (ver
+    chat_batch.py) e respostas na mesma ordem das mensagens.
+    """
+    with track_chat("chat_batch") as tracking:
+        return await _chat_batch(req, tracking)
+
+
+async def _chat_batch(req: ChatBatchRequest, tracking: ChatTracking) -> ChatBatchResponse:
+    requests = [
+        ChatRequest(session_id=req.session_id, message=m, device_id=req.device_id, site_id=req.site_id)
+        for m in req.messages
+    ]
+    # continuações resolvidas pela conversa de antes do lote
+    session = await session_store.get(req.session_id)
+    intents = await asyncio.gather(*(_classify_request(r, session) for r in requests))
+    kinds = {i.intent.value for i in intents}
+    tracking.intent = kinds.pop() if len(kinds) == 1 else "mixed"
+
+    shared = BatchTelemetry(req.device_id, req.site_id, *default_period(days=1))
+    for intent in intents:
+        if _uses_latest(intent):
+            shared.need_latest()
+        elif intent.intent == QueryIntentType.COMPARE_PERIODS:
+            lo, _, end = _compare_bounds(intent, shared)
+            for param in _compare_params(intent):
+                shared.need_range(param, lo, end)
+        elif intent.intent != QueryIntentType.GENERAL_HELP and intent.parameter is not None:
+            shared.need_range(intent.parameter, *_resolve_period(intent, shared))
+    await shared.fetch()
+
+    answers = await asyncio.gather(
+        *(_answer(r, intent, shared, session) for r, intent in zip(requests, intents))
+    )
+    for r, intent, answered in zip(requests, intents, answers):
+        session.record(r.message, answered.answer, intent)
+    await session_store.save(session)
+    return ChatBatchResponse(session_id=req.session_id, answers=list(answers))
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest, request: Request):
+    """
+    Mesma lógica do /chat, com a resposta em frames SSE (ou NDJSON, se
+    Accept: application/x-ndjson) à medida que a LLM gera os tokens.
+    Ver chat_stream.py para o formato.
+    """
+    started = time.perf_counter()
+    ndjson = wants_ndjson(request.headers.get("accept", ""))
+
+    # classificação e telemetria antes do stream: erros ainda viram status HTTP
+    # métricas só até o início do stream; a geração fica em /stats/chat-stream
+    data_used: Optional[Dict[str, Any]] = None
+    with track_chat("chat_stream") as tracking:
+        spec = _speculate(req)
+        try:
+            session = await session_store.get(req.session_id)
+            intent = await _classify_request(req, session)
+            tracking.intent = intent.intent.value
+            if intent.intent == QueryIntentType.GENERAL_HELP:
+                tokens = astream_general_help_answer(req.message, _history(session))
+            else:
+                answered = await _answer_telemetry(req, intent, spec)
+                tokens = single_token(answered.answer)
+                data_used = answered.data_used
+        finally:
+            if spec is not None:
+                spec.discard()
+
+    def make_response(answer: str) -> ChatResponse:
+        return ChatResponse(
+            session_id=req.session_id,
+            answer=answer,
+            intent=intent.intent.value,
+            data_used=data_used,
+        )
+
+    tokens = _recorded(tokens, session, req.message, intent)
+    return StreamingResponse(
+        stream_chat(tokens, make_response, intent.intent.value, started, ndjson),
+        media_type=NDJSON_MEDIA_TYPE if ndjson else SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _recorded(
+    tokens: AsyncIterator[str], session: ChatSession, question: str, intent: QueryIntent
+) -> AsyncIterator[str]:
+    # a resposta inteira só existe no fim do stream; em falha nada é gravado
+    parts = []
+    async for token in tokens:
+        parts.append(token)
+        yield token
+    await session_store.record(session, question, "".join(parts), intent)
 
-    # DEBUG (você pode remover depois)
-    print("INTENT DEBUG:", intent)
+
+@app.get("/stats/sessions")
+def session_stats():
+    return session_store.stats()
+
+
+@app.delete("/sessions/{session_id}", status_code=204)
+async def forget_session(session_id: str):
+    """
+    Apaga o histórico e o contexto (último parâmetro/período) da sessão.
+    """
+    await session_store.delete(session_id)
+    return Response(status_code=204)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Formato texto do Prometheus (ver metrics.py).
+    """
+    return PlainTextResponse(metrics_registry.render(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
+@app.get("/stats/chat-stream")
+def chat_stream_stats_endpoint():
+    return chat_stream_stats.stats()
+
+
+def _speculate(req: ChatRequest) -> Optional[SpeculativePrefetch]:
+    # Execução especulativa: device/site já são conhecidos, então buscamos a
+    # última leitura e as últimas 24h do parâmetro inferido enquanto a LLM classifica.
+    if settings.SPECULATIVE_PREFETCH_ENABLED and req.device_id and req.site_id:
+        start, end = default_period(days=1)
+        return SpeculativePrefetch(
+            req.device_id, req.site_id, infer_parameter_from_text(req.message), start, end
+        )
+    return None
+
+
+async def classify(message: str, history: Sequence[HistoryMessage] = ()) -> QueryIntent:
+    """
+    Regras determinísticas primeiro; a LLM só é chamada abaixo do limiar de
+    confiança e se a mesma pergunta (normalizada) não estiver no cache.
+    Com history (continuação que as regras não resolveram) o cache fica de
+    fora: a mesma frase muda de sentido conforme a conversa.
+    """
+    if settings.FAST_INTENT_ENABLED:
+        fast = classify_intent_fast(message)
+        if fast.intent is not None and fast.confidence >= settings.FAST_INTENT_THRESHOLD:
+            return fast.intent
+
+    if history:
+        return await aclassify_intent(message, history)
+    if not settings.INTENT_CACHE_ENABLED:
+        return await aclassify_intent(message)
+
+    cached = intent_cache.get(message)
+    if cached is not None:
+        return cached
+    intent = await aclassify_intent(message)
+    intent_cache.put(message, intent)
+    return intent
+
+
+def _history(session: Optional[ChatSession]) -> List[HistoryMessage]:
+    if session is None:
+        return []
+    return compact_history(
+        session.messages, settings.CHAT_HISTORY_TOKEN_BUDGET, settings.CHAT_HISTORY_MESSAGE_MAX_TOKENS
+    )
+
+
+async def _classify_request(req: ChatRequest, session: Optional[ChatSession] = None) -> QueryIntent:
+    previous = session.last_intent if session is not None else None
+    # "e ontem?", "e a turbidez?": completa a intenção anterior, sem LLM
+    intent = resolve_followup(req.message, previous) if previous is not None else None
+    if intent is None:
+        history = _history(session) if looks_like_followup(req.message) else []
+        intent = await classify(req.message, history)
+    logger.debug("intent de %r: %s", req.message, intent)
 
     # ✅ Fallback determinístico: se a LLM não identificou o parâmetro, tentamos pelo texto
     if intent.parameter is None:
         inferred = infer_parameter_from_text(req.message)
         if inferred is not None:
             intent.parameter = inferred
+    # ...e depois pelo parâmetro da conversa ("qual a máxima?" logo após falar do pH)
+    if intent.parameter is None and needs_parameter(intent.intent) and previous is not None:
+        intent.parameter = previous.parameter
+    return intent
 
+
+async def _answer(
+    req: ChatRequest,
+    intent: QueryIntent,
+    spec: Optional[TelemetryPrefetch],
+    session: Optional[ChatSession] = None,
+) -> ChatResponse:
     # Help geral: não exige device/site e não consulta Firestore
     if intent.intent == QueryIntentType.GENERAL_HELP:
-        answer = generate_general_help_answer(req.message)
+        answer = await agenerate_general_help_answer(req.message, _history(session))
         return ChatResponse(
             session_id=req.session_id,
             answer=answer,
             intent=intent.intent.value,
             data_used=None,
         )
+    return await _answer_telemetry(req, intent, spec)
+
+
+def _resolve_period(
+    intent: QueryIntent, spec: Optional[TelemetryPrefetch]
+) -> Tuple[datetime, datetime]:
+    # Período padrão: se vier days usa days, senão 1 dia (24h)
+    start, end = (spec.start, spec.end) if spec is not None else default_period(days=1)
+    if intent.days and intent.days != 1:
+        start = end - timedelta(days=intent.days)
+
+    if intent.start:
+        start = intent.start
+    if intent.end:
+        end = intent.end
+    return start, end
+
+
+def _compare_bounds(
+    intent: QueryIntent, spec: Optional[TelemetryPrefetch]
+) -> Tuple[datetime, datetime, datetime]:
+    """
+    compare_periods: o período pedido e o anterior, de mesma duração, colado
+    nele -> (início do anterior, início do pedido, fim).
+    """
+    start, end = _resolve_period(intent, spec)
+    return start - (end - start), start, end
 
+
+def _compare_params(intent: QueryIntent) -> List[WaterParameter]:
+    # sem parâmetro: os quatro, da mesma leitura
+    return [intent.parameter] if intent.parameter is not None else list(WaterParameter)
+
+
+def _compare_labels(intent: QueryIntent) -> Tuple[str, str]:
+    if intent.start or intent.end:
+        return "no período", "no período anterior"
+    days = intent.days or 1
+    if days == 1:
+        return "nas últimas 24 h", "nas 24 h anteriores"
+    if days == 7:
+        return "nesta semana", "na semana anterior"
+    return f"nos últimos {days} dias", f"nos {days} dias anteriores"
+
+
+def _uses_latest(intent: QueryIntent) -> bool:
+    """
+    Respondida pelo índice da última leitura: latest_status e ideal_check
+    sem período explícito.
+    """
+    if intent.intent == QueryIntentType.LATEST_STATUS:
+        return True
+    has_period = intent.start or intent.end or (intent.days and intent.days != 1)
+    return intent.intent == QueryIntentType.IDEAL_CHECK and not has_period
+
+
+async def _latest_state(req: ChatRequest, spec: Optional[TelemetryPrefetch]) -> Optional[DeviceLatest]:
+    if spec is not None:
+        return await spec.latest()
+    return await aget_latest_state(req.device_id, req.site_id)
+
+
+async def _answer_telemetry(
+    req: ChatRequest, intent: QueryIntent, spec: Optional[TelemetryPrefetch]
+) -> ChatResponse:
     # A partir daqui, tudo é telemetria -> exige device/site
     if not req.device_id or not req.site_id:
         raise HTTPException(
@@ -110,22 +745,13 @@ def chat(req: ChatRequest):
             data_used=None,
         )
 
-    # Período padrão: se vier days usa days, senão 1 dia (24h)
-    if intent.days:
-        start, end = default_period(days=intent.days)
-    else:
-        start, end = default_period(days=1)
-
-    if intent.start:
-        start = intent.start
-    if intent.end:
-        end = intent.end
+    start, end = _resolve_period(intent, spec)
 
     data_used: Optional[Dict[str, Any]] = None
 
     # -------- latest_status --------
     if intent.intent == QueryIntentType.LATEST_STATUS:
-        latest = get_latest_telemetry(req.device_id, req.site_id)
+        latest = await _latest_state(req, spec)
         if not latest:
             return ChatResponse(
                 session_id=req.session_id,
@@ -134,44 +760,28 @@ def chat(req: ChatRequest):
                 data_used=None,
             )
 
-        # Se perguntou de um parâmetro específico, responde só ele
+        # Se perguntou de um parâmetro específico, responde só ele (com a
+        # última vez que ele veio, mesmo que o envio mais recente não o traga)
         if intent.parameter:
-            wanted = intent.parameter.value
-
-            for m in latest.measurements:
-                m_name = m.parameter.strip().lower()
-
-                # normaliza pH
-                if wanted == "ph" and m_name in ("ph", "pH".lower()):
-                    answer = (
-                        f"Última {pretty_name(intent.parameter)}: "
-                        f"{m.value:.2f}{m.unit} (em {latest.sent_at.isoformat()})."
-                    )
-                    return ChatResponse(
-                        session_id=req.session_id,
-                        answer=answer,
-                        intent=intent.intent.value,
-                        data_used=None,
-                    )
-
-                if m_name == wanted:
-                    answer = (
-                        f"Última {pretty_name(intent.parameter)}: "
-                        f"{m.value:.2f}{m.unit} (em {latest.sent_at.isoformat()})."
-                    )
-                    return ChatResponse(
-                        session_id=req.session_id,
-                        answer=answer,
-                        intent=intent.intent.value,
-                        data_used=None,
-                    )
+            reading = latest.parameters.get(intent.parameter)
+            if reading is None:
+                return ChatResponse(
+                    session_id=req.session_id,
+                    answer=(
+                        f"Encontrei leituras desse dispositivo/local, mas nenhuma com "
+                        f"{pretty_name(intent.parameter)}."
+                    ),
+                    intent=intent.intent.value,
+                    data_used=None,
+                )
 
+            answer = (
+                f"Última {pretty_name(intent.parameter)}: "
+                f"{reading.value:.2f}{reading.unit} (em {reading.sent_at.isoformat()})."
+            )
             return ChatResponse(
                 session_id=req.session_id,
-                answer=(
-                    f"Encontrei a última leitura, mas não veio o parâmetro "
-                    f"{pretty_name(intent.parameter)} nesse envio."
-                ),
+                answer=answer,
                 intent=intent.intent.value,
                 data_used=None,
             )
@@ -188,6 +798,10 @@ def chat(req: ChatRequest):
             data_used=None,
         )
 
+    # -------- compare_periods: as duas janelas saem de uma leitura só --------
+    if intent.intent == QueryIntentType.COMPARE_PERIODS:
+        return await _answer_compare(req, intent, spec)
+
     # A partir daqui, usamos séries de um parâmetro
     param = intent.parameter
     if param is None:
@@ -198,9 +812,48 @@ def chat(req: ChatRequest):
             data_used=None,
         )
 
-    series = get_telemetry_range(req.device_id, req.site_id, param, start, end)
+    # -------- ideal_check sem período: valor mais recente, do índice --------
+    if intent.intent == QueryIntentType.IDEAL_CHECK and _uses_latest(intent):
+        latest = await _latest_state(req, spec)
+        reading = latest.parameters.get(param) if latest else None
+        if reading is None:
+            return ChatResponse(
+                session_id=req.session_id,
+                answer="Não encontrei dados nesse período. Tente aumentar o intervalo (ex: últimos 7 dias).",
+                intent=intent.intent.value,
+                data_used=None,
+            )
+        return _ideal_answer(req, intent, param, reading.value, reading.unit)
 
-    if not series:
+    # max/min/avg/period_status/trend saem direto dos rollups; ideal_check usa a série.
+    # Se a série especulada bater com o que foi pedido, usamos ela direto.
+    series = TelemetrySeries.empty()
+    summ: Optional[Dict[str, Any]] = None
+    best: Optional[Dict[str, Any]] = None
+    tr: Optional[Dict[str, Any]] = None
+    spec_series = await spec.claim_range(param, start, end) if spec is not None else None
+    if spec_series is not None:
+        series = spec_series
+        if intent.intent == QueryIntentType.MAX_VALUE:
+            best = extreme_in_series(series, "max")
+        elif intent.intent == QueryIntentType.MIN_VALUE:
+            best = extreme_in_series(series, "min")
+        elif intent.intent in (QueryIntentType.AVG_VALUE, QueryIntentType.PERIOD_STATUS):
+            summ = summarize_series(series)
+        elif intent.intent == QueryIntentType.TREND:
+            tr = trend_in_series(series)
+    elif intent.intent == QueryIntentType.MAX_VALUE:
+        best = await aextreme_in_range(req.device_id, req.site_id, param, start, end, "max")
+    elif intent.intent == QueryIntentType.MIN_VALUE:
+        best = await aextreme_in_range(req.device_id, req.site_id, param, start, end, "min")
+    elif intent.intent in (QueryIntentType.AVG_VALUE, QueryIntentType.PERIOD_STATUS):
+        summ = await asummarize_range(req.device_id, req.site_id, param, start, end)
+    elif intent.intent == QueryIntentType.TREND:
+        tr = await atrend_range(req.device_id, req.site_id, param, start, end)
+    else:
+        series = await aget_telemetry_range(req.device_id, req.site_id, param, start, end)
+
+    if not (series or summ or best or tr):
         return ChatResponse(
             session_id=req.session_id,
             answer="Não encontrei dados nesse período. Tente aumentar o intervalo (ex: últimos 7 dias).",
@@ -210,7 +863,6 @@ def chat(req: ChatRequest):
 
     # -------- max/min/avg/period_status --------
     if intent.intent == QueryIntentType.MAX_VALUE:
-        best = extreme_in_series(series, "max")
         answer = (
             f"O maior valor de {pretty_name(param)} no período foi "
             f"{best['value']:.2f}{best['unit']} (em {best['sent_at'].isoformat()})."
@@ -223,7 +875,6 @@ def chat(req: ChatRequest):
         )
 
     if intent.intent == QueryIntentType.MIN_VALUE:
-        best = extreme_in_series(series, "min")
         answer = (
             f"O menor valor de {pretty_name(param)} no período foi "
             f"{best['value']:.2f}{best['unit']} (em {best['sent_at'].isoformat()})."
@@ -236,7 +887,6 @@ def chat(req: ChatRequest):
         )
 
     if intent.intent == QueryIntentType.AVG_VALUE:
-        summ = summarize_series(series)
         answer = (
             f"Média de {pretty_name(param)} no período: "
             f"{summ['avg']:.2f}{summ['unit']} (amostras: {summ['count']})."
@@ -249,7 +899,6 @@ def chat(req: ChatRequest):
         )
 
     if intent.intent == QueryIntentType.PERIOD_STATUS:
-        summ = summarize_series(series)
         answer = (
             f"{pretty_name(param)} no período: média {summ['avg']:.2f}{summ['unit']}, "
             f"mín {summ['min']:.2f}, máx {summ['max']:.2f} (amostras: {summ['count']})."
@@ -263,7 +912,6 @@ def chat(req: ChatRequest):
 
     # -------- trend --------
     if intent.intent == QueryIntentType.TREND:
-        tr = trend_in_series(series)
         if not tr:
             return ChatResponse(
                 session_id=req.session_id,
@@ -275,8 +923,17 @@ def chat(req: ChatRequest):
         dir_txt = {"up": "subindo", "down": "caindo", "stable": "estável"}[tr["direction"]]
         answer = (
             f"Tendência de {pretty_name(param)} no período: {dir_txt}. "
-            f"Variação {tr['delta']:.2f}{tr['unit']} (de {tr['first']:.2f} para {tr['last']:.2f})."
+            f"Variação {tr['delta']:.2f}{tr['unit']} pela reta de tendência "
+            f"(de {tr['first']:.2f} para {tr['last']:.2f})."
         )
+        # só quando há tendência: quando começou a subir/cair (precisa dos pontos)
+        if tr["direction"] != "stable":
+            if not series:
+                series = await aget_telemetry_range(req.device_id, req.site_id, param, start, end)
+            change = change_point_in_series(series, tr["direction"])
+            if change is not None:
+                verb = "subir" if tr["direction"] == "up" else "cair"
+                answer += f" Começou a {verb} por volta de {change['sent_at'].isoformat()}."
         return ChatResponse(
             session_id=req.session_id,
             answer=answer,
@@ -286,43 +943,106 @@ def chat(req: ChatRequest):
 
     # -------- ideal_check --------
     if intent.intent == QueryIntentType.IDEAL_CHECK:
-        latest_point = series[-1]
-        value = latest_point[1]
-        ideal = IDEAL.get(param)
-        if not ideal:
-            return ChatResponse(
-                session_id=req.session_id,
-                answer="Não tenho faixa ideal configurada para esse parâmetro.",
-                intent=intent.intent.value,
-                data_used=None,
-            )
+        # pelo horário: a série pode vir DESC (consulta) ou ASC
+        latest_point = latest_in_series(series)
+        return _ideal_answer(req, intent, param, latest_point[1], latest_point[2])
 
-        ok = ideal["min"] <= value <= ideal["max"]
-        status = "dentro" if ok else "fora"
-        answer = (
-            f"A {pretty_name(param)} mais recente foi {value:.2f}{latest_point[2]} e está {status} da faixa ideal "
-            f"({ideal['min']:.1f}–{ideal['max']:.1f}{ideal['unit']})."
+    # fallback
+    return ChatResponse(
+        session_id=req.session_id,
+        answer="Não consegui classificar sua pergunta. Tente perguntar de outra forma.",
+        intent=intent.intent.value,
+        data_used=data_used,
+    )
+
+
+async def _answer_compare(
+    req: ChatRequest, intent: QueryIntent, spec: Optional[TelemetryPrefetch]
+) -> ChatResponse:
+    lo, split, end = _compare_bounds(intent, spec)
+    params = _compare_params(intent)
+    by_param: Dict[WaterParameter, TelemetrySeries] = {}
+    if spec is not None:
+        for p in params:
+            claimed = await spec.claim_range(p, lo, end)
+            if claimed is not None:
+                by_param[p] = claimed
+    missing = [p for p in params if p not in by_param]
+    if missing:
+        # um intervalo contínuo cobrindo as duas janelas, todos os parâmetros juntos
+        by_param.update(await aget_telemetry_ranges(req.device_id, req.site_id, missing, lo, end))
+
+    current_label, previous_label = _compare_labels(intent)
+    parts = []
+    for p in params:
+        cmp = compare_windows(by_param.get(p, TelemetrySeries.empty()), lo, split, end)
+        if cmp is not None:
+            parts.append(_compare_text(p, cmp, current_label, previous_label))
+    if not parts:
+        return ChatResponse(
+            session_id=req.session_id,
+            answer="Não encontrei dados nesse período. Tente aumentar o intervalo (ex: últimos 7 dias).",
+            intent=intent.intent.value,
+            data_used=None,
+        )
+    return ChatResponse(
+        session_id=req.session_id,
+        answer=" ".join(parts),
+        intent=intent.intent.value,
+        data_used=None,
+    )
+
+
+def _compare_text(param: WaterParameter, cmp: Dict[str, Any], current_label: str, previous_label: str) -> str:
+    def window(label: str, w: Optional[Dict[str, Any]]) -> str:
+        if w is None:
+            return f"sem leituras {label}"
+        return (
+            f"{label} média {w['avg']:.2f}{w['unit']} (mín {w['min']:.2f}, máx {w['max']:.2f}, "
+            f"variação {w['delta']:+.2f}, amostras: {w['count']})"
         )
+
+    text = (
+        f"{pretty_name(param)}: {window(current_label, cmp['current'])}; "
+        f"{window(previous_label, cmp['previous'])}."
+    )
+    change = cmp["change"]
+    if change is None:
+        return text
+    unit = cmp["current"]["unit"]
+    if abs(change) < 0.005:
+        return text + " A média ficou estável."
+    verb = "subiu" if change > 0 else "caiu"
+    pct = f" ({cmp['pct_change']:+.1f}%)" if cmp["pct_change"] is not None else ""
+    return text + f" A média {verb} {abs(change):.2f}{unit}{pct}."
+
+
+def _ideal_answer(
+    req: ChatRequest, intent: QueryIntent, param: WaterParameter, value: float, unit: str
+) -> ChatResponse:
+    # faixa do site (ALERT_RULES_PATH), a mesma usada nos alertas
+    ideal = alert_rules.ideal_range(req.site_id, param)
+    if not ideal:
         return ChatResponse(
             session_id=req.session_id,
-            answer=answer,
+            answer="Não tenho faixa ideal configurada para esse parâmetro.",
             intent=intent.intent.value,
             data_used=None,
         )
 
-    # fallback
+    ok = ideal["min"] <= value <= ideal["max"]
+    status = "dentro" if ok else "fora"
+    answer = (
+        f"A {pretty_name(param)} mais recente foi {value:.2f}{unit} e está {status} da faixa ideal "
+        f"({ideal['min']:.1f}–{ideal['max']:.1f}{ideal['unit']})."
+    )
     return ChatResponse(
         session_id=req.session_id,
-        answer="Não consegui classificar sua pergunta. Tente perguntar de outra forma.",
+        answer=answer,
         intent=intent.intent.value,
-        data_used=data_used,
+        data_used=None,
     )
 
 
 def pretty_name(p: WaterParameter) -> str:
-    return {
-        WaterParameter.PH: "pH",
-        WaterParameter.TEMPERATURE: "temperatura",
-        WaterParameter.TURBIDITY: "turbidez",
-        WaterParameter.TDS: "TDS",
-    }[p]
+    return PARAMETER_LABELS[p]
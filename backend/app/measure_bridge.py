@@ -0,0 +1,179 @@
+"""
+Medição sob demanda pelo backend (POST /devices/{device_id}/measure).
+
+Antes cada celular publicava direto em aquamonitor/<device>/command/measure
+e o firmware fazia uma leitura completa (30 amostras por sensor) e um envio
+ao Firestore por mensagem: vários toques no botão ao mesmo tempo viravam
+várias medições seguidas. Aqui:
+
+- pedidos do mesmo (device_id, site_id) enquanto há um comando em voo entram
+  nele (single-flight): um único publish no broker
+- a leitura resultante chega pelo hub de streaming (o mesmo on_snapshot do
+  GET /telemetry/stream) e é entregue a todos que esperavam
+- por MEASURE_COALESCE_SECONDS depois de chegar, novos pedidos recebem essa
+  mesma leitura em vez de disparar outra medição
+- sem leitura em MEASURE_TIMEOUT_SECONDS, todos recebem timeout e o próximo
+  pedido publica de novo
+
+A inscrição no hub é feita antes do publish, então a leitura não se perde
+mesmo se o dispositivo responder muito rápido. Só valem leituras com sent_at
+a partir do pedido (com MEASURE_CLOCK_SKEW_SECONDS de folga para o relógio
+do ESP32); a última leitura que o hub entrega ao se inscrever é ignorada.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from app.config import get_settings
+from app.models import TelemetryDocument
+from app.mqtt_client import MqttPublish, connect_mqtt_publisher
+from app.telemetry_stream import TelemetryStreamHub, stream_hub
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def command_topic(device_id: str) -> str:
+    # tópico assinado pelo firmware (mqttCmdTopic)
+    return f"aquamonitor/{device_id}/command/measure"
+
+
+class MeasureTimeout(Exception):
+    pass
+
+
+class MeasureResult(NamedTuple):
+    reading: TelemetryDocument
+    requested_at: datetime
+    coalesced: bool      # entrou num comando já publicado
+    waiters: int         # pedidos atendidos pelo mesmo comando até agora
+
+
+class _Command:
+    __slots__ = ("requested_at", "future", "waiters", "landed_at")
+
+    def __init__(self, requested_at: datetime, future: asyncio.Future) -> None:
+        self.requested_at = requested_at
+        self.future = future
+        self.waiters = 1
+        self.landed_at: Optional[float] = None
+
+
+class MeasureBridge:
+    def __init__(
+        self,
+        hub: TelemetryStreamHub,
+        publish: Optional[MqttPublish] = None,
+        host: str = "",
+        port: int = 1883,
+        timeout_s: float = 45.0,
+        coalesce_s: float = 10.0,
+        clock_skew_s: float = 5.0,
+    ) -> None:
+        self._hub = hub
+        self._publish = publish
+        self.host = host
+        self.port = port
+        self.timeout_s = timeout_s
+        self.coalesce_s = coalesce_s
+        self.clock_skew = timedelta(seconds=clock_skew_s)
+        self._commands: Dict[Tuple[str, str], _Command] = {}
+        self.requests = 0
+        self.published = 0
+        self.coalesced = 0
+        self.landed = 0
+        self.timeouts = 0
+
+    def _reusable(self, cmd: Optional[_Command], now: float) -> bool:
+        if cmd is None:
+            return False
+        if not cmd.future.done():
+            return True
+        return cmd.landed_at is not None and now - cmd.landed_at <= self.coalesce_s
+
+    async def measure(self, device_id: str, site_id: str) -> MeasureResult:
+        """
+        Leitura feita a partir deste pedido (ou de um concorrente do mesmo
+        par). MeasureTimeout se o dispositivo não responder a tempo.
+        """
+        loop = asyncio.get_running_loop()
+        key = (device_id, site_id)
+        self.requests += 1
+        cmd = self._commands.get(key)
+        coalesced = self._reusable(cmd, loop.time())
+        if coalesced:
+            cmd.waiters += 1
+            self.coalesced += 1
+        else:
+            cmd = _Command(datetime.now(timezone.utc), loop.create_future())
+            self._commands[key] = cmd
+            loop.create_task(self._run(key, cmd))
+
+        # shield: um cliente que desiste não cancela o comando dos outros
+        reading = await asyncio.shield(cmd.future)
+        return MeasureResult(reading, cmd.requested_at, coalesced, cmd.waiters)
+
+    async def _run(self, key: Tuple[str, str], cmd: _Command) -> None:
+        device_id, site_id = key
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout_s
+        not_before = cmd.requested_at - self.clock_skew
+        try:
+            async with self._hub.subscription(device_id, site_id) as sub:
+                if self._publish is None:
+                    self._publish = connect_mqtt_publisher(self.host, self.port)
+                self._publish(command_topic(device_id), json.dumps({
+                    "deviceId": device_id,
+                    "action": "measure",
+                    "source": "backend",
+                    "ts": cmd.requested_at.isoformat(),
+                }))
+                self.published += 1
+                while True:
+                    remaining = deadline - loop.time()
+                    doc = await sub.next(timeout=remaining) if remaining > 0 else None
+                    if doc is None:
+                        raise MeasureTimeout(
+                            f"{device_id}/{site_id} não enviou leitura em {self.timeout_s:g} s"
+                        )
+                    sent_at = doc.sent_at if doc.sent_at.tzinfo else doc.sent_at.astimezone()
+                    if sent_at >= not_before:
+                        break
+            cmd.landed_at = loop.time()
+            self.landed += 1
+            cmd.future.set_result(doc)
+        except Exception as e:
+            if isinstance(e, MeasureTimeout):
+                self.timeouts += 1
+            else:
+                logger.exception("falha no comando de medição de %s/%s", device_id, site_id)
+            # o próximo pedido publica de novo
+            if self._commands.get(key) is cmd:
+                del self._commands[key]
+            cmd.future.set_exception(e)
+            # marca como lida: se todos os clientes já desistiram, não vira aviso no log
+            cmd.future.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "published": self.published,
+            "coalesced": self.coalesced,
+            "landed": self.landed,
+            "timeouts": self.timeouts,
+            "in_flight": sum(not c.future.done() for c in self._commands.values()),
+        }
+
+
+measure_bridge = MeasureBridge(
+    stream_hub,
+    host=settings.MQTT_BROKER_HOST,
+    port=settings.MQTT_BROKER_PORT,
+    timeout_s=settings.MEASURE_TIMEOUT_SECONDS,
+    coalesce_s=settings.MEASURE_COALESCE_SECONDS,
+    clock_skew_s=settings.MEASURE_CLOCK_SKEW_SECONDS,
+)
@@ -0,0 +1,254 @@
+"""
+Métricas do /chat no formato texto do Prometheus (GET /metrics).
+
+- aquabot_stage_seconds{stage}: histograma de cada etapa (classify_intent,
+  generate_general_help_answer, get_latest_telemetry, get_telemetry_range,
+  telemetry_aggregate), por decorator (@timed) ou bloco (stage_timer)
+- aquabot_chat_requests_total / aquabot_chat_errors_total{endpoint,intent}
+  e aquabot_chat_request_seconds{endpoint,intent}: por requisição (track_chat)
+- aquabot_firestore_documents_total e aquabot_firestore_documents_per_request:
+  documentos lidos do Firestore, somados por requisição via ContextVar (vale
+  também nas tasks e threads que ela dispara: speculative prefetch, to_thread)
+
+Sem prometheus_client: contadores em dicts com um lock, o bastante para o
+volume do backend. Cada observação custa ~1 µs; etapas medem ms.
+"""
+from __future__ import annotations
+
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from app.config import get_settings
+
+settings = get_settings()
+
+F = TypeVar("F", bound=Callable)
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DOCUMENT_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000)
+
+Labels = Tuple[str, ...]
+
+
+def _label_text(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: Sequence[float], lock: threading.Lock) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # o último é +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = lock
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets=LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._children: Dict[Labels, _HistogramChild] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str) -> _HistogramChild:
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, _HistogramChild(self.buckets, self._lock))
+        return child
+
+    def observe(self, value: float, *labels: str) -> None:
+        self.labels(*labels).observe(value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            children = [(k, list(c.counts), c.sum, c.count) for k, c in self._children.items()]
+        for values, counts, total, count in sorted(children):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.label_names, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.label_names, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_label_text(self.label_names, values)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, v in values:
+            lines.append(f"{self.name}{_label_text(self.label_names, labels)} {_number(v)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True) -> None:
+        # desligado: @timed, stage_timer e track_chat viram passagem direta
+        self.enabled = enabled
+        self._metrics: List[object] = []
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        h = Histogram(name, help_text, label_names, buckets)
+        self._metrics.append(h)
+        return h
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        c = Counter(name, help_text, label_names)
+        self._metrics.append(c)
+        return c
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry(enabled=settings.METRICS_ENABLED)
+
+STAGE_SECONDS = registry.histogram("aquabot_stage_seconds", "Duração de cada etapa do /chat.", ("stage",))
+CHAT_SECONDS = registry.histogram(
+    "aquabot_chat_request_seconds", "Duração das requisições de chat.", ("endpoint", "intent")
+)
+CHAT_REQUESTS = registry.counter("aquabot_chat_requests_total", "Requisições de chat.", ("endpoint", "intent"))
+CHAT_ERRORS = registry.counter("aquabot_chat_errors_total", "Requisições de chat com erro.", ("endpoint", "intent"))
+FIRESTORE_DOCUMENTS = registry.counter("aquabot_firestore_documents_total", "Documentos lidos do Firestore.")
+DOCUMENTS_PER_REQUEST = registry.histogram(
+    "aquabot_firestore_documents_per_request",
+    "Documentos do Firestore lidos por requisição de chat.",
+    ("endpoint",),
+    buckets=DOCUMENT_BUCKETS,
+)
+
+# [documentos] da requisição de chat em andamento (None fora de track_chat)
+_request_documents: ContextVar[Optional[List[int]]] = ContextVar("request_documents", default=None)
+
+
+def timed(stage: str) -> Callable[[F], F]:
+    """
+    Decorator: duração de cada chamada (sync ou async) em aquabot_stage_seconds.
+    """
+    child = STAGE_SECONDS.labels(stage)
+
+    def decorate(fn: F) -> F:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def awrapper(*args, **kwargs):
+                if not registry.enabled:
+                    return await fn(*args, **kwargs)
+                t0 = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    child.observe(time.perf_counter() - t0)
+
+            return awrapper  # type: ignore[return-value]
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - t0)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    if not registry.enabled:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage)
+
+
+def count_documents(n: int) -> None:
+    if not n or not registry.enabled:
+        return
+    FIRESTORE_DOCUMENTS.inc(amount=n)
+    cell = _request_documents.get()
+    if cell is not None:
+        cell[0] += n
+
+
+class ChatTracking:
+    __slots__ = ("intent",)
+
+    def __init__(self) -> None:
+        self.intent = "unknown"  # preenchido depois da classificação
+
+
+@contextmanager
+def track_chat(endpoint: str) -> Iterator[ChatTracking]:
+    """
+    Conta a requisição (e o erro, se sair por exceção) com o intent que
+    o bloco atribuir em tracking.intent.
+    """
+    tracking = ChatTracking()
+    if not registry.enabled:
+        yield tracking
+        return
+    documents = [0]
+    token = _request_documents.set(documents)
+    t0 = time.perf_counter()
+    try:
+        yield tracking
+    except BaseException:
+        CHAT_ERRORS.inc(endpoint, tracking.intent)
+        raise
+    finally:
+        _request_documents.reset(token)
+        CHAT_REQUESTS.inc(endpoint, tracking.intent)
+        CHAT_SECONDS.observe(time.perf_counter() - t0, endpoint, tracking.intent)
+        DOCUMENTS_PER_REQUEST.observe(documents[0], endpoint)
@@ -18,6 +18,18 @@ class ChatResponse(BaseModel):
     data_used: Optional[Dict[str, Any]] = None
 
 
+class ChatBatchRequest(BaseModel):
+    session_id: str
+    device_id: str
+    site_id: str
+    messages: List[str] = Field(min_length=1, max_length=20)
+
+
+class ChatBatchResponse(BaseModel):
+    session_id: str
+    answers: List[ChatResponse]   # na mesma ordem de messages
+
+
 class WaterParameter(str, Enum):
     PH = "ph"
     TEMPERATURE = "temperature"
@@ -25,6 +37,15 @@ class WaterParameter(str, Enum):
     TDS = "tds"
 
 
+# nome de cada parâmetro nas respostas e alertas
+PARAMETER_LABELS = {
+    WaterParameter.PH: "pH",
+    WaterParameter.TEMPERATURE: "temperatura",
+    WaterParameter.TURBIDITY: "turbidez",
+    WaterParameter.TDS: "TDS",
+}
+
+
 class QueryIntentType(str, Enum):
     GENERAL_HELP = "general_help"
 
@@ -80,3 +101,129 @@ class TelemetryDocument(BaseModel):
     site_id: str
     sent_at: datetime
     measurements: List[Measurement]
+
+
+class ParameterReading(BaseModel):
+    value: float
+    unit: str
+    sent_at: datetime        # envio em que o parâmetro veio pela última vez
+
+
+class DeviceLatest(BaseModel):
+    device_id: str
+    site_id: str
+    sent_at: datetime        # leitura mais recente do par, de qualquer parâmetro
+    parameters: Dict[WaterParameter, ParameterReading]
+
+
+class MeasureResponse(BaseModel):
+    requested_at: datetime   # quando o comando foi publicado
+    coalesced: bool          # o pedido entrou num comando já em andamento
+    waiters: int             # pedidos atendidos pelo mesmo comando
+    reading: TelemetryDocument
+
+
+class HistorySeries(BaseModel):
+    unit: str
+    count: int               # leituras no intervalo antes da redução
+    t: List[int]             # epoch em ms, ASC
+    v: List[float]
+
+
+class TelemetryHistoryResponse(BaseModel):
+    device_id: str
+    site_id: str
+    start: datetime
+    end: datetime
+    method: str
+    max_points: int
+    parameters: Dict[WaterParameter, HistorySeries]
+
+
+class TelemetryReading(BaseModel):
+    # device_id/site_id podem vir só no lote (payload compacto de um dispositivo)
+    device_id: Optional[str] = None
+    site_id: Optional[str] = None
+    sent_at: datetime
+    seq: Optional[int] = None
+    measurements: List[Measurement] = Field(min_length=1)
+
+
+class TelemetryBatchRequest(BaseModel):
+    device_id: Optional[str] = None
+    site_id: Optional[str] = None
+    readings: List[TelemetryReading] = Field(min_length=1, max_length=5000)
+
+
+class TelemetryBatchResponse(BaseModel):
+    accepted: int
+    ids: List[str]
+    commits: int             # commits feitos nesta requisição (0 com write-behind)
+    buffered: int            # leituras aguardando o próximo flush
+
+
+class AlertRule(BaseModel):
+    # faixa e regras de um parâmetro (campos ausentes vêm do padrão/IDEAL)
+    min: Optional[float] = None
+    max: Optional[float] = None
+    unit: Optional[str] = None
+    hysteresis: Optional[float] = Field(default=None, ge=0)          # volta ao normal só a essa distância da faixa
+    min_duration_s: Optional[float] = Field(default=None, ge=0)      # tempo fora da faixa antes de alertar
+    max_rate_per_hour: Optional[float] = Field(default=None, gt=0)   # |variação|/hora na janela
+    rate_window_s: Optional[float] = Field(default=None, gt=0)
+
+
+class AlertKind(str, Enum):
+    OUT_OF_RANGE = "out_of_range"
+    RATE_OF_CHANGE = "rate_of_change"
+
+
+class AlertEvent(BaseModel):
+    device_id: str
+    site_id: str
+    parameter: WaterParameter
+    kind: AlertKind
+    status: str              # "open" ou "resolved"
+    level: str               # low/high (faixa) ou rising/falling (taxa)
+    value: float             # leitura (faixa) ou variação por hora (taxa)
+    unit: str
+    threshold: float
+    sent_at: datetime        # leitura que abriu/fechou o alerta
+    message: str
+
+
+class FleetRow(BaseModel):
+    device_id: str
+    site_id: str
+    value: Optional[float]   # métrica pedida (None = sem faixa ideal/tendência: fim da tabela)
+    count: int               # leituras do parâmetro no intervalo
+    avg: float
+    min: float
+    max: float
+    unit: str
+
+
+class FleetTotals(BaseModel):
+    devices: int             # pares com leituras no intervalo
+    count: int
+    avg: Optional[float]     # ponderada pelo número de leituras de cada par
+    min: Optional[float]
+    max: Optional[float]
+
+
+class FleetShardError(BaseModel):
+    device_id: str
+    site_id: str
+    error: str
+
+
+class FleetRankingResponse(BaseModel):
+    parameter: WaterParameter
+    metric: str
+    unit: str                # unidade de value
+    start: datetime
+    end: datetime
+    fleet: FleetTotals
+    rows: List[FleetRow]     # ordenadas por value, já cortadas em limit
+    skipped: int             # pares sem leituras do parâmetro no intervalo
+    failed: List[FleetShardError]
@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Callable
+
+# publish(topic, payload)
+MqttPublish = Callable[[str, str], None]
+
+# paho-mqtt só é importado quando algo publica de fato (alertas com sink
+# "mqtt" ou o POST /devices/{device_id}/measure); um cliente por broker
+
+
+@lru_cache
+def connect_mqtt_publisher(host: str, port: int = 1883) -> MqttPublish:
+    """
+    Cliente paho-mqtt com o loop de rede em thread própria; publica com QoS 1
+    (mensagens publicadas antes da conexão ficam na fila do cliente).
+    """
+    import paho.mqtt.client as mqtt
+
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    client.connect_async(host, port)
+    client.loop_start()
+    return lambda topic, payload: client.publish(topic, payload, qos=1)
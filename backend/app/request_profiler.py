@@ -0,0 +1,75 @@
+"""
+Profiling sob demanda de uma requisição (cProfile), só com PROFILE_ENABLED.
+
+- header X-Profile: 1 perfila aquela requisição; PROFILE_SAMPLE_RATE > 0
+  perfila também uma fração aleatória das demais
+- o .prof vai para PROFILE_DIR e o caminho volta no header X-Profile-Path
+  (abrir com `python -m pstats` ou snakeviz)
+- um perfil por vez: o cProfile pega a thread inteira, então requisições
+  concorrentes no mesmo event loop entram no mesmo perfil; se já houver um
+  ativo, a requisição segue sem profiling
+- em respostas em stream, só a parte até o fim do corpo é perfilada
+
+Middleware ASGI puro (sem BaseHTTPMiddleware), e só é registrado quando
+habilitado: desligado, não custa nada por requisição.
+"""
+from __future__ import annotations
+
+import cProfile
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_PATH_HEADER = b"x-profile-path"
+
+
+class ProfilerMiddleware:
+    def __init__(self, app: Callable, out_dir: str = "profiles", sample_rate: float = 0.0) -> None:
+        self.app = app
+        self.out_dir = out_dir
+        self.sample_rate = sample_rate
+        self._busy = threading.Lock()
+        self.profiled = 0
+
+    def _wanted(self, scope: Dict[str, Any]) -> bool:
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER:
+                return value not in (b"", b"0", b"false")
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _path(self, scope: Dict[str, Any]) -> str:
+        route = re.sub(r"[^A-Za-z0-9]+", "_", scope.get("path", "")).strip("_") or "root"
+        return os.path.join(self.out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{self.profiled}-{route}.prof")
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not self._wanted(scope) or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        self.profiled += 1
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = self._path(scope)
+
+        async def send_with_path(message) -> None:
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", ()), (PROFILE_PATH_HEADER, path.encode())]}
+            await send(message)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_with_path)
+            finally:
+                profiler.disable()
+                profiler.dump_stats(path)
+                logger.info("perfil de %s em %s", scope.get("path"), path)
+        finally:
+            self._busy.release()
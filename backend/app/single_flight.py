@@ -0,0 +1,144 @@
+"""
+Single-flight: chamadas simultâneas com a mesma chave dividem uma única
+execução (e o resultado, ou a exceção).
+
+Quando um viveiro sai da faixa, várias pessoas abrem o app e perguntam a
+mesma coisa em poucos segundos; sem isso cada requisição faz a sua leitura
+idêntica no Firestore. Não é cache: terminada a execução, a próxima chamada
+executa de novo (o cache de séries e o índice da última leitura continuam
+valendo por cima).
+
+- do(): threads (to_thread, pool do FastAPI); quem chega depois espera o
+  resultado de quem já está executando
+- ado(): asyncio; a execução roda na própria requisição que chegou
+  primeiro (sem task extra: sozinha, custa só o registro na tabela). Se ela
+  for cancelada, quem esperava tenta de novo e uma das outras assume
+- um concurrent.futures.Future por chave: chamadas síncronas e assíncronas
+  com a mesma chave também se juntam, exceto uma síncrona dentro do event
+  loop esperando uma assíncrona (travaria o loop), que executa sozinha
+- o resultado é o mesmo objeto para todos: tratar como somente leitura
+
+round_bounds arredonda o intervalo (início para baixo, fim para cima) para
+que "as últimas 24 h" pedidas com alguns segundos de diferença virem a
+mesma consulta.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def round_bounds(start: datetime, end: datetime, granularity_s: float) -> Tuple[datetime, datetime]:
+    """
+    [start, end] alargado até múltiplos de granularity_s (0 = sem arredondar).
+    """
+    if granularity_s <= 0:
+        return start, end
+    lo = math.floor(start.timestamp() / granularity_s) * granularity_s
+    hi = math.ceil(end.timestamp() / granularity_s) * granularity_s
+    return datetime.fromtimestamp(lo, start.tzinfo), datetime.fromtimestamp(hi, end.tzinfo)
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class _LeaderCancelled(Exception):
+    # a execução foi cancelada junto com a requisição líder: quem esperava repete
+    pass
+
+
+class _Flight:
+    __slots__ = ("future", "is_async")
+
+    def __init__(self, is_async: bool) -> None:
+        self.future: Future = Future()
+        self.is_async = is_async
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def _join(self, key: Hashable, is_async: bool) -> Tuple[Optional[_Flight], bool]:
+        """
+        (execução, é a líder); None = executar sem registrar.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight(is_async)
+                self.executions += 1
+                return flight, True
+            if not is_async and flight.is_async and _in_event_loop():
+                self.executions += 1
+                return None, True
+            self.coalesced += 1
+            return flight, False
+
+    def _finish(self, key: Hashable, flight: _Flight, result=None, error: Optional[BaseException] = None) -> None:
+        # sai da tabela antes de entregar: quem chegar depois executa de novo
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        if error is not None:
+            flight.future.set_exception(error)
+        else:
+            flight.future.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        while True:
+            flight, leader = self._join(key, is_async=False)
+            if flight is None:
+                return fn()
+            if leader:
+                break
+            try:
+                return flight.future.result()
+            except _LeaderCancelled:
+                continue
+        try:
+            result = fn()
+        except BaseException as exc:
+            self._finish(key, flight, error=exc)
+            raise
+        self._finish(key, flight, result)
+        return result
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        while True:
+            flight, leader = self._join(key, is_async=True)
+            if leader:
+                break
+            try:
+                # shield: cancelar quem espera não cancela a execução dos outros
+                return await asyncio.shield(asyncio.wrap_future(flight.future))
+            except _LeaderCancelled:
+                continue
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self._finish(key, flight, error=_LeaderCancelled())
+            raise
+        except BaseException as exc:
+            self._finish(key, flight, error=exc)
+            raise
+        self._finish(key, flight, result)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": len(self._flights), "executions": self.executions, "coalesced": self.coalesced}
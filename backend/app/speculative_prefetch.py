@@ -0,0 +1,140 @@
+"""
+Execução especulativa do /chat: enquanto a LLM classifica a intenção,
+já buscamos a última leitura e a série das últimas 24h do parâmetro
+inferido pelo texto. Quando a intenção chega, usamos o que bater e
+cancelamos o resto.
+
+Hit = resultado especulado de fato usado na resposta. Busca que falhou
+conta como miss (latest() busca de novo; claim_range devolve None), assim
+como o que foi descartado sem uso.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.models import DeviceLatest, WaterParameter
+from app.telemetry_repository import aget_latest_state, aget_telemetry_range
+from app.telemetry_series import TelemetrySeries
+
+
+class SpeculationStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {
+            "latest_hits": 0,
+            "latest_misses": 0,
+            "range_hits": 0,
+            "range_misses": 0,
+        }
+
+    def record(self, kind: str, hit: bool) -> None:
+        key = f"{kind}_{'hits' if hit else 'misses'}"
+        with self._lock:
+            self._counts[key] += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            out: Dict[str, float] = dict(self._counts)
+        for kind in ("latest", "range"):
+            total = out[f"{kind}_hits"] + out[f"{kind}_misses"]
+            out[f"{kind}_hit_rate"] = out[f"{kind}_hits"] / total if total else 0.0
+        return out
+
+
+speculation_stats = SpeculationStats()
+
+
+def _consume_exception(task: asyncio.Task) -> None:
+    # evita "Task exception was never retrieved" em especulações descartadas
+    if not task.cancelled():
+        task.exception()
+
+
+# resultado de uma especulação que falhou ou foi cancelada
+_FAILED = object()
+
+
+async def _result(task: asyncio.Task) -> Any:
+    if task.cancelled():
+        return _FAILED
+    try:
+        return await task
+    except Exception:
+        return _FAILED
+
+
+class SpeculativePrefetch:
+    def __init__(
+        self,
+        device_id: str,
+        site_id: str,
+        param: Optional[WaterParameter],
+        start: datetime,
+        end: datetime,
+    ) -> None:
+        self.device_id = device_id
+        self.site_id = site_id
+        self.param = param
+        self.start = start
+        self.end = end
+
+        self._latest_task: Optional[asyncio.Task] = asyncio.create_task(
+            aget_latest_state(device_id, site_id)
+        )
+        self._latest_task.add_done_callback(_consume_exception)
+
+        self._range_task: Optional[asyncio.Task] = None
+        if param is not None:
+            self._range_task = asyncio.create_task(
+                aget_telemetry_range(device_id, site_id, param, start, end)
+            )
+            self._range_task.add_done_callback(_consume_exception)
+
+    async def latest(self) -> Optional[DeviceLatest]:
+        task, self._latest_task = self._latest_task, None
+        if task is None:
+            raise RuntimeError("latest() já foi consumido")
+        state = await _result(task)
+        if state is _FAILED:
+            speculation_stats.record("latest", hit=False)
+            return await aget_latest_state(self.device_id, self.site_id)
+        speculation_stats.record("latest", hit=True)
+        return state
+
+    async def claim_range(
+        self, param: WaterParameter, start: datetime, end: datetime
+    ) -> Optional[TelemetrySeries]:
+        """
+        Série especulada, se param for o buscado e [start, end] estiver dentro
+        da janela buscada (recortada quando for menor). None = especulação
+        errada ou que falhou (o chamador busca normalmente); uma janela que
+        não cabe deixa a especulação para outra chamada ou para discard().
+        """
+        task = self._range_task
+        if task is None or param != self.param or start < self.start or end > self.end:
+            return None
+        self._range_task = None
+        series = await _result(task)
+        if series is _FAILED:
+            speculation_stats.record("range", hit=False)
+            return None
+        speculation_stats.record("range", hit=True)
+        if (start, end) == (self.start, self.end):
+            return series
+        return series.between(start, end)
+
+    def discard(self) -> None:
+        """
+        Cancela o que não foi usado e contabiliza como miss.
+        """
+        if self._latest_task is not None:
+            self._latest_task.cancel()
+            self._latest_task = None
+            speculation_stats.record("latest", hit=False)
+        if self._range_task is not None:
+            self._range_task.cancel()
+            self._range_task = None
+            speculation_stats.record("range", hit=False)
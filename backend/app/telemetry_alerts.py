@@ -0,0 +1,448 @@
+"""
+Alertas de qualidade da água avaliados na ingestão (antes só havia a faixa
+IDEAL consultada quando alguém perguntava no /chat).
+
+- regras por parâmetro, com padrão = IDEAL e sobrescritas por site num JSON
+  (ALERT_RULES_PATH):
+      {"default": {"ph": {"min_duration_s": 120}},
+       "sites": {"fazenda-x_rio-igarape": {"ph": {"min": 6.8, "max_rate_per_hour": 0.5}}}}
+- faixa com histerese: abre quando a leitura sai de [min, max] e fica fora
+  por min_duration_s; só fecha quando volta a [min + h, max - h]
+- taxa de variação: inclinação da reta de mínimos quadrados na janela
+  deslizante rate_window_s (Moments, O(1) por leitura) acima de
+  max_rate_per_hour em valor/hora; fecha abaixo de RATE_CLEAR_FRACTION do limite
+- cada leitura custa O(regras do parâmetro): um dict de regras por site e
+  o estado de cada (device_id, site_id, parâmetro) em memória, sem
+  nenhuma consulta ao store
+- os eventos vão para uma fila limitada e um task em segundo plano os
+  entrega aos sinks (log, webhook, MQTT em aquamonitor/<device>/alerts);
+  a ingestão nunca espera por eles
+
+O estado vive no event loop (a ingestão é assíncrona). Leituras mais antigas
+que a última avaliada no mesmo parâmetro (reenvios, backfill) são ignoradas.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Protocol, Tuple
+
+from app.config import Settings, get_settings
+from app.models import PARAMETER_LABELS, AlertEvent, AlertKind, AlertRule, WaterParameter
+from app.mqtt_client import connect_mqtt_publisher
+from app.telemetry_cache import TelemetryRow
+from app.telemetry_trend import Moments
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Faixas "típicas"
+IDEAL = {
+    WaterParameter.PH: {"min": 6.5, "max": 8.5, "unit": "pH"},
+    WaterParameter.TEMPERATURE: {"min": 20.0, "max": 30.0, "unit": "°C"},
+    WaterParameter.TURBIDITY: {"min": 0.0, "max": 10.0, "unit": "NTU"},
+    WaterParameter.TDS: {"min": 0.0, "max": 500.0, "unit": "ppm"},
+}
+
+# histerese padrão: fração da largura da faixa
+DEFAULT_HYSTERESIS_FRACTION = 0.02
+DEFAULT_RATE_WINDOW_S = 900.0
+# a taxa é calculada só com pelo menos essa fração da janela coberta
+RATE_MIN_SPAN_FRACTION = 0.5
+RATE_CLEAR_FRACTION = 0.8
+
+# (device_id, site_id, parâmetro)
+AlertKey = Tuple[str, str, WaterParameter]
+
+
+class CompiledRule:
+    __slots__ = (
+        "min", "max", "unit", "low_clear", "high_clear",
+        "min_duration_s", "max_rate", "rate_window_s",
+    )
+
+    def __init__(self, rule: AlertRule) -> None:
+        self.min = rule.min if rule.min is not None else float("-inf")
+        self.max = rule.max if rule.max is not None else float("inf")
+        self.unit = rule.unit or ""
+        h = rule.hysteresis
+        if h is None:
+            width = self.max - self.min
+            h = width * DEFAULT_HYSTERESIS_FRACTION if width != float("inf") else 0.0
+        self.low_clear = self.min + h
+        self.high_clear = self.max - h
+        self.min_duration_s = rule.min_duration_s or 0.0
+        self.max_rate = rule.max_rate_per_hour
+        self.rate_window_s = rule.rate_window_s or DEFAULT_RATE_WINDOW_S
+
+
+def _merge(base: Dict[WaterParameter, AlertRule], raw: Dict) -> Dict[WaterParameter, AlertRule]:
+    out = dict(base)
+    for name, fields in (raw or {}).items():
+        p = WaterParameter(name)
+        current = out.get(p, AlertRule())
+        out[p] = current.model_copy(update=AlertRule(**fields).model_dump(exclude_unset=True))
+    return out
+
+
+class AlertRules:
+    """
+    Regras padrão (IDEAL + "default" do JSON) e as de cada site, já compiladas.
+    """
+
+    def __init__(self, config: Optional[Dict] = None, min_duration_s: float = 0.0) -> None:
+        config = config or {}
+        base = {
+            p: AlertRule(min=r["min"], max=r["max"], unit=r["unit"], min_duration_s=min_duration_s)
+            for p, r in IDEAL.items()
+        }
+        self._default_rules = _merge(base, config.get("default"))
+        self._site_rules = {
+            site_id: _merge(self._default_rules, raw)
+            for site_id, raw in (config.get("sites") or {}).items()
+        }
+        self.default = {p: CompiledRule(r) for p, r in self._default_rules.items()}
+        self.sites = {
+            site_id: {p: CompiledRule(r) for p, r in rules.items()}
+            for site_id, rules in self._site_rules.items()
+        }
+
+    @classmethod
+    def from_settings(cls, s: Settings) -> "AlertRules":
+        config = None
+        if s.ALERT_RULES_PATH:
+            with open(s.ALERT_RULES_PATH, encoding="utf-8") as f:
+                config = json.load(f)
+        return cls(config, min_duration_s=s.ALERT_MIN_DURATION_SECONDS)
+
+    def for_site(self, site_id: str) -> Dict[WaterParameter, CompiledRule]:
+        return self.sites.get(site_id, self.default)
+
+    def ideal_range(self, site_id: Optional[str], param: WaterParameter) -> Optional[Dict]:
+        """
+        Faixa no formato de IDEAL ({"min", "max", "unit"}) para o site.
+        """
+        rule = self._site_rules.get(site_id or "", self._default_rules).get(param)
+        if rule is None or rule.min is None or rule.max is None:
+            return None
+        return {"min": rule.min, "max": rule.max, "unit": rule.unit or ""}
+
+    def describe(self) -> Dict:
+        return {
+            "default": {p.value: r.model_dump() for p, r in self._default_rules.items()},
+            "sites": {
+                site_id: {p.value: r.model_dump() for p, r in rules.items()}
+                for site_id, rules in self._site_rules.items()
+            },
+        }
+
+
+class _State:
+    __slots__ = ("last_ts", "out", "pending", "pending_since", "rate_open", "window", "moments")
+
+    def __init__(self) -> None:
+        self.last_ts = float("-inf")
+        self.out: Optional[str] = None          # "low"/"high" com alerta de faixa aberto
+        self.pending: Optional[str] = None      # fora da faixa, esperando min_duration_s
+        self.pending_since = 0.0
+        self.rate_open: Optional[str] = None    # "rising"/"falling" com alerta de taxa aberto
+        self.window: Deque[Tuple[float, float]] = deque()
+        self.moments = Moments()               # dos pontos em window
+
+
+class AlertEngine:
+    def __init__(self, rules: AlertRules, emit: Callable[[AlertEvent], None]) -> None:
+        self.rules = rules
+        self._emit = emit
+        self._states: Dict[AlertKey, _State] = {}
+        self.evaluated = 0
+        self.stale = 0
+        self.events = 0
+
+    def evaluate(self, device_id: str, site_id: str, rows: Iterable[TelemetryRow]) -> None:
+        """
+        Leituras recém-recebidas de um par (qualquer ordem).
+        """
+        rules = self.rules.for_site(site_id)
+        states = self._states
+        for sent_at, measurements in sorted(rows, key=lambda r: r[0]):
+            ts = sent_at.timestamp()
+            for p, value, unit in measurements:
+                rule = rules.get(p)
+                if rule is None:
+                    continue
+                key = (device_id, site_id, p)
+                state = states.get(key)
+                if state is None:
+                    state = states[key] = _State()
+                if ts <= state.last_ts:
+                    self.stale += 1
+                    continue
+                state.last_ts = ts
+                self.evaluated += 1
+                self._check_range(key, rule, state, sent_at, ts, value, unit)
+                if rule.max_rate is not None:
+                    self._check_rate(key, rule, state, sent_at, ts, value, unit)
+
+    def evaluate_series(self, by_series: Dict[Tuple[str, str], List[TelemetryRow]]) -> None:
+        for (device_id, site_id), rows in by_series.items():
+            self.evaluate(device_id, site_id, rows)
+
+    def _check_range(self, key, rule: CompiledRule, state: _State, sent_at, ts, value, unit) -> None:
+        if value < rule.min:
+            level = "low"
+        elif value > rule.max:
+            level = "high"
+        else:
+            level = None
+
+        if state.out is not None:
+            if rule.low_clear <= value <= rule.high_clear:
+                self._event(key, AlertKind.OUT_OF_RANGE, "resolved", state.out, value, unit,
+                            rule.min if state.out == "low" else rule.max, sent_at, rule)
+                state.out = None
+            elif level is not None and level != state.out:
+                # pulou de um lado da faixa para o outro
+                self._event(key, AlertKind.OUT_OF_RANGE, "resolved", state.out, value, unit,
+                            rule.min if state.out == "low" else rule.max, sent_at, rule)
+                state.out = None
+            else:
+                return
+
+        if level is None:
+            state.pending = None
+            return
+        if state.pending != level:
+            state.pending, state.pending_since = level, ts
+        if ts - state.pending_since >= rule.min_duration_s:
+            state.out, state.pending = level, None
+            self._event(key, AlertKind.OUT_OF_RANGE, "open", level, value, unit,
+                        rule.min if level == "low" else rule.max, sent_at, rule)
+
+    def _check_rate(self, key, rule: CompiledRule, state: _State, sent_at, ts, value, unit) -> None:
+        window, m = state.window, state.moments
+        window.append((ts, value))
+        m.add(ts, value)
+        while ts - window[0][0] > rule.rate_window_s:
+            m.remove(*window.popleft())
+        if ts - window[0][0] < rule.rate_window_s * RATE_MIN_SPAN_FRACTION or m.slope is None:
+            return
+        rate = m.slope * 3600
+        if state.rate_open is None:
+            if abs(rate) > rule.max_rate:
+                state.rate_open = "rising" if rate > 0 else "falling"
+                self._event(key, AlertKind.RATE_OF_CHANGE, "open", state.rate_open, rate, unit,
+                            rule.max_rate, sent_at, rule)
+        elif abs(rate) <= rule.max_rate * RATE_CLEAR_FRACTION:
+            self._event(key, AlertKind.RATE_OF_CHANGE, "resolved", state.rate_open, rate, unit,
+                        rule.max_rate, sent_at, rule)
+            state.rate_open = None
+
+    def _event(self, key: AlertKey, kind, status, level, value, unit, threshold, sent_at, rule) -> None:
+        device_id, site_id, p = key
+        unit = unit or rule.unit
+        name = PARAMETER_LABELS[p]
+        if kind == AlertKind.OUT_OF_RANGE:
+            where = "abaixo" if level == "low" else "acima"
+            if status == "open":
+                message = (
+                    f"{name} {value:.2f}{unit} {where} da faixa ideal "
+                    f"({rule.min:g}–{rule.max:g}{unit}) em {device_id}/{site_id}."
+                )
+            else:
+                message = f"{name} de volta à faixa ideal ({value:.2f}{unit}) em {device_id}/{site_id}."
+        else:
+            verb = "subindo" if level == "rising" else "caindo"
+            if status == "open":
+                message = (
+                    f"{name} {verb} rápido: {value:+.2f}{unit}/h "
+                    f"(limite {threshold:g}{unit}/h) em {device_id}/{site_id}."
+                )
+            else:
+                message = f"{name} voltou a variar devagar ({value:+.2f}{unit}/h) em {device_id}/{site_id}."
+        self.events += 1
+        self._emit(AlertEvent.model_construct(
+            device_id=device_id,
+            site_id=site_id,
+            parameter=p,
+            kind=kind,
+            status=status,
+            level=level,
+            value=value,
+            unit=unit,
+            threshold=threshold,
+            sent_at=sent_at,
+            message=message,
+        ))
+
+    def active(self) -> List[Dict]:
+        out = []
+        for (device_id, site_id, p), state in self._states.items():
+            for kind, level in ((AlertKind.OUT_OF_RANGE, state.out), (AlertKind.RATE_OF_CHANGE, state.rate_open)):
+                if level is not None:
+                    out.append({
+                        "device_id": device_id, "site_id": site_id,
+                        "parameter": p.value, "kind": kind.value, "level": level,
+                    })
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "series": len(self._states),
+            "evaluated": self.evaluated,
+            "stale": self.stale,
+            "events": self.events,
+            "active": len(self.active()),
+        }
+
+
+# ---------------- sinks ----------------
+
+class AlertSink(Protocol):
+    async def send(self, events: List[AlertEvent]) -> None: ...
+
+
+class LogAlertSink:
+    async def send(self, events: List[AlertEvent]) -> None:
+        for e in events:
+            logger.warning("alerta %s/%s: %s", e.kind.value, e.status, e.message)
+
+
+class WebhookAlertSink:
+    """
+    POST com a lista de eventos (JSON) a cada lote.
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0) -> None:
+        self.url = url
+        self.timeout = timeout
+        self._client = None
+
+    async def send(self, events: List[AlertEvent]) -> None:
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        r = await self._client.post(self.url, json=[e.model_dump(mode="json") for e in events])
+        r.raise_for_status()
+
+
+def alert_topic(device_id: str) -> str:
+    return f"aquamonitor/{device_id}/alerts"
+
+
+class MqttAlertSink:
+    """
+    Publica cada evento em aquamonitor/<device_id>/alerts (QoS 1).
+    publish(topic, payload) pode ser injetado; senão usa um cliente
+    paho-mqtt criado no primeiro envio, com o loop em thread própria.
+    """
+
+    def __init__(
+        self,
+        host: str = "",
+        port: int = 1883,
+        publish: Optional[Callable[[str, str], None]] = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self._publish = publish
+
+    async def send(self, events: List[AlertEvent]) -> None:
+        if self._publish is None:
+            self._publish = connect_mqtt_publisher(self.host, self.port)
+        for e in events:
+            self._publish(alert_topic(e.device_id), e.model_dump_json())
+
+
+def create_alert_sinks(s: Settings) -> List[AlertSink]:
+    sinks: List[AlertSink] = []
+    for name in (n.strip().lower() for n in s.ALERT_SINKS.split(",")):
+        if name == "log":
+            sinks.append(LogAlertSink())
+        elif name == "webhook" and s.ALERT_WEBHOOK_URL:
+            sinks.append(WebhookAlertSink(s.ALERT_WEBHOOK_URL))
+        elif name == "mqtt":
+            sinks.append(MqttAlertSink(s.MQTT_BROKER_HOST, s.MQTT_BROKER_PORT))
+        elif name:
+            raise ValueError(f"ALERT_SINKS: sink desconhecido ou sem configuração: {name!r}")
+    return sinks
+
+
+class AlertDispatcher:
+    """
+    Fila limitada (drop-oldest) entre a avaliação e os sinks. put() é
+    síncrono e barato; o envio roda num task do event loop.
+    """
+
+    def __init__(self, sinks: List[AlertSink], queue_size: int = 1000, recent_size: int = 200) -> None:
+        self.sinks = sinks
+        self._queue: Deque[AlertEvent] = deque(maxlen=queue_size)
+        self.recent: Deque[AlertEvent] = deque(maxlen=recent_size)
+        self._ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+        self.failures = 0
+
+    def put(self, event: AlertEvent) -> None:
+        self.recent.append(event)
+        if not self.sinks:
+            return
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(event)
+        if self._ready is not None:
+            self._ready.set()
+
+    async def drain(self) -> None:
+        while self._queue:
+            batch = list(self._queue)
+            self._queue.clear()
+            for sink in self.sinks:
+                try:
+                    await sink.send(batch)
+                except Exception:
+                    self.failures += 1
+                    logger.exception("falha ao enviar %d alertas para %s", len(batch), type(sink).__name__)
+            self.sent += len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            await self.drain()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._ready = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._ready = None
+        await self.drain()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": len(self._queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failures": self.failures,
+        }
+
+
+alert_rules = AlertRules.from_settings(settings)
+alert_dispatcher = AlertDispatcher(
+    create_alert_sinks(settings),
+    queue_size=settings.ALERT_QUEUE_SIZE,
+)
+alert_engine = AlertEngine(alert_rules, alert_dispatcher.put)
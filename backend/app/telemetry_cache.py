@@ -0,0 +1,701 @@
+"""
+Cache local (em processo) de séries temporais de telemetria.
+
+Cada par (device_id, site_id) vira uma série colunar: uma coluna de
+timestamps (epoch em microssegundos, ordenada) e uma coluna de valores
+por WaterParameter (NaN quando o envio não trouxe o parâmetro).
+
+- Só buscamos no Firestore o "delta" mais novo que a marca d'água
+  (covered_to) ou o trecho mais antigo que ainda não foi carregado.
+- Consultas de intervalo usam busca binária nos timestamps.
+- Séries inteiras são descartadas por LRU quando o orçamento de memória
+  é ultrapassado.
+- Cada parâmetro mantém rollups de 1 min / 1 h / 1 dia (telemetry_rollup.py),
+  atualizados conforme novas leituras chegam, para média/mín/máx e a reta
+  de tendência em O(buckets).
+- Aplicar uma carga (decodificar os documentos e atualizar os rollups)
+  roda fora do event loop, com asyncio.to_thread.
+- Leituras recebidas pelo próprio backend (POST /telemetry/batch) entram
+  direto nas séries já em cache, sem esperar o próximo delta.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.models import WaterParameter
+from app.telemetry_rollup import Aggregate, RollupIndex
+from app.telemetry_series import TelemetrySeries
+from app.telemetry_trend import trend_from_moments
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_US = timedelta(microseconds=1)
+
+# (sent_at, [(parâmetro, valor, unidade), ...]) em ordem ASC de sent_at
+TelemetryRow = Tuple[datetime, List[Tuple[WaterParameter, float, str]]]
+# colunas no formato interno: ts (epoch µs, ASC), valores (NaN = ausente), unidades
+Columns = Tuple[array, Dict[WaterParameter, array], Dict[WaterParameter, List[str]]]
+RangeLoader = Callable[[str, str, datetime, datetime], Iterable[TelemetryRow]]
+AsyncRangeLoader = Callable[[str, str, datetime, datetime], Awaitable[List[TelemetryRow]]]
+# coalesce(chave, fn): execuções simultâneas com a mesma chave viram uma (ver single_flight.py)
+Coalescer = Callable[[Hashable, Callable[[], Any]], Any]
+AsyncCoalescer = Callable[[Hashable, Callable[[], Awaitable[Any]]], Awaitable[Any]]
+
+_PARAMS = tuple(WaterParameter)
+# timestamp (8) + por parâmetro: valor (8) + referência da unidade (8)
+ROW_BYTES = 8 + len(_PARAMS) * 16
+
+
+def to_epoch_us(dt: datetime) -> int:
+    if dt.tzinfo is None:
+        # datetimes "naive" são tratados como horário local (igual a default_period)
+        dt = dt.astimezone()
+    return (dt - EPOCH) // _ONE_US
+
+
+def from_epoch_us(us: int) -> datetime:
+    return EPOCH + timedelta(microseconds=us)
+
+
+def _has(sorted_ts: array, t: int) -> bool:
+    pos = bisect_left(sorted_ts, t)
+    return pos < len(sorted_ts) and sorted_ts[pos] == t
+
+
+class _SeriesColumns:
+    __slots__ = (
+        "ts", "values", "units", "rollups", "covered_from", "covered_to", "ahead", "lock"
+    )
+
+    def __init__(self) -> None:
+        self.ts = array("q")
+        self.values: Dict[WaterParameter, array] = {p: array("d") for p in _PARAMS}
+        self.units: Dict[WaterParameter, List[str]] = {p: [] for p in _PARAMS}
+        self.rollups: Dict[WaterParameter, RollupIndex] = {p: RollupIndex() for p in _PARAMS}
+        self.covered_from: Optional[int] = None
+        self.covered_to: Optional[int] = None
+        # timestamps ingeridos além de covered_to (ver TelemetrySeriesCache.ingest)
+        self.ahead: Set[int] = set()
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.ts) * ROW_BYTES + sum(r.nbytes for r in self.rollups.values())
+
+    @staticmethod
+    def _columns_from_rows(rows: Iterable[TelemetryRow]) -> Columns:
+        ts = array("q")
+        values = {p: array("d") for p in _PARAMS}
+        units: Dict[WaterParameter, List[str]] = {p: [] for p in _PARAMS}
+
+        for sent_at, measurements in rows:
+            us = to_epoch_us(sent_at)
+            # Um mesmo envio pode repetir um parâmetro: cada repetição vira
+            # uma nova linha com o mesmo timestamp (igual ao scan bruto).
+            start = len(ts)
+            for param, value, unit in measurements:
+                i = start
+                while i < len(ts) and not math.isnan(values[param][i]):
+                    i += 1
+                if i == len(ts):
+                    ts.append(us)
+                    for p in _PARAMS:
+                        values[p].append(math.nan)
+                        units[p].append("")
+                values[param][i] = value
+                units[param][i] = unit
+        return ts, values, units
+
+    def append(self, rows: Iterable[TelemetryRow]) -> None:
+        ts, values, units = self._columns_from_rows(rows)
+        self.ts.extend(ts)
+        for p in _PARAMS:
+            self.values[p].extend(values[p])
+            self.units[p].extend(units[p])
+        self._update_rollups(ts, values)
+
+    def prepend(self, rows: Iterable[TelemetryRow]) -> None:
+        ts, values, units = self._columns_from_rows(rows)
+        self.ts = ts + self.ts
+        for p in _PARAMS:
+            self.values[p] = values[p] + self.values[p]
+            self.units[p] = units[p] + self.units[p]
+        self._update_rollups(ts, values)
+
+    def insert(self, rows: Iterable[TelemetryRow]) -> None:
+        """
+        Como append, mas aceita leituras fora de ordem (chegada atrasada).
+        """
+        self.insert_columns(*self._columns_from_rows(rows))
+
+    def insert_columns(
+        self, ts: array, values: Dict[WaterParameter, array], units: Dict[WaterParameter, List[str]]
+    ) -> None:
+        if not ts:
+            return
+        if not self.ts or ts[0] >= self.ts[-1]:
+            self.ts.extend(ts)
+            for p in _PARAMS:
+                self.values[p].extend(values[p])
+                self.units[p].extend(units[p])
+        else:
+            for i, t in enumerate(ts):
+                pos = bisect_right(self.ts, t)
+                self.ts.insert(pos, t)
+                for p in _PARAMS:
+                    self.values[p].insert(pos, values[p][i])
+                    self.units[p].insert(pos, units[p][i])
+        self._update_rollups(ts, values)
+
+    def _update_rollups(self, ts: array, values: Dict[WaterParameter, array]) -> None:
+        # NaN é "ausente"; inf (sensor com defeito) também fica fora dos rollups e das
+        # bordas brutas, senão um ponto só estraga a soma do bucket inteiro
+        t = np.frombuffer(ts, dtype=np.int64)
+        for p in _PARAMS:
+            v = np.frombuffer(values[p], dtype=np.float64)
+            finite = np.isfinite(v)
+            if finite.any():
+                self.rollups[p].add_many(
+                    t[finite], v[finite], lambda lo, hi, p=p: self.raw_points(p, lo, hi)
+                )
+
+    def raw_points(self, param: WaterParameter, start_us: int, end_us: int) -> Tuple[np.ndarray, np.ndarray]:
+        lo = bisect_left(self.ts, start_us)
+        hi = bisect_right(self.ts, end_us)
+        ts = np.frombuffer(self.ts[lo:hi], dtype=np.int64)
+        values = np.frombuffer(self.values[param][lo:hi], dtype=np.float64)
+        finite = np.isfinite(values)
+        return ts[finite], values[finite]
+
+    def unit_at(self, param: WaterParameter, ts_us: int, value: Optional[float] = None) -> str:
+        """
+        Unidade da leitura em ts_us (com esse valor, se dado). Em empates de
+        timestamp fica com a linha mais recente, como na série DESC.
+        """
+        values = self.values[param]
+        for i in range(bisect_right(self.ts, ts_us) - 1, bisect_left(self.ts, ts_us) - 1, -1):
+            if values[i] == value if value is not None else math.isfinite(values[i]):
+                return self.units[param][i]
+        return ""
+
+    def aggregate(self, param: WaterParameter, start_us: int, end_us: int) -> Aggregate:
+        return self.rollups[param].aggregate(
+            start_us, end_us, lambda lo, hi: self.raw_points(param, lo, hi)
+        )
+
+    def slice_desc(self, param: WaterParameter, start_us: int, end_us: int) -> TelemetrySeries:
+        lo = bisect_left(self.ts, start_us)
+        hi = bisect_right(self.ts, end_us)
+        # fatias de array.array são cópias, então o buffer não fica preso
+        ts = np.frombuffer(self.ts[lo:hi], dtype=np.int64)
+        values = np.frombuffer(self.values[param][lo:hi], dtype=np.float64)
+
+        present = ~np.isnan(values)
+        idx = np.flatnonzero(present)
+        unit = self.units[param][lo + idx[-1]] if len(idx) else ""
+        # DESC, igual à consulta original no Firestore
+        return TelemetrySeries(ts[present][::-1] * 1000, values[present][::-1], unit)
+
+
+def _summary(cols: _SeriesColumns, param: WaterParameter, agg: Aggregate) -> Dict:
+    return {
+        "start": from_epoch_us(agg.first_at),
+        "end": from_epoch_us(agg.last_at),
+        "count": agg.count,
+        "min": agg.min,
+        "max": agg.max,
+        "avg": agg.avg,
+        "unit": cols.unit_at(param, agg.last_at),
+    }
+
+
+def _extreme(cols: _SeriesColumns, param: WaterParameter, agg: Aggregate, mode: str) -> Dict:
+    if mode == "max":
+        value, ts = agg.max, agg.max_at
+    else:
+        value, ts = agg.min, agg.min_at
+    return {
+        "sent_at": from_epoch_us(ts),
+        "value": value,
+        "unit": cols.unit_at(param, ts, value),
+    }
+
+
+def _trend(cols: _SeriesColumns, param: WaterParameter, agg: Aggregate) -> Optional[Dict]:
+    return trend_from_moments(
+        agg.moments,
+        from_epoch_us(agg.first_at),
+        from_epoch_us(agg.last_at),
+        cols.unit_at(param, agg.last_at),
+    )
+
+
+async def _run_alone(key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+    return await fn()
+
+
+class TelemetrySeriesCache:
+    """
+    Os locks nunca ficam presos durante a leitura no Firestore: planejamos
+    os trechos faltantes, carregamos sem lock e aplicamos de volta (com
+    novo planejamento se outra requisição mexeu na série no meio tempo).
+    Assim o mesmo cache atende o caminho síncrono e o assíncrono.
+
+    Preenchimentos simultâneos da mesma série passam por coalesce/acoalesce
+    com a chave ("fill", device_id, site_id): um carrega, os outros esperam
+    e replanejam sobre a série já preenchida. Cada "hoje" pedido a partir
+    de now() tem limites próprios, mas o trecho que sobra para quem esperou
+    fica dentro de refresh_seconds e não vai ao store.
+    """
+
+    def __init__(
+        self,
+        loader: RangeLoader,
+        async_loader: Optional[AsyncRangeLoader] = None,
+        max_bytes: int = 64 * 1024 * 1024,
+        refresh_seconds: float = 30.0,
+        coalesce: Optional[Coalescer] = None,
+        acoalesce: Optional[AsyncCoalescer] = None,
+    ) -> None:
+        self._loader = loader
+        self._async_loader = async_loader
+        self._coalesce = coalesce or (lambda key, fn: fn())
+        self._acoalesce = acoalesce or _run_alone
+        self.max_bytes = max_bytes
+        self.refresh_seconds = refresh_seconds
+        self._series: "OrderedDict[Tuple[str, str], _SeriesColumns]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.firestore_loads = 0
+
+    # ---------------- API síncrona ----------------
+
+    def get_range(
+        self,
+        device_id: str,
+        site_id: str,
+        param: WaterParameter,
+        start: datetime,
+        end: datetime,
+    ) -> TelemetrySeries:
+        start_us, end_us = to_epoch_us(start), to_epoch_us(end)
+        if start_us > end_us:
+            return TelemetrySeries.empty()
+        cols = self._get_columns(device_id, site_id)
+        self._fill(device_id, site_id, cols, start_us, end_us)
+        with cols.lock:
+            series = cols.slice_desc(param, start_us, end_us)
+        self._evict()
+        return series
+
+    def get_ranges(
+        self,
+        device_id: str,
+        site_id: str,
+        params: Iterable[WaterParameter],
+        start: datetime,
+        end: datetime,
+    ) -> Dict[WaterParameter, TelemetrySeries]:
+        """
+        get_range de vários parâmetros: a série guarda todos, então basta
+        preencher o intervalo uma vez.
+        """
+        start_us, end_us = to_epoch_us(start), to_epoch_us(end)
+        if start_us > end_us:
+            return {p: TelemetrySeries.empty() for p in params}
+        cols = self._get_columns(device_id, site_id)
+        self._fill(device_id, site_id, cols, start_us, end_us)
+        with cols.lock:
+            out = {p: cols.slice_desc(p, start_us, end_us) for p in params}
+        self._evict()
+        return out
+
+    def summarize(
+        self,
+        device_id: str,
+        site_id: str,
+        param: WaterParameter,
+        start: datetime,
+        end: datetime,
+    ) -> Optional[Dict]:
+        """
+        Mesmo resultado de summarize_series(get_range(...)), mas via rollups.
+        """
+        return self._aggregate(
+            device_id, site_id, param, start, end,
+            lambda cols, agg: _summary(cols, param, agg),
+        )
+
+    def extreme(
+        self,
+        device_id: str,
+        site_id: str,
+        param: WaterParameter,
+        start: datetime,
+        end: datetime,
+        mode: str,
+    ) -> Optional[Dict]:
+        """
+        Mesmo resultado de extreme_in_series(get_range(...), mode), mas via rollups.
+        """
+        return self._aggregate(
+            device_id, site_id, param, start, end,
+            lambda cols, agg: _extreme(cols, param, agg, mode),
+        )
+
+    def trend(
+        self,
+        device_id: str,
+        site_id: str,
+        param: WaterParameter,
+        start: datetime,
+        end: datetime,
+    ) -> Optional[Dict]:
+        """
+        Mesmo resultado de trend_in_series(get_range(...)), mas via rollups.
+        """
+        return self._aggregate(
+            device_id, site_id, param, start, end,
+            lambda cols, agg: _trend(cols, param, agg),
+        )
+
+    def _aggregate(
+        self,
+        device_id: str,
+        site_id: str,
+        param: WaterParameter,
+        start: datetime,
+        end: datetime,
+        build: Callable[[_SeriesColumns, Aggregate], Dict],
+    ) -> Optional[Dict]:
+        start_us, end_us = to_epoch_us(start), to_epoch_us(end)
+        if start_us > end_us:
+            return None
+        cols = self._get_columns(device_id, site_id)
+        self._fill(device_id, site_id, cols, start_us, end_us)
+        result = self._build_aggregate(cols, param, start_us, end_us, build)
+        self._evict()
+        return result
+
+    def _fill(
+        self, device_id: str, site_id: str, cols: _SeriesColumns, start_us: int, end_us: int
+    ) -> None:
+        while True:
+            with cols.lock:
+                pending = bool(self._plan(cols, start_us, end_us))
+            if not pending:
+                return
+            self._coalesce(
+                ("fill", device_id, site_id),
+                lambda: self._fill_once(device_id, site_id, cols, start_us, end_us),
+            )
+
+    def _fill_once(
+        self, device_id: str, site_id: str, cols: _SeriesColumns, start_us: int, end_us: int
+    ) -> None:
+        # replaneja: a série pode ter sido preenchida enquanto esperávamos a vez
+        with cols.lock:
+            loads = self._plan(cols, start_us, end_us)
+        rows_per_load = [self._load(device_id, site_id, lo, hi) for lo, hi in loads]
+        self._apply_loads(cols, loads, rows_per_load)
+
+    def _load(self, device_id: str, site_id: str, lo: int, hi: int) -> List[TelemetryRow]:
+        self.firestore_loads += 1
+        return list(self._loader(device_id, site_id, from_epoch_us(lo), from_epoch_us(hi)))
+
+    # ---------------- API assíncrona ----------------
+
+    async def aget_range(
+        self,
+        device_id: str,
+        site_id: str,
+        param: WaterParameter,
+        start: datetime,
+        end: datetime,
+    ) -> TelemetrySeries:
+        start_us, end_us = to_epoch_us(start), to_epoch_us(end)
+        if start_us > end_us:
+            return TelemetrySeries.empty()
+        cols = self._get_columns(device_id, site_id)
+        await self._afill(device_id, site_id, cols, start_us, end_us)
+        with cols.lock:
+            series = cols.slice_desc(param, start_us, end_us)
+        self._evict()
+        return series
+
+    async def aget_ranges(
+        self,
+        device_id: str,
+        site_id: str,
+        params: Iterable[WaterParameter],
+        start: datetime,
+        end: datetime,
+    ) -> Dict[WaterParameter, TelemetrySeries]:
+        start_us, end_us = to_epoch_us(start), to_epoch_us(end)
+        if start_us > end_us:
+            return {p: TelemetrySeries.empty() for p in params}
+        cols = self._get_columns(device_id, site_id)
+        await self._afill(device_id, site_id, cols, start_us, end_us)
+        with cols.lock:
+            out = {p: cols.slice_desc(p, start_us, end_us) for p in params}
+        self._evict()
+        return out
+
+    async def asummarize(
+        self,
+        device_id: str,
+        site_id: str,
+        param: WaterParameter,
+        start: datetime,
+        end: datetime,
+    ) -> Optional[Dict]:
+        return await self._aaggregate(
+            device_id, site_id, param, start, end,
+            lambda cols, agg: _summary(cols, param, agg),
+        )
+
+    async def aextreme(
+        self,
+        device_id: str,
+        site_id: str,
+        param: WaterParameter,
+        start: datetime,
+        end: datetime,
+        mode: str,
+    ) -> Optional[Dict]:
+        return await self._aaggregate(
+            device_id, site_id, param, start, end,
+            lambda cols, agg: _extreme(cols, param, agg, mode),
+        )
+
+    async def atrend(
+        self,
+        device_id: str,
+        site_id: str,
+        param: WaterParameter,
+        start: datetime,
+        end: datetime,
+    ) -> Optional[Dict]:
+        return await self._aaggregate(
+            device_id, site_id, param, start, end,
+            lambda cols, agg: _trend(cols, param, agg),
+        )
+
+    async def _aaggregate(
+        self,
+        device_id: str,
+        site_id: str,
+        param: WaterParameter,
+        start: datetime,
+        end: datetime,
+        build: Callable[[_SeriesColumns, Aggregate], Dict],
+    ) -> Optional[Dict]:
+        start_us, end_us = to_epoch_us(start), to_epoch_us(end)
+        if start_us > end_us:
+            return None
+        cols = self._get_columns(device_id, site_id)
+        await self._afill(device_id, site_id, cols, start_us, end_us)
+        result = self._build_aggregate(cols, param, start_us, end_us, build)
+        self._evict()
+        return result
+
+    async def _afill(
+        self, device_id: str, site_id: str, cols: _SeriesColumns, start_us: int, end_us: int
+    ) -> None:
+        while True:
+            with cols.lock:
+                pending = bool(self._plan(cols, start_us, end_us))
+            if not pending:
+                return
+            await self._acoalesce(
+                ("fill", device_id, site_id),
+                lambda: self._afill_once(device_id, site_id, cols, start_us, end_us),
+            )
+
+    async def _afill_once(
+        self, device_id: str, site_id: str, cols: _SeriesColumns, start_us: int, end_us: int
+    ) -> None:
+        with cols.lock:
+            loads = self._plan(cols, start_us, end_us)
+        rows_per_load = await asyncio.gather(
+            *(self._aload(device_id, site_id, lo, hi) for lo, hi in loads)
+        )
+        # decodificar e atualizar os rollups é CPU: fora do loop, que segue atendendo
+        await asyncio.to_thread(self._apply_loads, cols, loads, rows_per_load)
+
+    async def _aload(self, device_id: str, site_id: str, lo: int, hi: int) -> List[TelemetryRow]:
+        if self._async_loader is None:
+            return await asyncio.to_thread(self._load, device_id, site_id, lo, hi)
+        self.firestore_loads += 1
+        return list(
+            await self._async_loader(device_id, site_id, from_epoch_us(lo), from_epoch_us(hi))
+        )
+
+    # ---------------- internos ----------------
+
+    def _get_columns(self, device_id: str, site_id: str) -> _SeriesColumns:
+        key = (device_id, site_id)
+        with self._lock:
+            cols = self._series.get(key)
+            if cols is None:
+                cols = _SeriesColumns()
+                self._series[key] = cols
+            self._series.move_to_end(key)
+        return cols
+
+    @staticmethod
+    def _build_aggregate(
+        cols: _SeriesColumns,
+        param: WaterParameter,
+        start_us: int,
+        end_us: int,
+        build: Callable[[_SeriesColumns, Aggregate], Dict],
+    ) -> Optional[Dict]:
+        with cols.lock:
+            agg = cols.aggregate(param, start_us, end_us)
+            return build(cols, agg) if agg.count else None
+
+    def _plan(self, cols: _SeriesColumns, start_us: int, end_us: int) -> List[Tuple[int, int]]:
+        """
+        Trechos [lo, hi] que ainda precisam vir do Firestore.
+        """
+        now_us = to_epoch_us(datetime.now(timezone.utc))
+        # nunca marcamos como coberto um trecho no futuro
+        end_us = min(end_us, now_us)
+        if end_us < start_us:
+            return []
+        if cols.covered_from is None or cols.covered_to is None:
+            return [(start_us, end_us)]
+
+        loads = []
+        # trecho mais antigo ainda não carregado
+        if start_us < cols.covered_from:
+            loads.append((start_us, cols.covered_from))
+        # delta mais novo que a marca d'água; se ela está a menos de
+        # refresh_seconds de "agora", aceitamos essa defasagem e não consultamos
+        fresh_us = now_us - int(self.refresh_seconds * 1_000_000)
+        if end_us > cols.covered_to and cols.covered_to < fresh_us:
+            loads.append((cols.covered_to, end_us))
+        return loads
+
+    @classmethod
+    def _apply_loads(
+        cls, cols: _SeriesColumns, loads: List[Tuple[int, int]], rows_per_load: List[List[TelemetryRow]]
+    ) -> None:
+        with cols.lock:
+            for (lo, hi), rows in zip(loads, rows_per_load):
+                cls._apply(cols, lo, hi, rows)
+
+    @staticmethod
+    def _apply(cols: _SeriesColumns, lo: int, hi: int, rows: List[TelemetryRow]) -> None:
+        if cols.covered_from is None or cols.covered_to is None:
+            cols.append(rows)
+            cols.covered_from, cols.covered_to = lo, hi
+            return
+        if lo > cols.covered_to or hi < cols.covered_from:
+            # disjunto da cobertura atual (corrida com outra carga): descarta e replaneja
+            return
+
+        covered_from, covered_to = cols.covered_from, cols.covered_to
+        older = [r for r in rows if to_epoch_us(r[0]) < covered_from]
+        # o que já entrou por ingest() não é duplicado
+        newer = [
+            r for r in rows
+            if to_epoch_us(r[0]) > covered_to and to_epoch_us(r[0]) not in cols.ahead
+        ]
+        if older:
+            cols.prepend(older)
+        if newer:
+            cols.insert(newer)
+        cols.covered_from = min(covered_from, lo)
+        cols.covered_to = max(covered_to, hi)
+        if cols.ahead:
+            cols.ahead = {t for t in cols.ahead if t > cols.covered_to}
+
+    def _evict(self) -> None:
+        with self._lock:
+            total = sum(c.nbytes for c in self._series.values())
+            while total > self.max_bytes and len(self._series) > 1:
+                _, cols = self._series.popitem(last=False)
+                total -= cols.nbytes
+
+    def ingest(self, device_id: str, site_id: str, rows: Iterable[TelemetryRow]) -> int:
+        """
+        Aplica leituras recém-gravadas a uma série que já está em cache.
+
+        - dentro da cobertura: inseridas na posição certa (senão nunca
+          seriam vistas, pois o trecho não é recarregado)
+        - além de covered_to: inseridas e lembradas em `ahead`, para que o
+          próximo delta do Firestore não as duplique
+        - instantes que já estão em cache (reenvio do mesmo lote): ignorados
+        - antes de covered_from: ignoradas (vêm do Firestore no backfill)
+
+        Séries que não estão em cache não são criadas. Devolve quantas
+        linhas foram aplicadas.
+        """
+        rows = sorted(rows, key=lambda r: to_epoch_us(r[0]))
+        return self.ingest_columns(device_id, site_id, *_SeriesColumns._columns_from_rows(rows))
+
+    def ingest_columns(
+        self,
+        device_id: str,
+        site_id: str,
+        ts: array,
+        values: Dict[WaterParameter, array],
+        units: Dict[WaterParameter, List[str]],
+    ) -> int:
+        """
+        Igual a ingest, mas já no formato colunar (ts ASC), sem passar por
+        TelemetryRow (usado pela ingestão binária).
+        """
+        with self._lock:
+            cols = self._series.get((device_id, site_id))
+        if cols is None:
+            return 0
+
+        with cols.lock:
+            if cols.covered_from is None or cols.covered_to is None:
+                return 0
+            lo = bisect_left(ts, cols.covered_from)
+            if lo:
+                ts = ts[lo:]
+                values = {p: v[lo:] for p, v in values.items()}
+                units = {p: u[lo:] for p, u in units.items()}
+            # reenvio (retry) do mesmo lote: o instante já em cache não entra de
+            # novo, senão count e avg passam a contar a leitura duas vezes
+            keep = [
+                i for i, t in enumerate(ts)
+                if (not i or ts[i - 1] != t) and t not in cols.ahead and not _has(cols.ts, t)
+            ]
+            if len(keep) < len(ts):
+                ts = array("q", (ts[i] for i in keep))
+                values = {p: array("d", (v[i] for i in keep)) for p, v in values.items()}
+                units = {p: [u[i] for i in keep] for p, u in units.items()}
+            cols.insert_columns(ts, values, units)
+            cols.ahead.update(ts[bisect_right(ts, cols.covered_to):])
+        return len(ts)
+
+    def invalidate(self, device_id: str, site_id: str) -> None:
+        with self._lock:
+            self._series.pop((device_id, site_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "series": len(self._series),
+                "rows": sum(len(c.ts) for c in self._series.values()),
+                "bytes": sum(c.nbytes for c in self._series.values()),
+                "max_bytes": self.max_bytes,
+                "firestore_loads": self.firestore_loads,
+            }
@@ -0,0 +1,141 @@
+"""
+Redução de séries para gráficos (GET /telemetry/history).
+
+- lttb_indices(): Largest-Triangle-Three-Buckets. Mantém o formato visual
+  da curva com um ponto por bucket (o que forma o maior triângulo com o
+  ponto escolhido antes e a média do bucket seguinte), sempre com o
+  primeiro e o último
+- minmax_indices(): envelope mínimo/máximo em buckets de tempo iguais; os
+  extremos da janela sempre sobrevivem (bom para o PDF e para picos)
+- downsample_series(): série ASC com no máximo max_points pontos
+- history_payload(): resposta colunar (t em epoch ms, v), em JSON ou
+  MessagePack (encode_history)
+
+O número de pontos depende só de max_points, não da taxa de amostragem:
+30 dias a cada 10 s ou a cada 5 min dão o mesmo tamanho de resposta.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict
+
+import numpy as np
+import ormsgpack
+
+from app.models import WaterParameter
+from app.telemetry_series import SeriesLike, TelemetrySeries, as_series
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+def lttb_indices(ts_ns: np.ndarray, values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Índices escolhidos pelo LTTB (ts_ns em ordem ASC).
+    """
+    n = len(values)
+    if max_points >= n:
+        return np.arange(n)
+    if max_points < 3:
+        return np.array([0, n - 1], dtype=np.int64)
+
+    x = (ts_ns - ts_ns[0]).astype(np.float64) / 1e9
+    y = values
+    buckets = max_points - 2
+    # bucket i = [bounds[i], bounds[i + 1]) entre o primeiro e o último ponto
+    bounds = (np.arange(buckets + 1) * ((n - 2) / buckets)).astype(np.int64) + 1
+    bounds[-1] = n - 1
+    # média de cada bucket (o "terceiro vértice" do bucket anterior); o
+    # último bucket usa o ponto final
+    cx, cy = np.cumsum(np.r_[0.0, x]), np.cumsum(np.r_[0.0, y])
+    sizes = np.diff(bounds)
+    avg_x = np.r_[(cx[bounds[1:]] - cx[bounds[:-1]]) / sizes, x[-1]]
+    avg_y = np.r_[(cy[bounds[1:]] - cy[bounds[:-1]]) / sizes, y[-1]]
+
+    out = np.empty(max_points, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(buckets):
+        lo, hi = bounds[i], bounds[i + 1]
+        ax, ay = x[a], y[a]
+        # 2x a área do triângulo (a, ponto, média do próximo bucket)
+        area = np.abs((ax - avg_x[i + 1]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (avg_y[i + 1] - ay))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(ts_ns: np.ndarray, values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Índices do mínimo e do máximo de cada bucket de tempo (max_points // 2
+    buckets), em ordem ASC e sem repetição.
+    """
+    n = len(values)
+    if max_points >= n:
+        return np.arange(n)
+    buckets = max(max_points // 2, 1)
+    span = int(ts_ns[-1] - ts_ns[0]) + 1
+    bucket = (ts_ns - ts_ns[0]) * buckets // span
+    # ordenado por bucket e, dentro dele, por valor: a 1ª posição é o
+    # mínimo e a última, o máximo
+    order = np.lexsort((values, bucket))
+    b = bucket[order]
+    starts = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    return np.unique(np.r_[order[starts], order[ends]])
+
+
+def downsample_series(series: SeriesLike, max_points: int, method: str = "lttb") -> TelemetrySeries:
+    """
+    Série em ordem ASC com no máximo max_points pontos. ValueError para
+    método desconhecido.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"método desconhecido: {method!r} (use {', '.join(DOWNSAMPLE_METHODS)})")
+    series = as_series(series)
+    order = np.argsort(series.ts_ns, kind="stable")
+    ts, values = series.ts_ns[order], series.values[order]
+    if len(values) > max_points:
+        pick = lttb_indices if method == "lttb" else minmax_indices
+        idx = pick(ts, values, max_points)
+        ts, values = ts[idx], values[idx]
+    return TelemetrySeries(ts, values, series.unit)
+
+
+def series_columns(series: TelemetrySeries, raw_count: int) -> Dict:
+    """
+    Formato colunar da resposta: t em epoch ms e v, na mesma ordem.
+    """
+    return {
+        "unit": series.unit,
+        "count": raw_count,
+        "t": (series.ts_ns // 1_000_000).tolist(),
+        "v": series.values.tolist(),
+    }
+
+
+def history_payload(
+    device_id: str,
+    site_id: str,
+    start: datetime,
+    end: datetime,
+    series_by_param: Dict[WaterParameter, TelemetrySeries],
+    max_points: int,
+    method: str,
+) -> Dict[str, Any]:
+    parameters = {}
+    for p, series in series_by_param.items():
+        parameters[p.value] = series_columns(downsample_series(series, max_points, method), len(series))
+    return {
+        "device_id": device_id,
+        "site_id": site_id,
+        "start": start,
+        "end": end,
+        "method": method,
+        "max_points": max_points,
+        "parameters": parameters,
+    }
+
+
+def encode_history(payload: Dict[str, Any]) -> bytes:
+    # datetimes viram strings RFC 3339, como no JSON
+    return ormsgpack.packb(payload)
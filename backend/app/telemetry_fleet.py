@@ -0,0 +1,175 @@
+"""
+Consultas sobre a frota inteira (todos os devices/sites): "qual viveiro teve
+o pior pH da semana", "temperatura média de todos hoje".
+
+Cada par é um shard consultado pelo mesmo caminho do /chat
+(asummarize_range, atrend_range, aget_telemetry_range: cache de séries,
+rollups, agregação no SQLite e single-flight), todos ao mesmo tempo com no
+máximo FLEET_MAX_CONCURRENCY em andamento. Com a concorrência acima do
+número de pares a espera pelo store é a do shard mais lento, não a soma
+(a decodificação dos documentos continua no event loop, essa se soma).
+
+Uma única varredura da coleção agrupada por device seria uma só consulta,
+mas no Firestore ela é um stream sequencial com todas as leituras da frota
+(tempo proporcional ao total) e não aproveita o cache por par.
+
+- os pares vêm do índice da última leitura (alist_latest_states); quem não
+  tem o parâmetro ou não envia nada desde start fica de fora sem consulta
+- cada shard tem FLEET_SHARD_TIMEOUT_SECONDS: erro ou timeout vai para
+  failed e não derruba a tabela
+- métricas:
+  avg/min/max     resumo do intervalo
+  excursion       maior distância fora da faixa ideal do site (0 = sempre dentro)
+  time_outside    % do tempo fora da faixa ideal (precisa da série inteira)
+  trend           variação da reta de mínimos quadrados no intervalo
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.config import get_settings
+from app.models import DeviceLatest, WaterParameter
+from app.telemetry_alerts import alert_rules
+from app.telemetry_repository import (
+    aget_telemetry_range,
+    alist_latest_states,
+    asummarize_range,
+    atrend_range,
+)
+from app.telemetry_series import fraction_outside, summarize_series
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+FLEET_METRICS = ("avg", "min", "max", "excursion", "time_outside", "trend")
+
+
+def _excursion(summary: Dict, ideal: Optional[Dict]) -> Optional[float]:
+    if ideal is None:
+        return None
+    return max(ideal["min"] - summary["min"], summary["max"] - ideal["max"], 0.0)
+
+
+async def _shard(
+    pair: DeviceLatest, param: WaterParameter, start: datetime, end: datetime, metric: str
+) -> Optional[Dict]:
+    """
+    Linha da tabela de um par (None = sem leituras no intervalo).
+    """
+    dev, site = pair.device_id, pair.site_id
+    ideal = alert_rules.ideal_range(site, param)
+    if metric == "time_outside":
+        series = await aget_telemetry_range(dev, site, param, start, end)
+        summary = summarize_series(series)
+        if summary is None:
+            return None
+        value = None if ideal is None else fraction_outside(series, ideal["min"], ideal["max"]) * 100
+    elif metric == "trend":
+        summary, trend = await asyncio.gather(
+            asummarize_range(dev, site, param, start, end),
+            atrend_range(dev, site, param, start, end),
+        )
+        if summary is None:
+            return None
+        value = trend["delta"] if trend else None
+    else:
+        summary = await asummarize_range(dev, site, param, start, end)
+        if summary is None:
+            return None
+        value = _excursion(summary, ideal) if metric == "excursion" else summary[metric]
+
+    return {
+        "device_id": dev,
+        "site_id": site,
+        "value": value,
+        "count": summary["count"],
+        "avg": summary["avg"],
+        "min": summary["min"],
+        "max": summary["max"],
+        "unit": summary["unit"],
+    }
+
+
+def _totals(rows: List[Dict]) -> Dict:
+    count = sum(r["count"] for r in rows)
+    return {
+        "devices": len(rows),
+        "count": count,
+        "avg": sum(r["avg"] * r["count"] for r in rows) / count if count else None,
+        "min": min((r["min"] for r in rows), default=None),
+        "max": max((r["max"] for r in rows), default=None),
+    }
+
+
+def _value_unit(metric: str, rows: List[Dict]) -> str:
+    if metric == "time_outside":
+        return "%"
+    return rows[0]["unit"] if rows else ""
+
+
+async def fleet_ranking(
+    param: WaterParameter,
+    start: datetime,
+    end: datetime,
+    metric: str,
+    site_id: Optional[str] = None,
+    descending: bool = True,
+    limit: Optional[int] = None,
+) -> Dict:
+    """
+    Tabela de todos os pares (ou só os do site_id) ordenada pela métrica,
+    no formato de FleetRankingResponse.
+    """
+    pairs: List[DeviceLatest] = []
+    skipped = 0
+    for pair in await alist_latest_states():
+        if site_id is not None and pair.site_id != site_id:
+            continue
+        reading = pair.parameters.get(param)
+        # última leitura do parâmetro antes de start: nada no intervalo
+        if reading is None or reading.sent_at < start:
+            skipped += 1
+            continue
+        pairs.append(pair)
+
+    semaphore = asyncio.Semaphore(max(1, settings.FLEET_MAX_CONCURRENCY))
+    timeout = settings.FLEET_SHARD_TIMEOUT_SECONDS or None
+
+    async def run(pair: DeviceLatest) -> Tuple[DeviceLatest, Optional[Dict], Optional[str]]:
+        async with semaphore:
+            try:
+                row = await asyncio.wait_for(_shard(pair, param, start, end, metric), timeout)
+            except asyncio.TimeoutError:
+                return pair, None, f"timeout ({timeout:g} s)"
+            except Exception as exc:
+                logger.warning("Fleet: falha em %s/%s: %s", pair.device_id, pair.site_id, exc)
+                return pair, None, str(exc) or type(exc).__name__
+        return pair, row, None
+
+    rows: List[Dict] = []
+    failed: List[Dict] = []
+    for pair, row, error in await asyncio.gather(*(run(p) for p in pairs)):
+        if error is not None:
+            failed.append({"device_id": pair.device_id, "site_id": pair.site_id, "error": error})
+        elif row is None:
+            skipped += 1
+        else:
+            rows.append(row)
+
+    # sem valor (sem faixa ideal/tendência) sempre no fim
+    sign = -1.0 if descending else 1.0
+    ranked = sorted(rows, key=lambda r: (r["value"] is None, sign * (r["value"] or 0.0)))
+    return {
+        "parameter": param,
+        "metric": metric,
+        "unit": _value_unit(metric, rows),
+        "start": start,
+        "end": end,
+        "fleet": _totals(rows),
+        "rows": ranked[:limit] if limit else ranked,
+        "skipped": skipped,
+        "failed": failed,
+    }
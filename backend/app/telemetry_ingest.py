@@ -0,0 +1,273 @@
+"""
+Ingestão em lote de telemetria (POST /telemetry/batch).
+
+- valida cada leitura como TelemetryDocument
+- grava com WriteBatch do Firestore (até 500 operações por commit)
+- write-behind opcional: as leituras aceitas ficam num buffer que é
+  gravado quando atinge INGEST_FLUSH_SIZE ou a cada
+  INGEST_FLUSH_INTERVAL_SECONDS, o que vier primeiro
+- as leituras entram no cache de séries e no índice da última leitura na
+  chegada, então o /chat já as enxerga antes mesmo do flush; na mesma hora
+  passam pelas regras de alerta (telemetry_alerts.py)
+- além do JSON, aceita o formato binário de telemetry_wire.py (MessagePack),
+  que vai direto para o formato colunar do cache
+- o ID de cada documento vem do par e do sent_at (telemetry_doc_id): se o
+  cliente reenviar um lote (timeout, 503), as leituras são regravadas nos
+  mesmos documentos, sem duplicar
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from app.config import get_settings
+from app.telemetry_cache import from_epoch_us, to_epoch_us
+from app.models import TelemetryBatchRequest, TelemetryBatchResponse, TelemetryDocument
+from app.telemetry_alerts import alert_engine
+from app.telemetry_repository import (
+    PendingDoc,
+    awrite_telemetry_docs,
+    cache_telemetry_docs,
+    index_latest_rows,
+    rows_by_series,
+    series_cache,
+    telemetry_doc_id,
+    telemetry_doc_to_data,
+)
+from app.telemetry_wire import DecodedBatch, batch_columns, batch_measurements
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class IngestUnavailable(Exception):
+    """
+    Buffer cheio e o flush falhou: o lote foi recusado sem efeito nenhum
+    (nem buffer, nem cache, nem índice) e pode ser reenviado (HTTP 503).
+    """
+
+
+def build_documents(req: TelemetryBatchRequest) -> List[TelemetryDocument]:
+    """
+    Expande o payload compacto em TelemetryDocument. ValueError se alguma
+    leitura ficar sem device_id/site_id.
+    """
+    docs = []
+    for i, r in enumerate(req.readings):
+        device_id = r.device_id or req.device_id
+        site_id = r.site_id or req.site_id
+        if not device_id or not site_id:
+            raise ValueError(f"readings[{i}]: device_id e site_id são obrigatórios")
+        sent_at = r.sent_at
+        if sent_at.tzinfo is None:
+            # o Firestore interpreta datetimes sem fuso como UTC
+            sent_at = sent_at.replace(tzinfo=timezone.utc)
+        docs.append(
+            TelemetryDocument(
+                id=telemetry_doc_id(device_id, site_id, to_epoch_us(sent_at)),
+                device_id=device_id,
+                site_id=site_id,
+                sent_at=sent_at,
+                measurements=r.measurements,
+            )
+        )
+    return docs
+
+
+def _doc_data(doc: TelemetryDocument, seq: Optional[int]) -> Dict[str, Any]:
+    data = telemetry_doc_to_data(doc)
+    data["msg_type"] = "telemetry"
+    if seq is not None:
+        data["seq"] = seq
+    return data
+
+
+class TelemetryWriteBuffer:
+    """
+    Buffer write-behind. O ack do endpoint significa "aceito", não
+    "persistido": o que estiver no buffer se perde se o processo morrer.
+    Se um commit falhar, os documentos voltam para a fila (os IDs são
+    fixos, então regravar o que já tinha entrado é idempotente).
+
+    max_pending limita a fila contando também o lote em gravação: com o
+    store fora do ar ela não cresce além disso. Um add que não cabe espera
+    um flush; se ainda assim não couber, IngestUnavailable, antes de
+    aceitar qualquer coisa.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[List[PendingDoc]], Awaitable[int]],
+        flush_size: int = 500,
+        flush_interval: float = 2.0,
+        max_pending: int = 10_000,
+    ) -> None:
+        self._write = write
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: List[PendingDoc] = []
+        # tamanho do lote em gravação (volta para _pending se o commit falhar)
+        self._inflight = 0
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+        self.written = 0
+        self.commits = 0
+        self.failures = 0
+        self.rejected = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _fits(self, n: int) -> bool:
+        return len(self._pending) + self._inflight + n <= self.max_pending
+
+    async def add(self, docs: List[PendingDoc]) -> None:
+        if not self._fits(len(docs)):
+            # contrapressão: quem está enviando espera o flush
+            try:
+                await self.flush()
+            except Exception as e:
+                self.rejected += len(docs)
+                raise IngestUnavailable(f"buffer de ingestão cheio ({self.pending} pendentes)") from e
+            if not self._fits(len(docs)):
+                self.rejected += len(docs)
+                raise IngestUnavailable(f"buffer de ingestão cheio ({self.pending} pendentes)")
+        self._pending.extend(docs)
+        if len(self._pending) >= self.flush_size and not self._flush_lock.locked():
+            task = asyncio.create_task(self._flush_logged())
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            # o mesmo ID pode estar duas vezes (lote reenviado antes do flush): fica o último
+            docs = list(dict(self._pending).items())
+            self._pending = []
+            self._inflight = len(docs)
+            try:
+                commits = await self._write(docs)
+            except Exception:
+                self._pending[:0] = docs
+                self.failures += 1
+                raise
+            finally:
+                self._inflight = 0
+            self.written += len(docs)
+            self.commits += commits
+
+    async def _flush_logged(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("falha no flush da telemetria (%d pendentes)", self.pending)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush_logged()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.gather(*self._background, return_exceptions=True)
+        await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self.pending,
+            "written": self.written,
+            "commits": self.commits,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+
+write_buffer = TelemetryWriteBuffer(
+    awrite_telemetry_docs,
+    flush_size=settings.INGEST_FLUSH_SIZE,
+    flush_interval=settings.INGEST_FLUSH_INTERVAL_SECONDS,
+    max_pending=settings.INGEST_MAX_PENDING,
+)
+
+
+async def ingest_documents(
+    docs: List[TelemetryDocument], seqs: List[Optional[int]]
+) -> TelemetryBatchResponse:
+    pending = [(d.id, _doc_data(d, seq)) for d, seq in zip(docs, seqs)]
+    commits = await _write(pending)
+    _index(pending)
+
+    if settings.TELEMETRY_CACHE_ENABLED:
+        cache_telemetry_docs(docs)
+
+    return _response(pending, commits)
+
+
+async def ingest_decoded(batches: List[DecodedBatch]) -> TelemetryBatchResponse:
+    """
+    Caminho do formato binário: do lote decodificado para os documentos do
+    Firestore e para as colunas do cache, sem TelemetryDocument no meio.
+    """
+    pending: List[PendingDoc] = []
+    for b in batches:
+        for i, (us, measurements) in enumerate(zip(b.ts_us.tolist(), batch_measurements(b))):
+            data: Dict[str, Any] = {
+                "device_id": b.device_id,
+                "site_id": b.site_id,
+                "sent_at": from_epoch_us(us),
+                "measurements": measurements,
+                "msg_type": "telemetry",
+            }
+            if b.seq0 is not None:
+                data["seq"] = b.seq0 + i
+            pending.append((telemetry_doc_id(b.device_id, b.site_id, us), data))
+    commits = await _write(pending)
+    _index(pending)
+
+    if settings.TELEMETRY_CACHE_ENABLED:
+        for b in batches:
+            series_cache.ingest_columns(b.device_id, b.site_id, *batch_columns(b))
+
+    return _response(pending, commits)
+
+
+async def _write(pending: List[PendingDoc]) -> int:
+    # nada de cache, índice ou alertas antes daqui: se falhar (IngestUnavailable,
+    # erro do store), o lote não deixa rastro e o reenvio cai nos mesmos IDs
+    if settings.INGEST_WRITE_BEHIND_ENABLED:
+        await write_buffer.add(pending)
+        return 0
+    return await awrite_telemetry_docs(pending)
+
+
+def _index(pending: List[PendingDoc]) -> None:
+    # índice da última leitura e alertas, na chegada (sem ler o store)
+    by_series = rows_by_series(pending)
+    index_latest_rows(by_series)
+    if settings.ALERTS_ENABLED:
+        alert_engine.evaluate_series(by_series)
+
+
+def _response(pending: List[PendingDoc], commits: int) -> TelemetryBatchResponse:
+    return TelemetryBatchResponse(
+        accepted=len(pending),
+        ids=[doc_id for doc_id, _ in pending],
+        commits=commits,
+        buffered=write_buffer.pending,
+    )
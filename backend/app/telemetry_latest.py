@@ -0,0 +1,203 @@
+"""
+Índice da última leitura de cada device/site (DeviceLatest): valor e horário
+mais recentes de CADA parâmetro, mesmo quando o último envio não traz todos.
+
+- o store persiste o índice no insert (Firestore: documento
+  devices_latest/{device_id}_{site_id}; SQLite: tabela telemetry_latest),
+  então carregar um par é uma leitura pontual, sem a consulta ordenada
+  (e sem o índice composto) sobre a coleção de telemetria
+- LatestIndex mantém os pares em memória e recebe as leituras na chegada,
+  como o cache de séries (antes mesmo do flush do write-behind)
+- entradas com mais de ttl_seconds são recarregadas do store, já que outras
+  instâncias também gravam; na mesclagem a leitura mais nova sempre vence
+
+Os sent_at comparados aqui têm fuso (ingestão, Firestore e SQLite); os
+modelos são montados com model_construct, porque isso roda a cada ingestão.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.models import DeviceLatest, ParameterReading, WaterParameter
+from app.telemetry_cache import TelemetryRow
+
+# (device_id, site_id)
+LatestKey = Tuple[str, str]
+
+
+def latest_doc_id(device_id: str, site_id: str) -> str:
+    return f"{device_id}_{site_id}"
+
+
+def build_latest(
+    device_id: str, site_id: str, parameters: Dict[WaterParameter, ParameterReading]
+) -> Optional[DeviceLatest]:
+    if not parameters:
+        return None
+    return DeviceLatest.model_construct(
+        device_id=device_id,
+        site_id=site_id,
+        sent_at=max(r.sent_at for r in parameters.values()),
+        parameters=parameters,
+    )
+
+
+def merge_latest(
+    current: Optional[DeviceLatest], update: Optional[DeviceLatest]
+) -> Optional[DeviceLatest]:
+    """
+    Por parâmetro, fica a leitura mais recente (no empate, a de update).
+    """
+    if current is None:
+        return update
+    if update is None:
+        return current
+    parameters = dict(current.parameters)
+    for p, reading in update.parameters.items():
+        old = parameters.get(p)
+        if old is None or reading.sent_at >= old.sent_at:
+            parameters[p] = reading
+    return build_latest(current.device_id, current.site_id, parameters)
+
+
+def latest_from_rows(
+    device_id: str, site_id: str, rows: Iterable[TelemetryRow]
+) -> Optional[DeviceLatest]:
+    """
+    DeviceLatest de um conjunto de envios em qualquer ordem.
+    """
+    newest: Dict[WaterParameter, Tuple[datetime, float, str]] = {}
+    for sent_at, measurements in rows:
+        for p, value, unit in measurements:
+            old = newest.get(p)
+            if old is None or sent_at >= old[0]:
+                newest[p] = (sent_at, value, unit)
+    return build_latest(
+        device_id,
+        site_id,
+        {
+            p: ParameterReading.model_construct(value=value, unit=unit, sent_at=sent_at)
+            for p, (sent_at, value, unit) in newest.items()
+        },
+    )
+
+
+def latest_to_data(state: DeviceLatest) -> Dict[str, Any]:
+    # formato do documento em devices_latest (sent_at de cada parâmetro)
+    return {
+        "device_id": state.device_id,
+        "site_id": state.site_id,
+        "parameters": {
+            p.value: {"value": r.value, "unit": r.unit, "sent_at": r.sent_at}
+            for p, r in state.parameters.items()
+        },
+    }
+
+
+def latest_from_data(data: Dict[str, Any]) -> Optional[DeviceLatest]:
+    parameters = {}
+    for name, r in (data.get("parameters") or {}).items():
+        try:
+            p = WaterParameter(name)
+        except ValueError:
+            continue
+        parameters[p] = ParameterReading(value=float(r["value"]), unit=r.get("unit", ""), sent_at=r["sent_at"])
+    return build_latest(data["device_id"], data["site_id"], parameters)
+
+
+class LatestIndex:
+    """
+    DeviceLatest por par em memória, carregado do store no primeiro uso.
+
+    Uma entrada criada só pela ingestão é parcial (pode faltar o que o store
+    já tinha) e é completada na primeira consulta.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str, str], Optional[DeviceLatest]],
+        async_loader: Callable[[str, str], Awaitable[Optional[DeviceLatest]]],
+        async_list_loader: Callable[[], Awaitable[List[DeviceLatest]]],
+        ttl_seconds: float = 30.0,
+    ) -> None:
+        self._loader = loader
+        self._async_loader = async_loader
+        self._async_list_loader = async_list_loader
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # key -> (estado, monotonic() da última carga do store; None = parcial)
+        self._entries: Dict[LatestKey, Tuple[Optional[DeviceLatest], Optional[float]]] = {}
+        self.hits = 0
+        self.loads = 0
+
+    def _lookup(self, key: LatestKey) -> Tuple[bool, Optional[DeviceLatest]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            state, loaded_at = entry
+            fresh = loaded_at is not None and (
+                self.ttl_seconds <= 0 or time.monotonic() - loaded_at < self.ttl_seconds
+            )
+            if fresh:
+                self.hits += 1
+            return fresh, state
+
+    def _loaded(self, key: LatestKey, loaded: Optional[DeviceLatest]) -> Optional[DeviceLatest]:
+        with self._lock:
+            self.loads += 1
+            entry = self._entries.get(key)
+            # o que está em memória pode ainda não ter sido gravado (write-behind)
+            state = merge_latest(loaded, entry[0] if entry else None)
+            self._entries[key] = (state, time.monotonic())
+            return state
+
+    def get(self, device_id: str, site_id: str) -> Optional[DeviceLatest]:
+        key = (device_id, site_id)
+        fresh, state = self._lookup(key)
+        if fresh:
+            return state
+        return self._loaded(key, self._loader(device_id, site_id))
+
+    async def aget(self, device_id: str, site_id: str) -> Optional[DeviceLatest]:
+        key = (device_id, site_id)
+        fresh, state = self._lookup(key)
+        if fresh:
+            return state
+        return self._loaded(key, await self._async_loader(device_id, site_id))
+
+    async def alist(self) -> List[DeviceLatest]:
+        """
+        Todos os pares: os do store (uma consulta) mais os que só estão em memória.
+        """
+        for state in await self._async_list_loader():
+            self._loaded((state.device_id, state.site_id), state)
+        with self._lock:
+            states = [state for state, _ in self._entries.values() if state is not None]
+        return sorted(states, key=lambda s: (s.device_id, s.site_id))
+
+    def apply(self, device_id: str, site_id: str, rows: Iterable[TelemetryRow]) -> None:
+        """
+        Leituras recém-recebidas do par (qualquer ordem).
+        """
+        update = latest_from_rows(device_id, site_id, rows)
+        if update is None:
+            return
+        key = (device_id, site_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = (update, None)
+            else:
+                self._entries[key] = (merge_latest(entry[0], update), entry[1])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "loads": self.loads}
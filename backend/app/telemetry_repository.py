@@ -1,34 +1,63 @@
 from __future__ import annotations
 
 from datetime import datetime, timedelta
-from statistics import mean
-from typing import Dict, List, Optional, Tuple
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, TypeVar
 
-from google.cloud.firestore_v1 import Query
-
-from app.firestore_client import get_firestore_client
 from app.config import get_settings
-from app.models import TelemetryDocument, Measurement, WaterParameter
+from app.metrics import timed
+from app.models import DeviceLatest, TelemetryDocument, WaterParameter
+from app.single_flight import SingleFlight, round_bounds
+from app.telemetry_cache import TelemetryRow, TelemetrySeriesCache
+from app.telemetry_latest import LatestIndex
+from app.telemetry_series import (  # noqa: F401 (reexportados para main.py)
+    TelemetrySeries,
+    compare_windows,
+    extreme_in_series,
+    percentile_in_series,
+    stddev_in_series,
+    summarize_series,
+    time_weighted_mean,
+    latest_in_series,
+    to_epoch_ns,
+)
+from app.telemetry_store import (  # noqa: F401 (reexportados)
+    PendingDoc,
+    create_telemetry_store,
+    data_to_row,
+    normalize_param,
+    telemetry_doc_id,
+    telemetry_doc_to_data,
+)
+from app.telemetry_trend import change_point_in_series, trend_in_series  # noqa: F401
 
 settings = get_settings()
-db = get_firestore_client()
-COLLECTION = settings.FIRESTORE_TELEMETRY_COLLECTION
-
-
-def _normalize_param(name: str) -> Optional[WaterParameter]:
-    name_lower = name.strip().lower()
-    mapping = {
-        "ph": WaterParameter.PH,
-        "pH".lower(): WaterParameter.PH,
-        "temperature": WaterParameter.TEMPERATURE,
-        "temperatura": WaterParameter.TEMPERATURE,
-        "turbidity": WaterParameter.TURBIDITY,
-        "turbidez": WaterParameter.TURBIDITY,
-        "tds": WaterParameter.TDS,
-        "condutividade": WaterParameter.TDS,
-        "conductivity": WaterParameter.TDS,
-    }
-    return mapping.get(name_lower)
+# Firestore ou SQLite, conforme Settings.TELEMETRY_STORE
+store = create_telemetry_store(settings)
+
+T = TypeVar("T")
+
+# leituras idênticas e simultâneas no store viram uma só (ver single_flight.py)
+query_flights = SingleFlight()
+
+
+def _coalesced(key: Hashable, fn: Callable[[], T]) -> T:
+    return query_flights.do(key, fn) if settings.SINGLE_FLIGHT_ENABLED else fn()
+
+
+async def _acoalesced(key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return await fn()
+    return await query_flights.ado(key, fn)
+
+
+def _flight_bounds(start: datetime, end: datetime) -> Tuple[datetime, datetime]:
+    """
+    Intervalo alargado até SINGLE_FLIGHT_GRANULARITY_SECONDS, para que o
+    "hoje" de requisições com segundos de diferença vire a mesma chave.
+    """
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return start, end
+    return round_bounds(start, end, settings.SINGLE_FLIGHT_GRANULARITY_SECONDS)
 
 
 def default_period(days: int = 1) -> Tuple[datetime, datetime]:
@@ -36,129 +65,330 @@ def default_period(days: int = 1) -> Tuple[datetime, datetime]:
     return now - timedelta(days=days), now
 
 
+@timed("get_latest_telemetry")
 def get_latest_telemetry(device_id: str, site_id: str) -> Optional[TelemetryDocument]:
-    query: Query = (
-        db.collection(COLLECTION)
-        .where("device_id", "==", device_id)
-        .where("site_id", "==", site_id)
-        .order_by("sent_at")      # ASC
-        .limit_to_last(1)         # último = mais recente
-    )
+    return _coalesced(("latest", device_id, site_id), lambda: store.latest(device_id, site_id))
+
+
+@timed("get_latest_telemetry")
+async def aget_latest_telemetry(device_id: str, site_id: str) -> Optional[TelemetryDocument]:
+    return await _acoalesced(("latest", device_id, site_id), lambda: store.alatest(device_id, site_id))
+
+
+def _load_latest_state(device_id: str, site_id: str) -> Optional[DeviceLatest]:
+    return _coalesced(("latest_state", device_id, site_id), lambda: store.latest_state(device_id, site_id))
+
+
+async def _aload_latest_state(device_id: str, site_id: str) -> Optional[DeviceLatest]:
+    return await _acoalesced(("latest_state", device_id, site_id), lambda: store.alatest_state(device_id, site_id))
+
 
-    docs = query.get()
-    if not docs:
-        return None
+async def _aload_latest_states() -> List[DeviceLatest]:
+    return await _acoalesced(("latest_states",), store.alist_latest)
 
-    doc = docs[0]
-    data = doc.to_dict()
-    return _doc_to_model(doc.id, data)
 
+# última leitura de cada parâmetro por par, em memória sobre o índice do store
+latest_index = LatestIndex(
+    loader=_load_latest_state,
+    async_loader=_aload_latest_state,
+    async_list_loader=_aload_latest_states,
+    ttl_seconds=settings.LATEST_INDEX_TTL_SECONDS,
+)
+
+
+@timed("get_latest_telemetry")
+def get_latest_state(device_id: str, site_id: str) -> Optional[DeviceLatest]:
+    return latest_index.get(device_id, site_id)
+
+
+@timed("get_latest_telemetry")
+async def aget_latest_state(device_id: str, site_id: str) -> Optional[DeviceLatest]:
+    return await latest_index.aget(device_id, site_id)
+
+
+async def alist_latest_states() -> List[DeviceLatest]:
+    return await latest_index.alist()
+
+
+def rows_by_series(docs: Iterable[PendingDoc]) -> Dict[Tuple[str, str], List[TelemetryRow]]:
+    """
+    Leituras recém-recebidas ((doc_id, data), como na gravação) agrupadas por par.
+    """
+    by_series: Dict[Tuple[str, str], List[TelemetryRow]] = {}
+    for _, data in docs:
+        by_series.setdefault((data["device_id"], data["site_id"]), []).append(data_to_row(data))
+    return by_series
+
+
+def index_latest_rows(by_series: Dict[Tuple[str, str], List[TelemetryRow]]) -> None:
+    """
+    Leituras recém-recebidas (ver rows_by_series) no índice da última leitura.
+    """
+    for (device_id, site_id), rows in by_series.items():
+        latest_index.apply(device_id, site_id, rows)
+
+
+def watch_latest_index() -> Callable[[], None]:
+    """
+    Leituras gravadas direto no store (firmware) no índice da última leitura,
+    em memória e no store. Devolve a função que encerra o watch.
+    """
+    return store.watch_index(index_latest_rows)
 
+
+def watch_latest_telemetry(
+    device_id: str, site_id: str, on_doc: Callable[[TelemetryDocument], None]
+) -> Callable[[], None]:
+    """
+    Observa a leitura mais recente do par (on_snapshot no Firestore). on_doc
+    pode ser chamado em outra thread, a cada nova leitura e uma vez no início
+    com a atual. Devolve a função que encerra o watch.
+    """
+    return store.watch_latest(device_id, site_id, on_doc)
+
+
+def _load_rows(device_id: str, site_id: str, start: datetime, end: datetime) -> List[TelemetryRow]:
+    return list(store.range_rows(device_id, site_id, start, end))
+
+
+async def _aload_rows(device_id: str, site_id: str, start: datetime, end: datetime) -> List[TelemetryRow]:
+    return await store.arange_rows(device_id, site_id, start, end)
+
+
+# o loader lê TODOS os parâmetros de cada envio no intervalo, em ordem ASC. As cargas
+# não passam pelo single-flight com os limites exatos (cada "hoje" vem de now() e
+# nenhuma chave se repetiria): o cache junta os preenchimentos simultâneos por série
+series_cache = TelemetrySeriesCache(
+    loader=_load_rows,
+    async_loader=_aload_rows,
+    max_bytes=settings.TELEMETRY_CACHE_MAX_BYTES,
+    refresh_seconds=settings.TELEMETRY_CACHE_REFRESH_SECONDS,
+    coalesce=_coalesced,
+    acoalesce=_acoalesced,
+)
+
+
+@timed("get_telemetry_range")
 def get_telemetry_range(
     device_id: str,
     site_id: str,
     param: WaterParameter,
     start: datetime,
     end: datetime,
-) -> List[Tuple[datetime, float, str]]:
-    query: Query = (
-        db.collection(COLLECTION)
-        .where("device_id", "==", device_id)
-        .where("site_id", "==", site_id)
-        .where("sent_at", ">=", start)
-        .where("sent_at", "<=", end)
-        .order_by("sent_at", direction=firestore.Query.DESCENDING)
+) -> TelemetrySeries:
+    if settings.TELEMETRY_CACHE_ENABLED:
+        return series_cache.get_range(device_id, site_id, param, start, end)
+
+    start, end = _flight_bounds(start, end)
+    return _coalesced(
+        ("series", device_id, site_id, param, start, end),
+        lambda: store.range_series(device_id, site_id, param, start, end),
+    )
+
+
+@timed("get_telemetry_range")
+async def aget_telemetry_range(
+    device_id: str,
+    site_id: str,
+    param: WaterParameter,
+    start: datetime,
+    end: datetime,
+) -> TelemetrySeries:
+    if settings.TELEMETRY_CACHE_ENABLED:
+        return await series_cache.aget_range(device_id, site_id, param, start, end)
+
+    start, end = _flight_bounds(start, end)
+    return await _acoalesced(
+        ("series", device_id, site_id, param, start, end),
+        lambda: store.arange_series(device_id, site_id, param, start, end),
+    )
+
+
+@timed("get_telemetry_range")
+def get_telemetry_ranges(
+    device_id: str,
+    site_id: str,
+    params: Iterable[WaterParameter],
+    start: datetime,
+    end: datetime,
+) -> Dict[WaterParameter, TelemetrySeries]:
+    """
+    Séries (DESC) de vários parâmetros a partir de uma única leitura do intervalo.
+    """
+    params = list(dict.fromkeys(params))
+    if settings.TELEMETRY_CACHE_ENABLED:
+        return series_cache.get_ranges(device_id, site_id, params, start, end)
+    start, end = _flight_bounds(start, end)
+    return _coalesced(
+        ("multi", device_id, site_id, frozenset(params), start, end),
+        lambda: store.range_multi(device_id, site_id, params, start, end),
+    )
+
+
+@timed("get_telemetry_range")
+async def aget_telemetry_ranges(
+    device_id: str,
+    site_id: str,
+    params: Iterable[WaterParameter],
+    start: datetime,
+    end: datetime,
+) -> Dict[WaterParameter, TelemetrySeries]:
+    params = list(dict.fromkeys(params))
+    if settings.TELEMETRY_CACHE_ENABLED:
+        return await series_cache.aget_ranges(device_id, site_id, params, start, end)
+    start, end = _flight_bounds(start, end)
+    return await _acoalesced(
+        ("multi", device_id, site_id, frozenset(params), start, end),
+        lambda: store.arange_multi(device_id, site_id, params, start, end),
+    )
+
+
+def _use_cache_rollups() -> bool:
+    return settings.TELEMETRY_CACHE_ENABLED and not store.pushdown_aggregates
+
+
+@timed("telemetry_aggregate")
+def summarize_range(
+    device_id: str,
+    site_id: str,
+    param: WaterParameter,
+    start: datetime,
+    end: datetime,
+) -> Optional[Dict]:
+    """
+    summarize_series sobre o intervalo: no próprio store quando ele agrega
+    (SQLite), senão pelos rollups do cache quando habilitado.
+    """
+    if _use_cache_rollups():
+        return series_cache.summarize(device_id, site_id, param, start, end)
+    start, end = _flight_bounds(start, end)
+    return _coalesced(
+        ("summarize", device_id, site_id, param, start, end),
+        lambda: store.summarize(device_id, site_id, param, start, end),
     )
 
-    series: List[Tuple[datetime, float, str]] = []
-    for doc in query.stream():
-        data = doc.to_dict()
-        sent_at = data.get("sent_at")
-        for m in data.get("measurements", []):
-            p = _normalize_param(m.get("parameter", ""))
-            if p == param:
-                series.append((sent_at, float(m["value"]), m.get("unit", "")))
-    return series
-
-
-def summarize_series(series: List[Tuple[datetime, float, str]]) -> Optional[Dict]:
-    if not series:
-        return None
-
-    timestamps = [t for (t, _, _) in series]
-    values = [v for (_, v, _) in series]
-    unit = series[0][2] if series else ""
-
-    return {
-        "start": min(timestamps),
-        "end": max(timestamps),
-        "count": len(series),
-        "min": min(values),
-        "max": max(values),
-        "avg": mean(values),
-        "unit": unit,
-    }
-
-
-def extreme_in_series(
-    series: List[Tuple[datetime, float, str]], mode: str
+
+@timed("telemetry_aggregate")
+def extreme_in_range(
+    device_id: str,
+    site_id: str,
+    param: WaterParameter,
+    start: datetime,
+    end: datetime,
+    mode: str,
+) -> Optional[Dict]:
+    """
+    extreme_in_series sobre o intervalo (mesma escolha de summarize_range).
+    """
+    if _use_cache_rollups():
+        return series_cache.extreme(device_id, site_id, param, start, end, mode)
+    start, end = _flight_bounds(start, end)
+    return _coalesced(
+        ("extreme", device_id, site_id, param, start, end, mode),
+        lambda: store.extreme(device_id, site_id, param, start, end, mode),
+    )
+
+
+@timed("telemetry_aggregate")
+async def asummarize_range(
+    device_id: str,
+    site_id: str,
+    param: WaterParameter,
+    start: datetime,
+    end: datetime,
 ) -> Optional[Dict]:
-    if not series:
-        return None
-    if mode == "max":
-        best = max(series, key=lambda x: x[1])
-    else:
-        best = min(series, key=lambda x: x[1])
-
-    ts, value, unit = best
-    return {"sent_at": ts, "value": value, "unit": unit}
-
-
-def trend_in_series(series: List[Tuple[datetime, float, str]]) -> Optional[Dict]:
-    """
-    Tendência simples:
-    - compara primeira vs última leitura
-    - calcula delta e direção
-    """
-    if len(series) < 2:
-        return None
-
-    first_ts, first_val, unit = series[0]
-    last_ts, last_val, _ = series[-1]
-
-    delta = last_val - first_val
-    if abs(delta) < 1e-9:
-        direction = "stable"
-    elif delta > 0:
-        direction = "up"
-    else:
-        direction = "down"
-
-    return {
-        "start": first_ts,
-        "end": last_ts,
-        "first": first_val,
-        "last": last_val,
-        "delta": delta,
-        "direction": direction,
-        "unit": unit,
-        "count": len(series),
-    }
-
-
-def _doc_to_model(doc_id: str, data: Dict) -> TelemetryDocument:
-    measurements = [
-        Measurement(
-            parameter=m["parameter"],
-            value=float(m["value"]),
-            unit=m["unit"],
+    if _use_cache_rollups():
+        return await series_cache.asummarize(device_id, site_id, param, start, end)
+    start, end = _flight_bounds(start, end)
+    return await _acoalesced(
+        ("summarize", device_id, site_id, param, start, end),
+        lambda: store.asummarize(device_id, site_id, param, start, end),
+    )
+
+
+@timed("telemetry_aggregate")
+async def aextreme_in_range(
+    device_id: str,
+    site_id: str,
+    param: WaterParameter,
+    start: datetime,
+    end: datetime,
+    mode: str,
+) -> Optional[Dict]:
+    if _use_cache_rollups():
+        return await series_cache.aextreme(device_id, site_id, param, start, end, mode)
+    start, end = _flight_bounds(start, end)
+    return await _acoalesced(
+        ("extreme", device_id, site_id, param, start, end, mode),
+        lambda: store.aextreme(device_id, site_id, param, start, end, mode),
+    )
+
+
+@timed("telemetry_aggregate")
+def trend_range(
+    device_id: str,
+    site_id: str,
+    param: WaterParameter,
+    start: datetime,
+    end: datetime,
+) -> Optional[Dict]:
+    """
+    trend_in_series sobre o intervalo (mesma escolha de summarize_range).
+    """
+    if _use_cache_rollups():
+        return series_cache.trend(device_id, site_id, param, start, end)
+    start, end = _flight_bounds(start, end)
+    return _coalesced(
+        ("trend", device_id, site_id, param, start, end),
+        lambda: store.trend(device_id, site_id, param, start, end),
+    )
+
+
+@timed("telemetry_aggregate")
+async def atrend_range(
+    device_id: str,
+    site_id: str,
+    param: WaterParameter,
+    start: datetime,
+    end: datetime,
+) -> Optional[Dict]:
+    if _use_cache_rollups():
+        return await series_cache.atrend(device_id, site_id, param, start, end)
+    start, end = _flight_bounds(start, end)
+    return await _acoalesced(
+        ("trend", device_id, site_id, param, start, end),
+        lambda: store.atrend(device_id, site_id, param, start, end),
+    )
+
+
+def new_telemetry_doc_id() -> str:
+    # gerado localmente (sem ida ao servidor)
+    return store.new_id()
+
+
+def write_telemetry_docs(docs: List[PendingDoc]) -> int:
+    """
+    Grava (doc_id, data) em lote. IDs pré-gerados (telemetry_doc_id na
+    ingestão) tornam a regravação idempotente. Devolve o número de commits.
+    """
+    return store.insert(docs)
+
+
+async def awrite_telemetry_docs(docs: List[PendingDoc]) -> int:
+    return await store.ainsert(docs)
+
+
+def cache_telemetry_docs(docs: Iterable[TelemetryDocument]) -> int:
+    """
+    Repassa documentos recém-recebidos ao cache de séries (ver
+    TelemetrySeriesCache.ingest). Devolve quantas leituras foram aplicadas.
+    """
+    by_series: Dict[Tuple[str, str], List[TelemetryRow]] = {}
+    for doc in docs:
+        by_series.setdefault((doc.device_id, doc.site_id), []).append(
+            data_to_row(telemetry_doc_to_data(doc))
         )
-        for m in data.get("measurements", [])
-    ]
-    return TelemetryDocument(
-        id=doc_id,
-        device_id=data["device_id"],
-        site_id=data["site_id"],
-        sent_at=data["sent_at"],
-        measurements=measurements,
+    return sum(
+        series_cache.ingest(device_id, site_id, rows)
+        for (device_id, site_id), rows in by_series.items()
     )
@@ -0,0 +1,407 @@
+"""
+Rollups pré-agregados (1 dia / 1 h / 1 min) das séries de telemetria.
+
+Cada bucket guarda count, soma EXATA (mantissa inteira * 2**expoente),
+mín/máx, o instante da primeira e da última leitura e as somas da reta de
+tendência (Σt, Σt², Σtv, Σv², com t em segundos desde o início do bucket,
+como telemetry_rollup_hour no SQLite). As consultas usam o tier mais
+grosso que cabe inteiro no intervalo e só descem para o tier mais fino
+(e, por fim, para os pontos brutos, com NumPy) nas bordas parciais.
+
+- a soma exata faz a média bater bit a bit com statistics.mean sobre os
+  pontos brutos (a resposta da varredura antiga)
+- a reta de tendência junta os momentos de cada bucket (Moments.combine),
+  em O(buckets), sem reler os pontos
+- o tier de 1 min é esparso: só vira bucket o minuto que recebe 2+
+  leituras no mesmo lote (ou que já tem bucket). Com um envio por minuto
+  ele não gasta nada além das colunas brutas; os minutos sem bucket saem
+  dos pontos brutos
+- o instante do mín/máx não fica no bucket: a agregação guarda o trecho
+  onde ele está e só procura nos pontos brutos desse trecho quando pedido
+  (min_at/max_at, usados pelo extreme)
+- add_many atualiza os buckets por grupo (NumPy), não ponto a ponto
+"""
+from __future__ import annotations
+
+import math
+from array import array
+from bisect import bisect_left
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from app.telemetry_trend import Moments
+
+MINUTE_US = 60 * 1_000_000
+HOUR_US = 60 * MINUTE_US
+DAY_US = 24 * HOUR_US
+
+# do mais grosso para o mais fino; o último é esparso (ver docstring)
+TIER_WIDTHS_US: Tuple[int, ...] = (DAY_US, HOUR_US, MINUTE_US)
+
+# pontos brutos (ts_us int64, valor float64, só os finitos) de [lo, hi]
+RawPoints = Callable[[int, int], Tuple[np.ndarray, np.ndarray]]
+# trecho [lo, hi] (µs) onde está um extremo
+Span = Tuple[int, int]
+
+_NO_SPAN: Span = (0, -1)
+
+# mantissas de 53 bits partidas em duas metades: somadas em int64 sem estouro
+_SPLIT = 26
+# desloca os expoentes de float64 (frexp - 53, de -1126 a 971) para >= 0
+_E_BIAS = 1 << 11
+
+
+def _exact_add(m: int, e: int, m2: int, e2: int) -> Tuple[int, int]:
+    if e2 < e:
+        m, e = m << (e - e2), e2
+    return m + (m2 << (e2 - e)), e
+
+
+def exact_mean(m: int, e: int, count: int) -> float:
+    # divisão int/int do Python é corretamente arredondada (igual a statistics.mean)
+    if e >= 0:
+        return (m << e) / count
+    return m / (count << -e)
+
+
+def _exact_sums(inverse: np.ndarray, groups: int, v: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Soma exata (mantissa, expoente) de v por grupo. Cada valor é M * 2**E
+    com M inteiro de 53 bits; as metades de M são somadas em int64 por
+    (grupo, E) e só esses poucos pares viram int do Python.
+    """
+    mant, exp = np.frexp(v)
+    m = (mant * 2.0 ** 53).astype(np.int64)
+    pair = inverse.astype(np.int64) * (2 * _E_BIAS) + (exp.astype(np.int64) - 53 + _E_BIAS)
+    pairs, pinv = np.unique(pair, return_inverse=True)
+    hi = np.zeros(len(pairs), dtype=np.int64)
+    np.add.at(hi, pinv, m >> _SPLIT)
+    lo = np.zeros(len(pairs), dtype=np.int64)
+    np.add.at(lo, pinv, m & ((1 << _SPLIT) - 1))
+
+    sums = [(0, 0)] * groups
+    for p, h, l in zip(pairs.tolist(), hi.tolist(), lo.tolist()):
+        g, e = divmod(p, 2 * _E_BIAS)
+        sums[g] = _exact_add(*sums[g], (h << _SPLIT) + l, e - _E_BIAS)
+    return sums
+
+
+# (n, mean_t, mean_v, m2_t, m2_v, c_tv), uma posição por parte (ver Moments.combine)
+_MomentColumns = Tuple[np.ndarray, ...]
+
+
+def _point_moments(ts: np.ndarray, v: np.ndarray) -> _MomentColumns:
+    m = Moments.from_arrays(ts / 1e6, v)
+    return tuple(np.array([getattr(m, f)], dtype=np.float64) for f in Moments.__slots__)
+
+
+# (count, sum_m, sum_e, min, max, first_at, last_at, Σt, Σt², Σtv, Σv²) de um bucket
+_Row = Tuple[int, int, int, float, float, int, int, float, float, float, float]
+
+
+def _group_rows(ts: np.ndarray, v: np.ndarray, width: int) -> Tuple[List[int], List[_Row]]:
+    """
+    Pontos (ts em µs, valores finitos, qualquer ordem) -> (chaves, linhas)
+    dos buckets de largura width.
+    """
+    starts = ts - ts % width
+    groups, inverse = np.unique(starts, return_inverse=True)
+    k = len(groups)
+    count = np.bincount(inverse, minlength=k)
+    mn = np.full(k, np.inf)
+    np.minimum.at(mn, inverse, v)
+    mx = np.full(k, -np.inf)
+    np.maximum.at(mx, inverse, v)
+    first = np.full(k, np.iinfo(np.int64).max)
+    np.minimum.at(first, inverse, ts)
+    last = np.full(k, np.iinfo(np.int64).min)
+    np.maximum.at(last, inverse, ts)
+    t = (ts - starts) / 1e6
+    st = np.bincount(inverse, weights=t, minlength=k)
+    stt = np.bincount(inverse, weights=t * t, minlength=k)
+    stv = np.bincount(inverse, weights=t * v, minlength=k)
+    svv = np.bincount(inverse, weights=v * v, minlength=k)
+    sums = _exact_sums(inverse, k, v)
+
+    rows = [
+        (c, sm, se, a, b, f, la, x1, x2, x3, x4)
+        for c, (sm, se), a, b, f, la, x1, x2, x3, x4 in zip(
+            count.tolist(), sums, mn.tolist(), mx.tolist(), first.tolist(), last.tolist(),
+            st.tolist(), stt.tolist(), stv.tolist(), svv.tolist(),
+        )
+    ]
+    return groups.tolist(), rows
+
+
+class Aggregate:
+    __slots__ = (
+        "count", "sum_m", "sum_e", "min", "max", "first_at", "last_at",
+        "_min_span", "_max_span", "_parts", "_raw",
+    )
+
+    def __init__(self, raw_points: Optional[RawPoints] = None) -> None:
+        self.count = 0
+        self.sum_m = 0
+        self.sum_e = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.first_at = self.last_at = 0
+        self._min_span = self._max_span = _NO_SPAN
+        # (função, args) que devolve as colunas de Moments de cada parte; só
+        # calculadas se .moments for lido (trend)
+        self._parts: List[Tuple[Callable[..., _MomentColumns], tuple]] = []
+        self._raw = raw_points
+
+    def add_points(self, ts: np.ndarray, v: np.ndarray) -> None:
+        if not len(v):
+            return
+        mn, mx = float(v.min()), float(v.max())
+        # empates ficam com a leitura mais recente (igual ao max/min sobre a série DESC)
+        mn_at = int(ts[v == mn].max())
+        mx_at = int(ts[v == mx].max())
+        sum_m, sum_e = _exact_sums(np.zeros(len(v), dtype=np.int64), 1, v)[0]
+        self._merge(
+            len(v), sum_m, sum_e, mn, (mn_at, mn_at), mx, (mx_at, mx_at), int(ts.min()), int(ts.max())
+        )
+        self._parts.append((_point_moments, (ts, v)))
+
+    def merge_buckets(self, tier: "_Tier", i: int, j: int) -> None:
+        """
+        Buckets [i, j) do tier (chaves em ordem, sem sobreposição).
+        """
+        if i >= j:
+            return
+        w = tier.width
+        sum_m, sum_e = 0, 0
+        for m, e in zip(tier.sum_m[i:j], tier.sum_e[i:j]):
+            sum_m, sum_e = _exact_add(sum_m, sum_e, m, e)
+        # fatias de array.array são cópias, então o buffer não fica preso
+        keys = np.frombuffer(tier.keys[i:j], dtype=np.int64)
+        mn = np.frombuffer(tier.min[i:j], dtype=np.float64)
+        mx = np.frombuffer(tier.max[i:j], dtype=np.float64)
+        # no empate vence o bucket mais recente
+        a = int(np.flatnonzero(mn == mn.min())[-1])
+        b = int(np.flatnonzero(mx == mx.max())[-1])
+        self._merge(
+            sum(tier.count[i:j]), sum_m, sum_e,
+            float(mn[a]), (int(keys[a]), int(keys[a]) + w - 1),
+            float(mx[b]), (int(keys[b]), int(keys[b]) + w - 1),
+            tier.first_at[i], tier.last_at[j - 1],
+        )
+        self._parts.append((tier.moment_columns, (i, j)))
+
+    def _merge(
+        self, count: int, sum_m: int, sum_e: int, mn: float, mn_span: Span, mx: float, mx_span: Span,
+        first_at: int, last_at: int,
+    ) -> None:
+        if self.count == 0:
+            self.first_at, self.last_at = first_at, last_at
+        else:
+            self.first_at = min(self.first_at, first_at)
+            self.last_at = max(self.last_at, last_at)
+        self.count += count
+        self.sum_m, self.sum_e = _exact_add(self.sum_m, self.sum_e, sum_m, sum_e)
+        # os trechos não se sobrepõem: no empate vence o mais recente
+        if mn < self.min or (mn == self.min and mn_span[0] > self._min_span[0]):
+            self.min, self._min_span = mn, mn_span
+        if mx > self.max or (mx == self.max and mx_span[0] > self._max_span[0]):
+            self.max, self._max_span = mx, mx_span
+
+    @property
+    def avg(self) -> float:
+        return exact_mean(self.sum_m, self.sum_e, self.count)
+
+    @property
+    def moments(self) -> Moments:
+        # t em segundos (epoch), como Moments.from_arrays sobre os pontos brutos
+        if not self._parts:
+            return Moments()
+        parts = [fn(*args) for fn, args in self._parts]
+        return Moments.combine(*(np.concatenate(col) for col in zip(*parts)))
+
+    @property
+    def min_at(self) -> int:
+        return self._locate(self.min, self._min_span)
+
+    @property
+    def max_at(self) -> int:
+        return self._locate(self.max, self._max_span)
+
+    def _locate(self, value: float, span: Span) -> int:
+        lo, hi = span
+        if lo == hi or self._raw is None:
+            return lo
+        ts, v = self._raw(lo, hi)
+        return int(ts[v == value].max())
+
+
+class _Tier:
+    __slots__ = (
+        "width", "sparse", "keys", "count", "sum_m", "sum_e", "min", "max", "first_at", "last_at",
+        "sum_t", "sum_tt", "sum_tv", "sum_vv",
+    )
+
+    def __init__(self, width: int, sparse: bool = False) -> None:
+        self.width = width
+        self.sparse = sparse
+        self.keys = array("q")
+        self.count = array("q")
+        self.sum_m: List[int] = []
+        self.sum_e = array("q")
+        self.min = array("d")
+        self.max = array("d")
+        self.first_at = array("q")
+        self.last_at = array("q")
+        self.sum_t = array("d")
+        self.sum_tt = array("d")
+        self.sum_tv = array("d")
+        self.sum_vv = array("d")
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _columns(self) -> tuple:
+        # na ordem de _Row
+        return (
+            self.count, self.sum_m, self.sum_e, self.min, self.max, self.first_at, self.last_at,
+            self.sum_t, self.sum_tt, self.sum_tv, self.sum_vv,
+        )
+
+    def add_many(self, ts: np.ndarray, v: np.ndarray, raw_points: RawPoints) -> None:
+        """
+        Pontos (ts em µs, valores finitos), em qualquer ordem. raw_points já
+        inclui esses pontos (o tier esparso monta o bucket novo a partir dele).
+        """
+        keys = self.keys
+        if self.sparse and len(v):
+            # minutos com uma leitura só (e sem bucket) não viram bucket: fora já aqui
+            starts = ts - ts % self.width
+            _, inverse, counts = np.unique(starts, return_inverse=True, return_counts=True)
+            keep = counts[inverse] >= 2
+            if keys:
+                keep |= np.isin(starts, np.frombuffer(keys[:], dtype=np.int64))
+            ts, v = ts[keep], v[keep]
+        if not len(v):
+            return
+        for key, row in zip(*_group_rows(ts, v, self.width)):
+            # caso comum: leituras novas caem no último bucket ou criam o próximo
+            if keys and keys[-1] == key:
+                self._combine(len(keys) - 1, row)
+                continue
+            i = len(keys) if not keys or keys[-1] < key else bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                self._combine(i, row)
+                continue
+            if self.sparse:
+                if row[0] < 2:
+                    continue
+                # pode haver uma leitura anterior do mesmo minuto só nos pontos brutos
+                _, (row,) = _group_rows(*raw_points(key, key + self.width - 1), self.width)
+            keys.insert(i, key)
+            for col, val in zip(self._columns(), row):
+                col.insert(i, val)
+
+    def _combine(self, i: int, row: _Row) -> None:
+        count, sum_m, sum_e, mn, mx, first, last, st, stt, stv, svv = row
+        self.count[i] += count
+        self.sum_m[i], self.sum_e[i] = _exact_add(self.sum_m[i], self.sum_e[i], sum_m, sum_e)
+        if mn < self.min[i]:
+            self.min[i] = mn
+        if mx > self.max[i]:
+            self.max[i] = mx
+        if first < self.first_at[i]:
+            self.first_at[i] = first
+        if last > self.last_at[i]:
+            self.last_at[i] = last
+        self.sum_t[i] += st
+        self.sum_tt[i] += stt
+        self.sum_tv[i] += stv
+        self.sum_vv[i] += svv
+
+    def moment_columns(self, i: int, j: int) -> _MomentColumns:
+        """
+        Colunas de Moments dos buckets [i, j), com t em segundos (epoch).
+        """
+        keys = np.frombuffer(self.keys[i:j], dtype=np.int64)
+        n = np.frombuffer(self.count[i:j], dtype=np.int64).astype(np.float64)
+        sv = np.array([exact_mean(m, e, 1) for m, e in zip(self.sum_m[i:j], self.sum_e[i:j])])
+        st, stt, stv, svv = (
+            np.frombuffer(col[i:j], dtype=np.float64)
+            for col in (self.sum_t, self.sum_tt, self.sum_tv, self.sum_vv)
+        )
+        # somas com t desde o início do bucket -> momentos centrados (como no SQLite)
+        mean_t, mean_v = st / n, sv / n
+        return (
+            n,
+            keys / 1e6 + mean_t,
+            mean_v,
+            np.maximum(stt - st * mean_t, 0.0),
+            np.maximum(svv - sv * mean_v, 0.0),
+            stv - st * mean_v,
+        )
+
+    @property
+    def nbytes(self) -> int:
+        # 12 colunas de 8 bytes + a mantissa da soma (int do Python, ~36 bytes)
+        return len(self.keys) * (12 * 8 + 36)
+
+
+class RollupIndex:
+    """
+    Tiers de um parâmetro de uma série (device_id, site_id).
+    """
+
+    def __init__(self, widths: Tuple[int, ...] = TIER_WIDTHS_US) -> None:
+        self.tiers = [_Tier(w, sparse=w == MINUTE_US) for w in widths]
+
+    def add_many(self, ts: np.ndarray, v: np.ndarray, raw_points: RawPoints) -> None:
+        for tier in self.tiers:
+            tier.add_many(ts, v, raw_points)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(t.nbytes for t in self.tiers)
+
+    def aggregate(self, start_us: int, end_us: int, raw_points: RawPoints) -> Aggregate:
+        """
+        Agrega [start_us, end_us] (inclusivo). raw_points(lo, hi) devolve
+        os pontos brutos das bordas que não cobrem um bucket inteiro, dos
+        minutos sem bucket (e do trecho do mín/máx, se min_at/max_at forem
+        lidos).
+        """
+        agg = Aggregate(raw_points)
+        self._plan(agg, start_us, end_us, 0, raw_points)
+        return agg
+
+    def _plan(self, agg: Aggregate, lo: int, hi: int, level: int, raw_points: RawPoints) -> None:
+        if lo > hi:
+            return
+        if level == len(self.tiers):
+            agg.add_points(*raw_points(lo, hi))
+            return
+
+        tier = self.tiers[level]
+        w = tier.width
+        first = -(-lo // w) * w          # primeiro bucket inteiro
+        stop = ((hi + 1) // w) * w       # fim (exclusivo) do último bucket inteiro
+        if first >= stop:
+            self._plan(agg, lo, hi, level + 1, raw_points)
+            return
+
+        self._plan(agg, lo, first - 1, level + 1, raw_points)
+        keys = tier.keys
+        i, j = bisect_left(keys, first), bisect_left(keys, stop)
+        if tier.sparse:
+            # os minutos sem bucket (entre os que têm) vêm dos pontos brutos
+            at = first
+            for k in range(i, j):
+                if at < keys[k]:
+                    agg.add_points(*raw_points(at, keys[k] - 1))
+                agg.merge_buckets(tier, k, k + 1)
+                at = keys[k] + w
+            if at < stop:
+                agg.add_points(*raw_points(at, stop - 1))
+        else:
+            agg.merge_buckets(tier, i, j)
+        self._plan(agg, stop, hi, level + 1, raw_points)
@@ -0,0 +1,226 @@
+"""
+Série de telemetria compacta baseada em arrays NumPy.
+
+- ts_ns: int64 com epoch em nanossegundos
+- values: float64
+- unit: uma unidade por série
+
+Substitui a antiga List[Tuple[datetime, float, str]], mas continua
+indexável/iterável como ela (series[i] -> (datetime, valor, unidade)).
+As estatísticas são calculadas de forma vetorizada sobre os arrays.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_US = timedelta(microseconds=1)
+
+SeriesPoint = Tuple[datetime, float, str]
+
+
+def to_epoch_ns(dt: datetime) -> int:
+    if dt.tzinfo is None:
+        dt = dt.astimezone()
+    return ((dt - EPOCH) // _ONE_US) * 1000
+
+
+def from_epoch_ns(ns: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(ns) // 1000)
+
+
+class TelemetrySeries:
+    __slots__ = ("ts_ns", "values", "unit")
+
+    def __init__(self, ts_ns: np.ndarray, values: np.ndarray, unit: str = "") -> None:
+        self.ts_ns = np.asarray(ts_ns, dtype=np.int64)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.unit = unit
+
+    @classmethod
+    def empty(cls, unit: str = "") -> "TelemetrySeries":
+        return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), unit)
+
+    @classmethod
+    def from_points(cls, points: Sequence[SeriesPoint]) -> "TelemetrySeries":
+        if not points:
+            return cls.empty()
+        ts_ns = np.fromiter((to_epoch_ns(p[0]) for p in points), dtype=np.int64, count=len(points))
+        values = np.fromiter((p[1] for p in points), dtype=np.float64, count=len(points))
+        return cls(ts_ns, values, points[0][2])
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, i: int) -> SeriesPoint:
+        return from_epoch_ns(self.ts_ns[i]), float(self.values[i]), self.unit
+
+    def __iter__(self) -> Iterator[SeriesPoint]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_points(self) -> List[SeriesPoint]:
+        return list(self)
+
+    def between(self, start: datetime, end: datetime) -> "TelemetrySeries":
+        """
+        Pontos em [start, end], na mesma ordem.
+        """
+        keep = (self.ts_ns >= to_epoch_ns(start)) & (self.ts_ns <= to_epoch_ns(end))
+        return TelemetrySeries(self.ts_ns[keep], self.values[keep], self.unit)
+
+
+SeriesLike = Union[TelemetrySeries, Sequence[SeriesPoint]]
+
+
+def as_series(series: SeriesLike) -> TelemetrySeries:
+    if isinstance(series, TelemetrySeries):
+        return series
+    return TelemetrySeries.from_points(series)
+
+
+def summarize_series(series: SeriesLike) -> Optional[Dict]:
+    series = as_series(series)
+    if not len(series):
+        return None
+    ts, values = series.ts_ns, series.values
+    return {
+        "start": from_epoch_ns(ts.min()),
+        "end": from_epoch_ns(ts.max()),
+        "count": len(series),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "avg": float(values.mean()),
+        "unit": series.unit,
+    }
+
+
+def extreme_in_series(series: SeriesLike, mode: str) -> Optional[Dict]:
+    series = as_series(series)
+    if not len(series):
+        return None
+    # argmax/argmin devolvem a primeira ocorrência, igual ao max/min do Python
+    i = int(series.values.argmax() if mode == "max" else series.values.argmin())
+    ts, value, unit = series[i]
+    return {"sent_at": ts, "value": value, "unit": unit}
+
+
+def latest_in_series(series: SeriesLike) -> Optional[SeriesPoint]:
+    """
+    Leitura mais recente pelo horário, qualquer que seja a ordem da série.
+    """
+    series = as_series(series)
+    if not len(series):
+        return None
+    return series[int(series.ts_ns.argmax())]
+
+
+def percentile_in_series(series: SeriesLike, q: float) -> Optional[float]:
+    """
+    Percentil q (0–100) dos valores, com interpolação linear.
+    """
+    series = as_series(series)
+    if not len(series):
+        return None
+    return float(np.percentile(series.values, q))
+
+
+def stddev_in_series(series: SeriesLike) -> Optional[float]:
+    """
+    Desvio padrão amostral (igual a statistics.stdev).
+    """
+    series = as_series(series)
+    if len(series) < 2:
+        return None
+    return float(series.values.std(ddof=1))
+
+
+def time_weighted_mean(series: SeriesLike) -> Optional[float]:
+    """
+    Média ponderada pelo tempo (integral trapezoidal / duração). Útil quando
+    o intervalo entre leituras varia, ex: medições sob demanda via MQTT.
+    """
+    series = as_series(series)
+    if not len(series):
+        return None
+    order = np.argsort(series.ts_ns, kind="stable")
+    ts = series.ts_ns[order].astype(np.float64)
+    values = series.values[order]
+    duration = ts[-1] - ts[0]
+    if duration <= 0:
+        return float(values.mean())
+    area = np.sum((values[1:] + values[:-1]) * np.diff(ts)) / 2.0
+    return float(area / duration)
+
+
+def fraction_outside(series: SeriesLike, lo: float, hi: float) -> Optional[float]:
+    """
+    Fração do tempo (0–1) com o valor fora de [lo, hi]: cada leitura vale até
+    a seguinte. Sem duração (uma leitura só), a fração das leituras.
+    """
+    series = as_series(series)
+    if not len(series):
+        return None
+    order = np.argsort(series.ts_ns, kind="stable")
+    values = series.values[order]
+    outside = (values < lo) | (values > hi)
+    dt = np.diff(series.ts_ns[order])
+    duration = dt.sum()
+    if duration <= 0:
+        return float(outside.mean())
+    return float(dt[outside[:-1]].sum() / duration)
+
+
+def summarize_windows(series: SeriesLike, edges: Sequence[datetime]) -> List[Optional[Dict]]:
+    """
+    summarize_series de cada janela [edges[i], edges[i+1]) da mesma série
+    (a última inclui edges[-1]), mais first/last/delta: primeira e última
+    leitura da janela e a diferença entre elas. Uma ordenação e um
+    searchsorted servem todas as janelas. None = janela sem leituras.
+    """
+    series = as_series(series)
+    order = np.argsort(series.ts_ns, kind="stable")
+    ts, values = series.ts_ns[order], series.values[order]
+    bounds = np.fromiter((to_epoch_ns(e) for e in edges), dtype=np.int64, count=len(edges))
+    idx = np.searchsorted(ts, bounds, side="left")
+    idx[-1] = np.searchsorted(ts, bounds[-1], side="right")
+
+    out: List[Optional[Dict]] = []
+    for lo, hi in zip(idx[:-1].tolist(), idx[1:].tolist()):
+        if hi <= lo:
+            out.append(None)
+            continue
+        v = values[lo:hi]
+        out.append({
+            "start": from_epoch_ns(ts[lo]),
+            "end": from_epoch_ns(ts[hi - 1]),
+            "count": hi - lo,
+            "min": float(v.min()),
+            "max": float(v.max()),
+            "avg": float(v.mean()),
+            "first": float(v[0]),
+            "last": float(v[-1]),
+            "delta": float(v[-1] - v[0]),
+            "unit": series.unit,
+        })
+    return out
+
+
+def compare_windows(series: SeriesLike, start: datetime, split: datetime, end: datetime) -> Optional[Dict]:
+    """
+    [start, split) contra [split, end] de uma só série: resumo de cada
+    janela e a variação da média (change, e pct_change em % quando a média
+    anterior não é zero). None = nenhuma leitura nas duas.
+    """
+    previous, current = summarize_windows(series, (start, split, end))
+    if previous is None and current is None:
+        return None
+    change = pct_change = None
+    if previous is not None and current is not None:
+        change = current["avg"] - previous["avg"]
+        if previous["avg"] != 0:
+            pct_change = change / abs(previous["avg"]) * 100
+    return {"previous": previous, "current": current, "change": change, "pct_change": pct_change}
@@ -0,0 +1,266 @@
+"""
+Contrato de armazenamento de telemetria (TelemetryStore) e helpers comuns.
+
+Implementações:
+- FirestoreTelemetryStore (telemetry_store_firestore.py): produção
+- SQLiteTelemetryStore (telemetry_store_sqlite.py): embarcado, mesmo modelo
+  de documento, com as agregações feitas em SQL; roda sem credenciais
+
+A escolha é feita por Settings.TELEMETRY_STORE ("firestore" ou "sqlite").
+"""
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Protocol,
+    Tuple,
+)
+
+from app.config import Settings
+from app.models import DeviceLatest, Measurement, TelemetryDocument, WaterParameter
+from app.telemetry_cache import TelemetryRow
+from app.telemetry_series import TelemetrySeries
+
+# (doc_id, dados no formato do documento do Firestore)
+PendingDoc = Tuple[str, Dict[str, Any]]
+
+
+class TelemetryStore(Protocol):
+    # True quando summarize/extreme/trend rodam no próprio backend (ex.: SQL) e
+    # não compensa passar pelo cache/rollups em memória
+    pushdown_aggregates: bool
+
+    def new_id(self) -> str: ...
+
+    # ---------------- última leitura ----------------
+
+    def latest(self, device_id: str, site_id: str) -> Optional[TelemetryDocument]: ...
+
+    async def alatest(self, device_id: str, site_id: str) -> Optional[TelemetryDocument]: ...
+
+    def watch_latest(
+        self, device_id: str, site_id: str, on_doc: Callable[[TelemetryDocument], None]
+    ) -> Callable[[], None]:
+        """
+        on_doc a cada nova leitura (pode vir de outra thread); devolve o unsubscribe.
+        """
+        ...
+
+    def latest_state(self, device_id: str, site_id: str) -> Optional[DeviceLatest]:
+        """
+        Índice mantido no insert: última leitura de cada parâmetro (ver telemetry_latest.py).
+        """
+        ...
+
+    async def alatest_state(self, device_id: str, site_id: str) -> Optional[DeviceLatest]: ...
+
+    def watch_index(
+        self, on_rows: Callable[[Dict[Tuple[str, str], List[TelemetryRow]]], None]
+    ) -> Callable[[], None]:
+        """
+        Mantém o índice com leituras gravadas por fora do insert (firmware
+        direto no store); on_rows recebe as novas, por par. Devolve o unsubscribe.
+        """
+        ...
+
+    async def alist_latest(self) -> List[DeviceLatest]:
+        """
+        latest_state de todos os pares.
+        """
+        ...
+
+    # ---------------- intervalo ----------------
+
+    def range_rows(
+        self, device_id: str, site_id: str, start: datetime, end: datetime
+    ) -> Iterable[TelemetryRow]:
+        """
+        Todos os parâmetros de cada envio em [start, end], em ordem ASC (loader do cache).
+        """
+        ...
+
+    async def arange_rows(
+        self, device_id: str, site_id: str, start: datetime, end: datetime
+    ) -> List[TelemetryRow]: ...
+
+    def range_series(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> TelemetrySeries:
+        """
+        Série de um parâmetro em [start, end], em ordem DESC.
+        """
+        ...
+
+    async def arange_series(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> TelemetrySeries: ...
+
+    def range_multi(
+        self,
+        device_id: str,
+        site_id: str,
+        params: Iterable[WaterParameter],
+        start: datetime,
+        end: datetime,
+    ) -> Dict[WaterParameter, TelemetrySeries]:
+        """
+        range_series de vários parâmetros com uma única leitura do intervalo.
+        """
+        ...
+
+    async def arange_multi(
+        self,
+        device_id: str,
+        site_id: str,
+        params: Iterable[WaterParameter],
+        start: datetime,
+        end: datetime,
+    ) -> Dict[WaterParameter, TelemetrySeries]: ...
+
+    # ---------------- agregações ----------------
+
+    def summarize(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> Optional[Dict]:
+        """
+        Mesmo formato de summarize_series.
+        """
+        ...
+
+    async def asummarize(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> Optional[Dict]: ...
+
+    def extreme(
+        self,
+        device_id: str,
+        site_id: str,
+        param: WaterParameter,
+        start: datetime,
+        end: datetime,
+        mode: str,
+    ) -> Optional[Dict]:
+        """
+        Mesmo formato de extreme_in_series.
+        """
+        ...
+
+    async def aextreme(
+        self,
+        device_id: str,
+        site_id: str,
+        param: WaterParameter,
+        start: datetime,
+        end: datetime,
+        mode: str,
+    ) -> Optional[Dict]: ...
+
+    def trend(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> Optional[Dict]:
+        """
+        Mesmo formato de trend_in_series.
+        """
+        ...
+
+    async def atrend(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> Optional[Dict]: ...
+
+    # ---------------- escrita ----------------
+
+    def insert(self, docs: List[PendingDoc]) -> int:
+        """
+        Gravação em lote; devolve o número de commits/transações.
+        """
+        ...
+
+    async def ainsert(self, docs: List[PendingDoc]) -> int: ...
+
+
+def create_telemetry_store(settings: Settings) -> TelemetryStore:
+    # import tardio: o modo sqlite não precisa carregar o SDK do Firestore
+    if settings.TELEMETRY_STORE == "sqlite":
+        from app.telemetry_store_sqlite import SQLiteTelemetryStore
+
+        return SQLiteTelemetryStore(settings.TELEMETRY_SQLITE_PATH)
+    if settings.TELEMETRY_STORE == "firestore":
+        from app.telemetry_store_firestore import FirestoreTelemetryStore
+
+        return FirestoreTelemetryStore(
+            settings.FIRESTORE_TELEMETRY_COLLECTION,
+            settings.FIRESTORE_LATEST_COLLECTION,
+            settings.LATEST_INDEX_VERIFY_SECONDS,
+        )
+    raise ValueError(f"TELEMETRY_STORE desconhecido: {settings.TELEMETRY_STORE!r}")
+
+
+# ---------------- conversões comuns ----------------
+
+def normalize_param(name: str) -> Optional[WaterParameter]:
+    name_lower = name.strip().lower()
+    mapping = {
+        "ph": WaterParameter.PH,
+        "pH".lower(): WaterParameter.PH,
+        "temperature": WaterParameter.TEMPERATURE,
+        "temperatura": WaterParameter.TEMPERATURE,
+        "turbidity": WaterParameter.TURBIDITY,
+        "turbidez": WaterParameter.TURBIDITY,
+        "tds": WaterParameter.TDS,
+        "condutividade": WaterParameter.TDS,
+        "conductivity": WaterParameter.TDS,
+    }
+    return mapping.get(name_lower)
+
+
+def data_to_row(data: Dict[str, Any]) -> TelemetryRow:
+    measurements = []
+    for m in data.get("measurements", []):
+        p = normalize_param(m.get("parameter", ""))
+        if p is not None:
+            measurements.append((p, float(m["value"]), m.get("unit", "")))
+    return data.get("sent_at"), measurements
+
+
+def telemetry_doc_id(device_id: str, site_id: str, ts_us: int) -> str:
+    """
+    ID do documento de uma leitura, derivado do par e do instante (µs): o
+    reenvio de um lote regrava os mesmos documentos em vez de duplicá-los.
+    20 caracteres hexadecimais, como os IDs automáticos do Firestore.
+    """
+    key = f"{device_id}\x00{site_id}\x00{ts_us}"
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def telemetry_doc_to_data(doc: TelemetryDocument) -> Dict[str, Any]:
+    return {
+        "device_id": doc.device_id,
+        "site_id": doc.site_id,
+        "sent_at": doc.sent_at,
+        "measurements": [m.model_dump() for m in doc.measurements],
+    }
+
+
+def doc_to_model(doc_id: str, data: Dict) -> TelemetryDocument:
+    measurements = [
+        Measurement(
+            parameter=m["parameter"],
+            value=float(m["value"]),
+            unit=m["unit"],
+        )
+        for m in data.get("measurements", [])
+    ]
+    return TelemetryDocument(
+        id=doc_id,
+        device_id=data["device_id"],
+        site_id=data["site_id"],
+        sent_at=data["sent_at"],
+        measurements=measurements,
+    )
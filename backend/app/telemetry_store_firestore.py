@@ -0,0 +1,512 @@
+"""
+TelemetryStore sobre o Firestore (consultas que antes ficavam em
+telemetry_repository). As agregações são feitas no backend, sobre a série
+lida do Firestore, que não agrega no servidor.
+
+O índice da última leitura fica em latest_collection, um documento por par
+({device_id}_{site_id}), atualizado com set(merge=True) no mesmo WriteBatch
+da telemetria. O firmware grava direto na coleção de telemetria, sem passar
+pelo backend, então o índice também é conferido e mantido de fora:
+- latest_state lê o documento do índice e, só quando ele não existe ou o
+  par não é conferido há verify_seconds, também a leitura mais recente
+  (limit_to_last(1), um documento); se ela for mais nova, vale ela e o
+  índice é corrigido
+- watch_index observa os envios novos da coleção (on_snapshot) e os grava
+  no índice, para que pares que só o firmware alimenta apareçam em
+  alist_latest. Roda numa instância só (LATEST_INDEX_WATCH_ENABLED); nela
+  o índice já está em dia e latest_state não confere mais nada
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from app import firestore_client
+from app.metrics import count_documents
+from app.models import DeviceLatest, TelemetryDocument, WaterParameter
+from app.telemetry_cache import TelemetryRow
+from app.telemetry_latest import (
+    LatestKey,
+    build_latest,
+    latest_doc_id,
+    latest_from_data,
+    latest_from_rows,
+    latest_to_data,
+    merge_latest,
+)
+from app.telemetry_series import TelemetrySeries, extreme_in_series, summarize_series, to_epoch_ns
+from app.telemetry_store import PendingDoc, data_to_row, doc_to_model, normalize_param
+from app.telemetry_trend import trend_in_series
+
+# limite de operações por commit de um WriteBatch do Firestore
+MAX_BATCH_WRITES = 500
+
+# mesmo valor de google.cloud.firestore_v1.Query.DESCENDING, sem importar o SDK
+DESCENDING = "DESCENDING"
+
+# (referência do documento, dados, merge) de um set() no WriteBatch
+_Write = Tuple[Any, Dict[str, Any], bool]
+
+
+class FirestoreTelemetryStore:
+    pushdown_aggregates = False
+
+    def __init__(
+        self, collection: str, latest_collection: str = "devices_latest", verify_seconds: float = 300.0
+    ) -> None:
+        self.collection = collection
+        self.latest_collection = latest_collection
+        self.verify_seconds = verify_seconds
+        # o que este processo já gravou em latest_collection (ver _latest_changes)
+        self._latest_written: Dict[LatestKey, DeviceLatest] = {}
+        # par -> monotonic() da última conferência do índice contra a coleção
+        self._verified_at: Dict[LatestKey, float] = {}
+        # True enquanto watch_index estiver ativo neste processo
+        self._watching = False
+        # clientes criados no primeiro uso (o AsyncClient dentro do event loop do servidor)
+        self._db = None
+        self._async_db = None
+        self._lock = threading.Lock()
+
+    @property
+    def db(self):
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    self._db = firestore_client.get_firestore_client()
+        return self._db
+
+    @property
+    def async_db(self):
+        if self._async_db is None:
+            with self._lock:
+                if self._async_db is None:
+                    self._async_db = firestore_client.get_async_firestore_client()
+        return self._async_db
+
+    def new_id(self) -> str:
+        # ID automático do Firestore, gerado localmente (sem ida ao servidor)
+        return self.db.collection(self.collection).document().id
+
+    # ---------------- consultas ----------------
+
+    def _latest_query(self, client, device_id: str, site_id: str):
+        return (
+            client.collection(self.collection)
+            .where("device_id", "==", device_id)
+            .where("site_id", "==", site_id)
+            .order_by("sent_at")      # ASC
+            .limit_to_last(1)         # último = mais recente
+        )
+
+    def _range_query(self, client, device_id: str, site_id: str, start: datetime, end: datetime):
+        return (
+            client.collection(self.collection)
+            .where("device_id", "==", device_id)
+            .where("site_id", "==", site_id)
+            .where("sent_at", ">=", start)
+            .where("sent_at", "<=", end)
+        )
+
+    # ---------------- última leitura ----------------
+
+    def latest(self, device_id: str, site_id: str) -> Optional[TelemetryDocument]:
+        docs = self._latest_query(self.db, device_id, site_id).get()
+        count_documents(len(docs))
+        if not docs:
+            return None
+
+        doc = docs[0]
+        return doc_to_model(doc.id, doc.to_dict())
+
+    async def alatest(self, device_id: str, site_id: str) -> Optional[TelemetryDocument]:
+        docs = await self._latest_query(self.async_db, device_id, site_id).get()
+        count_documents(len(docs))
+        if not docs:
+            return None
+
+        doc = docs[0]
+        return doc_to_model(doc.id, doc.to_dict())
+
+    def watch_latest(
+        self, device_id: str, site_id: str, on_doc: Callable[[TelemetryDocument], None]
+    ) -> Callable[[], None]:
+        """
+        on_snapshot sobre a leitura mais recente do par. on_doc é chamado na
+        thread do listener a cada nova leitura (e uma vez no início, com a atual).
+        """
+        # limit_to_last não é aceito em listeners: mesma consulta em DESC + limit(1)
+        query = (
+            self.db.collection(self.collection)
+            .where("device_id", "==", device_id)
+            .where("site_id", "==", site_id)
+            .order_by("sent_at", direction=DESCENDING)
+            .limit(1)
+        )
+
+        def on_snapshot(docs, changes, read_time):
+            for doc in docs:
+                on_doc(doc_to_model(doc.id, doc.to_dict()))
+
+        return query.on_snapshot(on_snapshot).unsubscribe
+
+    def _latest_ref(self, client, device_id: str, site_id: str):
+        return client.collection(self.latest_collection).document(latest_doc_id(device_id, site_id))
+
+    def latest_state(self, device_id: str, site_id: str) -> Optional[DeviceLatest]:
+        snap = self._latest_ref(self.db, device_id, site_id).get()
+        docs = []
+        if self._needs_check(device_id, site_id, snap):
+            docs = self._latest_query(self.db, device_id, site_id).get()
+            self._verified_at[(device_id, site_id)] = time.monotonic()
+        count_documents(1 + len(docs))
+        state, stale = self._checked_latest(device_id, site_id, snap, docs)
+        if stale is not None:
+            self._write_latest(self.db, [(self._latest_ref(self.db, device_id, site_id), stale)])
+        return state
+
+    async def alatest_state(self, device_id: str, site_id: str) -> Optional[DeviceLatest]:
+        snap = await self._latest_ref(self.async_db, device_id, site_id).get()
+        docs = []
+        if self._needs_check(device_id, site_id, snap):
+            docs = await self._latest_query(self.async_db, device_id, site_id).get()
+            self._verified_at[(device_id, site_id)] = time.monotonic()
+        count_documents(1 + len(docs))
+        state, stale = self._checked_latest(device_id, site_id, snap, docs)
+        if stale is not None:
+            batch = self.async_db.batch()
+            batch.set(self._latest_ref(self.async_db, device_id, site_id), latest_to_data(stale), merge=True)
+            await batch.commit()
+            self._remember_latest({(device_id, site_id): stale})
+        return state
+
+    def _needs_check(self, device_id: str, site_id: str, snap) -> bool:
+        """
+        Se a leitura do índice precisa ser conferida contra a coleção: sempre
+        que o documento não existe; senão só sem o watch_index neste processo
+        e quando a última conferência do par tem mais de verify_seconds.
+        """
+        if not snap.exists:
+            return True
+        if self._watching:
+            return False
+        checked = self._verified_at.get((device_id, site_id))
+        return checked is None or time.monotonic() - checked >= self.verify_seconds
+
+    @staticmethod
+    def _checked_latest(
+        device_id: str, site_id: str, snap, docs
+    ) -> Tuple[Optional[DeviceLatest], Optional[DeviceLatest]]:
+        """
+        (estado, parte a corrigir no índice). O documento do índice pode estar
+        atrás da coleção (envios do firmware) ou nem existir (dados anteriores
+        a ele): a leitura mais recente entra por cima, parâmetro a parâmetro.
+        """
+        indexed = latest_from_data(snap.to_dict()) if snap.exists else None
+        newest = latest_from_rows(device_id, site_id, [data_to_row(d.to_dict()) for d in docs])
+        if newest is None or (indexed is not None and newest.sent_at <= indexed.sent_at):
+            return indexed, None
+        return merge_latest(indexed, newest), newest
+
+    def _write_latest(self, client, writes: List[Tuple[Any, DeviceLatest]]) -> None:
+        batch = client.batch()
+        for ref, state in writes:
+            batch.set(ref, latest_to_data(state), merge=True)
+        batch.commit()
+        self._remember_latest({(s.device_id, s.site_id): s for _, s in writes})
+
+    def watch_index(
+        self, on_rows: Callable[[Dict[LatestKey, List[TelemetryRow]]], None]
+    ) -> Callable[[], None]:
+        """
+        on_snapshot nos envios da coleção a partir de agora: cada envio mais
+        novo que o índice é gravado nele (set merge, em lote) e repassado a
+        on_rows (por par). Os envios gravados por este processo já estão no
+        índice e não geram escrita.
+
+        É um listener sobre a coleção inteira: deve rodar numa instância só
+        (ver LATEST_INDEX_WATCH_ENABLED), ou ser trocado por uma Cloud Function
+        na coleção. As outras instâncias conferem o índice por verify_seconds.
+        """
+        query = self.db.collection(self.collection).where("sent_at", ">=", datetime.now(timezone.utc))
+
+        def on_snapshot(docs, changes, read_time):
+            added = [c.document for c in changes if c.type.name == "ADDED"]
+            if added:
+                self.index_documents([(d.id, d.to_dict()) for d in added], on_rows)
+
+        watch = query.on_snapshot(on_snapshot)
+        self._watching = True
+
+        def stop() -> None:
+            self._watching = False
+            watch.unsubscribe()
+
+        return stop
+
+    def index_documents(
+        self,
+        docs: List[PendingDoc],
+        on_rows: Optional[Callable[[Dict[LatestKey, List[TelemetryRow]]], None]] = None,
+    ) -> int:
+        """
+        Documentos já gravados na coleção (por outro escritor) no índice.
+        Devolve quantos pares foram atualizados.
+        """
+        changes = self._latest_changes(docs, strict=True)
+        for items in _chunks(list(changes.items()), MAX_BATCH_WRITES):
+            self._write_latest(self.db, [(self._latest_ref(self.db, *key), state) for key, state in items])
+        if on_rows is not None:
+            rows: Dict[LatestKey, List[TelemetryRow]] = {}
+            for _, data in docs:
+                rows.setdefault((data["device_id"], data["site_id"]), []).append(data_to_row(data))
+            on_rows(rows)
+        return len(changes)
+
+    async def alist_latest(self) -> List[DeviceLatest]:
+        states = [
+            latest_from_data(snap.to_dict())
+            async for snap in self.async_db.collection(self.latest_collection).stream()
+        ]
+        count_documents(len(states))
+        return [s for s in states if s is not None]
+
+    # ---------------- intervalo ----------------
+
+    def range_rows(
+        self, device_id: str, site_id: str, start: datetime, end: datetime
+    ) -> Iterator[TelemetryRow]:
+        query = self._range_query(self.db, device_id, site_id, start, end).order_by("sent_at")
+        for doc in _counted(query.stream()):
+            yield data_to_row(doc.to_dict())
+
+    async def arange_rows(
+        self, device_id: str, site_id: str, start: datetime, end: datetime
+    ) -> List[TelemetryRow]:
+        query = self._range_query(self.async_db, device_id, site_id, start, end).order_by("sent_at")
+        rows = [data_to_row(doc.to_dict()) async for doc in query.stream()]
+        count_documents(len(rows))
+        return rows
+
+    def range_series(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> TelemetrySeries:
+        query = self._range_query(self.db, device_id, site_id, start, end).order_by(
+            "sent_at", direction=DESCENDING
+        )
+        return _series_from_docs((doc.to_dict() for doc in _counted(query.stream())), param)
+
+    async def arange_series(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> TelemetrySeries:
+        query = self._range_query(self.async_db, device_id, site_id, start, end).order_by(
+            "sent_at", direction=DESCENDING
+        )
+        docs = [doc.to_dict() async for doc in query.stream()]
+        count_documents(len(docs))
+        return _series_from_docs(docs, param)
+
+    def range_multi(
+        self,
+        device_id: str,
+        site_id: str,
+        params: Iterable[WaterParameter],
+        start: datetime,
+        end: datetime,
+    ) -> Dict[WaterParameter, TelemetrySeries]:
+        query = self._range_query(self.db, device_id, site_id, start, end).order_by(
+            "sent_at", direction=DESCENDING
+        )
+        return _series_by_param((doc.to_dict() for doc in _counted(query.stream())), params)
+
+    async def arange_multi(
+        self,
+        device_id: str,
+        site_id: str,
+        params: Iterable[WaterParameter],
+        start: datetime,
+        end: datetime,
+    ) -> Dict[WaterParameter, TelemetrySeries]:
+        query = self._range_query(self.async_db, device_id, site_id, start, end).order_by(
+            "sent_at", direction=DESCENDING
+        )
+        docs = [doc.to_dict() async for doc in query.stream()]
+        count_documents(len(docs))
+        return _series_by_param(docs, params)
+
+    # ---------------- agregações (no backend) ----------------
+
+    def summarize(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> Optional[Dict]:
+        return summarize_series(self.range_series(device_id, site_id, param, start, end))
+
+    async def asummarize(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> Optional[Dict]:
+        return summarize_series(await self.arange_series(device_id, site_id, param, start, end))
+
+    def extreme(
+        self,
+        device_id: str,
+        site_id: str,
+        param: WaterParameter,
+        start: datetime,
+        end: datetime,
+        mode: str,
+    ) -> Optional[Dict]:
+        return extreme_in_series(self.range_series(device_id, site_id, param, start, end), mode)
+
+    async def aextreme(
+        self,
+        device_id: str,
+        site_id: str,
+        param: WaterParameter,
+        start: datetime,
+        end: datetime,
+        mode: str,
+    ) -> Optional[Dict]:
+        return extreme_in_series(
+            await self.arange_series(device_id, site_id, param, start, end), mode
+        )
+
+    def trend(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> Optional[Dict]:
+        return trend_in_series(self.range_series(device_id, site_id, param, start, end))
+
+    async def atrend(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> Optional[Dict]:
+        return trend_in_series(await self.arange_series(device_id, site_id, param, start, end))
+
+    # ---------------- escrita ----------------
+
+    def insert(self, docs: List[PendingDoc]) -> int:
+        """
+        WriteBatch com até MAX_BATCH_WRITES por commit. set() com IDs
+        pré-gerados torna a regravação idempotente.
+        """
+        changes = self._latest_changes(docs)
+        writes = self._writes(self.db, docs, changes)
+        commits = 0
+        for i in range(0, len(writes), MAX_BATCH_WRITES):
+            batch = self.db.batch()
+            for ref, data, merge in writes[i:i + MAX_BATCH_WRITES]:
+                batch.set(ref, data, merge=merge)
+            batch.commit()
+            commits += 1
+        self._remember_latest(changes)
+        return commits
+
+    async def ainsert(self, docs: List[PendingDoc]) -> int:
+        client = self.async_db
+        changes = self._latest_changes(docs)
+        writes = self._writes(client, docs, changes)
+
+        async def commit(chunk: List[_Write]) -> None:
+            batch = client.batch()
+            for ref, data, merge in chunk:
+                batch.set(ref, data, merge=merge)
+            await batch.commit()
+
+        chunks = [writes[i:i + MAX_BATCH_WRITES] for i in range(0, len(writes), MAX_BATCH_WRITES)]
+        await asyncio.gather(*(commit(c) for c in chunks))
+        self._remember_latest(changes)
+        return len(chunks)
+
+    def _writes(
+        self, client, docs: List[PendingDoc], changes: Dict[LatestKey, DeviceLatest]
+    ) -> List[_Write]:
+        col = client.collection(self.collection)
+        writes: List[_Write] = [(col.document(doc_id), data, False) for doc_id, data in docs]
+        # merge=True junta o mapa "parameters": só os parâmetros do lote mudam
+        writes += [
+            (self._latest_ref(client, *key), latest_to_data(state), True)
+            for key, state in changes.items()
+        ]
+        return writes
+
+    def _latest_changes(self, docs: List[PendingDoc], strict: bool = False) -> Dict[LatestKey, DeviceLatest]:
+        """
+        Parâmetros do lote mais novos que os já gravados por este processo no
+        índice: um backfill ou reenvio atrasado não faz o índice regredir.
+        strict: o mesmo sent_at não é regravado (envios vistos pelo watch_index).
+        """
+        rows: Dict[LatestKey, List[TelemetryRow]] = {}
+        for _, data in docs:
+            rows.setdefault((data["device_id"], data["site_id"]), []).append(data_to_row(data))
+
+        changes = {}
+        for key, key_rows in rows.items():
+            update = latest_from_rows(*key, key_rows)
+            if update is None:
+                continue
+            with self._lock:
+                written = self._latest_written.get(key)
+            newer = {
+                p: r
+                for p, r in update.parameters.items()
+                if written is None
+                or p not in written.parameters
+                or r.sent_at > written.parameters[p].sent_at
+                or (not strict and r.sent_at == written.parameters[p].sent_at)
+            }
+            state = build_latest(*key, newer)
+            if state is not None:
+                changes[key] = state
+        return changes
+
+    def _remember_latest(self, changes: Dict[LatestKey, DeviceLatest]) -> None:
+        # só depois do commit: se falhar, o reenvio grava o índice de novo
+        with self._lock:
+            for key, state in changes.items():
+                self._latest_written[key] = merge_latest(self._latest_written.get(key), state)
+
+
+def _chunks(items: List[Any], size: int) -> Iterator[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _counted(docs: Iterable[Any]) -> Iterator[Any]:
+    # documentos de um stream() síncrono, contados em aquabot_firestore_documents_*
+    n = 0
+    try:
+        for doc in docs:
+            n += 1
+            yield doc
+    finally:
+        count_documents(n)
+
+
+def _series_from_docs(docs: Iterable[Dict[str, Any]], param: WaterParameter) -> TelemetrySeries:
+    return _series_by_param(docs, (param,))[param]
+
+
+def _series_by_param(
+    docs: Iterable[Dict[str, Any]], params: Iterable[WaterParameter]
+) -> Dict[WaterParameter, TelemetrySeries]:
+    """
+    Uma passada pelos documentos, separando as medições de cada parâmetro pedido.
+    """
+    ts_ns: Dict[WaterParameter, List[int]] = {p: [] for p in params}
+    values: Dict[WaterParameter, List[float]] = {p: [] for p in ts_ns}
+    units: Dict[WaterParameter, str] = {}
+    for data in docs:
+        sent_at = to_epoch_ns(data.get("sent_at"))
+        for m in data.get("measurements", []):
+            p = normalize_param(m.get("parameter", ""))
+            if p in ts_ns:
+                ts_ns[p].append(sent_at)
+                values[p].append(float(m["value"]))
+                if p not in units:
+                    units[p] = m.get("unit", "")
+    return {
+        p: TelemetrySeries(np.array(ts_ns[p], dtype=np.int64), np.array(values[p]), units.get(p, ""))
+        for p in ts_ns
+    }
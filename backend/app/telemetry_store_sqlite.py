@@ -0,0 +1,680 @@
+"""
+TelemetryStore embarcado em SQLite.
+
+Guarda o mesmo documento do Firestore (tabela telemetry_docs, JSON), uma
+linha por medição (telemetry_points, índice (device_id, site_id, parameter,
+ts_us, value)), rollups por hora (telemetry_rollup_hour) e a última leitura
+de cada parâmetro (telemetry_latest), mantidos na mesma transação do insert.
+As agregações de janelas longas leem os rollups das horas completas e só as
+pontas do intervalo em telemetry_points.
+
+Além de count/sum/min/max, cada hora guarda Σt, Σt², Σtv e Σv² (t em
+segundos desde o início da hora, pequeno o bastante para não perder
+precisão), de onde sai a reta de tendência da janela (telemetry_trend).
+
+Útil para desenvolvimento, testes e benchmarks sem credenciais, e como
+réplica local para perguntas de janelas longas.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.models import DeviceLatest, ParameterReading, TelemetryDocument, WaterParameter
+from app.telemetry_cache import TelemetryRow, from_epoch_us, to_epoch_us
+from app.telemetry_latest import build_latest
+from app.telemetry_series import TelemetrySeries
+from app.telemetry_store import PendingDoc, data_to_row, doc_to_model, normalize_param
+from app.telemetry_trend import Moments, trend_from_moments
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS telemetry_docs (
+    id        TEXT PRIMARY KEY,
+    device_id TEXT NOT NULL,
+    site_id   TEXT NOT NULL,
+    ts_us     INTEGER NOT NULL,
+    data      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS telemetry_docs_by_time
+    ON telemetry_docs (device_id, site_id, ts_us);
+
+CREATE TABLE IF NOT EXISTS telemetry_points (
+    doc_id    TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    site_id   TEXT NOT NULL,
+    parameter TEXT NOT NULL,
+    ts_us     INTEGER NOT NULL,
+    value     REAL NOT NULL,
+    unit      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS telemetry_points_series
+    ON telemetry_points (device_id, site_id, parameter, ts_us, value);
+CREATE INDEX IF NOT EXISTS telemetry_points_doc
+    ON telemetry_points (doc_id);
+
+CREATE TABLE IF NOT EXISTS telemetry_rollup_hour (
+    device_id TEXT NOT NULL,
+    site_id   TEXT NOT NULL,
+    parameter TEXT NOT NULL,
+    bucket    INTEGER NOT NULL,
+    count     INTEGER NOT NULL,
+    sum       REAL NOT NULL,
+    min       REAL NOT NULL,
+    max       REAL NOT NULL,
+    sum_t     REAL NOT NULL DEFAULT 0,
+    sum_tt    REAL NOT NULL DEFAULT 0,
+    sum_tv    REAL NOT NULL DEFAULT 0,
+    sum_vv    REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (device_id, site_id, parameter, bucket)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS telemetry_latest (
+    device_id TEXT NOT NULL,
+    site_id   TEXT NOT NULL,
+    parameter TEXT NOT NULL,
+    ts_us     INTEGER NOT NULL,
+    value     REAL NOT NULL,
+    unit      TEXT NOT NULL,
+    PRIMARY KEY (device_id, site_id, parameter)
+) WITHOUT ROWID;
+"""
+
+# início de cada balde de rollup = ts_us arredondado para baixo na hora
+_BUCKET_US = 3600 * 1_000_000
+
+_SERIES_WHERE = "device_id = ? AND site_id = ? AND parameter = ? AND ts_us BETWEEN ? AND ?"
+_ROLLUP_WHERE = "device_id = ? AND site_id = ? AND parameter = ? AND bucket BETWEEN ? AND ?"
+
+# (device_id, site_id, parameter, bucket)
+_RollupKey = Tuple[str, str, str, int]
+
+# linhas de telemetry_rollup_hour recalculadas a partir das medições ({where})
+_ROLLUP_FROM_POINTS = (
+    f"SELECT device_id, site_id, parameter, ts_us / {_BUCKET_US} * {_BUCKET_US}, "
+    "COUNT(*), SUM(value), MIN(value), MAX(value), "
+    "SUM(t), SUM(t * t), SUM(t * value), SUM(value * value) "
+    f"FROM (SELECT *, (ts_us % {_BUCKET_US}) / 1e6 AS t FROM telemetry_points {{where}}) "
+    f"GROUP BY device_id, site_id, parameter, ts_us / {_BUCKET_US}"
+)
+
+
+def _full_buckets(start_us: int, end_us: int) -> Optional[Tuple[int, int]]:
+    """
+    [primeiro, último) dos baldes inteiramente dentro de [start_us, end_us],
+    ou None se não houver nenhum.
+    """
+    first = -(-start_us // _BUCKET_US) * _BUCKET_US
+    last = (end_us + 1) // _BUCKET_US * _BUCKET_US
+    return (first, last) if first < last else None
+
+
+def _dump(data: Dict[str, Any]) -> str:
+    return json.dumps(data, default=lambda v: v.isoformat(), ensure_ascii=False)
+
+
+def _load(raw: str) -> Dict[str, Any]:
+    data = json.loads(raw)
+    data["sent_at"] = datetime.fromisoformat(data["sent_at"])
+    return data
+
+
+class SQLiteTelemetryStore:
+    pushdown_aggregates = True
+
+    def __init__(self, path: str = ":memory:") -> None:
+        # uma conexão compartilhada; o lock serializa o acesso entre threads
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._watchers: Dict[Tuple[str, str], List[Callable[[TelemetryDocument], None]]] = {}
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            # arquivo anterior às colunas da tendência: recalcula os rollups
+            columns = {r[1] for r in self._conn.execute("PRAGMA table_info(telemetry_rollup_hour)")}
+            if "sum_t" not in columns:
+                for col in ("sum_t", "sum_tt", "sum_tv", "sum_vv"):
+                    self._conn.execute(
+                        f"ALTER TABLE telemetry_rollup_hour ADD COLUMN {col} REAL NOT NULL DEFAULT 0"
+                    )
+                self._conn.execute("DELETE FROM telemetry_rollup_hour")
+                self._conn.execute(
+                    "INSERT INTO telemetry_rollup_hour " + _ROLLUP_FROM_POINTS.format(where="")
+                )
+            # arquivo anterior à tabela telemetry_latest: preenche a partir das medições
+            if self._conn.execute("SELECT 1 FROM telemetry_latest LIMIT 1").fetchone() is None:
+                self._conn.execute(
+                    "INSERT INTO telemetry_latest "
+                    "SELECT device_id, site_id, parameter, MAX(ts_us), value, unit "
+                    "FROM telemetry_points GROUP BY device_id, site_id, parameter"
+                )
+
+    def _fetch(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def new_id(self) -> str:
+        return uuid.uuid4().hex[:20]
+
+    # ---------------- última leitura ----------------
+
+    def latest(self, device_id: str, site_id: str) -> Optional[TelemetryDocument]:
+        rows = self._fetch(
+            "SELECT id, data FROM telemetry_docs WHERE device_id = ? AND site_id = ? "
+            "ORDER BY ts_us DESC LIMIT 1",
+            (device_id, site_id),
+        )
+        if not rows:
+            return None
+        doc_id, raw = rows[0]
+        return doc_to_model(doc_id, _load(raw))
+
+    async def alatest(self, device_id: str, site_id: str) -> Optional[TelemetryDocument]:
+        return await asyncio.to_thread(self.latest, device_id, site_id)
+
+    def watch_latest(
+        self, device_id: str, site_id: str, on_doc: Callable[[TelemetryDocument], None]
+    ) -> Callable[[], None]:
+        """
+        Equivalente local do on_snapshot: avisa a cada insert() do par e,
+        como o Firestore, entrega a leitura atual logo de início.
+        """
+        key = (device_id, site_id)
+        with self._lock:
+            self._watchers.setdefault(key, []).append(on_doc)
+        current = self.latest(device_id, site_id)
+        if current is not None:
+            on_doc(current)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                watchers = self._watchers.get(key, [])
+                if on_doc in watchers:
+                    watchers.remove(on_doc)
+                if not watchers:
+                    self._watchers.pop(key, None)
+
+        return unsubscribe
+
+    def watch_index(
+        self, on_rows: Callable[[Dict[Tuple[str, str], List[TelemetryRow]]], None]
+    ) -> Callable[[], None]:
+        """
+        Nada a observar: toda gravação passa pelo insert(), que já mantém o índice.
+        """
+        return lambda: None
+
+    def latest_state(self, device_id: str, site_id: str) -> Optional[DeviceLatest]:
+        rows = self._fetch(
+            "SELECT device_id, site_id, parameter, ts_us, value, unit FROM telemetry_latest "
+            "WHERE device_id = ? AND site_id = ?",
+            (device_id, site_id),
+        )
+        states = _latest_from_table(rows)
+        return states[0] if states else None
+
+    async def alatest_state(self, device_id: str, site_id: str) -> Optional[DeviceLatest]:
+        return await asyncio.to_thread(self.latest_state, device_id, site_id)
+
+    def list_latest(self) -> List[DeviceLatest]:
+        return _latest_from_table(
+            self._fetch(
+                "SELECT device_id, site_id, parameter, ts_us, value, unit FROM telemetry_latest "
+                "ORDER BY device_id, site_id"
+            )
+        )
+
+    async def alist_latest(self) -> List[DeviceLatest]:
+        return await asyncio.to_thread(self.list_latest)
+
+    # ---------------- intervalo ----------------
+
+    def range_rows(
+        self, device_id: str, site_id: str, start: datetime, end: datetime
+    ) -> List[TelemetryRow]:
+        rows = self._fetch(
+            "SELECT data FROM telemetry_docs WHERE device_id = ? AND site_id = ? "
+            "AND ts_us BETWEEN ? AND ? ORDER BY ts_us",
+            (device_id, site_id, to_epoch_us(start), to_epoch_us(end)),
+        )
+        return [data_to_row(_load(raw)) for (raw,) in rows]
+
+    async def arange_rows(
+        self, device_id: str, site_id: str, start: datetime, end: datetime
+    ) -> List[TelemetryRow]:
+        return await asyncio.to_thread(self.range_rows, device_id, site_id, start, end)
+
+    def range_series(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> TelemetrySeries:
+        args = (device_id, site_id, param.value, to_epoch_us(start), to_epoch_us(end))
+        rows = self._fetch(
+            f"SELECT ts_us, value FROM telemetry_points WHERE {_SERIES_WHERE} ORDER BY ts_us DESC",
+            args,
+        )
+        if not rows:
+            return TelemetrySeries.empty()
+        points = np.array(rows, dtype=np.float64)
+        ts_ns = np.array([r[0] for r in rows], dtype=np.int64) * 1000
+        return TelemetrySeries(ts_ns, points[:, 1].copy(), self._latest_unit(args))
+
+    async def arange_series(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> TelemetrySeries:
+        return await asyncio.to_thread(self.range_series, device_id, site_id, param, start, end)
+
+    def range_multi(
+        self,
+        device_id: str,
+        site_id: str,
+        params: Iterable[WaterParameter],
+        start: datetime,
+        end: datetime,
+    ) -> Dict[WaterParameter, TelemetrySeries]:
+        params = list(dict.fromkeys(params))
+        if not params:
+            return {}
+        marks = ", ".join("?" for _ in params)
+        rows = self._fetch(
+            "SELECT parameter, ts_us, value, unit FROM telemetry_points "
+            f"WHERE device_id = ? AND site_id = ? AND parameter IN ({marks}) "
+            "AND ts_us BETWEEN ? AND ? ORDER BY ts_us DESC",
+            (device_id, site_id, *(p.value for p in params), to_epoch_us(start), to_epoch_us(end)),
+        )
+        by_param: Dict[str, List[Tuple]] = {p.value: [] for p in params}
+        for row in rows:
+            by_param[row[0]].append(row)
+        out = {}
+        for p in params:
+            points = by_param[p.value]
+            if not points:
+                out[p] = TelemetrySeries.empty()
+                continue
+            out[p] = TelemetrySeries(
+                np.array([r[1] for r in points], dtype=np.int64) * 1000,
+                np.array([r[2] for r in points], dtype=np.float64),
+                points[0][3],
+            )
+        return out
+
+    async def arange_multi(
+        self,
+        device_id: str,
+        site_id: str,
+        params: Iterable[WaterParameter],
+        start: datetime,
+        end: datetime,
+    ) -> Dict[WaterParameter, TelemetrySeries]:
+        return await asyncio.to_thread(self.range_multi, device_id, site_id, params, start, end)
+
+    def _latest_unit(self, args: Tuple) -> str:
+        rows = self._fetch(
+            f"SELECT unit FROM telemetry_points WHERE {_SERIES_WHERE} ORDER BY ts_us DESC LIMIT 1",
+            args,
+        )
+        return rows[0][0] if rows else ""
+
+    # ---------------- agregações (em SQL) ----------------
+
+    def summarize(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> Optional[Dict]:
+        key = (device_id, site_id, param.value)
+        start_us, end_us = to_epoch_us(start), to_epoch_us(end)
+        bounds = self._bounds(key, start_us, end_us)
+        if bounds is None:
+            return None
+        oldest_us, newest_us, unit = bounds
+
+        count, total, vmin, vmax = 0, 0.0, float("inf"), float("-inf")
+        for c, sm, mn, mx in self._partials(key, start_us, end_us):
+            if c:
+                count += c
+                total += sm
+                vmin = min(vmin, mn)
+                vmax = max(vmax, mx)
+        return {
+            "start": from_epoch_us(oldest_us),
+            "end": from_epoch_us(newest_us),
+            "count": count,
+            "min": vmin,
+            "max": vmax,
+            "avg": total / count,
+            "unit": unit,
+        }
+
+    def _bounds(
+        self, key: Tuple[str, str, str], start_us: int, end_us: int
+    ) -> Optional[Tuple[int, int, str]]:
+        """
+        (ts_us mais antigo, ts_us mais recente, unidade da mais recente) no intervalo.
+        """
+        newest = self._fetch(
+            f"SELECT ts_us, unit FROM telemetry_points WHERE {_SERIES_WHERE} "
+            "ORDER BY ts_us DESC LIMIT 1",
+            key + (start_us, end_us),
+        )
+        if not newest:
+            return None
+        (oldest_us,), = self._fetch(
+            f"SELECT ts_us FROM telemetry_points WHERE {_SERIES_WHERE} ORDER BY ts_us LIMIT 1",
+            key + (start_us, end_us),
+        )
+        return oldest_us, newest[0][0], newest[0][1]
+
+    def _partials(self, key: Tuple[str, str, str], start_us: int, end_us: int) -> List[Tuple]:
+        """
+        (count, sum, min, max) das horas completas (rollup) e das pontas (pontos).
+        """
+        point_sql = (
+            "SELECT COUNT(*), SUM(value), MIN(value), MAX(value) "
+            f"FROM telemetry_points WHERE {_SERIES_WHERE}"
+        )
+        buckets = _full_buckets(start_us, end_us)
+        if buckets is None:
+            return self._fetch(point_sql, key + (start_us, end_us))
+        first, last = buckets
+        return (
+            self._fetch(point_sql, key + (start_us, first - 1))
+            + self._fetch(
+                "SELECT SUM(count), SUM(sum), MIN(min), MAX(max) "
+                f"FROM telemetry_rollup_hour WHERE {_ROLLUP_WHERE}",
+                key + (first, last - _BUCKET_US),
+            )
+            + self._fetch(point_sql, key + (last, end_us))
+        )
+
+    async def asummarize(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> Optional[Dict]:
+        return await asyncio.to_thread(self.summarize, device_id, site_id, param, start, end)
+
+    def trend(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> Optional[Dict]:
+        key = (device_id, site_id, param.value)
+        start_us, end_us = to_epoch_us(start), to_epoch_us(end)
+        bounds = self._bounds(key, start_us, end_us)
+        if bounds is None:
+            return None
+        oldest_us, newest_us, unit = bounds
+
+        rows = [r for r in self._moment_partials(key, start_us, end_us) if r[1]]
+        # (origem µs, n, Σv, Σt, Σt², Σtv, Σv²) -> momentos centrados de cada parte
+        origin, n, sv, st, stt, stv, svv = (np.array(col, dtype=np.float64) for col in zip(*rows))
+        mean_t, mean_v = st / n, sv / n
+        m = Moments.combine(
+            n,
+            origin / 1e6 + mean_t,
+            mean_v,
+            np.maximum(stt - st * mean_t, 0.0),
+            np.maximum(svv - sv * mean_v, 0.0),
+            stv - st * mean_v,
+        )
+        return trend_from_moments(m, from_epoch_us(oldest_us), from_epoch_us(newest_us), unit)
+
+    def _moment_partials(self, key: Tuple[str, str, str], start_us: int, end_us: int) -> List[Tuple]:
+        """
+        (origem, count, Σv, Σt, Σt², Σtv, Σv²) de cada hora completa (rollup)
+        e das pontas (pontos), com t em segundos desde a origem.
+        """
+        def points(lo: int, hi: int) -> List[Tuple]:
+            return self._fetch(
+                "SELECT ?, COUNT(*), SUM(value), SUM(t), SUM(t * t), SUM(t * value), "
+                "SUM(value * value) FROM (SELECT value, (ts_us - ?) / 1e6 AS t "
+                f"FROM telemetry_points WHERE {_SERIES_WHERE})",
+                (lo, lo) + key + (lo, hi),
+            )
+
+        buckets = _full_buckets(start_us, end_us)
+        if buckets is None:
+            return points(start_us, end_us)
+        first, last = buckets
+        return (
+            points(start_us, first - 1)
+            + self._fetch(
+                "SELECT bucket, count, sum, sum_t, sum_tt, sum_tv, sum_vv "
+                f"FROM telemetry_rollup_hour WHERE {_ROLLUP_WHERE}",
+                key + (first, last - _BUCKET_US),
+            )
+            + points(last, end_us)
+        )
+
+    async def atrend(
+        self, device_id: str, site_id: str, param: WaterParameter, start: datetime, end: datetime
+    ) -> Optional[Dict]:
+        return await asyncio.to_thread(self.trend, device_id, site_id, param, start, end)
+
+    def extreme(
+        self,
+        device_id: str,
+        site_id: str,
+        param: WaterParameter,
+        start: datetime,
+        end: datetime,
+        mode: str,
+    ) -> Optional[Dict]:
+        key = (device_id, site_id, param.value)
+        start_us, end_us = to_epoch_us(start), to_epoch_us(end)
+        buckets = _full_buckets(start_us, end_us)
+        if buckets is None:
+            return self._extreme_points(key, start_us, end_us, mode)
+
+        # candidatos do mais recente para o mais antigo: ponta final, melhor hora, ponta inicial
+        first, last = buckets
+        candidates = [self._extreme_points(key, last, end_us, mode)]
+        col, order = ("max", "DESC") if mode == "max" else ("min", "ASC")
+        best_bucket = self._fetch(
+            f"SELECT bucket FROM telemetry_rollup_hour WHERE {_ROLLUP_WHERE} "
+            f"ORDER BY {col} {order}, bucket DESC LIMIT 1",
+            key + (first, last - _BUCKET_US),
+        )
+        if best_bucket:
+            bucket = best_bucket[0][0]
+            candidates.append(self._extreme_points(key, bucket, bucket + _BUCKET_US - 1, mode))
+        candidates.append(self._extreme_points(key, start_us, first - 1, mode))
+
+        # empates ficam com a leitura mais recente, como em extreme_in_series (série DESC)
+        best = None
+        for c in candidates:
+            if c is None:
+                continue
+            if best is None or (c["value"] > best["value"] if mode == "max" else c["value"] < best["value"]):
+                best = c
+        return best
+
+    def _extreme_points(
+        self, key: Tuple[str, str, str], start_us: int, end_us: int, mode: str
+    ) -> Optional[Dict]:
+        order = "value DESC" if mode == "max" else "value ASC"
+        rows = self._fetch(
+            f"SELECT ts_us, value, unit FROM telemetry_points WHERE {_SERIES_WHERE} "
+            f"ORDER BY {order}, ts_us DESC LIMIT 1",
+            key + (start_us, end_us),
+        )
+        if not rows:
+            return None
+        ts_us, value, unit = rows[0]
+        return {"sent_at": from_epoch_us(ts_us), "value": value, "unit": unit}
+
+    async def aextreme(
+        self,
+        device_id: str,
+        site_id: str,
+        param: WaterParameter,
+        start: datetime,
+        end: datetime,
+        mode: str,
+    ) -> Optional[Dict]:
+        return await asyncio.to_thread(
+            self.extreme, device_id, site_id, param, start, end, mode
+        )
+
+    # ---------------- escrita ----------------
+
+    def insert(self, docs: List[PendingDoc]) -> int:
+        """
+        Uma transação por chamada (documentos, medições e rollups). Regravar
+        um ID substitui o documento (como set() no Firestore), também dentro
+        do mesmo lote.
+        """
+        if not docs:
+            return 0
+        docs = list(dict(docs).items())
+        doc_rows = []
+        point_rows = []
+        added: Dict[_RollupKey, List[float]] = {}
+        # (device_id, site_id, parameter) -> (ts_us, value, unit) mais recente do lote
+        latest: Dict[Tuple[str, str, str], Tuple[int, float, str]] = {}
+        newest: Dict[Tuple[str, str], Tuple[int, str, Dict[str, Any]]] = {}
+        for doc_id, data in docs:
+            ts_us = to_epoch_us(data["sent_at"])
+            key = (data["device_id"], data["site_id"])
+            doc_rows.append((doc_id, key[0], key[1], ts_us, _dump(data)))
+            bucket = ts_us // _BUCKET_US * _BUCKET_US
+            for m in data.get("measurements", []):
+                p = normalize_param(m.get("parameter", ""))
+                if p is None:
+                    continue
+                value = float(m["value"])
+                # NaN/inf (sensor com defeito) fica só no documento: nas medições e
+                # nos rollups estragaria a soma, como nos rollups do cache
+                if not math.isfinite(value):
+                    continue
+                point_rows.append((doc_id, key[0], key[1], p.value, ts_us, value, m.get("unit", "")))
+                current = latest.get(key + (p.value,))
+                if current is None or ts_us >= current[0]:
+                    latest[key + (p.value,)] = (ts_us, value, m.get("unit", ""))
+                t = (ts_us - bucket) / 1e6
+                agg = added.get(key + (p.value, bucket))
+                if agg is None:
+                    added[key + (p.value, bucket)] = [
+                        1, value, value, value, t, t * t, t * value, value * value,
+                    ]
+                else:
+                    agg[0] += 1
+                    agg[1] += value
+                    agg[2] = min(agg[2], value)
+                    agg[3] = max(agg[3], value)
+                    agg[4] += t
+                    agg[5] += t * t
+                    agg[6] += t * value
+                    agg[7] += value * value
+            if key not in newest or ts_us >= newest[key][0]:
+                newest[key] = (ts_us, doc_id, data)
+
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN")
+                replaced = self._delete_points([r[0] for r in doc_rows])
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO telemetry_docs VALUES (?, ?, ?, ?, ?)", doc_rows
+                )
+                self._conn.executemany(
+                    "INSERT INTO telemetry_points VALUES (?, ?, ?, ?, ?, ?, ?)", point_rows
+                )
+                self._conn.executemany(
+                    "INSERT INTO telemetry_rollup_hour VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT DO UPDATE SET count = count + excluded.count, "
+                    "sum = sum + excluded.sum, min = MIN(min, excluded.min), "
+                    "max = MAX(max, excluded.max), sum_t = sum_t + excluded.sum_t, "
+                    "sum_tt = sum_tt + excluded.sum_tt, sum_tv = sum_tv + excluded.sum_tv, "
+                    "sum_vv = sum_vv + excluded.sum_vv",
+                    [k + tuple(agg) for k, agg in added.items()],
+                )
+                self._rebuild_rollups(replaced)
+                self._conn.executemany(
+                    "INSERT INTO telemetry_latest VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT DO UPDATE SET ts_us = excluded.ts_us, value = excluded.value, "
+                    "unit = excluded.unit WHERE excluded.ts_us >= ts_us",
+                    [k + v for k, v in latest.items()],
+                )
+                self._rebuild_latest({k[:3] for k in replaced})
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            # como o listener DESC + limit(1): só avisa se o lote trouxe a nova última leitura
+            notify = []
+            for key, (ts_us, doc_id, data) in newest.items():
+                watchers = list(self._watchers.get(key, ()))
+                if watchers and self._conn.execute(
+                    "SELECT MAX(ts_us) FROM telemetry_docs WHERE device_id = ? AND site_id = ?", key
+                ).fetchone()[0] == ts_us:
+                    notify.append((doc_to_model(doc_id, data), watchers))
+
+        for doc, watchers in notify:
+            for on_doc in watchers:
+                on_doc(doc)
+        return 1
+
+    def _delete_points(self, doc_ids: List[str]) -> Set[_RollupKey]:
+        """
+        Remove as medições de documentos que serão regravados; devolve os
+        baldes de rollup afetados. Chamado com o lock, dentro da transação.
+        """
+        touched: Set[_RollupKey] = set()
+        for doc_id in doc_ids:
+            for device_id, site_id, parameter, ts_us in self._conn.execute(
+                "SELECT device_id, site_id, parameter, ts_us FROM telemetry_points WHERE doc_id = ?",
+                (doc_id,),
+            ):
+                touched.add((device_id, site_id, parameter, ts_us // _BUCKET_US * _BUCKET_US))
+        if touched:
+            self._conn.executemany(
+                "DELETE FROM telemetry_points WHERE doc_id = ?", [(d,) for d in doc_ids]
+            )
+        return touched
+
+    def _rebuild_rollups(self, keys: Set[_RollupKey]) -> None:
+        # min/max não dá para desfazer incrementalmente: recalcula o balde inteiro
+        for device_id, site_id, parameter, bucket in keys:
+            args = (device_id, site_id, parameter, bucket, bucket + _BUCKET_US - 1)
+            self._conn.execute(
+                "DELETE FROM telemetry_rollup_hour "
+                "WHERE device_id = ? AND site_id = ? AND parameter = ? AND bucket = ?",
+                args[:4],
+            )
+            self._conn.execute(
+                "INSERT INTO telemetry_rollup_hour "
+                + _ROLLUP_FROM_POINTS.format(where=f"WHERE {_SERIES_WHERE}"),
+                args,
+            )
+
+    def _rebuild_latest(self, keys: Set[Tuple[str, str, str]]) -> None:
+        # um documento regravado pode ter sido a última leitura do parâmetro
+        for key in keys:
+            self._conn.execute(
+                "DELETE FROM telemetry_latest WHERE device_id = ? AND site_id = ? AND parameter = ?",
+                key,
+            )
+            self._conn.execute(
+                "INSERT INTO telemetry_latest "
+                "SELECT device_id, site_id, parameter, ts_us, value, unit FROM telemetry_points "
+                "WHERE device_id = ? AND site_id = ? AND parameter = ? ORDER BY ts_us DESC LIMIT 1",
+                key,
+            )
+
+    async def ainsert(self, docs: List[PendingDoc]) -> int:
+        return await asyncio.to_thread(self.insert, docs)
+
+
+def _latest_from_table(rows: List[Tuple]) -> List[DeviceLatest]:
+    """
+    Linhas (device_id, site_id, parameter, ts_us, value, unit) agrupadas por par, na ordem recebida.
+    """
+    by_key: Dict[Tuple[str, str], Dict[WaterParameter, ParameterReading]] = {}
+    for device_id, site_id, parameter, ts_us, value, unit in rows:
+        by_key.setdefault((device_id, site_id), {})[WaterParameter(parameter)] = ParameterReading(
+            value=value, unit=unit, sent_at=from_epoch_us(ts_us)
+        )
+    return [build_latest(*key, params) for key, params in by_key.items()]
@@ -0,0 +1,187 @@
+"""
+Fan-out de telemetria ao vivo (GET /telemetry/stream e WS /telemetry/ws).
+
+Em vez de cada celular abrir seu próprio listener no Firestore, o backend
+mantém UM on_snapshot por (device_id, site_id) e repassa as leituras para
+todos os inscritos:
+
+- rajadas são agrupadas: dentro de STREAM_COALESCE_SECONDS só a leitura
+  mais recente é publicada
+- cada inscrito tem um buffer limitado; se ele não consumir a tempo, as
+  leituras mais antigas são descartadas (drop-oldest) e contadas
+- quem entra recebe de imediato a última leitura conhecida
+- o watch no Firestore é encerrado quando o último inscrito sai
+
+Todo o estado vive no event loop; o callback do Firestore roda numa thread
+própria e só agenda trabalho no loop (call_soon_threadsafe).
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Deque, Dict, Optional, Set, Tuple
+
+from app.config import get_settings
+from app.models import TelemetryDocument
+from app.telemetry_repository import watch_latest_telemetry
+
+settings = get_settings()
+
+# source(device_id, site_id, on_doc) -> unsubscribe; on_doc pode vir de qualquer thread
+SnapshotSource = Callable[
+    [str, str, Callable[[TelemetryDocument], None]], Callable[[], None]
+]
+
+
+class Subscription:
+    def __init__(self, key: Tuple[str, str], buffer_size: int) -> None:
+        self.key = key
+        self._queue: Deque[TelemetryDocument] = deque(maxlen=buffer_size)
+        self._ready = asyncio.Event()
+        self.dropped = 0
+        self.closed = False
+
+    def push(self, doc: TelemetryDocument) -> None:
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1  # deque com maxlen descarta o mais antigo
+        self._queue.append(doc)
+        self._ready.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[TelemetryDocument]:
+        """
+        Próxima leitura; None se o timeout estourar (útil para keep-alive).
+        """
+        while not self._queue:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._queue.popleft()
+
+
+class _Channel:
+    __slots__ = ("subscribers", "unsubscribe", "last", "pending", "flush_handle", "closed")
+
+    def __init__(self) -> None:
+        self.subscribers: Set[Subscription] = set()
+        self.unsubscribe: Optional[Callable[[], None]] = None
+        self.last: Optional[TelemetryDocument] = None
+        self.pending: Optional[TelemetryDocument] = None
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        self.closed = False
+
+
+class TelemetryStreamHub:
+    def __init__(
+        self,
+        source: SnapshotSource,
+        coalesce_seconds: float = 0.25,
+        buffer_size: int = 32,
+    ) -> None:
+        self._source = source
+        self.coalesce_seconds = coalesce_seconds
+        self.buffer_size = buffer_size
+        self._channels: Dict[Tuple[str, str], _Channel] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.upstream_events = 0
+        self.published = 0
+
+    def subscribe(self, device_id: str, site_id: str) -> Subscription:
+        """
+        Precisa ser chamado de dentro do event loop.
+        """
+        self._loop = asyncio.get_running_loop()
+        key = (device_id, site_id)
+        sub = Subscription(key, self.buffer_size)
+
+        channel = self._channels.get(key)
+        if channel is None:
+            channel = _Channel()
+            self._channels[key] = channel
+            loop = self._loop
+            channel.unsubscribe = self._source(
+                device_id,
+                site_id,
+                lambda doc: loop.call_soon_threadsafe(self._on_upstream, channel, doc),
+            )
+        elif channel.last is not None:
+            sub.push(channel.last)
+
+        channel.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        if sub.closed:
+            return
+        sub.closed = True
+        channel = self._channels.get(sub.key)
+        if channel is None:
+            return
+        channel.subscribers.discard(sub)
+        if channel.subscribers:
+            return
+
+        # último inscrito saiu: derruba o watch (unsubscribe do Firestore
+        # espera a thread do listener, então roda fora do loop)
+        del self._channels[sub.key]
+        channel.closed = True
+        if channel.flush_handle is not None:
+            channel.flush_handle.cancel()
+        if channel.unsubscribe is not None:
+            self._loop.run_in_executor(None, channel.unsubscribe)
+
+    @asynccontextmanager
+    async def subscription(self, device_id: str, site_id: str) -> AsyncIterator[Subscription]:
+        sub = self.subscribe(device_id, site_id)
+        try:
+            yield sub
+        finally:
+            self.unsubscribe(sub)
+
+    def _on_upstream(self, channel: _Channel, doc: TelemetryDocument) -> None:
+        if channel.closed:
+            return
+        self.upstream_events += 1
+        newest = channel.pending or channel.last
+        # reenvios do mesmo snapshot (reconexão do watch) ou leituras mais antigas
+        if newest is not None and (doc.id == newest.id or doc.sent_at < newest.sent_at):
+            return
+        channel.pending = doc
+        if channel.flush_handle is None:
+            channel.flush_handle = self._loop.call_later(
+                self.coalesce_seconds, self._publish, channel
+            )
+
+    def _publish(self, channel: _Channel) -> None:
+        channel.flush_handle = None
+        doc, channel.pending = channel.pending, None
+        if doc is None or channel.closed:
+            return
+        channel.last = doc
+        self.published += 1
+        for sub in channel.subscribers:
+            sub.push(doc)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "watches": len(self._channels),
+            "subscribers": sum(len(c.subscribers) for c in self._channels.values()),
+            "upstream_events": self.upstream_events,
+            "published": self.published,
+            "dropped": sum(
+                s.dropped for c in self._channels.values() for s in c.subscribers
+            ),
+        }
+
+
+stream_hub = TelemetryStreamHub(
+    watch_latest_telemetry,
+    coalesce_seconds=settings.STREAM_COALESCE_SECONDS,
+    buffer_size=settings.STREAM_BUFFER_SIZE,
+)
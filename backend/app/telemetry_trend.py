@@ -0,0 +1,295 @@
+"""
+Tendência por mínimos quadrados e detecção de mudança (Page-Hinkley).
+
+- Moments: estatísticas suficientes da reta v = a + b*t (n, médias de t e v,
+  M2_t, M2_v e C_tv) na forma centrada. add() é o passo de Welford (e
+  remove() o inverso, para janelas deslizantes) e merge()/combine() a combinação de Chan et al., então juntar buckets de
+  rollup dá a mesma inclinação que a regressão sobre os pontos brutos, sem
+  o cancelamento de Σt² com t em segundos desde 1970
+- trend_from_moments(): inclinação, reta ajustada no início/fim e direção
+  ("stable" se a inclinação não for significativa: |t| < TREND_MIN_T)
+- PageHinkley: detector online (um ponto por vez) do início de uma subida
+  ou queda; change_point_in_series() faz o mesmo cálculo vetorizado, sobre
+  médias diárias em janelas longas (o ciclo do dia, ex. pH x fotossíntese,
+  dispararia o detector nos pontos brutos)
+- tudo independe da ordem da série (DESC nas consultas, ASC no cache)
+"""
+from __future__ import annotations
+
+import math
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.telemetry_series import SeriesLike, as_series, from_epoch_ns
+
+# |inclinação| / erro padrão abaixo disso = "stable" (~95% com muitas amostras)
+TREND_MIN_T = 2.0
+
+# Page-Hinkley em múltiplos do ruído da série (desvio das diferenças / sqrt(2))
+PH_DELTA_SIGMAS = 0.5
+PH_LAMBDA_SIGMAS = 8.0
+# janelas maiores que isso usam médias diárias no Page-Hinkley
+PH_DAILY_MEANS_AFTER_NS = 3 * 86400 * 10**9
+_DAY_NS = 86400 * 10**9
+
+
+class Moments:
+    __slots__ = ("n", "mean_t", "mean_v", "m2_t", "m2_v", "c_tv")
+
+    def __init__(
+        self,
+        n: int = 0,
+        mean_t: float = 0.0,
+        mean_v: float = 0.0,
+        m2_t: float = 0.0,
+        m2_v: float = 0.0,
+        c_tv: float = 0.0,
+    ) -> None:
+        self.n = n
+        self.mean_t = mean_t
+        self.mean_v = mean_v
+        self.m2_t = m2_t
+        self.m2_v = m2_v
+        self.c_tv = c_tv
+
+    @classmethod
+    def from_arrays(cls, t: np.ndarray, v: np.ndarray) -> "Moments":
+        n = len(t)
+        if not n:
+            return cls()
+        mean_t, mean_v = float(t.mean()), float(v.mean())
+        dt, dv = t - mean_t, v - mean_v
+        return cls(n, mean_t, mean_v, float(dt @ dt), float(dv @ dv), float(dt @ dv))
+
+    @classmethod
+    def combine(
+        cls,
+        n: np.ndarray,
+        mean_t: np.ndarray,
+        mean_v: np.ndarray,
+        m2_t: np.ndarray,
+        m2_v: np.ndarray,
+        c_tv: np.ndarray,
+    ) -> "Moments":
+        """
+        Junta vários grupos de uma vez (colunas de buckets).
+        """
+        total = int(n.sum())
+        if not total:
+            return cls()
+        mt = float(n @ mean_t) / total
+        mv = float(n @ mean_v) / total
+        dt, dv = mean_t - mt, mean_v - mv
+        return cls(
+            total,
+            mt,
+            mv,
+            float(m2_t.sum() + n @ (dt * dt)),
+            float(m2_v.sum() + n @ (dv * dv)),
+            float(c_tv.sum() + n @ (dt * dv)),
+        )
+
+    def add(self, t: float, v: float) -> None:
+        self.n += 1
+        dt = t - self.mean_t
+        self.mean_t += dt / self.n
+        dv = v - self.mean_v
+        self.mean_v += dv / self.n
+        self.m2_t += dt * (t - self.mean_t)
+        self.m2_v += dv * (v - self.mean_v)
+        self.c_tv += dt * (v - self.mean_v)
+
+    def remove(self, t: float, v: float) -> None:
+        # inverso de add() (janela deslizante); só vale para um ponto já adicionado
+        if self.n <= 1:
+            self.__init__()
+            return
+        self.n -= 1
+        dt = t - self.mean_t
+        self.mean_t -= dt / self.n
+        dv = v - self.mean_v
+        self.mean_v -= dv / self.n
+        self.m2_t -= dt * (t - self.mean_t)
+        self.m2_v -= dv * (v - self.mean_v)
+        self.c_tv -= dt * (v - self.mean_v)
+
+    def merge(self, n: int, mean_t: float, mean_v: float, m2_t: float, m2_v: float, c_tv: float) -> None:
+        if not n:
+            return
+        if not self.n:
+            self.n, self.mean_t, self.mean_v = n, mean_t, mean_v
+            self.m2_t, self.m2_v, self.c_tv = m2_t, m2_v, c_tv
+            return
+        total = self.n + n
+        dt = mean_t - self.mean_t
+        dv = mean_v - self.mean_v
+        w = self.n * n / total
+        self.mean_t += dt * n / total
+        self.mean_v += dv * n / total
+        self.m2_t += m2_t + dt * dt * w
+        self.m2_v += m2_v + dv * dv * w
+        self.c_tv += c_tv + dt * dv * w
+        self.n = total
+
+    def merge_moments(self, other: "Moments") -> None:
+        self.merge(other.n, other.mean_t, other.mean_v, other.m2_t, other.m2_v, other.c_tv)
+
+    @property
+    def variance(self) -> Optional[float]:
+        # variância amostral dos valores (Welford)
+        return self.m2_v / (self.n - 1) if self.n > 1 else None
+
+    @property
+    def slope(self) -> Optional[float]:
+        # unidade por segundo
+        return self.c_tv / self.m2_t if self.m2_t > 0 else None
+
+
+def trend_from_moments(
+    m: Moments, first_at: datetime, last_at: datetime, unit: str
+) -> Optional[Dict]:
+    """
+    Tendência pela reta de mínimos quadrados. first/last são os valores da
+    reta na primeira e na última leitura; delta é a variação ajustada.
+    """
+    slope = m.slope
+    if m.n < 2 or slope is None:
+        return None
+    t0, t1 = first_at.timestamp(), last_at.timestamp()
+    first = m.mean_v + slope * (t0 - m.mean_t)
+    last = m.mean_v + slope * (t1 - m.mean_t)
+    delta = last - first
+
+    t_stat = math.inf
+    if m.n > 2:
+        sse = max(m.m2_v - m.c_tv * slope, 0.0)
+        stderr = math.sqrt(sse / (m.n - 2) / m.m2_t)
+        if stderr > 0:
+            t_stat = abs(slope) / stderr
+
+    if abs(delta) < 1e-9 or t_stat < TREND_MIN_T:
+        direction = "stable"
+    elif delta > 0:
+        direction = "up"
+    else:
+        direction = "down"
+
+    return {
+        "start": first_at,
+        "end": last_at,
+        "first": first,
+        "last": last,
+        "delta": delta,
+        "direction": direction,
+        "unit": unit,
+        "count": m.n,
+        "slope_per_hour": slope * 3600,
+        "t_stat": t_stat,
+    }
+
+
+def _seconds(series) -> np.ndarray:
+    return series.ts_ns.astype(np.float64) / 1e9
+
+
+def trend_in_series(series: SeriesLike) -> Optional[Dict]:
+    """
+    trend_from_moments sobre os pontos brutos (referência dos rollups).
+    """
+    series = as_series(series)
+    if len(series) < 2:
+        return None
+    m = Moments.from_arrays(_seconds(series), series.values)
+    return trend_from_moments(
+        m, from_epoch_ns(series.ts_ns.min()), from_epoch_ns(series.ts_ns.max()), series.unit
+    )
+
+
+def noise_sigma(values: np.ndarray) -> float:
+    """
+    Ruído ponto a ponto (desvio das diferenças / sqrt(2)), pouco afetado por tendências lentas.
+    """
+    if len(values) < 3:
+        return 0.0
+    return float(np.diff(values).std() / math.sqrt(2))
+
+
+class PageHinkley:
+    """
+    Page-Hinkley online para o início de uma subida (direction="up") ou
+    queda ("down") na média. update() devolve True no alarme; change_index
+    é então o primeiro ponto (contando de 0) do novo regime.
+    """
+
+    def __init__(self, delta: float, threshold: float, direction: str) -> None:
+        self.delta = delta
+        self.threshold = threshold
+        self.sign = 1.0 if direction == "up" else -1.0
+        self.n = 0
+        self.mean = 0.0
+        self.cum = 0.0
+        self.cum_min = math.inf
+        self.cum_min_index = -1
+        self.change_index: Optional[int] = None
+
+    def update(self, v: float) -> bool:
+        self.n += 1
+        self.mean += (v - self.mean) / self.n
+        self.cum += self.sign * (v - self.mean) - self.delta
+        if self.cum <= self.cum_min:
+            self.cum_min, self.cum_min_index = self.cum, self.n - 1
+        if self.change_index is None and self.cum - self.cum_min > self.threshold:
+            self.change_index = self.cum_min_index + 1
+            return True
+        return False
+
+
+def page_hinkley_params(values: np.ndarray) -> Tuple[float, float]:
+    sigma = noise_sigma(values) or 1e-9 * (1.0 + abs(float(values.mean())))
+    return PH_DELTA_SIGMAS * sigma, PH_LAMBDA_SIGMAS * sigma
+
+
+def daily_means(ts_ns: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (início do dia UTC, média) de cada dia com leituras, em ordem.
+    """
+    days, inverse = np.unique(ts_ns // _DAY_NS, return_inverse=True)
+    means = np.bincount(inverse, weights=values) / np.bincount(inverse)
+    return days * _DAY_NS, means
+
+
+def change_point_in_series(series: SeriesLike, direction: str) -> Optional[Dict]:
+    """
+    Primeiro alarme do Page-Hinkley na direção pedida, em ordem de tempo:
+    {"sent_at", "value", "detected_at"} (início da mudança e quando foi
+    detectada), ou None. Mesmo resultado de PageHinkley ponto a ponto sobre
+    a mesma entrada (pontos ou, em janelas longas, médias diárias).
+    """
+    series = as_series(series)
+    if direction not in ("up", "down") or len(series) < 3:
+        return None
+    order = np.argsort(series.ts_ns, kind="stable")
+    ts, values = series.ts_ns[order], series.values[order]
+    if ts[-1] - ts[0] > PH_DAILY_MEANS_AFTER_NS:
+        ts, values = daily_means(ts, values)
+        if len(values) < 3:
+            return None
+    delta, threshold = page_hinkley_params(values)
+
+    sign = 1.0 if direction == "up" else -1.0
+    running_mean = np.cumsum(values) / np.arange(1, len(values) + 1)
+    cum = np.cumsum(sign * (values - running_mean) - delta)
+    cum_min = np.minimum.accumulate(cum)
+    alarms = np.flatnonzero(cum - cum_min > threshold)
+    if not len(alarms):
+        return None
+    k = int(alarms[0])
+    # logo depois do último índice <= k em que cum atingiu o mínimo corrente
+    start = int(np.flatnonzero(cum[:k + 1] <= cum_min[k])[-1]) + 1
+    return {
+        "sent_at": from_epoch_ns(ts[start]),
+        "value": float(values[start]),
+        "detected_at": from_epoch_ns(ts[k]),
+    }
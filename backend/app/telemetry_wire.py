@@ -0,0 +1,227 @@
+"""
+Formato binário compacto (MessagePack) para o POST /telemetry/batch.
+
+Cada lote é um map (ou uma lista de maps, um por dispositivo):
+
+    {
+      "v":  1,                        # versão do formato
+      "d":  "esp32-agua-01",          # device_id
+      "s":  "fazenda-x_rio-igarape",  # site_id
+      "t0": 1736510400000,            # epoch em ms da referência
+      "dt": [0, 60000, 60000],        # ms desde a leitura anterior (a 1ª, desde t0)
+      "p":  [0, 1, 2, 3],             # códigos dos parâmetros (ordem das colunas de "x")
+      "x":  [[712, 713, 709], ...],   # uma coluna por parâmetro; nil = sem leitura
+      "k":  [2, 2, 1, 0],             # opcional: casas decimais (x inteiro = valor * 10**k)
+      "q":  42                        # opcional: seq da 1ª leitura (+1 por leitura)
+    }
+
+Unidades não trafegam: cada parâmetro usa a unidade padrão do firmware.
+A decodificação vai direto para arrays NumPy, sem objetos Pydantic.
+"""
+from __future__ import annotations
+
+from array import array
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import ormsgpack
+
+from app.models import WaterParameter
+from app.telemetry_cache import Columns
+
+WIRE_VERSION = 1
+MAX_READINGS = 5000  # mesmo limite de TelemetryBatchRequest.readings
+_MAX_EPOCH_MS = 2 ** 42  # ~ ano 2109; evita overflow de int64 em µs
+
+# código -> parâmetro (o índice é o código)
+PARAM_CODES = (
+    WaterParameter.PH,
+    WaterParameter.TEMPERATURE,
+    WaterParameter.TURBIDITY,
+    WaterParameter.TDS,
+)
+
+# nome/unidade gravados no Firestore, iguais aos do firmware
+WIRE_NAMES = {
+    WaterParameter.PH: "pH",
+    WaterParameter.TEMPERATURE: "temperature",
+    WaterParameter.TURBIDITY: "turbidity",
+    WaterParameter.TDS: "tds",
+}
+DEFAULT_UNITS = {
+    WaterParameter.PH: "pH",
+    WaterParameter.TEMPERATURE: "°C",
+    WaterParameter.TURBIDITY: "NTU",
+    WaterParameter.TDS: "ppm",
+}
+
+
+class DecodedBatch(NamedTuple):
+    device_id: str
+    site_id: str
+    ts_us: np.ndarray                        # int64, ASC
+    values: Dict[WaterParameter, np.ndarray]  # float64, NaN = ausente
+    seq0: Optional[int]
+
+    @property
+    def size(self) -> int:
+        return len(self.ts_us)
+
+
+def decode_batches(payload: bytes) -> List[DecodedBatch]:
+    """
+    ValueError para qualquer payload malformado.
+    """
+    try:
+        obj = ormsgpack.unpackb(payload)
+    except ormsgpack.MsgpackDecodeError as e:
+        raise ValueError(f"msgpack inválido: {e}") from None
+    groups = obj if isinstance(obj, list) else [obj]
+    if not groups:
+        raise ValueError("lote vazio")
+    batches = [_decode_group(i, g) for i, g in enumerate(groups)]
+    if sum(b.size for b in batches) > MAX_READINGS:
+        raise ValueError(f"no máximo {MAX_READINGS} leituras por requisição")
+    return batches
+
+
+def _is_int(v: Any) -> bool:
+    return isinstance(v, int) and not isinstance(v, bool)
+
+
+def _decode_group(i: int, g: Any) -> DecodedBatch:
+    if not isinstance(g, dict) or g.get("v") != WIRE_VERSION:
+        raise ValueError(f"[{i}]: versão do formato não suportada")
+
+    device_id, site_id = g.get("d"), g.get("s")
+    if not isinstance(device_id, str) or not device_id or not isinstance(site_id, str) or not site_id:
+        raise ValueError(f"[{i}]: device_id (d) e site_id (s) são obrigatórios")
+    t0 = g.get("t0")
+    if not _is_int(t0) or not 0 <= t0 < _MAX_EPOCH_MS:
+        raise ValueError(f"[{i}]: t0 deve ser inteiro (epoch em ms)")
+
+    dt = np.asarray(g.get("dt") or [])
+    if dt.ndim != 1 or not len(dt) or dt.dtype.kind not in "iu" or (dt < 0).any():
+        raise ValueError(f"[{i}]: dt deve ser uma lista de inteiros >= 0")
+    if t0 + int(dt.sum(dtype=object)) >= _MAX_EPOCH_MS:
+        raise ValueError(f"[{i}]: timestamps fora do intervalo suportado")
+    n = len(dt)
+
+    codes = g.get("p", list(range(len(PARAM_CODES))))
+    columns = g.get("x")
+    decimals = g.get("k")
+    if (
+        not isinstance(codes, list)
+        or not all(_is_int(c) and 0 <= c < len(PARAM_CODES) for c in codes)
+        or len(set(codes)) != len(codes)
+    ):
+        raise ValueError(f"[{i}]: códigos de parâmetro inválidos em p")
+    if not isinstance(columns, list) or len(columns) != len(codes):
+        raise ValueError(f"[{i}]: x deve ter uma coluna por parâmetro de p")
+    if decimals is not None and (
+        not isinstance(decimals, list)
+        or len(decimals) != len(codes)
+        or not all(_is_int(k) and 0 <= k <= 6 for k in decimals)
+    ):
+        raise ValueError(f"[{i}]: k deve ter uma casa decimal (0..6) por parâmetro")
+
+    values: Dict[WaterParameter, np.ndarray] = {}
+    for j, (code, col) in enumerate(zip(codes, columns)):
+        try:
+            # nil vira NaN
+            v = np.array(col, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError(f"[{i}]: x[{j}] deve conter apenas números ou nil") from None
+        if v.shape != (n,):
+            raise ValueError(f"[{i}]: x[{j}] deve ter {n} valores")
+        if np.isinf(v).any():
+            raise ValueError(f"[{i}]: x[{j}] contém valores infinitos")
+        if decimals is not None and decimals[j]:
+            # divisão (não multiplicação por 0.01): 712 / 100 == 7.12 exatamente
+            v /= 10.0 ** decimals[j]
+        values[PARAM_CODES[code]] = v
+
+    present = np.zeros(n, dtype=bool)
+    for v in values.values():
+        present |= ~np.isnan(v)
+    if not present.all():
+        raise ValueError(f"[{i}]: toda leitura precisa de pelo menos uma medição")
+
+    seq0 = g.get("q")
+    if seq0 is not None and not _is_int(seq0):
+        raise ValueError(f"[{i}]: q deve ser inteiro")
+
+    ts_us = (t0 + np.cumsum(dt, dtype=np.int64)) * 1000
+    return DecodedBatch(device_id, site_id, ts_us, values, seq0)
+
+
+def batch_measurements(batch: DecodedBatch) -> List[List[Dict[str, Any]]]:
+    """
+    Lista de measurements (formato do documento no Firestore) por leitura.
+    """
+    cols = [
+        (WIRE_NAMES[p], DEFAULT_UNITS[p], v.tolist())
+        for p, v in batch.values.items()
+    ]
+    return [
+        [
+            {"parameter": name, "value": vals[i], "unit": unit}
+            for name, unit, vals in cols
+            if vals[i] == vals[i]  # NaN != NaN
+        ]
+        for i in range(batch.size)
+    ]
+
+
+def batch_columns(batch: DecodedBatch) -> Columns:
+    """
+    O lote já no formato colunar do cache de séries (TelemetrySeriesCache.ingest_columns).
+    """
+    n = batch.size
+    ts = array("q", batch.ts_us.astype(np.int64).tobytes())
+    values = {}
+    units = {}
+    for p in WaterParameter:
+        v = batch.values.get(p)
+        values[p] = array("d", (v if v is not None else np.full(n, np.nan)).tobytes())
+        units[p] = [DEFAULT_UNITS[p]] * n
+    return ts, values, units
+
+
+def encode_batch(
+    device_id: str,
+    site_id: str,
+    sent_at_ms: Sequence[int],
+    values: Dict[WaterParameter, Sequence[Optional[float]]],
+    decimals: Optional[Dict[WaterParameter, int]] = None,
+    seq0: Optional[int] = None,
+) -> bytes:
+    """
+    Referência do lado do dispositivo (usada nos benchmarks). sent_at_ms em ordem ASC.
+    """
+    params = list(values)
+    t0 = sent_at_ms[0] if sent_at_ms else 0
+    dt = [t - prev for prev, t in zip([t0] + list(sent_at_ms[:-1]), sent_at_ms)]
+
+    columns: List[List[Any]] = []
+    for p in params:
+        col = list(values[p])
+        if decimals is not None:
+            scale = 10 ** decimals[p]
+            col = [None if v is None else round(v * scale) for v in col]
+        columns.append(col)
+
+    obj: Dict[str, Any] = {
+        "v": WIRE_VERSION,
+        "d": device_id,
+        "s": site_id,
+        "t0": t0,
+        "dt": dt,
+        "p": [PARAM_CODES.index(p) for p in params],
+        "x": columns,
+    }
+    if decimals is not None:
+        obj["k"] = [decimals[p] for p in params]
+    if seq0 is not None:
+        obj["q"] = seq0
+    return ormsgpack.packb(obj)
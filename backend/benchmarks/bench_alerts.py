@@ -0,0 +1,175 @@
+"""
+Regras de alerta na ingestão: vazão da avaliação e comportamento das regras.
+
+1) AlertEngine sozinho sobre N envios (4 parâmetros cada) de vários
+   dispositivos: leituras/s (meta: >= 10k/s)
+2) POST /telemetry/batch com e sem alertas (Firestore fake), para ver o
+   custo no caminho da ingestão
+3) cenários conferidos:
+   - pH ruidoso cruzando 8.5: com histerese (0.1) e duração mínima abre
+     uma vez; sem elas, abre e fecha a cada cruzamento do ruído
+   - pico de 1 leitura na temperatura: segurado pela duração mínima
+   - pH caindo DROP_PER_HOUR (1.2/h) desde o início: alerta de taxa
+     "falling" com a taxa medida a menos de 0.05/h da injetada (a janela
+     de taxa só tem pontos da queda); pH parado não abre alerta de taxa
+   - eventos publicados em aquamonitor/<device>/alerts (broker fake)
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_alerts
+    python -m benchmarks.bench_alerts --devices 200 --minutes 600
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks.fakes import FakeFirestore, install
+
+SITE_ID = "fazenda-x"
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+# queda de pH injetada no cenário "drop" (valor/hora)
+DROP_PER_HOUR = 1.2
+PARAMS = (("pH", "pH", 7.2, 0.05), ("temperature", "°C", 26.0, 0.3), ("turbidity", "NTU", 3.0, 0.2), ("tds", "ppm", 180.0, 3.0))
+
+
+def _reading(device_id: str, minute: float, values: Dict[str, float]) -> Dict:
+    return {
+        "device_id": device_id,
+        "site_id": SITE_ID,
+        "sent_at": START + timedelta(minutes=minute),
+        "measurements": [
+            {"parameter": p, "value": values.get(p, base), "unit": unit} for p, unit, base, _ in PARAMS
+        ],
+    }
+
+
+def make_readings(devices: int, minutes: int) -> List[Dict]:
+    rnd = random.Random(1)
+    out = []
+    for m in range(minutes):
+        for d in range(devices):
+            out.append(_reading(f"esp32-{d:03d}", m, {
+                p: round(base + rnd.gauss(0, sd), 3) for p, _, base, sd in PARAMS
+            }))
+    return out
+
+
+def scenario_readings(minutes: int) -> List[Dict]:
+    rnd = random.Random(2)
+    out = []
+    for m in range(minutes):
+        # pH subindo devagar através do limite de 8.5, com ruído
+        out.append(_reading("flap", m, {"pH": round(8.42 + 0.0015 * m + rnd.gauss(0, 0.03), 3)}))
+        # um único pico de temperatura (30 s acima da faixa)
+        out.append(_reading("spike", m, {"temperature": 31.0 if m == 30 else 26.0}))
+        # pH caindo DROP_PER_HOUR desde o primeiro envio
+        out.append(_reading("drop", m, {"pH": round(7.4 - DROP_PER_HOUR / 60 * m, 3)}))
+    return out
+
+
+def _rows(readings: List[Dict]):
+    from app.telemetry_repository import rows_by_series
+
+    return rows_by_series([(str(i), r) for i, r in enumerate(readings)])
+
+
+def count_events(events, device_id: str, kind: str) -> Tuple[int, int]:
+    mine = [e for e in events if e.device_id == device_id and e.kind.value == kind]
+    return sum(e.status == "open" for e in mine), sum(e.status == "resolved" for e in mine)
+
+
+async def run(args) -> None:
+    store = FakeFirestore(latency_s=0)
+    install(store)
+
+    from app.config import get_settings
+
+    settings = get_settings()
+    settings.INGEST_WRITE_BEHIND_ENABLED = False
+    settings.TELEMETRY_CACHE_ENABLED = False
+
+    from app.models import AlertEvent
+    from app.telemetry_alerts import AlertDispatcher, AlertEngine, AlertRules, MqttAlertSink
+
+    # 1) vazão do motor
+    readings = make_readings(args.devices, args.minutes)
+    by_series = _rows(readings)
+    engine = AlertEngine(
+        AlertRules({"default": {"ph": {"max_rate_per_hour": 0.5}}}, min_duration_s=60), lambda e: None
+    )
+    t0 = time.perf_counter()
+    engine.evaluate_series(by_series)
+    engine_s = time.perf_counter() - t0
+    per_s = len(readings) / engine_s
+    assert per_s >= 10_000, per_s
+
+    # 3) cenários, com o broker MQTT fake
+    published: List[Tuple[str, str]] = []
+    dispatcher = AlertDispatcher([MqttAlertSink(publish=lambda t, p: published.append((t, p)))])
+    scenario = _rows(scenario_readings(120))
+    events: List[AlertEvent] = []
+    rules = AlertRules({"default": {"ph": {"max_rate_per_hour": 0.5, "hysteresis": 0.1}}}, min_duration_s=60)
+    AlertEngine(rules, lambda e: (events.append(e), dispatcher.put(e))).evaluate_series(scenario)
+    naive: List[AlertEvent] = []
+    AlertEngine(AlertRules({"default": {"ph": {"hysteresis": 0}}}, min_duration_s=0), naive.append).evaluate_series(
+        {k: v for k, v in scenario.items() if k[0] == "flap"}
+    )
+    await dispatcher.drain()
+
+    flap = count_events(events, "flap", "out_of_range")
+    flap_naive = count_events(naive, "flap", "out_of_range")
+    assert flap[0] == 1 and flap_naive[0] >= 5, (flap, flap_naive)
+    assert count_events(events, "spike", "out_of_range") == (0, 0)
+    drop = [e for e in events if e.device_id == "drop" and e.kind.value == "rate_of_change"]
+    assert drop and drop[0].level == "falling", drop
+    assert abs(drop[0].value + DROP_PER_HOUR) < 0.05, (drop[0].value, DROP_PER_HOUR)
+    assert count_events(events, "spike", "rate_of_change") == (0, 0)
+    assert all(t == f"aquamonitor/{json.loads(p)['device_id']}/alerts" for t, p in published)
+    assert len(published) == len(events)
+
+    # 2) custo na ingestão (JSON, sem write-behind nem cache)
+    from app.main import app
+
+    batch = [{**r, "sent_at": r["sent_at"].isoformat()} for r in readings[: args.ingest_readings]]
+    timings = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for enabled in (False, True):
+            settings.ALERTS_ENABLED = enabled
+            t0 = time.perf_counter()
+            for i in range(0, len(batch), 500):
+                r = await client.post("/telemetry/batch", json={"readings": batch[i:i + 500]})
+                r.raise_for_status()
+            timings[enabled] = time.perf_counter() - t0
+
+    print(f"{len(readings)} envios ({args.devices} dispositivos x {args.minutes} min, 4 parâmetros)")
+    print(f"  motor: {engine_s * 1e3:.1f} ms, {per_s:,.0f} envios/s ({per_s * 4:,.0f} leituras/s), {engine.events} eventos")
+    print(
+        f"  ingestão de {len(batch)} envios: sem alertas {len(batch) / timings[False]:,.0f}/s, "
+        f"com alertas {len(batch) / timings[True]:,.0f}/s"
+    )
+    print(
+        f"  OK: pH cruzando 8.5 abriu {flap[0]}x com histerese/duração mínima (sem: {flap_naive[0]}x); "
+        f"pico de 1 leitura ignorado; queda de pH {drop[0].value:+.2f}/h alertada "
+        f"(injetada {-DROP_PER_HOUR:+.2f}/h); "
+        f"{len(published)} eventos no MQTT"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--minutes", type=int, default=1000)
+    parser.add_argument("--ingest-readings", type=int, default=5000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+POST /chat/batch vs as mesmas perguntas uma a uma no /chat, com Firestore
+fake (latência por consulta) e classificação pelas regras.
+
+Perguntas típicas do painel para uma lagoa: última leitura, média 24h dos 4
+parâmetros, tendência, faixa ideal e máximo. Compara consultas/documentos
+lidos no Firestore e o tempo total, e confere que as respostas são as mesmas.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_chat_batch
+    python -m benchmarks.bench_chat_batch --firestore-latency 0.08 --cache
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.fakes import FakeFirestore, StubChain, install, install_llm
+
+DEVICE_ID = "esp32-agua-01"
+SITE_ID = "fazenda-x_rio-igarape"
+QUESTIONS = [
+    "qual a última leitura?",
+    "qual a média do pH hoje?",
+    "qual a média da temperatura hoje?",
+    "qual a média da turbidez hoje?",
+    "qual a média do TDS hoje?",
+    "o pH está subindo?",
+    "a temperatura está dentro do ideal?",
+    "qual foi o maior pH hoje?",
+]
+
+
+def _seed(store: FakeFirestore, collection: str, days: int) -> None:
+    now = datetime.now(timezone.utc)
+    # meio intervalo de folga: nenhum envio cai na borda da janela de 24h
+    for i in range(days * 288):
+        store.add(collection, f"doc-{i}", {
+            "device_id": DEVICE_ID,
+            "site_id": SITE_ID,
+            "sent_at": now - timedelta(seconds=150 + 300 * i),
+            "measurements": [
+                {"parameter": "pH", "value": 7.0 + (i % 10) / 10, "unit": "pH"},
+                {"parameter": "temperature", "value": 26.0 + (i % 7) / 10, "unit": "°C"},
+                {"parameter": "turbidity", "value": 3.0 + (i % 5) / 10, "unit": "NTU"},
+                {"parameter": "tds", "value": 180.0 + i % 11, "unit": "ppm"},
+            ],
+        })
+
+
+async def _scenario(app, store: FakeFirestore, name: str) -> Dict:
+    from app.telemetry_repository import series_cache
+
+    series_cache.clear()
+    queries0, reads0 = store.queries, store.reads
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one(message: str) -> str:
+            r = await client.post("/chat", json={
+                "session_id": "bench", "message": message, "device_id": DEVICE_ID, "site_id": SITE_ID,
+            })
+            r.raise_for_status()
+            return r.json()["answer"]
+
+        t0 = time.perf_counter()
+        if name == "sequencial":
+            answers = [await one(q) for q in QUESTIONS]
+        elif name == "concorrente":
+            answers = list(await asyncio.gather(*(one(q) for q in QUESTIONS)))
+        else:
+            r = await client.post("/chat/batch", json={
+                "session_id": "bench", "device_id": DEVICE_ID, "site_id": SITE_ID, "messages": QUESTIONS,
+            })
+            r.raise_for_status()
+            answers = [a["answer"] for a in r.json()["answers"]]
+        wall = time.perf_counter() - t0
+    return {
+        "scenario": name,
+        "queries": store.queries - queries0,
+        "reads": store.reads - reads0,
+        "ms": wall * 1e3,
+        "answers": answers,
+    }
+
+
+async def run(args) -> List[Dict]:
+    store = FakeFirestore(latency_s=args.firestore_latency)
+    install(store)
+
+    from app.config import get_settings
+    from app.models import QueryIntent, QueryIntentType
+
+    get_settings().TELEMETRY_CACHE_ENABLED = args.cache
+    _seed(store, get_settings().FIRESTORE_TELEMETRY_COLLECTION, args.days)
+    # todas as perguntas saem das regras; a LLM não deve ser chamada
+    llm = StubChain(lambda _: QueryIntent(intent=QueryIntentType.GENERAL_HELP))
+    install_llm(llm, StubChain(lambda _: ""))
+
+    from app.main import app
+
+    results = [await _scenario(app, store, name) for name in ("sequencial", "concorrente", "batch")]
+    assert llm.calls == 0
+    for r in results[1:]:
+        assert r["answers"] == results[0]["answers"], (r["scenario"], r["answers"])
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--firestore-latency", type=float, default=0.03)
+    parser.add_argument("--days", type=int, default=2, help="dias de histórico no Firestore fake")
+    parser.add_argument("--cache", action="store_true", help="liga o cache de séries")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(
+        f"{len(QUESTIONS)} perguntas, Firestore {args.firestore_latency * 1e3:.0f} ms/consulta, "
+        f"cache={'on' if args.cache else 'off'}"
+    )
+    print(f"{'cenário':>12} {'consultas':>10} {'docs lidos':>11} {'tempo ms':>9}")
+    for r in results:
+        print(f"{r['scenario']:>12} {r['queries']:>10} {r['reads']:>11} {r['ms']:>9.1f}")
+    print("  OK: mesmas respostas nos três cenários")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Tempo até o primeiro byte (TTFB) do /chat vs /chat/stream, com Ollama e
+Firestore fake. A LLM simulada leva --first-token até o primeiro token e
+--token-latency por token seguinte, como a inferência em CPU.
+
+Mede, do lado do cliente, o primeiro pedaço do corpo e a resposta completa:
+- general_help: no /chat o corpo só sai com a resposta inteira; no stream, no 1º token
+- telemetria (média de pH): mesmo protocolo, um único frame de texto
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_chat_stream
+    python -m benchmarks.bench_chat_stream --first-token 0.8 --token-latency 0.08 --requests 20
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import socket
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+import httpx
+import uvicorn
+
+from benchmarks.fakes import FakeFirestore, StubChain, install, install_llm
+
+DEVICE_ID = "esp32-agua-01"
+SITE_ID = "fazenda-x_rio-igarape"
+HELP_ANSWER = (
+    "Olá! Sou o assistente do AquaMonitor. Posso informar a última leitura, máximos, "
+    "mínimos, médias e tendências de pH, temperatura, turbidez e TDS dos seus viveiros, "
+    "além de dizer se os valores estão dentro da faixa ideal para a criação."
+)
+QUESTIONS = {
+    "general_help": "olá, quem é você?",
+    "avg_value": "qual a média do pH hoje?",
+}
+
+
+def _setup(args):
+    store = FakeFirestore()
+    install(store)
+
+    from app.config import get_settings
+    from app.models import QueryIntent, QueryIntentType
+
+    now = datetime.now(timezone.utc)
+    for i in range(288):
+        store.add(get_settings().FIRESTORE_TELEMETRY_COLLECTION, f"doc-{i}", {
+            "device_id": DEVICE_ID,
+            "site_id": SITE_ID,
+            "sent_at": now - timedelta(minutes=5 * i),
+            "measurements": [{"parameter": "pH", "value": 7.0 + (i % 10) / 10, "unit": "pH"}],
+        })
+
+    # a classificação sai das regras (sem LLM); só a resposta de ajuda usa a LLM simulada
+    install_llm(
+        StubChain(lambda _: QueryIntent(intent=QueryIntentType.GENERAL_HELP)),
+        StubChain(lambda _: HELP_ANSWER, args.first_token, args.token_latency),
+    )
+
+    from app.main import app
+
+    return app
+
+
+async def _measure(client: httpx.AsyncClient, path: str, message: str, accept: str) -> Tuple[float, float, str]:
+    payload = {"session_id": "bench", "message": message, "device_id": DEVICE_ID, "site_id": SITE_ID}
+    t0 = time.perf_counter()
+    first = None
+    body = b""
+    async with client.stream("POST", path, json=payload, headers={"accept": accept}) as r:
+        r.raise_for_status()
+        async for chunk in r.aiter_raw():
+            if first is None:
+                first = time.perf_counter() - t0
+            body += chunk
+    return first, time.perf_counter() - t0, body.decode()
+
+
+def _final_answer(path: str, body: str) -> str:
+    if path == "/chat":
+        return json.loads(body)["answer"]
+    last = [line for line in body.splitlines() if line.strip()][-1]
+    frame = json.loads(last[len("data: "):] if last.startswith("data: ") else last)
+    return frame["response"]["answer"]
+
+
+def _serve(app) -> Tuple[uvicorn.Server, str]:
+    """
+    uvicorn de verdade numa thread: o ASGITransport do httpx junta o corpo
+    inteiro antes de devolver, o que esconderia o streaming.
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning", lifespan="off"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def run(args) -> List[Dict]:
+    server, base_url = _serve(_setup(args))
+    modes = [
+        ("/chat", "application/json"),
+        ("/chat/stream", "text/event-stream"),
+        ("/chat/stream", "application/x-ndjson"),
+    ]
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        for intent, message in QUESTIONS.items():
+            answers = set()
+            for path, accept in modes:
+                ttfb, total = [], []
+                for _ in range(args.requests):
+                    f, t, body = await _measure(client, path, message, accept)
+                    ttfb.append(f)
+                    total.append(t)
+                    answers.add(_final_answer(path, body))
+                results.append({
+                    "intent": intent,
+                    "mode": f"{path} ({accept.split('/')[-1]})",
+                    "ttfb_ms": statistics.median(ttfb) * 1e3,
+                    "total_ms": statistics.median(total) * 1e3,
+                })
+            # o texto final é o mesmo nos três modos
+            assert len(answers) == 1, answers
+    server.should_exit = True
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--first-token", type=float, default=0.4)
+    parser.add_argument("--token-latency", type=float, default=0.04)
+    parser.add_argument("--requests", type=int, default=5)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"LLM: 1º token {args.first_token * 1e3:.0f} ms, depois {args.token_latency * 1e3:.0f} ms/token")
+    print(f"{'intent':>13} {'modo':>34} {'ttfb ms':>9} {'total ms':>9}")
+    for r in results:
+        print(f"{r['intent']:>13} {r['mode']:>34} {r['ttfb_ms']:>9.1f} {r['total_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
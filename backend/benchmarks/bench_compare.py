@@ -0,0 +1,154 @@
+"""
+compare_periods no /chat: período pedido contra o anterior, as duas janelas
+de UMA leitura contínua (aget_telemetry_ranges) e todos os parâmetros da
+mesma leitura quando a pergunta não cita nenhum.
+
+Conferido (Firestore fake com latência, cache de séries desligado e ligado):
+1) "hoje vs ontem" (days=1) e "semana vs semana passada" (days=7), um
+   parâmetro e os quatro: 1 consulta cada
+2) média/mín/máx/amostras de cada janela iguais às calculadas direto das
+   colunas sintéticas
+3) comparado com duas leituras separadas (uma por janela e parâmetro)
+4) /chat/batch com compare e outras perguntas: uma leitura por janela
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_compare
+    python -m benchmarks.bench_compare --days 30 --per-day 1440
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import re
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.fakes import FakeFirestore, StubChain, install, install_llm
+from benchmarks.synthetic import PARAMETERS, generate
+
+_QUESTIONS = {
+    "compare o pH de hoje com ontem": ("ph", 1),
+    "compare a água de hoje com a de ontem": (None, 1),
+    "a temperatura desta semana vs semana passada": ("temperature", 7),
+    "compare esta semana com a semana passada": (None, 7),
+}
+
+
+def _expected(device, param: str, lo, split, end):
+    from app.telemetry_series import to_epoch_ns
+
+    col = [name.lower() for name, _, _ in PARAMETERS].index(param.lower() if param != "ph" else "ph")
+    ts, v = device.ts_ns, device.values[:, col]
+    out = []
+    for a, b, inclusive in ((lo, split, False), (split, end, True)):
+        a_ns, b_ns = to_epoch_ns(a), to_epoch_ns(b)
+        mask = (ts >= a_ns) & ((ts <= b_ns) if inclusive else (ts < b_ns)) & ~np.isnan(v)
+        w = v[mask]
+        out.append((w.mean(), w.min(), w.max(), len(w)))
+    return out
+
+
+async def run(args) -> None:
+    store = FakeFirestore(latency_s=args.firestore_latency)
+    install(store)
+
+    from app.config import get_settings
+    from app.models import QueryIntent, QueryIntentType, WaterParameter
+
+    settings = get_settings()
+    settings.INGEST_WRITE_BEHIND_ENABLED = False
+    settings.SPECULATIVE_PREFETCH_ENABLED = False
+    settings.FAST_INTENT_ENABLED = False
+    settings.INTENT_CACHE_ENABLED = False
+    settings.SINGLE_FLIGHT_ENABLED = False
+
+    intents = {
+        q: QueryIntent(intent=QueryIntentType.COMPARE_PERIODS, parameter=p, days=d)
+        for q, (p, d) in _QUESTIONS.items()
+    }
+    intents["qual a média do pH hoje?"] = QueryIntent(intent=QueryIntentType.AVG_VALUE, parameter=WaterParameter.PH)
+    install_llm(StubChain(lambda inputs: intents[inputs["user_question"]].model_copy()), StubChain(lambda _: ""))
+
+    device = generate(1, args.days, args.days * args.per_day, seed=5)[0]
+    store.add_columns(settings.FIRESTORE_TELEMETRY_COLLECTION, device)
+    dev, site = device.device_id, device.site_id
+
+    import app.main as main
+    import app.telemetry_repository as repo
+
+    transport = httpx.ASGITransport(app=main.app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for cache in (False, True):
+            settings.TELEMETRY_CACHE_ENABLED = cache
+            for question, (param, days) in _QUESTIONS.items():
+                repo.series_cache.clear()
+                store.queries = 0
+                t0 = time.perf_counter()
+                response = await client.post("/chat", json={
+                    "session_id": "s", "message": question, "device_id": dev, "site_id": site,
+                })
+                elapsed = time.perf_counter() - t0
+                assert response.status_code == 200, response.text
+                answer = response.json()["answer"]
+                assert store.queries == 1, (question, store.queries)
+                assert ("Média" in answer or "média" in answer) and "anterior" in answer, answer
+                assert answer.count("amostras") == (2 if param else 8), answer
+
+                # números da resposta conferidos com as colunas (duas casas)
+                intent = intents[question]
+                lo, split, end = main._compare_bounds(intent, None)
+                for p in [param] if param else [w.value for w in WaterParameter]:
+                    cur, prev = _expected(device, p, lo, split, end)[::-1]
+                    for (avg, mn, mx, n) in (cur, prev):
+                        assert f"média {avg:.2f}" in answer and f"mín {mn:.2f}" in answer, (p, avg, answer)
+                        assert f"máx {mx:.2f}" in answer and f"amostras: {n})" in answer
+                results[(cache, question)] = (elapsed, store.queries, answer)
+
+            # duas leituras separadas, como seria sem o compare_periods
+            repo.series_cache.clear()
+            store.queries = 0
+            lo, split, end = main._compare_bounds(intents["compare esta semana com a semana passada"], None)
+            t0 = time.perf_counter()
+            await asyncio.gather(*(
+                repo.asummarize_range(dev, site, p, a, b)
+                for p in WaterParameter for a, b in ((lo, split), (split, end))
+            ))
+            results[(cache, "separadas")] = (time.perf_counter() - t0, store.queries, "")
+
+        # /chat/batch: compare junto com outras perguntas da mesma janela
+        settings.TELEMETRY_CACHE_ENABLED = False
+        store.queries = 0
+        response = await client.post("/chat/batch", json={
+            "session_id": "s", "device_id": dev, "site_id": site,
+            "messages": ["compare o pH de hoje com ontem", "compare a água de hoje com a de ontem",
+                         "qual a média do pH hoje?"],
+        })
+        assert response.status_code == 200, response.text
+        batch_queries = store.queries
+        # as duas comparações de 48 h numa leitura, a média de 24 h em outra
+        assert batch_queries == 2, batch_queries
+
+    print(f"1 device, {len(device)} envios em {args.days} dias; Firestore fake com "
+          f"{args.firestore_latency * 1e3:.0f} ms por consulta")
+    print(f"{'pergunta':>46} {'cache':>6} {'consultas':>10} {'ms':>8}")
+    for (cache, question), (s, q, _) in results.items():
+        print(f"{question[:46]:>46} {'sim' if cache else 'não':>6} {q:>10} {s * 1e3:>8.0f}")
+    example = results[(False, "compare o pH de hoje com ontem")][2]
+    print(f"  resposta: {re.sub(r'  +', ' ', example)}")
+    print(f"  /chat/batch (2 compare + 1 média): {batch_queries} consultas")
+    print("  OK: uma leitura por comparação, valores iguais ao cálculo direto")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=15)
+    parser.add_argument("--per-day", type=int, default=288, help="envios por dia")
+    parser.add_argument("--firestore-latency", type=float, default=0.03)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
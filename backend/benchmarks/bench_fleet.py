@@ -0,0 +1,169 @@
+"""
+GET /fleet/ranking (telemetry_fleet.py): um parâmetro em centenas de
+devices, com o Firestore fake com latência fixa por consulta.
+
+Conferido:
+1) tempo total por FLEET_MAX_CONCURRENCY: com 1 é a soma dos shards; com a
+   concorrência >= número de devices, perto de um shard só (mais a leitura
+   do índice devices_latest, que vem antes)
+2) avg e excursion de cada device iguais aos calculados direto das colunas
+   sintéticas com NumPy, e a tabela na ordem certa
+3) um device lento: timeout só nele (vai para failed), o resto responde
+4) device sem envios desde start: fica de fora sem consulta (skipped)
+5) time_outside pelo endpoint HTTP (série inteira de cada device)
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_fleet
+    python -m benchmarks.bench_fleet --devices 500 --firestore-latency 0.05
+
+Os documentos de cada shard são decodificados no event loop: esse custo de
+CPU (~25 µs por documento aqui) se soma entre os shards; só a espera pelo
+Firestore fica em paralelo. Com --per-day/--window-days grandes é ele que
+domina o tempo total.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import numpy as np
+
+from benchmarks.fakes import FakeFirestore, install
+from benchmarks.synthetic import PARAMETERS, generate
+
+
+def _seed_latest(store: FakeFirestore, collection: str, series) -> None:
+    from app.telemetry_latest import latest_doc_id, latest_from_rows, latest_to_data
+    from app.telemetry_store import data_to_row
+
+    for s in series:
+        rows = [data_to_row(data) for _, data in s.documents(max(0, len(s) - 50))]
+        state = latest_from_rows(s.device_id, s.site_id, rows)
+        store.add(collection, latest_doc_id(s.device_id, s.site_id), latest_to_data(state))
+
+
+async def run(args) -> None:
+    store = FakeFirestore(latency_s=args.firestore_latency)
+    install(store)
+
+    from app.config import get_settings
+    from app.models import WaterParameter
+
+    settings = get_settings()
+    settings.TELEMETRY_CACHE_ENABLED = False     # cada shard chega ao store
+    settings.SINGLE_FLIGHT_ENABLED = False
+
+    now = datetime.now(timezone.utc)
+    fleet = generate(args.devices, args.days, args.devices * args.days * args.per_day, seed=11, end=now)
+    # parado há 10 dias: nada no intervalo
+    stale = generate(1, 2, 576, seed=12, end=now - timedelta(days=10), site_id="fazenda-parada")
+    for s in fleet + stale:
+        store.add_columns(settings.FIRESTORE_TELEMETRY_COLLECTION, s)
+    _seed_latest(store, settings.FIRESTORE_LATEST_COLLECTION, fleet + stale)
+
+    import app.telemetry_repository as repo
+    from app.main import app
+    from app.telemetry_alerts import alert_rules
+    from app.telemetry_fleet import fleet_ranking
+
+    param = WaterParameter.TURBIDITY
+    col = [name for name, _, _ in PARAMETERS].index("turbidity")
+    end = now
+    start = end - timedelta(days=args.window_days)
+
+    # 1) concorrência
+    n = args.devices
+    timings = {}
+    for concurrency in (1, 16, n):
+        settings.FLEET_MAX_CONCURRENCY = concurrency
+        store.queries = 0
+        t0 = time.perf_counter()
+        result = await fleet_ranking(param, start, end, "excursion")
+        timings[concurrency] = (time.perf_counter() - t0, store.queries)
+        assert len(result["rows"]) == n and not result["failed"], result["failed"]
+        # uma consulta ao índice devices_latest e uma por device; o parado não é consultado
+        assert result["skipped"] == 1 and store.queries == n + 1, (result["skipped"], store.queries)
+    shard_s = args.firestore_latency
+    assert timings[n][0] < timings[1][0] / 5, timings
+
+    # 2) valores conferidos com as colunas
+    ideal = alert_rules.ideal_range(fleet[0].site_id, param)
+    lo_ns, hi_ns = int(start.timestamp() * 1e9), int(end.timestamp() * 1e9)
+    expected = {}
+    for s in fleet:
+        inside = (s.ts_ns >= lo_ns) & (s.ts_ns <= hi_ns)
+        v = s.values[inside, col]
+        v = v[~np.isnan(v)]
+        expected[s.device_id] = (v.mean(), max(ideal["min"] - v.min(), v.max() - ideal["max"], 0.0), len(v))
+    for row in result["rows"]:
+        avg, excursion, count = expected[row["device_id"]]
+        assert row["count"] == count and abs(row["avg"] - avg) < 1e-9 and abs(row["value"] - excursion) < 1e-9
+    values = [r["value"] for r in result["rows"]]
+    assert values == sorted(values, reverse=True)
+    total = sum(c for _, _, c in expected.values())
+    fleet_avg = sum(a * c for a, _, c in expected.values()) / total
+    assert result["fleet"]["count"] == total and abs(result["fleet"]["avg"] - fleet_avg) < 1e-9
+    worst = result["rows"][0]
+
+    # 3) um device lento
+    settings.FLEET_SHARD_TIMEOUT_SECONDS = max(10 * shard_s, 0.2)
+    slow_id = fleet[-1].device_id
+    original = repo.store.asummarize
+
+    async def slow(device_id, *a, **kw):
+        if device_id == slow_id:
+            await asyncio.sleep(30)
+        return await original(device_id, *a, **kw)
+
+    repo.store.asummarize = slow
+    t0 = time.perf_counter()
+    partial = await fleet_ranking(param, start, end, "avg", limit=10)
+    slow_s = time.perf_counter() - t0
+    repo.store.asummarize = original
+    assert [f["device_id"] for f in partial["failed"]] == [slow_id]
+    assert len(partial["rows"]) == 10 and partial["fleet"]["devices"] == n - 1
+    assert slow_s < settings.FLEET_SHARD_TIMEOUT_SECONDS + 1.0, slow_s
+
+    # 5) time_outside pelo endpoint
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        t0 = time.perf_counter()
+        response = await client.get("/fleet/ranking", params={
+            "parameter": "turbidez", "metric": "time_outside", "limit": 5,
+            "start": start.isoformat(), "end": end.isoformat(),
+        })
+        http_s = time.perf_counter() - t0
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["unit"] == "%" and len(body["rows"]) == 5 and 0 <= body["rows"][-1]["value"] <= body["rows"][0]["value"]
+
+    readings = sum(len(s) for s in fleet)
+    print(f"{n} devices, {readings} envios em {args.days} dias; janela de {args.window_days} dias; "
+          f"Firestore fake com {shard_s * 1e3:.0f} ms por consulta")
+    print(f"{'concorrência':>14} {'consultas':>10} {'ms':>8} {'x 1 shard':>10}")
+    for concurrency, (s, q) in timings.items():
+        print(f"{concurrency:>14} {q:>10} {s * 1e3:>8.0f} {s / shard_s:>10.1f}")
+    print(f"  pior excursão: {worst['device_id']} {worst['value']:.1f} NTU acima da faixa (máx {worst['max']:.1f})")
+    print(f"  média da frota: {result['fleet']['avg']:.2f} NTU em {result['fleet']['count']} leituras")
+    print(f"  device lento: {slow_s * 1e3:.0f} ms (timeout {settings.FLEET_SHARD_TIMEOUT_SECONDS:g} s), "
+          f"{len(partial['failed'])} em failed")
+    top = body["rows"][0]
+    print(f"  /fleet/ranking time_outside: {http_s * 1e3:.0f} ms, pior {top['device_id']} {top['value']:.1f}% do tempo")
+    print("  OK: valores iguais ao cálculo direto; tempo ~ shard mais lento com concorrência >= devices")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=300)
+    parser.add_argument("--days", type=int, default=2)
+    parser.add_argument("--per-day", type=int, default=48, help="envios por device por dia")
+    parser.add_argument("--window-days", type=float, default=1)
+    parser.add_argument("--firestore-latency", type=float, default=0.03)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+GET /telemetry/history: redução LTTB e min/max para gráficos de 30 dias.
+
+1) em memória, 30 dias de pH a cada 10 s (259 200 pontos) com ciclo
+   diário, ruído e alguns picos isolados:
+   - LTTB igual a uma implementação de referência em Python puro
+   - no máximo max_points pontos, com o primeiro e o último
+   - min/max preserva o mínimo e o máximo globais; o LTTB pega os picos
+   - tempo por parâmetro e tamanho da resposta (JSON) vs série bruta
+2) o endpoint com Firestore fake (1 envio/min, 4 parâmetros): JSON e
+   MessagePack, pontos por parâmetro independentes da taxa de amostragem
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_history
+    python -m benchmarks.bench_history --days 30 --every 5 --max-points 2000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+import httpx
+import numpy as np
+import ormsgpack
+
+from benchmarks.fakes import FakeFirestore, install
+
+DEVICE_ID = "esp32-agua-01"
+SITE_ID = "fazenda-x_rio-igarape"
+END = datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+
+def make_ph(days: int, every_s: int, seed: int = 3):
+    rnd = np.random.default_rng(seed)
+    n = days * 86400 // every_s
+    t_s = np.arange(n, dtype=np.int64) * every_s
+    ph = 7.4 + 0.1 * np.sin(2 * np.pi * t_s / 86400) + rnd.normal(0, 0.02, n)
+    spikes = rnd.choice(n, 5, replace=False)
+    ph[spikes] += np.array([1.5, -1.2, 1.0, -1.4, 1.3])
+    ts_ns = (int(END.timestamp()) - t_s[::-1]) * 10**9
+    return ts_ns, np.round(ph, 4), spikes
+
+
+def lttb_reference(x: List[float], y: List[float], threshold: int) -> List[int]:
+    """
+    LTTB ponto a ponto (a versão original, sem NumPy).
+    """
+    n = len(x)
+    every = (n - 2) / (threshold - 2)
+    out, a = [0], 0
+    for i in range(threshold - 2):
+        avg_lo = int((i + 1) * every) + 1
+        avg_hi = min(int((i + 2) * every) + 1, n)
+        avg_x = sum(x[avg_lo:avg_hi]) / (avg_hi - avg_lo)
+        avg_y = sum(y[avg_lo:avg_hi]) / (avg_hi - avg_lo)
+        best, best_area = -1, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        out.append(best)
+        a = best
+    out.append(n - 1)
+    return out
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def check_memory(args) -> None:
+    from app.telemetry_downsample import downsample_series, lttb_indices, series_columns
+    from app.telemetry_series import TelemetrySeries
+
+    ts_ns, ph, spikes = make_ph(args.days, args.every)
+    n = len(ph)
+
+    # referência em Python puro, num pedaço (é lenta)
+    k = min(n, 20_000)
+    x = ((ts_ns[:k] - ts_ns[0]) / 1e9).tolist()
+    ref = lttb_reference(x, ph[:k].tolist(), 500)
+    assert lttb_indices(ts_ns[:k], ph[:k], 500).tolist() == ref
+
+    series = TelemetrySeries(ts_ns[::-1], ph[::-1], "pH")  # DESC, como nas consultas
+    raw_bytes = len(json.dumps(series_columns(series, n)))
+    print(f"{n} pontos ({args.days} dias, a cada {args.every} s), max_points={args.max_points}")
+    print(f"{'método':>8} {'pontos':>8} {'ms':>8} {'KB JSON':>9}")
+    print(f"{'bruto':>8} {n:>8} {'':>8} {raw_bytes / 1024:>9.0f}")
+    for method in ("lttb", "minmax"):
+        out = downsample_series(series, args.max_points, method)
+        assert len(out) <= args.max_points, (method, len(out))
+        assert np.all(np.diff(out.ts_ns) > 0)
+        assert out.ts_ns[0] == ts_ns[0] or method == "minmax"
+        assert out.ts_ns[-1] == ts_ns[-1] or method == "minmax"
+        if method == "minmax":
+            assert out.values.max() == ph.max() and out.values.min() == ph.min()
+        else:
+            missing = set(ts_ns[spikes].tolist()) - set(out.ts_ns.tolist())
+            assert not missing, missing
+        s = _best_of(lambda: downsample_series(series, args.max_points, method), args.repeat)
+        size = len(json.dumps(series_columns(out, n)))
+        print(f"{method:>8} {len(out):>8} {s * 1e3:>8.1f} {size / 1024:>9.0f}")
+
+
+async def check_endpoint(args) -> None:
+    store = FakeFirestore()
+    install(store)
+
+    from app.config import get_settings
+
+    settings = get_settings()
+    settings.TELEMETRY_CACHE_ENABLED = False
+    collection = settings.FIRESTORE_TELEMETRY_COLLECTION
+    minutes = args.days * 1440
+    rnd = np.random.default_rng(5)
+    noise = rnd.normal(0, 1, (minutes, 4))
+    for i in range(minutes):
+        store.add(collection, f"doc-{i}", {
+            "device_id": DEVICE_ID,
+            "site_id": SITE_ID,
+            "sent_at": END - timedelta(minutes=i),
+            "measurements": [
+                {"parameter": "pH", "value": 7.2 + 0.02 * noise[i, 0], "unit": "pH"},
+                {"parameter": "temperature", "value": 26.0 + 0.3 * noise[i, 1], "unit": "°C"},
+                {"parameter": "turbidity", "value": 3.0 + 0.2 * noise[i, 2], "unit": "NTU"},
+                {"parameter": "tds", "value": 180.0 + 3 * noise[i, 3], "unit": "ppm"},
+            ],
+        })
+
+    from app.main import app
+
+    query = {
+        "device_id": DEVICE_ID,
+        "site_id": SITE_ID,
+        "start": (END - timedelta(days=args.days)).isoformat(),
+        "end": END.isoformat(),
+        "max_points": args.max_points,
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        t0 = time.perf_counter()
+        r = await client.get("/telemetry/history", params=query)
+        json_s = time.perf_counter() - t0
+        r.raise_for_status()
+        body = r.json()
+        json_bytes = len(r.content)
+
+        r = await client.get(
+            "/telemetry/history", params={**query, "method": "minmax"}, headers={"Accept": "application/msgpack"}
+        )
+        r.raise_for_status()
+        assert r.headers["content-type"] == "application/msgpack"
+        packed = ormsgpack.unpackb(r.content)
+        msgpack_bytes = len(r.content)
+
+        r = await client.get("/telemetry/history", params={**query, "parameter": ["pH", "turbidez"]})
+        r.raise_for_status()
+        assert set(r.json()["parameters"]) == {"ph", "turbidity"}
+        r = await client.get("/telemetry/history", params={**query, "method": "spline"})
+        assert r.status_code == 422
+
+    assert set(body["parameters"]) == {"ph", "temperature", "turbidity", "tds"}
+    for p, s in body["parameters"].items():
+        assert s["count"] == minutes, (p, s["count"])
+        assert len(s["t"]) == len(s["v"]) <= args.max_points
+        assert s["t"] == sorted(s["t"])
+    for p, s in packed["parameters"].items():
+        assert len(s["t"]) <= args.max_points
+
+    print(
+        f"  endpoint ({minutes} envios x 4 parâmetros, Firestore fake): "
+        f"{json_s * 1e3:.0f} ms, JSON {json_bytes / 1024:.0f} KB, min/max MessagePack {msgpack_bytes / 1024:.0f} KB"
+    )
+    print(f"  OK: LTTB igual à referência; picos e extremos preservados; <= {args.max_points} pontos por parâmetro")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--every", type=int, default=10)
+    parser.add_argument("--max-points", type=int, default=1500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    check_memory(args)
+    asyncio.run(check_endpoint(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Throughput da ingestão (POST /telemetry/batch) com Firestore fake.
+
+Cenários (mesmo total de leituras, vários dispositivos):
+- per-reading: 1 leitura por requisição e 1 commit por leitura (como o firmware hoje)
+- batch:       N leituras por requisição, WriteBatch de até 500 por commit
+- write-behind: 1 leitura por requisição, agrupadas pelo buffer antes do commit
+
+Cada cenário grava num site_id próprio (os IDs dos documentos vêm do par e do
+sent_at). No fim, o lote do cenário batch é reenviado: nenhum documento novo.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_ingest
+    python -m benchmarks.bench_ingest --readings 20000 --batch-size 200 --commit-latency 0.05
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.fakes import FakeFirestore, install
+
+PARAMS = [("pH", "pH", 7.0), ("temperature", "°C", 26.0), ("turbidity", "NTU", 3.0), ("tds", "ppm", 180.0)]
+
+
+def _readings(total: int, devices: int, site_id: str) -> List[Dict]:
+    now = datetime.now(timezone.utc)
+    out = []
+    for i in range(total):
+        out.append({
+            "device_id": f"esp32-{i % devices:03d}",
+            "site_id": site_id,
+            "sent_at": (now - timedelta(seconds=total - i)).isoformat(),
+            "seq": i,
+            "measurements": [
+                {"parameter": p, "value": base + (i % 7) / 10, "unit": unit}
+                for p, unit, base in PARAMS
+            ],
+        })
+    return out
+
+
+async def _run(
+    app, store: FakeFirestore, readings: List[Dict], batch_size: int, concurrency: int, new_docs: bool = True
+):
+    from app.telemetry_ingest import write_buffer
+
+    batches = [readings[i:i + batch_size] for i in range(0, len(readings), batch_size)]
+    sem = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    from app.config import get_settings
+
+    # só a coleção de telemetria: o índice da última leitura também recebe set()
+    telemetry = store.collections.setdefault(get_settings().FIRESTORE_TELEMETRY_COLLECTION, {})
+    docs0, commits0 = len(telemetry), store.commits
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one(batch: List[Dict]) -> None:
+            async with sem:
+                r = await client.post("/telemetry/batch", json={"readings": batch})
+                r.raise_for_status()
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(b) for b in batches))
+        # o tempo inclui o flush final do que ficou no buffer
+        await write_buffer.flush()
+        wall = time.perf_counter() - t0
+
+    assert len(telemetry) - docs0 == (len(readings) if new_docs else 0)
+    return {
+        "requests": len(batches),
+        "commits": store.commits - commits0,
+        "readings_per_s": len(readings) / wall,
+        "wall_s": wall,
+    }
+
+
+async def main_async(args) -> None:
+    store = FakeFirestore(latency_s=args.commit_latency)
+    install(store)
+
+    from app.config import get_settings
+    from app.main import app
+
+    settings = get_settings()
+    scenarios = [
+        ("per-reading", 1, False),
+        ("batch", args.batch_size, False),
+        ("write-behind", 1, True),
+    ]
+    print(
+        f"{args.readings} leituras, {args.devices} dispositivos, "
+        f"commit {args.commit_latency * 1e3:.0f} ms, concorrência {args.concurrency}"
+    )
+    print(f"{'cenário':>13} {'reqs':>6} {'commits':>8} {'leituras/s':>11} {'tempo s':>8}")
+    sent: Dict[str, List[Dict]] = {}
+    for name, batch_size, write_behind in scenarios:
+        settings.INGEST_WRITE_BEHIND_ENABLED = write_behind
+        readings = sent[name] = _readings(args.readings, args.devices, name)
+        r = await _run(app, store, readings, batch_size, args.concurrency)
+        print(
+            f"{name:>13} {r['requests']:>6} {r['commits']:>8} "
+            f"{r['readings_per_s']:>11.0f} {r['wall_s']:>8.2f}"
+        )
+
+    # reenvio (cliente que não recebeu o ack): os mesmos IDs, nada duplicado
+    settings.INGEST_WRITE_BEHIND_ENABLED = False
+    await _run(app, store, sent["batch"], args.batch_size, args.concurrency, new_docs=False)
+    print("  OK: reenvio do lote batch regravou os mesmos documentos")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readings", type=int, default=5000)
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--commit-latency", type=float, default=0.03)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
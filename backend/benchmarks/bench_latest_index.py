@@ -0,0 +1,124 @@
+"""
+Perguntas de última leitura com o índice devices_latest vs a consulta
+ordenada (limit_to_last(1)) na coleção de telemetria, com Firestore fake.
+
+Os dispositivos enviam pH só a cada 3 leituras: o índice guarda a última
+de cada parâmetro, então "qual o pH agora?" responde o valor, em vez de
+"não veio o parâmetro nesse envio". Também confere GET /devices/latest e a
+recarga de um processo novo. Cada carga de um par lê o documento do índice
+(1 consulta a cada LATEST_INDEX_TTL_SECONDS, contra 1 por pergunta sem o
+índice); a leitura mais recente da coleção (limit_to_last(1)), para pegar o
+que o firmware gravou direto nela, só é conferida na primeira carga e depois a
+cada LATEST_INDEX_VERIFY_SECONDS.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_latest_index
+    python -m benchmarks.bench_latest_index --ponds 50 --questions 500 --firestore-latency 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.fakes import FakeFirestore, StubChain, install, install_llm
+
+SITE_ID = "fazenda-x"
+
+
+def _readings(ponds: int, per_pond: int) -> List[Dict]:
+    now = datetime.now(timezone.utc)
+    out = []
+    for p in range(ponds):
+        for i in range(per_pond):
+            measurements = [{"parameter": "temperature", "value": 26.0 + i % 5 / 10, "unit": "°C"}]
+            if i % 3 == 0:
+                measurements.append({"parameter": "pH", "value": 7.0 + p % 10 / 10, "unit": "pH"})
+            out.append({
+                "device_id": f"esp32-{p:03d}",
+                "site_id": SITE_ID,
+                # o último envio (i = per_pond - 1) fica sem pH quando per_pond % 3 != 1
+                "sent_at": (now - timedelta(minutes=5 * (per_pond - 1 - i))).isoformat(),
+                "measurements": measurements,
+            })
+    return out
+
+
+async def run(args) -> None:
+    store = FakeFirestore(latency_s=args.firestore_latency)
+    install(store)
+
+    from app.config import get_settings
+    from app.models import QueryIntent, QueryIntentType
+
+    settings = get_settings()
+    settings.INGEST_WRITE_BEHIND_ENABLED = False
+    install_llm(
+        StubChain(lambda _: QueryIntent(intent=QueryIntentType.GENERAL_HELP)),
+        StubChain(lambda _: ""),
+    )
+
+    from app.main import app
+    from app.telemetry_repository import latest_index, store as telemetry_store
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        r = await client.post("/telemetry/batch", json={"readings": _readings(args.ponds, args.per_pond)})
+        r.raise_for_status()
+
+        # 1) consulta ordenada antiga, uma por pergunta
+        q0, t0 = store.queries, time.perf_counter()
+        for i in range(args.questions):
+            await telemetry_store.alatest(f"esp32-{i % args.ponds:03d}", SITE_ID)
+        ordered = (store.queries - q0, (time.perf_counter() - t0) / args.questions)
+
+        # 2) índice, processo "novo": uma leitura pontual por lagoa, depois memória
+        latest_index.clear()
+        q0, t0 = store.queries, time.perf_counter()
+        for i in range(args.questions):
+            await latest_index.aget(f"esp32-{i % args.ponds:03d}", SITE_ID)
+        indexed = (store.queries - q0, (time.perf_counter() - t0) / args.questions)
+
+        # 3) o /chat de ponta a ponta, com o pH herdado de um envio anterior
+        r = await client.post("/chat", json={
+            "session_id": "bench", "message": "qual o pH agora?", "device_id": "esp32-000", "site_id": SITE_ID,
+        })
+        r.raise_for_status()
+        answer = r.json()["answer"]
+        assert answer.startswith("Última pH: 7.00"), answer
+
+        r = await client.get("/devices/latest")
+        r.raise_for_status()
+        overview = r.json()
+        assert len(overview) == args.ponds
+        assert all(set(d["parameters"]) == {"ph", "temperature"} for d in overview)
+
+    latest_docs = store.collections[settings.FIRESTORE_LATEST_COLLECTION]
+    assert len(latest_docs) == args.ponds
+
+    print(
+        f"{args.ponds} lagoas, {args.questions} perguntas, "
+        f"Firestore {args.firestore_latency * 1e3:.0f} ms/consulta"
+    )
+    print(f"{'caminho':>24} {'consultas':>10} {'ms/pergunta':>12}")
+    print(f"{'limit_to_last(1)':>24} {ordered[0]:>10} {ordered[1] * 1e3:>12.2f}")
+    print(f"{'índice (memória)':>24} {indexed[0]:>10} {indexed[1] * 1e3:>12.2f}")
+    print(f"  /chat: {answer}")
+    print(f"  OK: /devices/latest com {len(overview)} lagoas, pH herdado do envio anterior")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ponds", type=int, default=20)
+    parser.add_argument("--per-pond", type=int, default=50)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--firestore-latency", type=float, default=0.03)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Medição sob demanda: N celulares pedindo "medir agora" ao mesmo tempo.
+
+O dispositivo é simulado: assina aquamonitor/+/command/measure, leva
+--measure-ms por comando (as 30 amostras por sensor do firmware), um de
+cada vez, e grava a leitura no store SQLite do backend (cujo watch faz o
+papel do on_snapshot do Firestore).
+
+Cenários conferidos:
+1) antes: cada celular publica direto no broker -> N medições e N gravações
+2) POST /devices/{id}/measure concorrentes -> 1 comando, 1 medição, todos
+   recebem a mesma leitura
+3) pedido logo depois de a leitura chegar (dentro de MEASURE_COALESCE_SECONDS)
+   -> mesma leitura, sem novo comando
+4) vários dispositivos ao mesmo tempo -> um comando por dispositivo
+5) dispositivo offline -> 504 para todos e o próximo pedido publica de novo
+
+Por padrão usa um broker em processo (FakeMqttBroker); com --broker
+localhost:1883 usa um Mosquitto local de verdade (paho-mqtt).
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_measure
+    python -m benchmarks.bench_measure --phones 50 --measure-ms 500
+    python -m benchmarks.bench_measure --broker localhost:1883
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Set
+
+import httpx
+
+from benchmarks.fakes import FakeMqttBroker
+
+SITE_ID = "fazenda-x_rio-igarape"
+COMMAND_FILTER = "aquamonitor/+/command/measure"
+
+
+class SimulatedDevice:
+    """
+    Um "firmware" por device_id: comandos numa fila, atendidos em série.
+    """
+
+    def __init__(self, store, measure_s: float, offline: Set[str]) -> None:
+        self.store = store
+        self.measure_s = measure_s
+        self.offline = offline
+        self.measurements: Counter = Counter()
+        self._queues: Dict[str, "queue.Queue[str]"] = {}
+        self._lock = threading.Lock()
+
+    def on_command(self, topic: str, payload: str) -> None:
+        device_id = topic.split("/")[1]
+        if device_id in self.offline:
+            return
+        with self._lock:
+            q = self._queues.get(device_id)
+            if q is None:
+                q = self._queues[device_id] = queue.Queue()
+                threading.Thread(target=self._loop, args=(device_id, q), daemon=True).start()
+        q.put(payload)
+
+    def _loop(self, device_id: str, q: "queue.Queue[str]") -> None:
+        n = 0
+        while True:
+            q.get()
+            time.sleep(self.measure_s)
+            n += 1
+            self.store.insert([(self.store.new_id(), {
+                "device_id": device_id,
+                "site_id": SITE_ID,
+                "sent_at": datetime.now(timezone.utc),
+                "measurements": [{"parameter": "pH", "value": 7.0 + n / 100, "unit": "pH"}],
+            })])
+            with self._lock:
+                self.measurements[device_id] += 1
+            q.task_done()
+
+    def wait_idle(self) -> None:
+        for q in list(self._queues.values()):
+            q.join()
+
+
+def _paho_subscribe(host: str, port: int, on_message: Callable[[str, str], None]) -> None:
+    import paho.mqtt.client as mqtt
+
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    client.on_connect = lambda c, *_: c.subscribe(COMMAND_FILTER, qos=1)
+    client.on_message = lambda c, u, msg: on_message(msg.topic, msg.payload.decode())
+    client.connect(host, port)
+    client.loop_start()
+
+
+async def run(args) -> None:
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    os.environ["TELEMETRY_STORE"] = "sqlite"
+    os.environ["TELEMETRY_SQLITE_PATH"] = path
+    try:
+        await _run(args)
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+async def _run(args) -> None:
+    import app.main as main
+    from app.measure_bridge import MeasureBridge
+    from app.mqtt_client import connect_mqtt_publisher
+    from app.telemetry_repository import store
+    from app.telemetry_stream import stream_hub
+
+    measure_s = args.measure_ms / 1000
+    device = SimulatedDevice(store, measure_s, offline={"esp32-offline"})
+    published: List[str] = []
+    if args.broker:
+        host, _, port = args.broker.partition(":")
+        port = int(port or 1883)
+        _paho_subscribe(host, port, device.on_command)
+        await asyncio.sleep(0.5)  # SUBACK
+        mqtt_publish = connect_mqtt_publisher(host, port)
+    else:
+        broker = FakeMqttBroker()
+        broker.subscribe(COMMAND_FILTER, device.on_command)
+        mqtt_publish = broker.publish
+
+    def publish(topic: str, payload: str) -> None:
+        published.append(topic)
+        mqtt_publish(topic, payload)
+
+    bridge = MeasureBridge(stream_hub, publish=publish, timeout_s=args.timeout, coalesce_s=args.coalesce)
+    main.measure_bridge = bridge
+
+    # 1) antes: cada celular publica direto
+    t0 = time.perf_counter()
+    for _ in range(args.phones):
+        mqtt_publish("aquamonitor/esp32-direto/command/measure", "{}")
+    await asyncio.sleep(0.2)
+    await asyncio.to_thread(device.wait_idle)
+    direct_s = time.perf_counter() - t0
+    direct = device.measurements["esp32-direto"]
+    assert direct == args.phones, direct
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+
+        async def tap(device_id: str) -> httpx.Response:
+            return await client.post(f"/devices/{device_id}/measure", params={"site_id": SITE_ID})
+
+        # 2) N pedidos simultâneos, um dispositivo
+        t0 = time.perf_counter()
+        responses = await asyncio.gather(*(tap("esp32-agua-01") for _ in range(args.phones)))
+        bridge_s = time.perf_counter() - t0
+        bodies = [r.json() for r in responses]
+        assert all(r.status_code == 200 for r in responses), [r.text for r in responses[:3]]
+        assert len({b["reading"]["id"] for b in bodies}) == 1
+        assert sum(not b["coalesced"] for b in bodies) == 1
+        assert device.measurements["esp32-agua-01"] == 1
+        assert published.count("aquamonitor/esp32-agua-01/command/measure") == 1
+
+        # 3) logo depois: mesma leitura, sem comando novo
+        late = (await tap("esp32-agua-01")).json()
+        assert late["coalesced"] and late["reading"]["id"] == bodies[0]["reading"]["id"]
+        assert published.count("aquamonitor/esp32-agua-01/command/measure") == 1
+
+        # 4) vários dispositivos
+        ids = [f"esp32-lagoa-{i:02d}" for i in range(args.devices)]
+        t0 = time.perf_counter()
+        responses = await asyncio.gather(*(tap(d) for d in ids for _ in range(args.phones)))
+        fleet_s = time.perf_counter() - t0
+        assert all(r.status_code == 200 for r in responses)
+        assert all(device.measurements[d] == 1 for d in ids)
+        assert all(published.count(f"aquamonitor/{d}/command/measure") == 1 for d in ids)
+
+        # 5) offline: timeout para todos, e o próximo pedido tenta de novo
+        responses = await asyncio.gather(*(tap("esp32-offline") for _ in range(5)))
+        assert all(r.status_code == 504 for r in responses), [r.status_code for r in responses]
+        await tap("esp32-offline")
+        assert published.count("aquamonitor/esp32-offline/command/measure") == 2
+
+        stats = (await client.get("/stats/measure")).json()
+
+    print(
+        f"{args.phones} celulares, medição de {args.measure_ms:.0f} ms, "
+        f"broker {'fake' if not args.broker else args.broker}"
+    )
+    print(f"{'caminho':>24} {'comandos':>9} {'medições':>9} {'s até a última':>15}")
+    print(f"{'MQTT direto':>24} {args.phones:>9} {direct:>9} {direct_s:>15.2f}")
+    print(f"{'POST .../measure':>24} {1:>9} {1:>9} {bridge_s:>15.2f}")
+    print(f"{f'{args.devices} dispositivos':>24} {args.devices:>9} {args.devices:>9} {fleet_s:>15.2f}")
+    print(f"  /stats/measure: {stats}")
+    print("  OK: um comando por dispositivo, mesma leitura para todos, reuso na janela, 504 e nova tentativa")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--phones", type=int, default=20)
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--measure-ms", type=float, default=200)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--coalesce", type=float, default=10.0)
+    parser.add_argument("--broker", default="", help="host:porta de um broker real (ex. Mosquitto)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Custo da instrumentação do /chat (metrics.py) e conferência do GET /metrics.
+
+1) custo por observação: @timed num no-op async, track_chat vazio e
+   count_documents, ligado vs desligado
+2) /chat de ponta a ponta (Firestore fake, regras + LLM fake), rodadas
+   alternadas com as métricas ligadas e desligadas; o overhead estimado é
+   (observações por requisição x custo de cada uma) / tempo da requisição,
+   que precisa ficar < 1%. A diferença direta entre as rodadas também é
+   mostrada, mas numa máquina ruidosa ela oscila mais do que o efeito
+3) /metrics: formato do Prometheus, etapas presentes, documentos lidos por
+   requisição e erro contado (pergunta de telemetria sem device_id)
+4) header X-Profile com o ProfilerMiddleware: gera um .prof legível pelo pstats
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_metrics
+    python -m benchmarks.bench_metrics --rounds 10 --requests 200
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import pstats
+import re
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.fakes import FakeFirestore, StubChain, install, install_llm
+
+DEVICE_ID = "esp32-agua-01"
+SITE_ID = "fazenda-x_rio-igarape"
+QUESTIONS = [
+    "qual a última leitura?",
+    "qual a média do pH hoje?",
+    "a temperatura está subindo?",
+    "qual foi o maior pH hoje?",
+    "como faço para limpar o sensor?",
+]
+_SAMPLE = re.compile(r'^[a-z_]+(\{([a-z_]+="[^"]*",?)*\})? -?[0-9.e+Inf-]+$')
+
+
+def _seed(store: FakeFirestore, collection: str) -> None:
+    now = datetime.now(timezone.utc)
+    for i in range(288):
+        store.add(collection, f"doc-{i}", {
+            "device_id": DEVICE_ID,
+            "site_id": SITE_ID,
+            "sent_at": now - timedelta(seconds=150 + 300 * i),
+            "measurements": [
+                {"parameter": "pH", "value": 7.0 + (i % 10) / 10, "unit": "pH"},
+                {"parameter": "temperature", "value": 26.0 + (i % 7) / 10, "unit": "°C"},
+            ],
+        })
+
+
+async def micro(n: int) -> Dict[str, float]:
+    """
+    ns por chamada, métricas ligadas menos desligadas.
+    """
+    from app.metrics import count_documents, registry, timed, track_chat
+
+    async def noop() -> None:
+        return None
+
+    wrapped = timed("bench_noop")(noop)
+
+    async def loop_timed() -> None:
+        for _ in range(n):
+            await wrapped()
+
+    async def loop_track() -> None:
+        for _ in range(n):
+            with track_chat("bench"):
+                pass
+
+    async def loop_docs() -> None:
+        with track_chat("bench"):
+            for _ in range(n):
+                count_documents(1)
+
+    out = {}
+    for name, fn in (("@timed", loop_timed), ("track_chat", loop_track), ("count_documents", loop_docs)):
+        best = {}
+        for enabled in (False, True):
+            registry.enabled = enabled
+            runs = []
+            for _ in range(5):
+                t0 = time.perf_counter()
+                await fn()
+                runs.append(time.perf_counter() - t0)
+            best[enabled] = min(runs) / n
+        out[name] = max(best[True] - best[False], 0.0) * 1e9
+    registry.enabled = True
+    return out
+
+
+def _observations() -> int:
+    from app.metrics import CHAT_SECONDS, STAGE_SECONDS
+
+    return sum(c.count for h in (STAGE_SECONDS, CHAT_SECONDS) for c in list(h._children.values()))
+
+
+async def run(args) -> None:
+    store = FakeFirestore()
+    install(store)
+
+    from app.config import get_settings
+    from app.models import QueryIntent, QueryIntentType
+
+    settings = get_settings()
+    settings.INGEST_WRITE_BEHIND_ENABLED = False
+    settings.TELEMETRY_CACHE_ENABLED = False
+    _seed(store, settings.FIRESTORE_TELEMETRY_COLLECTION)
+    install_llm(
+        StubChain(lambda _: QueryIntent(intent=QueryIntentType.GENERAL_HELP)),
+        StubChain(lambda _: "Lave com água destilada."),
+    )
+
+    from app.main import app
+    from app.metrics import registry
+    from app.request_profiler import ProfilerMiddleware
+
+    per_call = await micro(args.micro_calls)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def ask(message: str, **extra) -> httpx.Response:
+            return await client.post("/chat", json={
+                "session_id": "bench", "message": message, "device_id": DEVICE_ID, "site_id": SITE_ID, **extra,
+            })
+
+        for q in QUESTIONS:  # aquecimento
+            (await ask(q)).raise_for_status()
+
+        # 2) rodadas alternadas
+        timings: Dict[bool, List[float]] = {False: [], True: []}
+        observations = queries = 0
+        for r in range(args.rounds * 2):
+            enabled = r % 2 == 1
+            registry.enabled = enabled
+            obs0, q0 = _observations(), store.queries
+            t0 = time.perf_counter()
+            for i in range(args.requests):
+                (await ask(QUESTIONS[i % len(QUESTIONS)])).raise_for_status()
+            timings[enabled].append((time.perf_counter() - t0) / args.requests)
+            if enabled:
+                observations += _observations() - obs0
+                queries += store.queries - q0
+        registry.enabled = True
+
+        # 3) /metrics
+        r = await ask("qual a média do pH hoje?", device_id=None)
+        assert r.status_code == 400
+        r = await client.get("/metrics")
+        r.raise_for_status()
+        text = r.text
+
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = [line for line in text.splitlines() if line and not line.startswith("#")]
+    bad = [line for line in samples if not _SAMPLE.match(line)]
+    assert not bad, bad[:3]
+    for stage in ("get_latest_telemetry", "get_telemetry_range", "telemetry_aggregate", "generate_general_help_answer"):
+        assert f'aquabot_stage_seconds_count{{stage="{stage}"}}' in text, stage
+    assert 'aquabot_chat_errors_total{endpoint="chat",intent="avg_value"} 1' in text
+    docs_sum = float(re.search(r'aquabot_firestore_documents_per_request_sum\{endpoint="chat"\} (\S+)', text).group(1))
+    assert docs_sum > 0
+
+    # 4) profiling por header
+    with tempfile.TemporaryDirectory() as out_dir:
+        profiled = ProfilerMiddleware(app, out_dir=out_dir)
+        transport = httpx.ASGITransport(app=profiled)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            r = await client.post("/chat", headers={"X-Profile": "1"}, json={
+                "session_id": "bench", "message": "qual a média do pH hoje?", "device_id": DEVICE_ID, "site_id": SITE_ID,
+            })
+            r.raise_for_status()
+            path = r.headers["x-profile-path"]
+            r = await client.get("/health")
+            assert "x-profile-path" not in r.headers
+        stats = pstats.Stats(path)
+        assert any(fn[2] == "_answer_telemetry" for fn in stats.stats), "sem _answer_telemetry no perfil"
+        profile_kb = os.path.getsize(path) / 1024
+
+    off = statistics.median(timings[False])
+    on = statistics.median(timings[True])
+    n_requests = args.rounds * args.requests
+    obs_per_request = observations / n_requests
+    # cada requisição: 1 track_chat + (observações - 1) @timed + 1 count_documents por consulta
+    cost = (
+        per_call["track_chat"]
+        + (obs_per_request - 1) * per_call["@timed"]
+        + queries / n_requests * per_call["count_documents"]
+    )
+    estimated = cost / (off * 1e9)
+
+    print(f"custo por chamada (ligado - desligado): " + ", ".join(f"{k} {v:.0f} ns" for k, v in per_call.items()))
+    print(f"/chat ({len(QUESTIONS)} perguntas em rodízio, {args.rounds} rodadas x {args.requests} por estado):")
+    print(f"  desligado {off * 1e3:.3f} ms/req, ligado {on * 1e3:.3f} ms/req (diferença medida {(on / off - 1):+.2%})")
+    print(f"  {obs_per_request:.1f} observações/req -> overhead estimado {cost / 1e3:.1f} µs/req = {estimated:.3%}")
+    print(f"  /metrics: {len(samples)} amostras; .prof de {profile_kb:.0f} KB via X-Profile")
+    assert estimated < 0.01, estimated
+    print("  OK: overhead < 1%, formato Prometheus, etapas, documentos por requisição, erro contado, perfil gerado")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=6)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--micro-calls", type=int, default=100_000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
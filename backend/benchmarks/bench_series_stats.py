@@ -0,0 +1,114 @@
+"""
+Benchmark: estatísticas sobre List[Tuple[datetime, float, str]] (caminho
+antigo, loops em Python + statistics.mean) vs TelemetrySeries (NumPy).
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_series_stats
+    python -m benchmarks.bench_series_stats --sizes 10000 100000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from statistics import mean
+from typing import Callable, Dict, List, Tuple
+
+from app.telemetry_series import (
+    TelemetrySeries,
+    extreme_in_series,
+    summarize_series,
+)
+from app.telemetry_trend import trend_in_series
+
+
+# ---- caminho antigo (cópia de telemetry_repository antes do NumPy) ----
+
+def legacy_summarize_series(series):
+    timestamps = [t for (t, _, _) in series]
+    values = [v for (_, v, _) in series]
+    return {
+        "start": min(timestamps),
+        "end": max(timestamps),
+        "count": len(series),
+        "min": min(values),
+        "max": max(values),
+        "avg": mean(values),
+        "unit": series[0][2],
+    }
+
+
+def legacy_extreme_in_series(series, mode):
+    best = max(series, key=lambda x: x[1]) if mode == "max" else min(series, key=lambda x: x[1])
+    ts, value, unit = best
+    return {"sent_at": ts, "value": value, "unit": unit}
+
+
+def make_points(n: int, seed: int = 42) -> List[Tuple[datetime, float, str]]:
+    rnd = random.Random(seed)
+    end = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        (end - timedelta(seconds=30 * i), 7.0 + rnd.gauss(0, 0.3), "pH")
+        for i in range(n)
+    ]
+
+
+def _best_of(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(sizes: List[int], repeat: int) -> List[Dict]:
+    results = []
+    for n in sizes:
+        points = make_points(n)
+        series = TelemetrySeries.from_points(points)
+
+        old = _best_of(
+            lambda: (
+                legacy_summarize_series(points),
+                legacy_extreme_in_series(points, "max"),
+                legacy_extreme_in_series(points, "min"),
+            ),
+            repeat,
+        )
+        new = _best_of(
+            lambda: (
+                summarize_series(series),
+                extreme_in_series(series, "max"),
+                extreme_in_series(series, "min"),
+                trend_in_series(series),
+            ),
+            repeat,
+        )
+
+        # sanity: mesmos resultados (média pode diferir no último ulp)
+        a, b = legacy_summarize_series(points), summarize_series(series)
+        assert a["count"] == b["count"] and a["min"] == b["min"] and a["max"] == b["max"]
+        assert abs(a["avg"] - b["avg"]) <= 1e-9 * abs(a["avg"])
+
+        results.append({"points": n, "legacy_s": old, "numpy_s": new, "speedup": old / new})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'points':>10} {'legacy (ms)':>12} {'numpy (ms)':>12} {'speedup':>8}")
+    for r in run(args.sizes, args.repeat):
+        print(
+            f"{r['points']:>10} {r['legacy_s'] * 1e3:>12.2f} "
+            f"{r['numpy_s'] * 1e3:>12.2f} {r['speedup']:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
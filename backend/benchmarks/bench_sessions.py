@@ -0,0 +1,194 @@
+"""
+Memória de conversa do /chat (chat_session.py + resolve_followup).
+
+Conferido:
+1) conversa com continuações ("e ontem?", "e a turbidez?", "e a máxima?",
+   "qual a mínima?"): chamadas de classificação à LLM com e sem sessão, e
+   cada resposta com o parâmetro/período herdado
+2) histórico enviado à LLM (ajuda geral) em 60 turnos com respostas longas:
+   tokens estimados por chamada ficam abaixo de CHAT_HISTORY_TOKEN_BUDGET,
+   sem crescer com a conversa
+3) LRU (SESSION_MAX_SESSIONS) e TTL das sessões em memória
+4) backend SQLite: outra instância do store (reinício) continua a conversa;
+   custo de get+record em memória e no SQLite. Redis só se o pacote estiver
+   instalado e SESSION_REDIS_URL responder
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_sessions
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fakes import FakeFirestore, StubChain, install, install_llm
+from benchmarks.synthetic import generate
+
+_CONVERSATION = (
+    # (pergunta, intent esperada, trecho esperado na resposta)
+    ("qual a média do pH hoje?", "avg_value", "Média de pH"),
+    ("e ontem?", "avg_value", "Média de pH"),
+    ("e a turbidez?", "avg_value", "Média de turbidez"),
+    ("e a máxima?", "max_value", "maior valor de turbidez"),
+    ("e nos últimos 7 dias?", "max_value", "maior valor de turbidez"),
+    ("qual a mínima?", "min_value", "menor valor de turbidez"),
+    ("como eu calibro o sensor?", "general_help", "calibrar"),
+    ("e o pH?", "min_value", "menor valor de pH"),
+)
+
+_LONG_ANSWER = (
+    "Para calibrar o sensor de pH, lave o eletrodo com água destilada, seque sem esfregar e "
+    "mergulhe primeiro na solução pH 7; espere a leitura estabilizar e confirme. Depois lave de "
+    "novo e repita com a solução pH 4. Faça isso a cada duas semanas ou quando as leituras "
+    "parecerem estranhas, e guarde o eletrodo sempre úmido na solução de armazenamento. "
+) * 2
+
+
+async def run(args) -> None:
+    store = FakeFirestore()
+    install(store)
+
+    from app.chat_session import SessionStore, SqliteSessionBackend, estimate_tokens
+    from app.config import get_settings
+    from app.intent_rules import resolve_followup
+    from app.models import QueryIntent, QueryIntentType
+
+    settings = get_settings()
+    settings.INGEST_WRITE_BEHIND_ENABLED = False
+    settings.SPECULATIVE_PREFETCH_ENABLED = False
+    settings.INTENT_CACHE_ENABLED = False
+
+    # a LLM de intenção só reconhece a pergunta de ajuda; continuações soltas viram ajuda geral
+    help_intent = QueryIntent(intent=QueryIntentType.GENERAL_HELP)
+    intent_chain = StubChain(lambda _: help_intent.model_copy())
+    prompt_tokens = []
+
+    def help_answer(inputs):
+        prompt_tokens.append(sum(estimate_tokens(text) for _, text in inputs.get("history", ())))
+        return _LONG_ANSWER
+
+    install_llm(intent_chain, StubChain(help_answer))
+
+    device = generate(1, 10, 10 * 288, seed=3)[0]
+    store.add_columns(settings.FIRESTORE_TELEMETRY_COLLECTION, device)
+    dev, site = device.device_id, device.site_id
+
+    import app.main as main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def ask(session_id: str, message: str):
+            response = await client.post("/chat", json={
+                "session_id": session_id, "message": message, "device_id": dev, "site_id": site,
+            })
+            assert response.status_code == 200, response.text
+            return response.json()
+
+        # 1) continuações
+        calls = {}
+        for with_session in (False, True):
+            intent_chain.calls = 0
+            correct = 0
+            t0 = time.perf_counter()
+            for i, (question, intent, snippet) in enumerate(_CONVERSATION):
+                body = await ask("conversa" if with_session else f"solta-{i}", question)
+                ok = body["intent"] == intent and snippet in body["answer"]
+                assert ok or not with_session, (question, body)
+                correct += ok
+            calls[with_session] = (intent_chain.calls, correct, time.perf_counter() - t0)
+        # com sessão só a pergunta de ajuda vai para a LLM; sem ela, "e ontem?" vai (e as
+        # continuações que as regras pegam sozinhas respondem outra coisa)
+        assert calls[True][:2] == (1, len(_CONVERSATION)) and calls[False][0] > 1, calls
+
+        # 2) histórico compactado
+        prompt_tokens.clear()
+        for _ in range(args.turns):
+            await ask("longa", "como eu calibro o sensor?")
+        ring = main.session_store._sessions["longa"].messages
+        full_tokens = sum(estimate_tokens(text) for _, text in ring)
+        assert max(prompt_tokens) <= settings.CHAT_HISTORY_TOKEN_BUDGET, max(prompt_tokens)
+        stats = (await client.get("/stats/sessions")).json()
+        assert (await client.delete("/sessions/longa")).status_code == 204
+
+    # 3) LRU e TTL
+    lru = SessionStore(max_sessions=1000, ttl_seconds=3600, max_messages=10)
+    for i in range(5000):
+        await lru.record(await lru.get(f"s{i}"), "oi", "olá", help_intent)
+    assert lru.stats()["size"] == 1000 and lru.stats()["evictions"] == 4000
+    ttl = SessionStore(max_sessions=1000, ttl_seconds=0.05, max_messages=10)
+    await ttl.record(await ttl.get("s"), "oi", "olá", help_intent)
+    await asyncio.sleep(0.1)
+    assert not (await ttl.get("s")).messages and ttl.stats()["expirations"] == 1
+
+    # 4) SQLite: reinício no meio da conversa
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.sqlite3")
+        first = SessionStore(backend=SqliteSessionBackend(path))
+        session = await first.get("s")
+        avg = QueryIntent(intent=QueryIntentType.AVG_VALUE, parameter="ph", days=7)
+        await first.record(session, "média do pH na semana?", "Média de pH ...", avg)
+        restarted = SessionStore(backend=SqliteSessionBackend(path))
+        loaded = await restarted.get("s")
+        follow = resolve_followup("e a temperatura?", loaded.last_intent)
+        assert len(loaded.messages) == 2 and follow.parameter.value == "temperature" and follow.days == 7
+
+        costs = {}
+        stores = (("memória", SessionStore()), ("sqlite", SessionStore(backend=SqliteSessionBackend(path))))
+        for name, s in stores:
+            n = args.ops
+            t0 = time.perf_counter()
+            for i in range(n):
+                sess = await s.get(f"u{i % 200}")
+                await s.record(sess, "qual a média do pH hoje?", "Média de pH no período: 7.10pH.", avg)
+            costs[name] = (time.perf_counter() - t0) / n * 1e6
+
+    redis_note = "pacote redis não instalado: não medido"
+    try:
+        import redis  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        from app.chat_session import RedisSessionBackend
+
+        try:
+            rs = SessionStore(backend=RedisSessionBackend(settings.SESSION_REDIS_URL))
+            sess = await rs.get("bench")
+            await rs.record(sess, "oi", "olá", avg)
+            assert (await rs.get("bench")).last_intent is not None
+            await rs.delete("bench")
+            redis_note = f"ok em {settings.SESSION_REDIS_URL}"
+        except Exception as e:
+            redis_note = f"{settings.SESSION_REDIS_URL} indisponível ({type(e).__name__})"
+
+    print(f"conversa de {len(_CONVERSATION)} perguntas (1 de ajuda geral)")
+    for with_session in (False, True):
+        n, correct, s = calls[with_session]
+        print(f"  {'com sessão' if with_session else 'sem sessão':>12}: {n} classificações na LLM, "
+              f"{correct}/{len(_CONVERSATION)} respostas ao que foi pedido, {s * 1e3:.0f} ms")
+    print(f"histórico em {args.turns} turnos de ajuda geral (resposta de ~{estimate_tokens(_LONG_ANSWER)} tokens):")
+    print(f"  anel de {settings.MAX_HISTORY_MESSAGES} mensagens: {full_tokens} tokens; enviados à LLM: "
+          f"turno 1 = {prompt_tokens[0]}, 2 = {prompt_tokens[1]}, máx = {max(prompt_tokens)} "
+          f"(orçamento {settings.CHAT_HISTORY_TOKEN_BUDGET})")
+    print(f"  /stats/sessions: {stats}")
+    print("LRU: 5000 sessões -> 1000 em memória, 4000 descartadas; TTL: sessão parada expira")
+    print(f"get+record: memória {costs['memória']:.1f} µs, sqlite {costs['sqlite']:.1f} µs; "
+          "SQLite sobrevive ao reinício")
+    print(f"redis: {redis_note}")
+    print("  OK: continuações sem LLM, histórico limitado ao orçamento de tokens")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--ops", type=int, default=2000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
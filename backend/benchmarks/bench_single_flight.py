@@ -0,0 +1,189 @@
+"""
+Single-flight das leituras de telemetria (single_flight.py): N requisições
+idênticas e simultâneas -> uma consulta ao Firestore (fake com latência).
+
+Cenários conferidos (cache de séries desligado, salvo no 6):
+1) N threads em get_telemetry_range, com `end` espalhado por ~2 s dentro da
+   mesma janela de arredondamento -> 1 consulta
+2) N tasks em aget_telemetry_range e aget_latest_telemetry -> 1 cada
+3) threads (to_thread) e tasks misturadas na mesma chave -> 1 consulta
+4) a requisição que iniciou a consulta é cancelada -> uma das outras
+   assume e todas recebem a série
+5) erro no store -> todas recebem a exceção; a chamada seguinte consulta de novo
+6) cache de séries ligado e vazio: N aget_telemetry_range, cada um com o
+   seu `end` -> 1 carga (o cache junta os preenchimentos da série)
+7) N POST /chat "média do pH hoje" simultâneos, com e sem single-flight,
+   com o cache desligado e com a configuração padrão (cache ligado)
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_single_flight
+    python -m benchmarks.bench_single_flight --callers 200 --firestore-latency 0.1
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from benchmarks.fakes import FakeFirestore, StubChain, install, install_llm
+from benchmarks.synthetic import generate
+
+
+async def run(args) -> None:
+    store = FakeFirestore(latency_s=args.firestore_latency)
+    install(store)
+
+    from app.config import get_settings
+    from app.models import QueryIntent, QueryIntentType, WaterParameter
+
+    settings = get_settings()
+    settings.INGEST_WRITE_BEHIND_ENABLED = False
+    settings.TELEMETRY_CACHE_ENABLED = False
+    settings.SPECULATIVE_PREFETCH_ENABLED = False
+    settings.SINGLE_FLIGHT_GRANULARITY_SECONDS = 5
+    install_llm(
+        StubChain(lambda _: QueryIntent(intent=QueryIntentType.AVG_VALUE, parameter=WaterParameter.PH)),
+        StubChain(lambda _: ""),
+    )
+
+    device = generate(1, 2, 2 * 1440, seed=7)[0]  # 1 envio/min
+    store.add_columns(settings.FIRESTORE_TELEMETRY_COLLECTION, device)
+    dev, site, ph = device.device_id, device.site_id, WaterParameter.PH
+
+    import app.telemetry_repository as repo
+    from app.main import app
+
+    n = args.callers
+    # `end` de cada chamador entre +1 s e +3 s de um múltiplo de 5 s: mesma chave arredondada
+    now = datetime.now(timezone.utc)
+    base = now.replace(second=now.second - now.second % 5, microsecond=0)
+    ends = [base + timedelta(seconds=1 + 2 * i / n) for i in range(n)]
+    start_of = lambda end: end - timedelta(hours=24)  # noqa: E731
+
+    def reset() -> None:
+        store.queries = 0
+
+    # 1) threads
+    reset()
+    barrier = threading.Barrier(n)
+
+    def call(end: datetime):
+        barrier.wait()
+        return repo.get_telemetry_range(dev, site, ph, start_of(end), end)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        results = list(pool.map(call, ends))
+    threads_s = time.perf_counter() - t0
+    assert store.queries == 1, store.queries
+    assert len({id(r) for r in results}) == 1 and len(results[0]) > 1000
+    threads_q = store.queries
+
+    # 2) asyncio
+    reset()
+    t0 = time.perf_counter()
+    series = await asyncio.gather(*(repo.aget_telemetry_range(dev, site, ph, start_of(e), e) for e in ends))
+    async_s = time.perf_counter() - t0
+    assert store.queries == 1, store.queries
+    assert all(s is series[0] for s in series)
+    reset()
+    latest = await asyncio.gather(*(repo.aget_latest_telemetry(dev, site) for _ in range(n)))
+    assert store.queries == 1 and latest[0].id == device.doc_id(len(device) - 1)
+
+    # 3) threads e tasks na mesma chave (pool com uma thread por chamador: com o padrão de
+    # min(32, CPUs + 4) elas rodariam em ondas, e cada onda seria uma consulta nova)
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=n))
+    reset()
+    half = n // 2
+    mixed = await asyncio.gather(
+        *(asyncio.to_thread(repo.get_telemetry_range, dev, site, ph, start_of(e), e) for e in ends[:half]),
+        *(repo.aget_telemetry_range(dev, site, ph, start_of(e), e) for e in ends[half:]),
+    )
+    assert store.queries == 1, store.queries
+    assert len({len(s) for s in mixed}) == 1
+
+    # 4) quem iniciou é cancelado
+    reset()
+    first = asyncio.ensure_future(repo.aget_telemetry_range(dev, site, ph, start_of(ends[0]), ends[0]))
+    await asyncio.sleep(0)
+    others = [asyncio.ensure_future(repo.aget_telemetry_range(dev, site, ph, start_of(e), e)) for e in ends[1:]]
+    await asyncio.sleep(0)
+    first.cancel()
+    survivors = await asyncio.gather(*others)
+    assert first.cancelled() and store.queries == 1
+    assert all(len(s) == len(survivors[0]) > 1000 for s in survivors)
+
+    # 5) erro no store
+    reset()
+    original = repo.store.arange_series
+
+    async def failing(*a, **kw):
+        await asyncio.sleep(args.firestore_latency)
+        raise RuntimeError("Firestore indisponível")
+
+    repo.store.arange_series = failing
+    errors = await asyncio.gather(
+        *(repo.aget_telemetry_range(dev, site, ph, start_of(e), e) for e in ends), return_exceptions=True
+    )
+    repo.store.arange_series = original
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    assert repo.query_flights.stats()["in_flight"] == 0
+    await repo.aget_telemetry_range(dev, site, ph, start_of(ends[0]), ends[0])
+    assert store.queries == 1  # só a chamada depois do erro chegou ao store
+
+    # 6) cache de séries: cargas simultâneas do mesmo trecho
+    settings.TELEMETRY_CACHE_ENABLED = True
+    repo.series_cache.clear()
+    reset()
+    await asyncio.gather(*(repo.aget_telemetry_range(dev, site, ph, start_of(e), e) for e in ends))
+    cache_q = store.queries
+    assert cache_q == 1, cache_q
+    settings.TELEMETRY_CACHE_ENABLED = False
+
+    # 7) /chat de ponta a ponta
+    transport = httpx.ASGITransport(app=app)
+    chat = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for cache, enabled in ((False, False), (False, True), (True, False), (True, True)):
+            settings.TELEMETRY_CACHE_ENABLED = cache
+            settings.SINGLE_FLIGHT_ENABLED = enabled
+            repo.series_cache.clear()
+            # o "hoje" vem de now(): começa longe da virada da janela de 5 s
+            await asyncio.sleep((0.5 - time.time()) % 5)
+            reset()
+            t0 = time.perf_counter()
+            responses = await asyncio.gather(*(client.post("/chat", json={
+                "session_id": f"s{i}", "message": "qual a média do pH hoje?", "device_id": dev, "site_id": site,
+            }) for i in range(n)))
+            assert all(r.status_code == 200 for r in responses), responses[0].text
+            chat[cache, enabled] = (store.queries, time.perf_counter() - t0, len({r.json()["answer"] for r in responses}))
+        stats = (await client.get("/stats/single-flight")).json()
+
+    print(f"{n} chamadores simultâneos, Firestore fake com {args.firestore_latency * 1e3:.0f} ms por consulta")
+    print(f"  threads:       {threads_q} consulta em {threads_s * 1e3:.0f} ms")
+    print(f"  asyncio:       1 consulta em {async_s * 1e3:.0f} ms (última leitura: 1 consulta)")
+    print("  misturado:     1 consulta; cancelado o líder, os demais recebem a série")
+    print(f"  erro:          {n} exceções de 1 consulta, a seguinte consulta de novo; cache: {cache_q} carga")
+    print(f"{'/chat':>15} {'cache':>6} {'consultas':>10} {'ms':>8} {'respostas distintas':>20}")
+    for (cache, enabled), (q, s, answers) in chat.items():
+        print(f"{'single-flight' if enabled else 'sem':>15} {'sim' if cache else 'não':>6} {q:>10} "
+              f"{s * 1e3:>8.0f} {answers:>20}")
+    print(f"  /stats/single-flight: {stats}")
+    assert chat[False, False][0] == n and chat[False, True][0] == 1 and chat[True, True][0] == 1, chat
+    print("  OK: uma leitura por consulta idêntica em threads, asyncio e misturado; cancelamento e erro isolados")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--callers", type=int, default=50)
+    parser.add_argument("--firestore-latency", type=float, default=0.05)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Cold start do backend: tempo de import de app.main (python -X importtime) e
+tempo até o primeiro GET /health respondido por um uvicorn recém-iniciado.
+
+Cada medição roda num processo novo, então o cache de módulos não ajuda.
+Não precisa de Firestore nem Ollama (os clientes só são criados no primeiro uso).
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 5 --top 15 --warmup
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("langchain", "langgraph", "ollama", "google.cloud", "grpc")
+
+
+def import_time() -> Tuple[float, List[Tuple[int, str]]]:
+    """
+    (total em s, [(cumulativo em µs, módulo), ...]) de `import app.main`.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((int(cumulative), name.rstrip()))
+    total = next(c for c, name in modules if name.strip() == "app.main")
+    return total / 1e6, modules
+
+
+def heavy_modules_loaded() -> List[str]:
+    """
+    Quais pacotes de HEAVY já estão carregados logo após `import app.main`.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-c", "import sys, app.main; print('\\n'.join(sys.modules))"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = proc.stdout.split()
+    return [h for h in HEAVY if any(m == h or m.startswith(h + ".") for m in loaded)]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_health(warmup: bool, timeout: float = 60.0) -> float:
+    port = _free_port()
+    env = dict(os.environ, OLLAMA_WARMUP_ENABLED="true" if warmup else "false")
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - t0 < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - t0
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise TimeoutError("o /health não respondeu a tempo")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def run(repeat: int, warmup: bool) -> Dict:
+    imports = [import_time() for _ in range(repeat)]
+    health = [time_to_health(warmup) for _ in range(repeat)]
+    return {
+        "import_s": statistics.median(t for t, _ in imports),
+        "modules": imports[-1][1],
+        "health_s": statistics.median(health),
+        "heavy": heavy_modules_loaded(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--warmup", action="store_true", help="liga OLLAMA_WARMUP_ENABLED no uvicorn")
+    args = parser.parse_args()
+
+    r = run(args.repeat, args.warmup)
+    print(f"import app.main:           {r['import_s'] * 1e3:8.1f} ms (mediana de {args.repeat})")
+    print(f"uvicorn até 1º /health:    {r['health_s'] * 1e3:8.1f} ms (warm-up {'ligado' if args.warmup else 'desligado'})")
+    print(f"pacotes pesados no import: {', '.join(r['heavy']) or 'nenhum'}")
+    print("\nmaiores imports (cumulativo):")
+    for cumulative, name in sorted(r["modules"], reverse=True)[1:args.top + 1]:
+        print(f"  {cumulative / 1e3:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
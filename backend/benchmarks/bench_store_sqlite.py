@@ -0,0 +1,124 @@
+"""
+Benchmark: estatísticas de janelas longas no SQLiteTelemetryStore (agregação
+em SQL sobre o índice (device_id, site_id, parameter, ts_us, value)) vs ler a
+série e calcular com NumPy (o que o caminho do Firestore faz).
+
+Roda sem credenciais: o banco é um arquivo temporário.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_store_sqlite
+    python -m benchmarks.bench_store_sqlite --days 7 30 90 --interval 60
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+from app.models import WaterParameter
+from app.telemetry_series import extreme_in_series, summarize_series
+from app.telemetry_store_sqlite import SQLiteTelemetryStore
+
+DEVICE_ID = "esp32-agua-01"
+SITE_ID = "fazenda-x_rio-igarape"
+PARAMS = [("pH", "pH", 7.0), ("temperature", "°C", 26.0), ("turbidity", "NTU", 3.0), ("tds", "ppm", 180.0)]
+END = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def seed(store: SQLiteTelemetryStore, days: int, interval_s: int) -> int:
+    rnd = random.Random(42)
+    total = days * 86400 // interval_s
+    docs = []
+    for i in range(total):
+        docs.append((store.new_id(), {
+            "device_id": DEVICE_ID,
+            "site_id": SITE_ID,
+            "sent_at": END - timedelta(seconds=interval_s * i),
+            "measurements": [
+                {"parameter": p, "value": round(base + rnd.gauss(0, base * 0.02), 3), "unit": unit}
+                for p, unit, base in PARAMS
+            ],
+        }))
+        if len(docs) == 5000:
+            store.insert(docs)
+            docs = []
+    store.insert(docs)
+    return total
+
+
+def _best_of(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(days_list: List[int], interval_s: int, repeat: int) -> List[Dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteTelemetryStore(os.path.join(tmp, "telemetry.sqlite3"))
+        t0 = time.perf_counter()
+        docs = seed(store, max(days_list), interval_s)
+        seed_s = time.perf_counter() - t0
+        print(f"seed: {docs} envios ({docs * len(PARAMS)} medições) em {seed_s:.1f} s "
+              f"({docs / seed_s:,.0f} envios/s)")
+
+        for days in days_list:
+            start = END - timedelta(days=days)
+            args = (DEVICE_ID, SITE_ID, WaterParameter.PH, start, END)
+
+            sql = _best_of(
+                lambda: (
+                    store.summarize(*args),
+                    store.extreme(*args, "max"),
+                    store.extreme(*args, "min"),
+                ),
+                repeat,
+            )
+
+            def scan():
+                series = store.range_series(*args)
+                return (
+                    summarize_series(series),
+                    extreme_in_series(series, "max"),
+                    extreme_in_series(series, "min"),
+                )
+
+            numpy = _best_of(scan, repeat)
+
+            # sanity: mesmos resultados (média pode diferir nos últimos ulps)
+            a, (b, b_max, b_min) = store.summarize(*args), scan()
+            assert (a["count"], a["min"], a["max"], a["start"], a["end"], a["unit"]) == (
+                b["count"], b["min"], b["max"], b["start"], b["end"], b["unit"]
+            )
+            assert abs(a["avg"] - b["avg"]) <= 1e-9 * abs(b["avg"])
+            assert store.extreme(*args, "max") == b_max
+            assert store.extreme(*args, "min") == b_min
+
+            results.append({"days": days, "points": a["count"], "sql_s": sql, "scan_s": numpy})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, nargs="+", default=[1, 7, 30, 90])
+    parser.add_argument("--interval", type=int, default=60, help="segundos entre envios")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'dias':>6} {'pontos':>9} {'sql (ms)':>10} {'leitura+numpy (ms)':>19} {'speedup':>8}")
+    for r in run(args.days, args.interval, args.repeat):
+        print(
+            f"{r['days']:>6} {r['points']:>9} {r['sql_s'] * 1e3:>10.2f} "
+            f"{r['scan_s'] * 1e3:>19.2f} {r['scan_s'] / r['sql_s']:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Tendência (reta de mínimos quadrados) e início da queda (Page-Hinkley) em
+60 dias de leituras por minuto: tempo por pergunta em cada caminho
+(pontos, cache em memória, rollups por hora do SQLite, Page-Hinkley).
+
+A exatidão contra np.polyfit (1e-9) e o Page-Hinkley online == vetorizado
+ficam em tests/test_telemetry_trend.py, que usa make_ph/seed_store daqui.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_trend
+    python -m benchmarks.bench_trend --days 90 --drop-day 80
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+import numpy as np
+
+from app.models import WaterParameter
+from app.telemetry_cache import TelemetrySeriesCache
+from app.telemetry_store_sqlite import SQLiteTelemetryStore
+from app.telemetry_trend import change_point_in_series, trend_in_series
+
+DEVICE_ID = "esp32-agua-01"
+SITE_ID = "fazenda-x_rio-igarape"
+END = datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+
+def make_ph(days: int, drop_day: float, seed: int = 7):
+    """
+    pH por minuto: ciclo diário + ruído, caindo 0.1/dia a partir de drop_day.
+    """
+    rnd = np.random.default_rng(seed)
+    n = days * 1440
+    t_s = np.arange(n, dtype=np.float64) * 60
+    day = t_s / 86400
+    ph = 7.4 + 0.05 * np.sin(2 * np.pi * day) + rnd.normal(0, 0.02, n)
+    ph -= 0.1 * np.clip(day - drop_day, 0, None)
+    start = END - timedelta(minutes=n - 1)
+    return [start + timedelta(minutes=i) for i in range(n)], np.round(ph, 4)
+
+
+def seed_store(store: SQLiteTelemetryStore, times, values) -> None:
+    docs = []
+    for ts, v in zip(times, values):
+        docs.append((store.new_id(), {
+            "device_id": DEVICE_ID,
+            "site_id": SITE_ID,
+            "sent_at": ts,
+            "measurements": [{"parameter": "pH", "value": float(v), "unit": "pH"}],
+        }))
+        if len(docs) == 5000:
+            store.insert(docs)
+            docs = []
+    store.insert(docs)
+
+
+def _best_of(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(args) -> None:
+    times, values = make_ph(args.days, args.drop_day)
+    n = len(values)
+
+    # janela com pontas quebradas (não alinhadas a minuto/hora/dia)
+    start = times[0] + timedelta(minutes=3, seconds=17)
+    end = times[-1] - timedelta(minutes=95, seconds=40)
+
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        t_seed = time.perf_counter()
+        store = SQLiteTelemetryStore(path)
+        seed_store(store, times, values)
+        seed_s = time.perf_counter() - t_seed
+
+        cache = TelemetrySeriesCache(loader=store.range_rows, max_bytes=1 << 30, refresh_seconds=3600)
+        series = store.range_series(DEVICE_ID, SITE_ID, WaterParameter.PH, start, end)
+        trend = store.trend(DEVICE_ID, SITE_ID, WaterParameter.PH, start, end)
+        change = change_point_in_series(series, "down")
+        drop_at = times[0] + timedelta(days=args.drop_day)
+        error_h = (change["sent_at"] - drop_at).total_seconds() / 3600
+
+        # tempo por pergunta
+        repeat = args.repeat
+        timings = {
+            "série + trend_in_series": _best_of(
+                lambda: trend_in_series(store.range_series(DEVICE_ID, SITE_ID, WaterParameter.PH, start, end)),
+                repeat,
+            ),
+            "trend_in_series (memória)": _best_of(lambda: trend_in_series(series), repeat),
+            "cache (rollups)": _best_of(
+                lambda: cache.trend(DEVICE_ID, SITE_ID, WaterParameter.PH, start, end), repeat
+            ),
+            "SQLite (rollups)": _best_of(
+                lambda: store.trend(DEVICE_ID, SITE_ID, WaterParameter.PH, start, end), repeat
+            ),
+            "Page-Hinkley vetorizado": _best_of(lambda: change_point_in_series(series, "down"), repeat),
+        }
+    finally:
+        os.remove(path)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    print(f"{n} leituras ({args.days} dias, 1/min), queda a partir do dia {args.drop_day:g}; carga {seed_s:.1f} s")
+    print(f"{'caminho':>28} {'ms/pergunta':>12}")
+    for name, s in timings.items():
+        print(f"{name:>28} {s * 1e3:>12.2f}")
+    print(
+        f"  inclinação {trend['slope_per_hour'] * 24:+.4f} pH/dia; "
+        f"queda detectada em {change['sent_at']:%Y-%m-%d %H:%M} ({error_h:+.1f} h do início real)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--drop-day", type=float, default=52.5)
+    parser.add_argument("--repeat", type=int, default=5)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Tamanho e custo de decodificação dos formatos de upload de telemetria.
+
+- firestore-rest: um envelope REST do Firestore por leitura (o que o firmware envia hoje)
+- json-batch:     POST /telemetry/batch em JSON (TelemetryBatchRequest)
+- msgpack:        telemetry_wire v1 com valores float
+- msgpack-k:      telemetry_wire v1 com valores inteiros escalados ("k")
+
+A decodificação vai até o formato colunar do cache de séries, que é o que
+a ingestão precisa no fim.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_wire_format
+    python -m benchmarks.bench_wire_format --readings 1 10 100 1000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+import orjson
+
+from app.models import TelemetryBatchRequest, WaterParameter
+from app.telemetry_cache import _SeriesColumns
+from app.telemetry_store import data_to_row
+from app.telemetry_wire import (
+    DEFAULT_UNITS,
+    WIRE_NAMES,
+    batch_columns,
+    decode_batches,
+    encode_batch,
+)
+
+DEVICE_ID = "esp32-agua-01"
+SITE_ID = "fazenda-x_rio-igarape"
+DECIMALS = {
+    WaterParameter.PH: 2,
+    WaterParameter.TEMPERATURE: 2,
+    WaterParameter.TURBIDITY: 1,
+    WaterParameter.TDS: 0,
+}
+
+
+def _samples(n: int) -> List[Dict]:
+    rnd = random.Random(n)
+    start = datetime(2025, 1, 10, tzinfo=timezone.utc)
+    return [
+        {
+            "sent_at": start + timedelta(seconds=60 * i),
+            "values": {
+                WaterParameter.PH: round(rnd.uniform(6.5, 8.0), 2),
+                WaterParameter.TEMPERATURE: round(rnd.uniform(24, 29), 2),
+                WaterParameter.TURBIDITY: round(rnd.uniform(1, 8), 1),
+                WaterParameter.TDS: float(rnd.randint(120, 260)),
+            },
+        }
+        for i in range(n)
+    ]
+
+
+def _firestore_rest(samples: List[Dict]) -> List[bytes]:
+    # mesmo envelope de buildFirestorePayload (sem os campos raw/method/power/fw)
+    out = []
+    for seq, s in enumerate(samples):
+        fields = {
+            "version": {"stringValue": "1.0.0"},
+            "msg_type": {"stringValue": "telemetry"},
+            "device_id": {"stringValue": DEVICE_ID},
+            "site_id": {"stringValue": SITE_ID},
+            "sent_at": {"timestampValue": s["sent_at"].isoformat().replace("+00:00", "Z")},
+            "seq": {"integerValue": str(seq)},
+            "measurements": {"arrayValue": {"values": [
+                {"mapValue": {"fields": {
+                    "parameter": {"stringValue": WIRE_NAMES[p]},
+                    "value": {"doubleValue": v},
+                    "unit": {"stringValue": DEFAULT_UNITS[p]},
+                }}}
+                for p, v in s["values"].items()
+            ]}},
+        }
+        out.append(json.dumps({"fields": fields}, ensure_ascii=False).encode())
+    return out
+
+
+def _json_batch(samples: List[Dict]) -> bytes:
+    return orjson.dumps({
+        "device_id": DEVICE_ID,
+        "site_id": SITE_ID,
+        "readings": [
+            {
+                "sent_at": s["sent_at"].isoformat(),
+                "seq": seq,
+                "measurements": [
+                    {"parameter": WIRE_NAMES[p], "value": v, "unit": DEFAULT_UNITS[p]}
+                    for p, v in s["values"].items()
+                ],
+            }
+            for seq, s in enumerate(samples)
+        ],
+    })
+
+
+def _msgpack(samples: List[Dict], scaled: bool) -> bytes:
+    return encode_batch(
+        DEVICE_ID,
+        SITE_ID,
+        [int(s["sent_at"].timestamp() * 1000) for s in samples],
+        {p: [s["values"][p] for s in samples] for p in WaterParameter},
+        decimals=DECIMALS if scaled else None,
+        seq0=0,
+    )
+
+
+# ---------------- decodificação até o formato colunar ----------------
+
+def _decode_firestore_rest(payloads: List[bytes]):
+    rows = []
+    for raw in payloads:
+        f = orjson.loads(raw)["fields"]
+        rows.append(data_to_row({
+            "sent_at": datetime.fromisoformat(f["sent_at"]["timestampValue"]),
+            "measurements": [
+                {k: next(iter(v.values())) for k, v in m["mapValue"]["fields"].items()}
+                for m in f["measurements"]["arrayValue"]["values"]
+            ],
+        }))
+    return _SeriesColumns._columns_from_rows(rows)
+
+
+def _decode_json_batch(payload: bytes):
+    req = TelemetryBatchRequest.model_validate_json(payload)
+    rows = [
+        data_to_row({"sent_at": r.sent_at, "measurements": [m.model_dump() for m in r.measurements]})
+        for r in req.readings
+    ]
+    return _SeriesColumns._columns_from_rows(rows)
+
+
+def _decode_msgpack(payload: bytes):
+    return [batch_columns(b) for b in decode_batches(payload)]
+
+
+def _time_per_call(fn: Callable[[], object], min_seconds: float = 0.3) -> float:
+    calls = 0
+    t0 = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_seconds:
+            return elapsed / calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readings", type=int, nargs="+", default=[1, 10, 100, 1000])
+    args = parser.parse_args()
+
+    print(f"{'leituras':>8} {'formato':>15} {'bytes':>9} {'B/leitura':>10} {'decode µs':>10} {'leituras/s':>11}")
+    for n in args.readings:
+        samples = _samples(n)
+        rest = _firestore_rest(samples)
+        json_batch = _json_batch(samples)
+        mp = _msgpack(samples, scaled=False)
+        mpk = _msgpack(samples, scaled=True)
+
+        # o msgpack precisa decodificar para os mesmos valores do JSON
+        ref_ts, ref_values, _ = _decode_json_batch(json_batch)
+        for payload in (mp, mpk):
+            ts, values, _ = _decode_msgpack(payload)[0]
+            assert list(ts) == list(ref_ts)
+            assert all(list(values[p]) == list(ref_values[p]) for p in WaterParameter)
+
+        cases = [
+            ("firestore-rest", sum(len(p) for p in rest), lambda: _decode_firestore_rest(rest)),
+            ("json-batch", len(json_batch), lambda: _decode_json_batch(json_batch)),
+            ("msgpack", len(mp), lambda: _decode_msgpack(mp)),
+            ("msgpack-k", len(mpk), lambda: _decode_msgpack(mpk)),
+        ]
+        for name, size, decode in cases:
+            per_call = _time_per_call(decode)
+            print(
+                f"{n:>8} {name:>15} {size:>9} {size / n:>10.1f} "
+                f"{per_call * 1e6:>10.1f} {n / per_call:>11.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
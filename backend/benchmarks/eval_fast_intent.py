@@ -0,0 +1,120 @@
+"""
+Avaliação offline do classificador por regras (app.intent_rules).
+
+Para cada mensagem do corpus rotulado (benchmarks/data/intent_corpus.jsonl)
+e do conjunto separado (intent_heldout.jsonl, frases escritas sem olhar as
+regex, ex. "mês passado", "semana passada", "de manhã"):
+- cobertura: fração respondida sem LLM (confiança >= limiar)
+- acurácia no que foi respondido (intent, parâmetro e days). Linhas com
+  "explicit_period": true precisam de start/end (período de calendário),
+  então qualquer resposta das regras a elas conta como erro
+- latência de CPU por mensagem
+- opcionalmente (--llm) a mesma acurácia para classify_intent (Ollama real)
+
+Uso (a partir de backend/):
+    python -m benchmarks.eval_fast_intent
+    python -m benchmarks.eval_fast_intent --threshold 0.9 --llm --verbose
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.intent_rules import classify_intent_fast
+from app.models import QueryIntent
+
+CORPUS = Path(__file__).resolve().parent / "data" / "intent_corpus.jsonl"
+HELDOUT = Path(__file__).resolve().parent / "data" / "intent_heldout.jsonl"
+
+
+def load_corpus(path: Path = CORPUS) -> List[Dict]:
+    with path.open(encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _matches(intent: Optional[QueryIntent], label: Dict) -> bool:
+    if intent is None or (label.get("explicit_period") and intent.start is None):
+        return False
+    param = intent.parameter.value if intent.parameter else None
+    return (
+        intent.intent.value == label["intent"]
+        and param == label["parameter"]
+        and intent.days == label["days"]
+    )
+
+
+def evaluate_rules(corpus: List[Dict], threshold: float, verbose: bool) -> Dict:
+    accepted = correct = 0
+    cpu_us: List[float] = []
+    for row in corpus:
+        t0 = time.process_time_ns()
+        result = classify_intent_fast(row["message"])
+        cpu_us.append((time.process_time_ns() - t0) / 1e3)
+
+        if result.confidence < threshold:
+            if verbose:
+                print(f"  [LLM ] {row['message']!r} (conf {result.confidence:.2f})")
+            continue
+        accepted += 1
+        ok = _matches(result.intent, row)
+        correct += ok
+        if verbose and not ok:
+            print(f"  [ERRO] {row['message']!r} -> {result.intent} esperado {row}")
+
+    cpu_us.sort()
+    return {
+        "messages": len(corpus),
+        "coverage": accepted / len(corpus),
+        "accuracy": correct / accepted if accepted else 0.0,
+        "cpu_mean_us": statistics.mean(cpu_us),
+        "cpu_p99_us": cpu_us[int(0.99 * (len(cpu_us) - 1))],
+    }
+
+
+def evaluate_llm(corpus: List[Dict]) -> Dict:
+    from app.llm.intent_agent import classify_intent
+
+    correct = 0
+    latencies: List[float] = []
+    for row in corpus:
+        t0 = time.perf_counter()
+        try:
+            intent = classify_intent(row["message"])
+        except Exception:  # saída inválida do modelo conta como erro
+            intent = None
+        latencies.append(time.perf_counter() - t0)
+        correct += _matches(intent, row)
+    return {
+        "accuracy": correct / len(corpus),
+        "latency_mean_ms": statistics.mean(latencies) * 1e3,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--llm", action="store_true", help="compara com classify_intent (Ollama)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    for name, path in (("corpus", CORPUS), ("separado", HELDOUT)):
+        corpus = load_corpus(path)
+        rules = evaluate_rules(corpus, args.threshold, args.verbose)
+        print(f"regras, {name} ({rules['messages']} mensagens, limiar {args.threshold}):")
+        print(
+            f"  cobertura {rules['coverage']:.1%} | acurácia {rules['accuracy']:.1%} | "
+            f"CPU média {rules['cpu_mean_us']:.0f} µs, p99 {rules['cpu_p99_us']:.0f} µs"
+        )
+
+        if args.llm:
+            llm = evaluate_llm(corpus)
+            print("LLM (classify_intent):")
+            print(f"  acurácia {llm['accuracy']:.1%} | latência média {llm['latency_mean_ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
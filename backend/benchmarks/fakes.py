@@ -0,0 +1,441 @@
+"""
+Fakes em memória para benchmarks/load tests (sem Firestore nem Ollama).
+
+- FakeFirestore: coleção com where/order_by/limit_to_last/get/stream, leitura
+  pontual (document(id).get()) e WriteBatch (set com merge/commit, máx. 500
+  operações), em versão síncrona (Client) e assíncrona (AsyncClient), com
+  latência configurável por consulta/commit. Blocos em colunas
+  (add_columns, ex. synthetic.SyntheticSeries) atendem consultas por
+  device/site + intervalo de sent_at com busca binária, materializando só os
+  documentos do resultado: dá para ter milhões de leituras em memória.
+- StubChain: substitui as chains LangChain (invoke/ainvoke/astream) com latência
+  fixa até o primeiro token e por token.
+- FakeSnapshotSource: substitui watch_latest_telemetry (on_snapshot) no hub de streaming.
+- FakeMqttBroker: broker MQTT em processo (publish/subscribe com + e #).
+
+install() precisa rodar antes da primeira consulta (os clientes do Firestore são
+criados no primeiro uso).
+"""
+from __future__ import annotations
+
+import asyncio
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_OPS: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": lambda a, b: a == b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    "<": lambda a, b: a is not None and a < b,
+}
+# limites de sent_at num bloco em colunas: (lado do searchsorted, é limite inferior)
+_BOUNDS = {">=": ("left", True), ">": ("right", True), "<=": ("right", False), "<": ("left", False)}
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id: str, data: Optional[Dict[str, Any]]) -> None:
+        self.id = doc_id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return dict(self._data) if self._data is not None else None
+
+
+def _deep_merge(current: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    # como set(merge=True): mapas aninhados são mesclados campo a campo
+    out = dict(current)
+    for k, v in data.items():
+        out[k] = _deep_merge(out[k], v) if isinstance(v, dict) and isinstance(out.get(k), dict) else v
+    return out
+
+
+class FakeFirestore:
+    """
+    Armazenamento compartilhado pelos clientes fake, com contadores de custo.
+    """
+
+    def __init__(self, latency_s: float = 0.0) -> None:
+        self.collections: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.columns: Dict[str, List[Any]] = {}
+        self.latency_s = latency_s
+        self.queries = 0
+        self.reads = 0
+        self.writes = 0
+        self.commits = 0
+        # listeners de on_snapshot ativos (o callback não é chamado sozinho)
+        self.watches: List["FakeWatch"] = []
+
+    def add(self, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        self.collections.setdefault(collection, {})[doc_id] = data
+        self.writes += 1
+
+    def add_columns(self, collection: str, block: Any) -> None:
+        """
+        Bloco de leituras de um par: device_id, site_id, ts_ns (ASC) e
+        documents(lo, hi) -> [(doc_id, dados)] (ver synthetic.SyntheticSeries).
+        """
+        self.columns.setdefault(collection, []).append(block)
+        self.writes += len(block)
+
+    def commit(self, ops: List[Tuple["FakeDocumentRef", Dict[str, Any], bool]]) -> None:
+        if len(ops) > 500:
+            raise ValueError("maximum 500 writes allowed per request")
+        self.commits += 1
+        for ref, data, merge in ops:
+            current = self.collections.get(ref.collection, {}).get(ref.id)
+            if merge and current is not None:
+                data = _deep_merge(current, data)
+            self.add(ref.collection, ref.id, data)
+
+    def get(self, collection: str, doc_id: str) -> FakeSnapshot:
+        # leitura pontual: cobrada mesmo se o documento não existir
+        self.queries += 1
+        self.reads += 1
+        return FakeSnapshot(doc_id, self.collections.get(collection, {}).get(doc_id))
+
+    def run(self, collection: str, query: "_QuerySpec") -> List[FakeSnapshot]:
+        self.queries += 1
+        docs = self.collections.get(collection, {})
+        rows = [
+            (doc_id, data)
+            for doc_id, data in docs.items()
+            if all(_OPS[op](data.get(field), value) for field, op, value in query.filters)
+        ]
+        for block in self.columns.get(collection, ()):
+            rows.extend(_block_rows(block, query))
+        if query.order_field:
+            rows.sort(key=lambda r: r[1][query.order_field], reverse=query.descending)
+        if query.last is not None:
+            rows = rows[-query.last:]
+        self.reads += len(rows)
+        return [FakeSnapshot(doc_id, data) for doc_id, data in rows]
+
+
+def _epoch_ns(value: Any) -> int:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return (value - _EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def _block_rows(block: Any, query: "_QuerySpec") -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Documentos de um bloco que passam nos filtros: == em device_id/site_id e
+    limites de sent_at por busca binária; com order_by(sent_at) +
+    limit_to_last, só os últimos do intervalo são materializados.
+    """
+    lo, hi = 0, len(block)
+    others = []
+    for field, op, value in query.filters:
+        if field in ("device_id", "site_id") and op == "==":
+            if getattr(block, field) != value:
+                return []
+        elif field == "sent_at" and op in _BOUNDS:
+            side, lower = _BOUNDS[op]
+            i = int(np.searchsorted(block.ts_ns, _epoch_ns(value), side=side))
+            lo, hi = (max(lo, i), hi) if lower else (lo, min(hi, i))
+        else:
+            others.append((field, op, value))
+    if lo >= hi:
+        return []
+    if query.last is not None and query.order_field == "sent_at" and not others:
+        lo, hi = (max(lo, hi - query.last), hi) if not query.descending else (lo, min(hi, lo + query.last))
+    return [
+        (doc_id, data)
+        for doc_id, data in block.documents(lo, hi)
+        if all(_OPS[op](data.get(field), value) for field, op, value in others)
+    ]
+
+
+class FakeDocumentRef:
+    def __init__(self, store: FakeFirestore, collection: str, doc_id: str) -> None:
+        self._store = store
+        self.collection = collection
+        self.id = doc_id
+
+    def get(self) -> FakeSnapshot:
+        if self._store.latency_s:
+            time.sleep(self._store.latency_s)
+        return self._store.get(self.collection, self.id)
+
+
+class FakeAsyncDocumentRef(FakeDocumentRef):
+    async def get(self) -> FakeSnapshot:
+        if self._store.latency_s:
+            await asyncio.sleep(self._store.latency_s)
+        return self._store.get(self.collection, self.id)
+
+
+class FakeWriteBatch:
+    def __init__(self, store: FakeFirestore) -> None:
+        self._store = store
+        self._ops: List[Tuple[FakeDocumentRef, Dict[str, Any], bool]] = []
+
+    def set(self, ref: FakeDocumentRef, data: Dict[str, Any], merge: bool = False) -> None:
+        self._ops.append((ref, data, merge))
+
+    def commit(self) -> None:
+        if self._store.latency_s:
+            time.sleep(self._store.latency_s)
+        self._store.commit(self._ops)
+
+
+class FakeAsyncWriteBatch(FakeWriteBatch):
+    async def commit(self) -> None:
+        if self._store.latency_s:
+            await asyncio.sleep(self._store.latency_s)
+        self._store.commit(self._ops)
+
+
+class _QuerySpec:
+    def __init__(
+        self,
+        filters: Tuple = (),
+        order_field: Optional[str] = None,
+        descending: bool = False,
+        last: Optional[int] = None,
+    ) -> None:
+        self.filters = filters
+        self.order_field = order_field
+        self.descending = descending
+        self.last = last
+
+
+class _BaseQuery:
+    _ref_type = FakeDocumentRef
+
+    def __init__(self, store: FakeFirestore, collection: str, spec: Optional[_QuerySpec] = None):
+        self._store = store
+        self._collection = collection
+        self._spec = spec or _QuerySpec()
+
+    def _with(self, **changes) -> "_BaseQuery":
+        spec = _QuerySpec(**{**self._spec.__dict__, **changes})
+        return type(self)(self._store, self._collection, spec)
+
+    def where(self, field: str, op: str, value: Any) -> "_BaseQuery":
+        return self._with(filters=self._spec.filters + ((field, op, value),))
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "_BaseQuery":
+        return self._with(order_field=field, descending=direction == "DESCENDING")
+
+    def limit_to_last(self, n: int) -> "_BaseQuery":
+        return self._with(last=n)
+
+    def document(self, doc_id: Optional[str] = None) -> FakeDocumentRef:
+        return self._ref_type(self._store, self._collection, doc_id or uuid.uuid4().hex[:20])
+
+
+class FakeWatch:
+    def __init__(self, store: FakeFirestore, callback: Callable) -> None:
+        self._store = store
+        self.callback = callback
+
+    def unsubscribe(self) -> None:
+        self._store.watches.remove(self)
+
+
+class FakeQuery(_BaseQuery):
+    def on_snapshot(self, callback: Callable) -> FakeWatch:
+        watch = FakeWatch(self._store, callback)
+        self._store.watches.append(watch)
+        return watch
+
+    def get(self) -> List[FakeSnapshot]:
+        if self._store.latency_s:
+            time.sleep(self._store.latency_s)
+        return self._store.run(self._collection, self._spec)
+
+    def stream(self):
+        return iter(self.get())
+
+
+class FakeAsyncQuery(_BaseQuery):
+    _ref_type = FakeAsyncDocumentRef
+
+    async def get(self) -> List[FakeSnapshot]:
+        if self._store.latency_s:
+            await asyncio.sleep(self._store.latency_s)
+        return self._store.run(self._collection, self._spec)
+
+    async def stream(self):
+        for snap in await self.get():
+            yield snap
+
+
+class FakeClient:
+    def __init__(self, store: FakeFirestore) -> None:
+        self.store = store
+
+    def collection(self, name: str) -> FakeQuery:
+        return FakeQuery(self.store, name)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self.store)
+
+
+class FakeAsyncClient:
+    def __init__(self, store: FakeFirestore) -> None:
+        self.store = store
+
+    def collection(self, name: str) -> FakeAsyncQuery:
+        return FakeAsyncQuery(self.store, name)
+
+    def batch(self) -> FakeAsyncWriteBatch:
+        return FakeAsyncWriteBatch(self.store)
+
+
+class StubChain:
+    """
+    Substituto de uma chain LangChain: responde com respond(inputs) após latency_s
+    (tempo até o primeiro token) mais token_latency_s por token seguinte.
+    """
+
+    def __init__(
+        self,
+        respond: Callable[[Dict[str, Any]], Any],
+        latency_s: float = 0.0,
+        token_latency_s: float = 0.0,
+    ) -> None:
+        self.respond = respond
+        self.latency_s = latency_s
+        self.token_latency_s = token_latency_s
+        self.calls = 0
+
+    def _duration(self, result: Any) -> float:
+        tokens = _tokens(result) if isinstance(result, str) else []
+        return self.latency_s + self.token_latency_s * max(0, len(tokens) - 1)
+
+    def invoke(self, inputs: Dict[str, Any]) -> Any:
+        self.calls += 1
+        result = self.respond(inputs)
+        if self._duration(result):
+            time.sleep(self._duration(result))
+        return result
+
+    async def ainvoke(self, inputs: Dict[str, Any]) -> Any:
+        self.calls += 1
+        result = self.respond(inputs)
+        if self._duration(result):
+            await asyncio.sleep(self._duration(result))
+        return result
+
+    async def astream(self, inputs: Dict[str, Any]) -> AsyncIterator[str]:
+        self.calls += 1
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        for i, token in enumerate(_tokens(self.respond(inputs))):
+            if i and self.token_latency_s:
+                await asyncio.sleep(self.token_latency_s)
+            yield token
+
+
+def _tokens(text: str) -> List[str]:
+    # "tokens" = palavras com o espaço seguinte, o bastante para simular o Ollama
+    return re.findall(r"\S+\s*", text)
+
+
+class FakeSnapshotSource:
+    """
+    Mesmo contrato de watch_latest_telemetry: source(device_id, site_id, on_doc)
+    devolve o unsubscribe. emit() entrega uma leitura a todos os watches do
+    par, como o listener do Firestore (normalmente a partir de outra thread).
+    """
+
+    def __init__(self) -> None:
+        self._watches: Dict[Tuple[str, str], List[Callable[[Any], None]]] = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.stopped = 0
+        self.delivered = 0  # equivale às leituras de documento cobradas pelo Firestore
+
+    def __call__(self, device_id: str, site_id: str, on_doc: Callable[[Any], None]):
+        key = (device_id, site_id)
+        with self._lock:
+            self._watches.setdefault(key, []).append(on_doc)
+            self.started += 1
+
+        def unsubscribe() -> None:
+            with self._lock:
+                self._watches[key].remove(on_doc)
+                if not self._watches[key]:
+                    del self._watches[key]
+                self.stopped += 1
+
+        return unsubscribe
+
+    @property
+    def active(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._watches.values())
+
+    def emit(self, device_id: str, site_id: str, doc: Any) -> None:
+        with self._lock:
+            callbacks = list(self._watches.get((device_id, site_id), ()))
+            self.delivered += len(callbacks)
+        for cb in callbacks:
+            cb(doc)
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    parts, levels = topic_filter.split("/"), topic.split("/")
+    for i, part in enumerate(parts):
+        if part == "#":
+            return True
+        if i >= len(levels) or (part != "+" and part != levels[i]):
+            return False
+    return len(parts) == len(levels)
+
+
+class FakeMqttBroker:
+    """
+    Mesmo contrato do publish do paho (publish(topic, payload)); entrega a
+    cada assinante de um filtro compatível, na thread de quem publicou.
+    """
+
+    def __init__(self) -> None:
+        self._subs: List[Tuple[str, Callable[[str, str], None]]] = []
+        self._lock = threading.Lock()
+        self.published: List[Tuple[str, str]] = []
+
+    def subscribe(self, topic_filter: str, callback: Callable[[str, str], None]) -> None:
+        with self._lock:
+            self._subs.append((topic_filter, callback))
+
+    def publish(self, topic: str, payload: str) -> None:
+        with self._lock:
+            self.published.append((topic, payload))
+            callbacks = [cb for f, cb in self._subs if topic_matches(f, topic)]
+        for cb in callbacks:
+            cb(topic, payload)
+
+
+def install(store: FakeFirestore) -> None:
+    """
+    Faz app.firestore_client devolver os clientes fake.
+    """
+    import app.firestore_client as firestore_client
+
+    firestore_client.get_firestore_client = lambda: FakeClient(store)
+    firestore_client.get_async_firestore_client = lambda: FakeAsyncClient(store)
+
+
+def install_llm(intent_chain: StubChain, general_help_chain: StubChain) -> None:
+    import app.llm.answer_agent as answer_agent
+    import app.llm.intent_agent as intent_agent
+
+    intent_agent._intent_chain = intent_chain
+    answer_agent._general_help_chain = general_help_chain
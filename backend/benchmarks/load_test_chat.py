@@ -0,0 +1,149 @@
+"""
+Load test do /chat com Ollama e Firestore fake (latência configurável).
+
+Compara o pipeline antigo (def síncrono no threadpool do FastAPI, chamadas
+bloqueantes) com o /chat assíncrono atual, para vários níveis de concorrência.
+
+Uso (a partir de backend/):
+    python -m benchmarks.load_test_chat
+    python -m benchmarks.load_test_chat --llm-latency 0.5 --firestore-latency 0.05 \\
+        --concurrency 1 10 50 100 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.fakes import FakeFirestore, StubChain, install, install_llm
+
+DEVICE_ID = "esp32-agua-01"
+SITE_ID = "fazenda-x_rio-igarape"
+
+
+def _seed(store: FakeFirestore, collection: str, points: int) -> None:
+    now = datetime.now(timezone.utc)
+    for i in range(points):
+        store.add(
+            collection,
+            f"doc-{i}",
+            {
+                "device_id": DEVICE_ID,
+                "site_id": SITE_ID,
+                "sent_at": now - timedelta(minutes=5 * i),
+                "measurements": [
+                    {"parameter": "pH", "value": 7.0 + (i % 10) / 10, "unit": "pH"},
+                    {"parameter": "temperature", "value": 26.0, "unit": "°C"},
+                ],
+            },
+        )
+
+
+def _build_apps(args) -> Dict[str, FastAPI]:
+    store = FakeFirestore(latency_s=args.firestore_latency)
+    install(store)
+
+    from app.config import get_settings
+    from app.models import ChatRequest, ChatResponse, QueryIntent, QueryIntentType, WaterParameter
+
+    get_settings().TELEMETRY_CACHE_ENABLED = args.cache
+    # mede o pipeline com LLM (a mensagem é sempre a mesma: sem atalho nem cache)
+    get_settings().FAST_INTENT_ENABLED = False
+    get_settings().INTENT_CACHE_ENABLED = False
+    _seed(store, get_settings().FIRESTORE_TELEMETRY_COLLECTION, args.points)
+
+    intent = QueryIntent(intent=QueryIntentType.AVG_VALUE, parameter=WaterParameter.PH, days=1)
+    install_llm(
+        StubChain(lambda _: intent.model_copy(), args.llm_latency),
+        StubChain(lambda _: "Olá!", args.llm_latency),
+    )
+
+    from app.llm.intent_agent import classify_intent
+    from app.main import app as async_app
+    from app.telemetry_repository import default_period, summarize_range
+
+    # pipeline antigo: mesmas etapas, mas bloqueantes e rodando no threadpool
+    sync_app = FastAPI()
+
+    @sync_app.post("/chat", response_model=ChatResponse)
+    def chat(req: ChatRequest):
+        it = classify_intent(req.message)
+        start, end = default_period(days=it.days or 1)
+        summ = summarize_range(req.device_id, req.site_id, it.parameter, start, end)
+        return ChatResponse(
+            session_id=req.session_id,
+            answer=f"Média: {summ['avg']:.2f}",
+            intent=it.intent.value,
+        )
+
+    return {"threadpool": sync_app, "async": async_app}
+
+
+async def _run_level(app: FastAPI, concurrency: int, total: int) -> Dict:
+    payload = {
+        "session_id": "load",
+        "message": "qual a média do pH hoje?",
+        "device_id": DEVICE_ID,
+        "site_id": SITE_ID,
+    }
+    latencies: List[float] = []
+    sem = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one() -> None:
+            async with sem:
+                t0 = time.perf_counter()
+                r = await client.post("/chat", json=payload)
+                r.raise_for_status()
+                latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        wall = time.perf_counter() - t0
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "rps": total / wall,
+        "p50_ms": statistics.median(latencies) * 1e3,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1e3,
+    }
+
+
+async def main_async(args) -> None:
+    apps = _build_apps(args)
+    print(
+        f"LLM {args.llm_latency * 1e3:.0f} ms, Firestore {args.firestore_latency * 1e3:.0f} ms, "
+        f"cache={'on' if args.cache else 'off'}"
+    )
+    print(f"{'mode':>10} {'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, app in apps.items():
+        for c in args.concurrency:
+            r = await _run_level(app, c, max(c * args.rounds, c))
+            print(
+                f"{name:>10} {r['concurrency']:>5} {r['rps']:>8.1f} "
+                f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--firestore-latency", type=float, default=0.03)
+    parser.add_argument("--points", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 100, 200])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--cache", action="store_true", help="liga o cache de séries")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Cenário do fan-out de telemetria ao vivo (app.telemetry_stream) com uma
+fonte de snapshots fake e 1.000 inscritos simulados.
+
+Verifica (e falha com AssertionError se não valer):
+- um único watch upstream por (device_id, site_id), não um por inscrito
+- rajadas agrupadas: cada inscrito recebe só a última leitura de cada rajada
+- inscritos lentos ficam com o buffer limitado (drop-oldest) sem atrasar os outros
+- os watches são encerrados quando o último inscrito sai
+
+Uso (a partir de backend/):
+    python -m benchmarks.stream_fanout
+    python -m benchmarks.stream_fanout --subscribers 5000 --ponds 20 --rounds 50
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from app.models import Measurement, TelemetryDocument
+from app.telemetry_stream import TelemetryStreamHub
+from benchmarks.fakes import FakeSnapshotSource
+
+SITE_ID = "fazenda-x"
+
+
+def _doc(pond: int, n: int, base: datetime) -> TelemetryDocument:
+    return TelemetryDocument(
+        id=f"p{pond}-{n}",
+        device_id=f"esp32-{pond:02d}",
+        site_id=SITE_ID,
+        sent_at=base + timedelta(milliseconds=n),
+        measurements=[Measurement(parameter="pH", value=7.0 + (n % 10) / 10, unit="pH")],
+    )
+
+
+async def run(args) -> None:
+    source = FakeSnapshotSource()
+    hub = TelemetryStreamHub(source, coalesce_seconds=args.coalesce, buffer_size=args.buffer)
+    emitted_at: Dict[str, float] = {}
+    latencies: List[float] = []
+    received: Dict[int, List[str]] = {}
+
+    subs = []
+    for i in range(args.subscribers):
+        pond = i % args.ponds
+        subs.append((i, pond, hub.subscribe(f"esp32-{pond:02d}", SITE_ID)))
+    slow = {i for i, _, _ in subs if i % 10 == 0}  # 10% nunca consomem
+
+    assert source.active == args.ponds, source.active
+    assert source.started == args.ponds
+
+    async def consume(i: int, sub) -> None:
+        got = received.setdefault(i, [])
+        while True:
+            doc = await sub.next()
+            latencies.append(time.perf_counter() - emitted_at[doc.id])
+            got.append(doc.id)
+
+    consumers = [asyncio.create_task(consume(i, sub)) for i, _, sub in subs if i not in slow]
+
+    # rajadas vindas da "thread do listener", como no Firestore
+    base = datetime.now(timezone.utc)
+    last_of_round: Dict[int, List[str]] = {p: [] for p in range(args.ponds)}
+
+    def emitter() -> None:
+        n = 0
+        for _ in range(args.rounds):
+            for pond in range(args.ponds):
+                for _ in range(args.burst):
+                    doc = _doc(pond, n, base)
+                    emitted_at[doc.id] = time.perf_counter()
+                    source.emit(doc.device_id, SITE_ID, doc)
+                    n += 1
+                last_of_round[pond].append(doc.id)
+            time.sleep(args.coalesce * 2)
+
+    t0 = time.perf_counter()
+    await asyncio.to_thread(emitter)
+    await asyncio.sleep(args.coalesce * 2)
+    wall = time.perf_counter() - t0
+    stats = hub.stats()
+
+    for c in consumers:
+        c.cancel()
+
+    # agrupamento: cada inscrito rápido viu exatamente a última leitura de cada rajada
+    for i, pond, _ in subs:
+        if i not in slow:
+            assert received[i] == last_of_round[pond], (i, received[i][:3], last_of_round[pond][:3])
+    # inscritos lentos: buffer cheio, o excedente foi descartado
+    for i, _, sub in subs:
+        if i in slow:
+            assert sub.pending == min(args.buffer, args.rounds)
+            assert sub.dropped == max(0, args.rounds - args.buffer)
+
+    for _, _, sub in subs:
+        hub.unsubscribe(sub)
+    await asyncio.sleep(0.1)  # unsubscribe upstream roda no executor
+    assert source.active == 0 and source.stopped == args.ponds
+    assert hub.stats()["watches"] == 0
+
+    upstream = args.rounds * args.ponds * args.burst
+    latencies.sort()
+    print(f"inscritos {args.subscribers} ({len(slow)} lentos), lagoas {args.ponds}, "
+          f"rodadas {args.rounds} x rajada {args.burst}, janela {args.coalesce * 1e3:.0f} ms")
+    print(f"  watches upstream:       {args.ponds} (sem o hub: {args.subscribers})")
+    print(f"  leituras de documento:  {source.delivered} (sem o hub: {upstream * args.subscribers // args.ponds})")
+    print(f"  eventos upstream:       {stats['upstream_events']} -> publicados {stats['published']}")
+    print(f"  entregas:               {len(latencies)} em {wall:.2f} s, descartadas {stats['dropped']}")
+    print(
+        f"  latência emit->inscrito: p50 {statistics.median(latencies) * 1e3:.1f} ms, "
+        f"p99 {latencies[int(0.99 * (len(latencies) - 1))] * 1e3:.1f} ms "
+        f"(inclui a janela de agrupamento)"
+    )
+    print("  OK: watch único por par, agrupamento, drop-oldest e teardown verificados")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--ponds", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=40)
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--buffer", type=int, default=32)
+    parser.add_argument("--coalesce", type=float, default=0.05)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""
+Suíte reprodutível: funções do telemetry_repository e /chat por intent, de
+1k a 10M leituras, com o resultado em JSON para comparar entre commits.
+
+- dados: benchmarks.synthetic (N dispositivos x M dias, determinístico pela
+  seed), servidos pelo FakeFirestore em colunas (add_columns), mais o índice
+  devices_latest de cada par
+- LLM: StubChain com latência configurável (--llm-ms até a resposta,
+  --llm-token-ms por token da ajuda geral); regras rápidas e cache de
+  intenções desligados, então toda pergunta passa pela "LLM"
+- modos: "store" (TELEMETRY_CACHE_ENABLED=false e índice da última leitura
+  sem TTL, cada chamada lê o Firestore) e "cache" (cache de séries ligado,
+  aquecido pela primeira chamada)
+- consultas de intervalo: últimas --window-hours horas do dispositivo 0 (o
+  "hoje" do /chat); escritas por último, num dispositivo à parte
+- cada tamanho roda num subprocesso (o cliente do Firestore e os caches do
+  repositório são globais do processo), que grava sua parte num JSON temporário
+
+Por medição: chamadas, min/mediana/p95 (ms) e documentos lidos por chamada,
+depois de uma chamada de aquecimento. Fica de fora watch_latest_telemetry
+(listener; ver stream_fanout).
+
+Uso (a partir de backend/):
+    python -m benchmarks.suite run
+    python -m benchmarks.suite run --sizes 1k,100k,1m,10m --llm-ms 800 --out head.json
+    python -m benchmarks.suite compare base.json head.json --threshold 0.15
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+import httpx
+import numpy as np
+
+from benchmarks.fakes import FakeFirestore, StubChain, install, install_llm
+from benchmarks.synthetic import generate
+
+_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+_KEY_ARGS = ("devices", "days", "seed", "window_hours", "llm_ms", "llm_token_ms")
+
+Case = Tuple[str, Callable[[], Any]]
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    if text[-1:] in _SUFFIXES:
+        return int(float(text[:-1]) * _SUFFIXES[text[-1]])
+    return int(text)
+
+
+def _label(size: int) -> str:
+    for suffix, mult in sorted(_SUFFIXES.items(), key=lambda kv: -kv[1]):
+        if size >= mult and size % mult == 0:
+            return f"{size // mult}{suffix}"
+    return str(size)
+
+
+def _git(*cmd: str) -> str:
+    try:
+        return subprocess.run(["git", *cmd], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+# ---------------- um tamanho (subprocesso) ----------------
+
+async def _measure(call: Callable[[], Any], store: FakeFirestore, args) -> Dict[str, Any]:
+    async def once() -> Any:
+        result = call()
+        return await result if inspect.isawaitable(result) else result
+
+    await once()  # aquecimento (e carga do cache, no modo cache)
+    reads0 = store.reads
+    samples: List[float] = []
+    deadline = time.perf_counter() + args.min_time
+    while len(samples) < args.min_calls or (time.perf_counter() < deadline and len(samples) < args.max_calls):
+        t0 = time.perf_counter()
+        await once()
+        samples.append(time.perf_counter() - t0)
+    ms = np.array(samples) * 1e3
+    return {
+        "calls": len(samples),
+        "min_ms": round(float(ms.min()), 4),
+        "median_ms": round(float(np.median(ms)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "docs_per_call": round((store.reads - reads0) / len(samples), 1),
+    }
+
+
+def _seed(store: FakeFirestore, args) -> Tuple[Dict[str, Any], List[Any]]:
+    from app.config import get_settings
+    from app.telemetry_latest import latest_doc_id, latest_from_rows, latest_to_data
+    from app.telemetry_store import data_to_row
+
+    settings = get_settings()
+    t0 = time.perf_counter()
+    series = generate(args.devices, args.days, args.size, seed=args.seed)
+    generated = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for s in series:
+        store.add_columns(settings.FIRESTORE_TELEMETRY_COLLECTION, s)
+        # índice devices_latest como o insert deixaria: última de cada parâmetro
+        rows = [data_to_row(data) for _, data in s.documents(max(0, len(s) - 200))]
+        state = latest_from_rows(s.device_id, s.site_id, rows)
+        if state is not None:
+            store.add(settings.FIRESTORE_LATEST_COLLECTION, latest_doc_id(s.device_id, s.site_id), latest_to_data(state))
+    dataset = {
+        "size": args.size,
+        "devices": args.devices,
+        "days": args.days,
+        "readings": sum(len(s) for s in series),
+        "offline_gaps": sum(s.gaps for s in series),
+        "missing_measurements": sum(s.missing for s in series),
+        "generate_s": round(generated, 3),
+        "load_s": round(time.perf_counter() - t0, 3),
+    }
+    return dataset, series
+
+
+def _repository_cases(repo, device_id: str, site_id: str, start: datetime, end: datetime) -> List[Case]:
+    from app.models import WaterParameter
+
+    ph, temp, turb = WaterParameter.PH, WaterParameter.TEMPERATURE, WaterParameter.TURBIDITY
+    every = list(WaterParameter)
+    return [
+        ("get_latest_telemetry", lambda: repo.get_latest_telemetry(device_id, site_id)),
+        ("aget_latest_telemetry", lambda: repo.aget_latest_telemetry(device_id, site_id)),
+        ("get_latest_state", lambda: repo.get_latest_state(device_id, site_id)),
+        ("aget_latest_state", lambda: repo.aget_latest_state(device_id, site_id)),
+        ("alist_latest_states", lambda: repo.alist_latest_states()),
+        ("get_telemetry_range", lambda: repo.get_telemetry_range(device_id, site_id, ph, start, end)),
+        ("aget_telemetry_range", lambda: repo.aget_telemetry_range(device_id, site_id, ph, start, end)),
+        ("get_telemetry_ranges", lambda: repo.get_telemetry_ranges(device_id, site_id, every, start, end)),
+        ("aget_telemetry_ranges", lambda: repo.aget_telemetry_ranges(device_id, site_id, every, start, end)),
+        ("summarize_range", lambda: repo.summarize_range(device_id, site_id, ph, start, end)),
+        ("asummarize_range", lambda: repo.asummarize_range(device_id, site_id, ph, start, end)),
+        ("extreme_in_range", lambda: repo.extreme_in_range(device_id, site_id, turb, start, end, "max")),
+        ("aextreme_in_range", lambda: repo.aextreme_in_range(device_id, site_id, turb, start, end, "min")),
+        ("trend_range", lambda: repo.trend_range(device_id, site_id, temp, start, end)),
+        ("atrend_range", lambda: repo.atrend_range(device_id, site_id, temp, start, end)),
+    ]
+
+
+def _write_cases(repo, args, device: Any) -> List[Case]:
+    from app.telemetry_store import doc_to_model
+
+    # sempre os mesmos 500 IDs: regravação idempotente, o store não cresce
+    writer = generate(1, 1, 500, seed=args.seed + 1, site_id="bench-writer")[0]
+    docs = writer.documents()
+    models = [doc_to_model(doc_id, data) for doc_id, data in device.documents(max(0, len(device) - 500))]
+    return [
+        ("new_telemetry_doc_id", repo.new_telemetry_doc_id),
+        ("write_telemetry_docs[500]", lambda: repo.write_telemetry_docs(docs)),
+        ("awrite_telemetry_docs[500]", lambda: repo.awrite_telemetry_docs(docs)),
+        ("cache_telemetry_docs[500]", lambda: repo.cache_telemetry_docs(models)),
+    ]
+
+
+# pergunta -> intent que a LLM fake devolve
+_CHAT_CASES = (
+    ("general_help", "como eu calibro o sensor de pH?", None),
+    ("latest_status", "qual a última leitura de pH?", "ph"),
+    ("period_status", "como está a temperatura hoje?", "temperature"),
+    ("avg_value", "qual a média do pH hoje?", "ph"),
+    ("max_value", "qual foi a maior turbidez hoje?", "turbidity"),
+    ("min_value", "qual foi o menor TDS hoje?", "tds"),
+    ("trend", "a temperatura está subindo?", "temperature"),
+    ("ideal_check", "o pH está na faixa ideal?", "ph"),
+    ("compare_periods", "o pH de hoje está maior que o de ontem?", "ph"),
+)
+
+
+def _install_stub_llm(args) -> None:
+    from app.models import QueryIntent
+
+    intents = {q: QueryIntent(intent=intent, parameter=param) for intent, q, param in _CHAT_CASES}
+    install_llm(
+        StubChain(lambda inputs: intents[inputs["user_question"]].model_copy(), latency_s=args.llm_ms / 1000),
+        StubChain(
+            lambda _: "Lave o eletrodo com água destilada e calibre com as soluções pH 4 e pH 7.",
+            latency_s=args.llm_ms / 1000,
+            token_latency_s=args.llm_token_ms / 1000,
+        ),
+    )
+
+
+async def _run_size(args) -> Dict[str, Any]:
+    store = FakeFirestore()
+    install(store)
+
+    from app.config import get_settings
+
+    settings = get_settings()
+    settings.INGEST_WRITE_BEHIND_ENABLED = False
+    settings.FAST_INTENT_ENABLED = False
+    settings.INTENT_CACHE_ENABLED = False
+    _install_stub_llm(args)
+
+    dataset, series = _seed(store, args)
+    _log(
+        f"[{_label(args.size)}] {dataset['readings']} leituras em {args.devices} dispositivos x {args.days} dias "
+        f"({dataset['offline_gaps']} janelas offline, {dataset['missing_measurements']} medições ausentes), "
+        f"gerado em {dataset['generate_s']:.1f} s"
+    )
+
+    import app.telemetry_repository as repo
+    from app.main import app
+
+    device = series[0]
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(hours=args.window_hours)
+    ttl = repo.latest_index.ttl_seconds
+    results: List[Dict[str, Any]] = []
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+        def chat_case(intent: str, question: str) -> Case:
+            async def ask() -> None:
+                r = await client.post("/chat", json={
+                    "session_id": "bench", "message": question,
+                    "device_id": device.device_id, "site_id": device.site_id,
+                })
+                r.raise_for_status()
+                assert r.json()["intent"] == intent, (question, r.json())
+
+            return f"chat[{intent}]", ask
+
+        for mode in args.modes:
+            settings.TELEMETRY_CACHE_ENABLED = mode == "cache"
+            # sem cache: toda consulta da última leitura vai ao store
+            repo.latest_index.ttl_seconds = ttl if mode == "cache" else 1e-9
+            repo.series_cache.clear()
+            repo.latest_index.clear()
+
+            cases = _repository_cases(repo, device.device_id, device.site_id, start, end)
+            cases += [chat_case(intent, question) for intent, question, _ in _CHAT_CASES]
+            for name, call in cases:
+                stats = await _measure(call, store, args)
+                results.append({"size": args.size, "mode": mode, "name": name, **stats})
+                _log(f"  {mode:>5} {name:<28} {stats['median_ms']:>10.3f} ms  {stats['docs_per_call']:>9.0f} docs")
+
+        for name, call in _write_cases(repo, args, device):
+            stats = await _measure(call, store, args)
+            results.append({"size": args.size, "mode": "write", "name": name, **stats})
+            _log(f"  write {name:<28} {stats['median_ms']:>10.3f} ms")
+
+    return {"dataset": dataset, "results": results}
+
+
+# ---------------- comandos ----------------
+
+def cmd_run(args) -> None:
+    commit = _git("rev-parse", "--short", "HEAD") or "unknown"
+    out = {
+        "meta": {
+            "commit": commit,
+            "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("command", "out")},
+        },
+        "datasets": [],
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in [parse_size(s) for s in args.sizes.split(",")]:
+            part_path = os.path.join(tmp, f"{size}.json")
+            config = json.dumps({**vars(args), "size": size})
+            proc = subprocess.run([sys.executable, "-m", "benchmarks.suite", "_size", config, part_path])
+            if proc.returncode != 0:
+                raise SystemExit(f"tamanho {_label(size)} falhou (código {proc.returncode})")
+            part = _load(part_path)
+            out["datasets"].append(part["dataset"])
+            out["results"].extend(part["results"])
+
+    path = args.out or f"suite-{commit}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(out, f, indent=1, ensure_ascii=False)
+    print(f"{len(out['results'])} medições em {path}")
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def cmd_compare(args) -> None:
+    """
+    Mediana de cada (tamanho, modo, medição) nos dois arquivos; regressão =
+    mais lenta que threshold E pelo menos --min-delta-ms (ruído em µs).
+    """
+    base, head = _load(args.base), _load(args.head)
+    diff = {
+        k: (base["meta"]["args"].get(k), head["meta"]["args"].get(k))
+        for k in _KEY_ARGS
+        if base["meta"]["args"].get(k) != head["meta"]["args"].get(k)
+    }
+    if diff:
+        print(f"aviso: argumentos diferentes entre as execuções: {diff}")
+
+    key = lambda r: (r["size"], r["mode"], r["name"])  # noqa: E731
+    before = {key(r): r for r in base["results"]}
+    print(f"{base['meta']['commit']} -> {head['meta']['commit']}")
+    print(f"{'tamanho':>8} {'modo':>5} {'medição':<28} {'antes ms':>10} {'depois ms':>10} {'razão':>7}")
+    regressions = 0
+    for r in head["results"]:
+        old = before.get(key(r))
+        if old is None:
+            continue
+        ratio = r["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+        slower = ratio > 1 + args.threshold and r["median_ms"] - old["median_ms"] > args.min_delta_ms
+        regressions += slower
+        flag = "  <- regressão" if slower else ("  (mais rápido)" if ratio < 1 / (1 + args.threshold) else "")
+        print(
+            f"{_label(r['size']):>8} {r['mode']:>5} {r['name']:<28} "
+            f"{old['median_ms']:>10.3f} {r['median_ms']:>10.3f} {ratio:>7.2f}{flag}"
+        )
+    missing = set(before) - {key(r) for r in head["results"]}
+    if missing:
+        print(f"{len(missing)} medições só em {args.base}")
+    print(f"{regressions} regressões acima de {args.threshold:.0%}")
+    if regressions:
+        raise SystemExit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run")
+    run.add_argument("--sizes", default="1k,10k,100k", help="leituras no total, ex. 1k,100k,1m,10m")
+    run.add_argument("--devices", type=int, default=4)
+    run.add_argument("--days", type=float, default=30)
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--window-hours", type=float, default=24)
+    run.add_argument("--modes", type=lambda s: s.split(","), default=["store", "cache"])
+    run.add_argument("--llm-ms", type=float, default=0.0)
+    run.add_argument("--llm-token-ms", type=float, default=0.0)
+    run.add_argument("--min-time", type=float, default=0.5, help="segundos por medição")
+    run.add_argument("--min-calls", type=int, default=3)
+    run.add_argument("--max-calls", type=int, default=200)
+    run.add_argument("--out", default="", help="padrão: suite-<commit>.json")
+
+    compare = sub.add_parser("compare")
+    compare.add_argument("base")
+    compare.add_argument("head")
+    compare.add_argument("--threshold", type=float, default=0.10)
+    compare.add_argument("--min-delta-ms", type=float, default=0.05)
+
+    size = sub.add_parser("_size")  # interno: um tamanho, resultado em out_path
+    size.add_argument("config")
+    size.add_argument("out_path")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        cmd_run(args)
+    elif args.command == "compare":
+        cmd_compare(args)
+    else:
+        part = asyncio.run(_run_size(argparse.Namespace(**json.loads(args.config))))
+        with open(args.out_path, "w", encoding="utf-8") as f:
+            json.dump(part, f)
+
+
+if __name__ == "__main__":
+    main()
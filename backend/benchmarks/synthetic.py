@@ -0,0 +1,160 @@
+"""
+Telemetria sintética determinística para benchmarks: N dispositivos x M dias.
+
+Cada dispositivo tem curvas plausíveis de viveiro/rio:
+- temperatura: ciclo diário (pico no meio da tarde) e deriva lenta
+- pH: ciclo da fotossíntese (sobe de dia, cai à noite) e queda com chuva
+- turbidez: base baixa com picos de chuva que decaem em algumas horas
+- TDS: deriva lenta, diluído pela chuva
+com ruído de sensor, janelas offline (nenhum envio) e medições ausentes
+(sensor que não respondeu naquele envio; todo envio tem ao menos uma).
+
+Mesma seed e mesmos argumentos -> mesmos valores, falhas e IDs; `end` só
+desloca os horários. As leituras ficam em colunas NumPy (10M ocupam
+~400 MB) e os documentos no formato do Firestore saem sob demanda
+(documents(lo, hi)), que é como o FakeFirestore.add_columns os serve.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+DAY_S = 86400
+# (nome no documento, unidade, casas decimais do sensor)
+PARAMETERS = (("pH", "pH", 2), ("temperature", "°C", 2), ("turbidity", "NTU", 1), ("tds", "ppm", 0))
+
+
+class SyntheticSeries:
+    """
+    Leituras de um dispositivo em ordem ASC: ts_ns (int64) e values (n x 4,
+    na ordem de PARAMETERS; NaN = medição ausente).
+    """
+
+    def __init__(self, device_id: str, site_id: str, ts_ns: np.ndarray, values: np.ndarray, gaps: int) -> None:
+        self.device_id = device_id
+        self.site_id = site_id
+        self.ts_ns = ts_ns
+        self.values = values
+        self.gaps = gaps            # janelas offline
+
+    def __len__(self) -> int:
+        return len(self.ts_ns)
+
+    @property
+    def missing(self) -> int:
+        return int(np.isnan(self.values).sum())
+
+    def doc_id(self, i: int) -> str:
+        return f"{self.device_id}-{i:08d}"
+
+    def documents(self, lo: int = 0, hi: Optional[int] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        (doc_id, dados) das leituras [lo, hi), como gravados pelo /telemetry.
+        """
+        hi = len(self) if hi is None else hi
+        sent = self.ts_ns[lo:hi].view("datetime64[ns]").astype("datetime64[us]").tolist()
+        out = []
+        for k, (dt, row) in enumerate(zip(sent, self.values[lo:hi].tolist())):
+            out.append((self.doc_id(lo + k), {
+                "device_id": self.device_id,
+                "site_id": self.site_id,
+                "sent_at": dt.replace(tzinfo=timezone.utc),
+                "measurements": [
+                    {"parameter": name, "value": v, "unit": unit}
+                    for (name, unit, _), v in zip(PARAMETERS, row)
+                    if v == v
+                ],
+            }))
+        return out
+
+
+def generate(
+    devices: int,
+    days: float,
+    readings: int,
+    seed: int = 42,
+    end: Optional[datetime] = None,
+    site_id: str = "fazenda-x",
+    offline_per_day: float = 0.3,
+    missing_rate: float = 0.02,
+) -> List[SyntheticSeries]:
+    """
+    `readings` envios no total, divididos entre os dispositivos e espalhados
+    pelo tempo online dos últimos `days` dias até `end` (agora, se omitido).
+    """
+    end = end or datetime.now(timezone.utc)
+    end_us = int(end.timestamp() * 1e6)
+    out = []
+    for i in range(devices):
+        n = readings // devices + (1 if i < readings % devices else 0)
+        rng = np.random.default_rng([seed, i])   # um dispositivo não depende dos outros
+        offset_s, gaps = _send_times(rng, n, days * DAY_S, offline_per_day * days)
+        values = _curves(rng, offset_s, days * DAY_S)
+        missing = rng.random(values.shape) < missing_rate
+        missing[missing.all(axis=1), 1] = False    # a temperatura sempre vem
+        values[missing] = np.nan
+        ts_ns = (end_us - int(days * DAY_S * 1e6) + (offset_s * 1e6).astype(np.int64)) * 1000
+        out.append(SyntheticSeries(f"esp32-{i:03d}", site_id, ts_ns, values, gaps))
+    return out
+
+
+def _send_times(rng: np.random.Generator, n: int, span_s: float, expected_gaps: float) -> Tuple[np.ndarray, int]:
+    """
+    n instantes (s desde o início) espaçados por igual no tempo online, com
+    jitter; as janelas offline (30 min a 6 h) ficam sem nenhum envio.
+    """
+    k = rng.poisson(expected_gaps)
+    starts = np.sort(rng.uniform(0, span_s, k))
+    ends = np.minimum(starts + rng.uniform(1800, 6 * 3600, k), span_s)
+    online_lo, online_hi, cursor = [], [], 0.0
+    for a, b in zip(starts, ends):
+        if a > cursor:
+            online_lo.append(cursor)
+            online_hi.append(a)
+        cursor = max(cursor, b)
+    if cursor < span_s:
+        online_lo.append(cursor)
+        online_hi.append(span_s)
+    lo = np.array(online_lo)
+    cum = np.concatenate([[0.0], np.cumsum(np.array(online_hi) - lo)])
+
+    u = (np.arange(n) + rng.uniform(0.2, 0.8, n)) * (cum[-1] / max(n, 1))
+    seg = np.searchsorted(cum, u, side="right") - 1
+    return lo[seg] + (u - cum[seg]), k
+
+
+def _rain(rng: np.random.Generator, t: np.ndarray, span_s: float) -> np.ndarray:
+    # eventos de chuva (~1 a cada 4 dias): efeito m*exp(-dt/tau) depois de cada um
+    effect = np.zeros_like(t)
+    for t0 in rng.uniform(0, span_s, rng.poisson(span_s / DAY_S / 4)):
+        m, tau = rng.uniform(0.4, 1.0), rng.uniform(4, 16) * 3600
+        after = t >= t0
+        effect[after] += m * np.exp(-(t[after] - t0) / tau)
+    return effect
+
+
+def _curves(rng: np.random.Generator, t: np.ndarray, span_s: float) -> np.ndarray:
+    n = len(t)
+    hour = (t / 3600) % 24
+    rain = _rain(rng, t, span_s)
+    temp_base, ph_base, tds_base = 26 + rng.normal(0, 1.0), 7.2 + rng.normal(0, 0.2), 180 + rng.normal(0, 25)
+    phase = rng.uniform(0, 2 * np.pi, 2)
+
+    values = np.empty((n, len(PARAMETERS)))
+    values[:, 0] = ph_base + 0.3 * np.sin(2 * np.pi * (hour - 10) / 24) - 0.35 * rain + rng.normal(0, 0.02, n)
+    values[:, 1] = (
+        temp_base
+        + 1.8 * np.sin(2 * np.pi * (hour - 9) / 24)
+        + 0.6 * np.sin(2 * np.pi * t / (9 * DAY_S) + phase[0])
+        - 0.8 * rain
+        + rng.normal(0, 0.08, n)
+    )
+    values[:, 2] = 2.5 * np.exp(rng.normal(0, 0.15, n)) + 35 * rain
+    values[:, 3] = np.maximum(
+        tds_base + 10 * np.sin(2 * np.pi * t / (13 * DAY_S) + phase[1]) - 50 * rain + rng.normal(0, 2, n), 0
+    )
+    for j, (_, _, decimals) in enumerate(PARAMETERS):
+        values[:, j] = np.round(values[:, j], decimals)
+    return values
@@ -0,0 +1,53 @@
+"""
+Fixtures compartilhadas: Firestore e LLM fake (benchmarks/fakes.py), sem
+credenciais nem Ollama.
+
+Rodar a partir de backend/:
+    python -m pytest -q
+"""
+from __future__ import annotations
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeFirestore, install  # noqa: E402
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    """
+    Settings do app; alterações feitas com monkeypatch.setattr voltam ao fim do teste.
+    """
+    from app.config import get_settings
+
+    s = get_settings()
+    # nada roda em segundo plano nos testes
+    monkeypatch.setattr(s, "INGEST_WRITE_BEHIND_ENABLED", False)
+    monkeypatch.setattr(s, "OLLAMA_WARMUP_ENABLED", False)
+    return s
+
+
+@pytest.fixture
+def fake_firestore(settings):
+    """
+    FakeFirestore novo instalado no store de telemetria, com caches vazios.
+    """
+    store = FakeFirestore()
+    install(store)
+
+    import app.main as main
+    import app.telemetry_repository as repo
+
+    repo.store._db = repo.store._async_db = None
+    repo.store._latest_written.clear()
+    repo.store._verified_at.clear()
+    repo.series_cache.clear()
+    repo.latest_index.clear()
+    main.intent_cache.clear()
+    yield store
+    repo.series_cache.clear()
+    repo.latest_index.clear()
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from datetime import timedelta
+
+import httpx
+
+from app.models import QueryIntent, QueryIntentType, WaterParameter
+from benchmarks.fakes import StubChain, install_llm
+from benchmarks.synthetic import generate
+
+
+class _AsyncOnly(StubChain):
+    """
+    StubChain que falha se o caminho síncrono (invoke) for usado.
+    """
+
+    def invoke(self, inputs):
+        raise AssertionError("invoke síncrono dentro do /chat")
+
+
+def _post(path: str, bodies, headers=None):
+    from app.main import app
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post(path, json=b, headers=headers) for b in bodies))
+
+    return asyncio.run(run())
+
+
+def _seed(fake_firestore, settings, days: int = 2):
+    device = generate(1, days, days * 1440, seed=3)[0]
+    fake_firestore.add_columns(settings.FIRESTORE_TELEMETRY_COLLECTION, device)
+    return device
+
+
+def test_chat_runs_on_async_clients_only(fake_firestore, settings, monkeypatch):
+    import app.firestore_client as firestore_client
+
+    monkeypatch.setattr(settings, "FAST_INTENT_ENABLED", False)
+    monkeypatch.setattr(settings, "SPECULATIVE_PREFETCH_ENABLED", False)
+
+    def sync_client():
+        raise AssertionError("cliente síncrono do Firestore dentro do /chat")
+
+    monkeypatch.setattr(firestore_client, "get_firestore_client", sync_client)
+    intents = {
+        "como limpo o sensor?": QueryIntent(intent=QueryIntentType.GENERAL_HELP),
+        "me fala do ph": QueryIntent(intent=QueryIntentType.AVG_VALUE, parameter=WaterParameter.PH),
+    }
+    intent_chain = _AsyncOnly(lambda inputs: intents[inputs["user_question"]].model_copy(), latency_s=0.05)
+    help_chain = _AsyncOnly(lambda _: "Lave com água destilada.", latency_s=0.05)
+    install_llm(intent_chain, help_chain)
+    device = _seed(fake_firestore, settings)
+
+    bodies = [
+        {"session_id": f"s{i}", "message": m, "device_id": device.device_id, "site_id": device.site_id}
+        for i, m in enumerate(list(intents) * 5)
+    ]
+    responses = _post("/chat", bodies)
+
+    assert all(r.status_code == 200 for r in responses), responses[0].text
+    assert intent_chain.calls == 10 and help_chain.calls == 5
+    by_intent = {r.json()["intent"]: r.json()["answer"] for r in responses}
+    assert by_intent["general_help"] == "Lave com água destilada."
+    assert "Média de pH" in by_intent["avg_value"]
+    assert fake_firestore.queries > 0
+
+
+def _sse(text: str):
+    frames = []
+    for block in text.strip().split("\n\n"):
+        event, data = block.split("\n")
+        frames.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return frames
+
+
+def _ndjson(text: str):
+    return [(f.pop("type"), f) for f in map(json.loads, text.splitlines())]
+
+
+def test_chat_stream_framing(fake_firestore, settings, monkeypatch):
+    monkeypatch.setattr(settings, "SPECULATIVE_PREFETCH_ENABLED", False)
+    help_intent = QueryIntent(intent=QueryIntentType.GENERAL_HELP)
+    install_llm(StubChain(lambda _: help_intent.model_copy()), StubChain(lambda _: "Lave com água destilada."))
+    device = _seed(fake_firestore, settings)
+    ask = {"session_id": "s", "device_id": device.device_id, "site_id": device.site_id}
+
+    # SSE: um frame por token da LLM e o done com a resposta inteira
+    (r,) = _post("/chat/stream", [{**ask, "message": "como limpo o sensor?"}])
+    assert r.headers["content-type"].startswith("text/event-stream")
+    frames = _sse(r.text)
+    assert [e for e, _ in frames] == ["token"] * 4 + ["done"]
+    assert "".join(d["text"] for _, d in frames[:-1]) == "Lave com água destilada."
+    done = frames[-1][1]
+    assert done["response"]["answer"] == "Lave com água destilada."
+    assert done["response"]["intent"] == "general_help" and done["ttfb_ms"] >= 0
+
+    # NDJSON: telemetria vai num único token
+    (r,) = _post("/chat/stream", [{**ask, "message": "qual a média do pH hoje?"}], {"Accept": "application/x-ndjson"})
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    frames = _ndjson(r.text)
+    assert [e for e, _ in frames] == ["token", "done"]
+    assert frames[1][1]["response"]["answer"] == frames[0][1]["text"]
+    assert "Média de pH" in frames[0][1]["text"]
+    assert frames[1][1]["response"]["intent"] == "avg_value"
+
+
+def test_chat_stream_failure_after_headers_is_an_error_frame(fake_firestore, settings):
+    def fail(_):
+        raise RuntimeError("ollama caiu")
+
+    install_llm(StubChain(lambda _: QueryIntent(intent=QueryIntentType.GENERAL_HELP)), StubChain(fail))
+    (r,) = _post("/chat/stream", [{"session_id": "s", "message": "como limpo o sensor?"}])
+
+    assert r.status_code == 200
+    assert [e for e, _ in _sse(r.text)] == ["error"]
+
+
+def test_chat_batch_reads_each_window_once(fake_firestore, settings, monkeypatch):
+    import app.chat_batch as chat_batch
+    from benchmarks.bench_chat_batch import DEVICE_ID, QUESTIONS, SITE_ID, _seed as seed_batch
+
+    monkeypatch.setattr(settings, "TELEMETRY_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "SPECULATIVE_PREFETCH_ENABLED", False)
+    install_llm(_AsyncOnly(lambda _: None), StubChain(lambda _: ""))
+    seed_batch(fake_firestore, settings.FIRESTORE_TELEMETRY_COLLECTION, 8)
+    reads = []
+    ranges = chat_batch.aget_telemetry_ranges
+
+    async def counted(device_id, site_id, params, start, end):
+        reads.append((frozenset(params), end - start))
+        return await ranges(device_id, site_id, params, start, end)
+
+    monkeypatch.setattr(chat_batch, "aget_telemetry_ranges", counted)
+    messages = QUESTIONS + ["qual a média do pH nos últimos 7 dias?"]
+    ask = {"session_id": "lote", "device_id": DEVICE_ID, "site_id": SITE_ID}
+
+    (r,) = _post("/chat/batch", [{**ask, "messages": messages}])
+    assert r.status_code == 200, r.text
+    batch = [a["answer"] for a in r.json()["answers"]]
+
+    # 24h com os 4 parâmetros numa leitura só, e a janela de 7 dias à parte
+    assert sorted(reads, key=lambda w: w[1]) == [
+        (frozenset(WaterParameter), timedelta(days=1)),
+        (frozenset({WaterParameter.PH}), timedelta(days=7)),
+    ]
+    # mesmas respostas do /chat, na ordem das mensagens
+    one_by_one = [_post("/chat", [{**ask, "message": m}])[0].json()["answer"] for m in messages]
+    assert batch == one_by_one
+
+
+def test_compare_answers_both_windows_from_one_read(fake_firestore, settings, monkeypatch):
+    monkeypatch.setattr(settings, "TELEMETRY_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "SPECULATIVE_PREFETCH_ENABLED", False)
+    monkeypatch.setattr(settings, "FAST_INTENT_ENABLED", False)
+    intent = QueryIntent(intent=QueryIntentType.COMPARE_PERIODS, days=7)
+    install_llm(StubChain(lambda _: intent.model_copy()), StubChain(lambda _: ""))
+    device = _seed(fake_firestore, settings, days=15)
+    ask = {"session_id": "s", "device_id": device.device_id, "site_id": device.site_id}
+
+    (r,) = _post("/chat", [{**ask, "message": "compare esta semana com a semana passada"}])
+    assert r.status_code == 200, r.text
+    # os quatro parâmetros e as duas semanas saem da mesma consulta
+    assert fake_firestore.queries == 1
+    answer = r.json()["answer"]
+    assert answer.count("nesta semana") == 4 and answer.count("na semana anterior") == 4
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+T0 = datetime(2025, 1, 10, 12, tzinfo=timezone.utc)
+
+
+def _batch(n: int, device_id: str = "esp"):
+    return {
+        "device_id": device_id,
+        "site_id": "lagoa",
+        "readings": [
+            {
+                "sent_at": (T0 + timedelta(minutes=i)).isoformat(),
+                "measurements": [{"parameter": "pH", "value": 7.0 + i / 100, "unit": "pH"}],
+            }
+            for i in range(n)
+        ],
+    }
+
+
+def _post(*bodies):
+    from app.main import app
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [await client.post("/telemetry/batch", json=b) for b in bodies]
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def buffer(fake_firestore, settings, monkeypatch):
+    from app.telemetry_ingest import write_buffer
+
+    monkeypatch.setattr(settings, "INGEST_WRITE_BEHIND_ENABLED", True)
+    monkeypatch.setattr(write_buffer, "max_pending", 10)
+    monkeypatch.setattr(write_buffer, "flush_size", 100)
+    write_buffer._pending.clear()
+    yield write_buffer
+    write_buffer._pending.clear()
+
+
+def _docs(store, settings):
+    return store.collections.get(settings.FIRESTORE_TELEMETRY_COLLECTION, {})
+
+
+def test_retried_batch_reuses_doc_ids(fake_firestore, settings):
+    first, retry = _post(_batch(5), _batch(5))
+
+    assert first.status_code == retry.status_code == 200
+    assert first.json()["ids"] == retry.json()["ids"]
+    assert len(_docs(fake_firestore, settings)) == 5
+
+
+def test_full_buffer_rejects_without_side_effects(fake_firestore, settings, buffer, monkeypatch):
+    import app.telemetry_repository as repo
+
+    down = True
+    commit = fake_firestore.commit
+
+    def flaky_commit(ops):
+        if down:
+            raise RuntimeError("firestore fora do ar")
+        commit(ops)
+
+    monkeypatch.setattr(fake_firestore, "commit", flaky_commit)
+    assert _post(_batch(8))[0].status_code == 200
+
+    for _ in range(3):
+        response = _post(_batch(5, "outro"))[0]
+        assert response.status_code == 503
+        assert response.headers["Retry-After"]
+    # o backlog não cresce com o store fora do ar e o lote recusado não deixou rastro
+    assert buffer.pending == 8
+    assert buffer.stats()["rejected"] == 15
+    assert repo.latest_index.get("outro", "lagoa") is None
+
+    # store de volta: o reenvio é aceito e o flush grava cada leitura uma vez
+    down = False
+    responses = _post(_batch(5, "outro"), _batch(8))
+    assert [r.status_code for r in responses] == [200, 200]
+    asyncio.run(buffer.flush())
+    assert len(_docs(fake_firestore, settings)) == 13
+    assert repo.latest_index.get("outro", "lagoa").parameters["ph"].value == 7.04
+
+
+def test_retry_against_cached_series_counts_once(fake_firestore, settings):
+    import app.telemetry_repository as repo
+    from app.models import WaterParameter
+
+    start, end = T0, T0 + timedelta(hours=1)
+    _post(_batch(5))
+    before = repo.series_cache.summarize("esp", "lagoa", WaterParameter.PH, start, end)
+    assert before["count"] == 5
+
+    # o mesmo lote de novo, agora com a série quente no cache
+    _post(_batch(5))
+    after = repo.series_cache.summarize("esp", "lagoa", WaterParameter.PH, start, end)
+    assert (after["count"], after["avg"]) == (before["count"], before["avg"])
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import pytest
+
+from app.intent_cache import cache_key
+from app.intent_rules import classify_intent_fast, needs_parameter, normalize_numbers
+from app.models import QueryIntentType
+from benchmarks.eval_fast_intent import CORPUS, HELDOUT, _matches, load_corpus
+
+THRESHOLD = 0.8
+
+
+@pytest.mark.parametrize("row", load_corpus(CORPUS) + load_corpus(HELDOUT), ids=lambda r: r["message"])
+def test_rules_only_answer_what_they_get_right(row):
+    result = classify_intent_fast(row["message"])
+    if result.confidence >= THRESHOLD:
+        assert _matches(result.intent, row), result.intent
+
+
+@pytest.mark.parametrize("message", [
+    "qual a média de temperatura do mês passado",
+    "temperatura média da semana passada",
+    "pH de manhã",
+    "maior turbidez ontem à noite",
+    "média do pH no fim de semana",
+    "qual o pH na quarta-feira",
+    "resumo do TDS em março",
+])
+def test_calendar_periods_go_to_the_llm(message):
+    assert classify_intent_fast(message).confidence < THRESHOLD
+
+
+def test_greeting_is_not_a_period():
+    result = classify_intent_fast("boa noite")
+    assert result.confidence >= THRESHOLD and result.intent.intent.value == "general_help"
+
+
+def test_needs_parameter():
+    assert needs_parameter(QueryIntentType.AVG_VALUE)
+    assert needs_parameter(QueryIntentType.TREND)
+    assert not needs_parameter(QueryIntentType.LATEST_STATUS)
+    assert not needs_parameter(QueryIntentType.GENERAL_HELP)
+
+
+def test_normalize_numbers():
+    assert normalize_numbers("ultimos tres dias") == "ultimos 3 dias"
+    assert normalize_numbers("umidade em duas semanas") == "umidade em 2 semanas"
+    assert cache_key("Como está o pH nos últimos TRÊS dias?!") == cache_key("como esta o ph nos ultimos 3 dias")
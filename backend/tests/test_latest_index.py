@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+T0 = datetime(2025, 1, 10, 12, tzinfo=timezone.utc)
+
+
+def _doc(device_id: str, sent_at: datetime, ph: float):
+    return {
+        "device_id": device_id,
+        "site_id": "lagoa",
+        "sent_at": sent_at,
+        "measurements": [{"parameter": "ph", "value": ph, "unit": "pH"}],
+    }
+
+
+def test_latest_state_sees_firmware_writes_after_index(fake_firestore, settings, monkeypatch):
+    import app.telemetry_repository as repo
+
+    repo.write_telemetry_docs([("d1", _doc("esp", T0, 7.0))])
+    # o firmware grava direto na coleção, sem passar pelo insert
+    fake_firestore.add(settings.FIRESTORE_TELEMETRY_COLLECTION, "d2", _doc("esp", T0 + timedelta(minutes=5), 6.1))
+
+    state = repo.store.latest_state("esp", "lagoa")
+    assert state.parameters["ph"].value == 6.1
+    # o documento do índice foi corrigido
+    indexed = fake_firestore.collections[settings.FIRESTORE_LATEST_COLLECTION]["esp_lagoa"]
+    assert indexed["parameters"]["ph"]["value"] == 6.1
+
+    # conferido há pouco: só o documento do índice é lido
+    fake_firestore.add(settings.FIRESTORE_TELEMETRY_COLLECTION, "d3", _doc("esp", T0 + timedelta(minutes=10), 5.9))
+    queries = fake_firestore.queries
+    assert asyncio.run(repo.store.alatest_state("esp", "lagoa")).parameters["ph"].value == 6.1
+    assert fake_firestore.queries == queries + 1
+
+    # passado verify_seconds, confere de novo
+    monkeypatch.setattr(repo.store, "verify_seconds", 0)
+    state = asyncio.run(repo.store.alatest_state("esp", "lagoa"))
+    assert state.parameters["ph"].value == 5.9
+
+
+def test_latest_state_checks_pairs_missing_from_index(fake_firestore, settings):
+    import app.telemetry_repository as repo
+
+    fake_firestore.add(settings.FIRESTORE_TELEMETRY_COLLECTION, "f1", _doc("firmware", T0, 6.8))
+    assert repo.store.latest_state("firmware", "lagoa").parameters["ph"].value == 6.8
+    # a conferência criou o documento: a próxima carga lê só ele
+    queries = fake_firestore.queries
+    assert repo.store.latest_state("firmware", "lagoa").parameters["ph"].value == 6.8
+    assert fake_firestore.queries == queries + 1
+    assert repo.store.latest_state("outro", "lagoa") is None
+
+
+def test_watch_owner_trusts_the_index(fake_firestore, settings):
+    import app.telemetry_repository as repo
+
+    repo.write_telemetry_docs([("d1", _doc("esp", T0, 7.0))])
+    stop = repo.store.watch_index(repo.index_latest_rows)
+    assert len(fake_firestore.watches) == 1
+
+    # o listener mantém o índice: a carga não consulta a coleção
+    queries = fake_firestore.queries
+    assert repo.store.latest_state("esp", "lagoa").parameters["ph"].value == 7.0
+    assert fake_firestore.queries == queries + 1
+
+    stop()
+    assert fake_firestore.watches == []
+    assert repo.store.latest_state("esp", "lagoa").parameters["ph"].value == 7.0
+    assert fake_firestore.queries == queries + 3
+
+
+def test_latest_state_keeps_newer_index(fake_firestore, settings):
+    import app.telemetry_repository as repo
+
+    fake_firestore.add(settings.FIRESTORE_TELEMETRY_COLLECTION, "d1", _doc("esp", T0, 7.0))
+    repo.write_telemetry_docs([("d2", _doc("esp", T0 + timedelta(minutes=5), 6.5))])
+    writes = fake_firestore.writes
+
+    assert repo.store.latest_state("esp", "lagoa").parameters["ph"].value == 6.5
+    assert fake_firestore.writes == writes
+
+
+def test_index_documents_lists_firmware_only_devices(fake_firestore, settings):
+    import app.telemetry_repository as repo
+
+    repo.write_telemetry_docs([("d1", _doc("backend", T0, 7.0))])
+    firmware = [("f1", _doc("firmware", T0, 6.8)), ("f2", _doc("firmware", T0 + timedelta(minutes=1), 6.9))]
+    for doc_id, data in firmware:
+        fake_firestore.add(settings.FIRESTORE_TELEMETRY_COLLECTION, doc_id, data)
+
+    # o que o on_snapshot do watch_index entrega
+    assert repo.store.index_documents(firmware, repo.index_latest_rows) == 1
+    states = asyncio.run(repo.store.alist_latest())
+    assert [(s.device_id, s.parameters["ph"].value) for s in states] == [("backend", 7.0), ("firmware", 6.9)]
+    assert repo.latest_index.get("firmware", "lagoa").parameters["ph"].value == 6.9
+
+    # envios deste processo já estão no índice: nada é regravado
+    writes = fake_firestore.writes
+    assert repo.store.index_documents([("d1", _doc("backend", T0, 7.0))]) == 0
+    assert fake_firestore.writes == writes
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.measure_bridge import MeasureBridge, MeasureTimeout
+from app.models import Measurement, TelemetryDocument
+from app.telemetry_stream import TelemetryStreamHub
+from benchmarks.fakes import FakeMqttBroker, FakeSnapshotSource
+
+
+def _doc(n: int, sent_at: datetime) -> TelemetryDocument:
+    return TelemetryDocument(
+        id=f"d{n}",
+        device_id="esp",
+        site_id="lagoa",
+        sent_at=sent_at,
+        measurements=[Measurement(parameter="pH", value=7.0, unit="pH")],
+    )
+
+
+def _bridge(online: bool, **kwargs):
+    source, broker = FakeSnapshotSource(), FakeMqttBroker()
+    bridge = MeasureBridge(TelemetryStreamHub(source, coalesce_seconds=0), broker.publish, **kwargs)
+
+    def on_command(topic, payload):
+        # o firmware mede por um tempo; antes disso chega um envio antigo
+        loop = asyncio.get_running_loop()
+        n = len(broker.published)
+        now = datetime.now(timezone.utc)
+        loop.call_later(0.01, source.emit, "esp", "lagoa", _doc(-n, now - timedelta(minutes=5)))
+        loop.call_later(0.03, source.emit, "esp", "lagoa", _doc(n, now))
+
+    if online:
+        broker.subscribe("aquamonitor/+/command/measure", on_command)
+    return bridge, broker
+
+
+def test_concurrent_requests_share_one_command():
+    bridge, broker = _bridge(True, coalesce_s=10)
+
+    async def run():
+        results = await asyncio.gather(*(bridge.measure("esp", "lagoa") for _ in range(20)))
+        # logo depois de chegar: mesma leitura, sem novo comando
+        return results, await bridge.measure("esp", "lagoa")
+
+    results, later = asyncio.run(run())
+    assert [t for t, _ in broker.published] == ["aquamonitor/esp/command/measure"]
+    assert {r.reading.id for r in results} == {"d1"} and later.reading.id == "d1"
+    assert sum(r.coalesced for r in results) == 19 and later.coalesced
+    assert later.waiters == 21
+    assert bridge.stats() == {
+        "requests": 21, "published": 1, "coalesced": 20, "landed": 1, "timeouts": 0, "in_flight": 0,
+    }
+
+
+def test_timeout_fails_every_waiter_and_the_next_request_publishes_again():
+    bridge, broker = _bridge(False, timeout_s=0.05)
+
+    async def run():
+        first = await asyncio.gather(*(bridge.measure("esp", "lagoa") for _ in range(5)), return_exceptions=True)
+        try:
+            await bridge.measure("esp", "lagoa")
+        except MeasureTimeout as e:
+            return first, e
+
+    first, retry = asyncio.run(run())
+    assert all(isinstance(e, MeasureTimeout) for e in first)
+    assert isinstance(retry, MeasureTimeout)
+    assert len(broker.published) == 2
+    assert bridge.stats()["timeouts"] == 2 and bridge.stats()["in_flight"] == 0
+
+
+def test_coalesce_window_expires():
+    bridge, broker = _bridge(True, coalesce_s=0)
+
+    async def run():
+        first = await bridge.measure("esp", "lagoa")
+        await asyncio.sleep(0.01)
+        return first, await bridge.measure("esp", "lagoa")
+
+    first, second = asyncio.run(run())
+    assert (first.reading.id, second.reading.id) == ("d1", "d2")
+    assert not second.coalesced and len(broker.published) == 2
+
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+
+from app.metrics import MetricsRegistry
+from app.models import QueryIntent, QueryIntentType
+from benchmarks.fakes import StubChain, install_llm
+from benchmarks.synthetic import generate
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    h = registry.histogram("t_seconds", "Duração.", ("stage",), buckets=(0.1, 1))
+    for v in (0.05, 0.5, 5):
+        h.observe(v, "a")
+    c = registry.counter("t_total", "Total.", ("k",))
+    c.inc("x")
+    c.inc("x", amount=2)
+
+    assert registry.render() == "\n".join([
+        "# HELP t_seconds Duração.",
+        "# TYPE t_seconds histogram",
+        't_seconds_bucket{stage="a",le="0.1"} 1',
+        't_seconds_bucket{stage="a",le="1"} 2',
+        't_seconds_bucket{stage="a",le="+Inf"} 3',
+        't_seconds_sum{stage="a"} 5.55',
+        't_seconds_count{stage="a"} 3',
+        "# HELP t_total Total.",
+        "# TYPE t_total counter",
+        't_total{k="x"} 3',
+    ]) + "\n"
+
+
+def _samples(text: str):
+    return {
+        name: float(value)
+        for name, value in (line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+    }
+
+
+def test_metrics_endpoint_counts_chat_requests_errors_and_documents(fake_firestore, settings, monkeypatch):
+    from app.main import app
+
+    monkeypatch.setattr(settings, "TELEMETRY_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "SPECULATIVE_PREFETCH_ENABLED", False)
+
+    def fail(_):
+        raise RuntimeError("ollama caiu")
+
+    install_llm(StubChain(lambda _: QueryIntent(intent=QueryIntentType.GENERAL_HELP)), StubChain(fail))
+    device = generate(1, 2, 2 * 1440, seed=3)[0]
+    fake_firestore.add_columns(settings.FIRESTORE_TELEMETRY_COLLECTION, device)
+    ask = {"session_id": "s", "device_id": device.device_id, "site_id": device.site_id}
+
+    async def run():
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            before = (await client.get("/metrics")).text
+            ok = await client.post("/chat", json={**ask, "message": "qual a média do pH hoje?"})
+            failed = await client.post("/chat", json={**ask, "message": "como limpo o sensor?"})
+            return before, ok, failed, await client.get("/metrics")
+
+    before, ok, failed, r = asyncio.run(run())
+    assert ok.status_code == 200 and failed.status_code == 500
+    assert r.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+
+    b, a = _samples(before), _samples(r.text)
+
+    def delta(name):
+        return a.get(name, 0) - b.get(name, 0)
+
+    assert delta('aquabot_chat_requests_total{endpoint="chat",intent="avg_value"}') == 1
+    assert delta('aquabot_chat_requests_total{endpoint="chat",intent="general_help"}') == 1
+    assert delta('aquabot_chat_errors_total{endpoint="chat",intent="general_help"}') == 1
+    assert delta('aquabot_chat_errors_total{endpoint="chat",intent="avg_value"}') == 0
+    assert delta('aquabot_chat_request_seconds_count{endpoint="chat",intent="avg_value"}') == 1
+    assert delta('aquabot_stage_seconds_count{stage="classify_intent"}') == 1
+    # as leituras das últimas 24h (uma por minuto, com falhas) contam na requisição
+    documents = delta("aquabot_firestore_documents_total")
+    assert documents > 1000
+    assert delta('aquabot_firestore_documents_per_request_sum{endpoint="chat"}') == documents
+    assert delta('aquabot_firestore_documents_per_request_count{endpoint="chat"}') == 2
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+
+from benchmarks.fakes import StubChain, install_llm
+from benchmarks.synthetic import generate
+
+
+def _chat_concurrently(n: int, dev: str, site: str):
+    from app.main import app
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post("/chat", json={
+                "session_id": f"s{i}", "message": "qual a média do pH hoje?", "device_id": dev, "site_id": site,
+            }) for i in range(n)))
+
+    return asyncio.run(run())
+
+
+def test_concurrent_chat_with_cache_reads_store_once(fake_firestore, settings, monkeypatch):
+    # configuração padrão: cache de séries e single-flight ligados
+    monkeypatch.setattr(settings, "TELEMETRY_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_ENABLED", True)
+    monkeypatch.setattr(settings, "SPECULATIVE_PREFETCH_ENABLED", False)
+    fake_firestore.latency_s = 0.05
+    install_llm(StubChain(lambda _: None), StubChain(lambda _: ""))
+    device = generate(1, 2, 2 * 1440, seed=7)[0]
+    fake_firestore.add_columns(settings.FIRESTORE_TELEMETRY_COLLECTION, device)
+
+    responses = _chat_concurrently(50, device.device_id, device.site_id)
+
+    assert all(r.status_code == 200 for r in responses), responses[0].text
+    assert fake_firestore.queries == 1
+    assert len({r.json()["answer"] for r in responses}) == 1
+    assert "Média de pH" in responses[0].json()["answer"]
+
+
+def test_concurrent_cache_fills_share_one_load(fake_firestore, settings, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+
+    import app.telemetry_repository as repo
+    from app.models import WaterParameter
+
+    monkeypatch.setattr(settings, "TELEMETRY_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_ENABLED", True)
+    fake_firestore.latency_s = 0.05
+    device = generate(1, 2, 2 * 1440, seed=7)[0]
+    fake_firestore.add_columns(settings.FIRESTORE_TELEMETRY_COLLECTION, device)
+
+    async def run():
+        # cada chamador com o seu now(), como requisições de verdade
+        async def one():
+            end = datetime.now(timezone.utc)
+            return await repo.aget_telemetry_range(
+                device.device_id, device.site_id, WaterParameter.PH, end - timedelta(hours=24), end
+            )
+
+        return await asyncio.gather(*(one() for _ in range(50)))
+
+    series = asyncio.run(run())
+    assert fake_firestore.queries == 1
+    assert min(len(s) for s in series) > 1000
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+import app.speculative_prefetch as sp
+from app.models import WaterParameter
+from app.telemetry_series import TelemetrySeries, to_epoch_ns
+
+END = datetime(2025, 1, 10, 12, tzinfo=timezone.utc)
+START = END - timedelta(days=1)
+
+
+def _counts():
+    snap = sp.speculation_stats.snapshot()
+    return {k: v for k, v in snap.items() if not k.endswith("rate")}
+
+
+def _delta(before):
+    return {k: v - before[k] for k, v in _counts().items() if v != before[k]}
+
+
+def _series():
+    ts = [to_epoch_ns(END - timedelta(hours=h)) for h in range(24)]
+    return TelemetrySeries(np.array(ts), np.arange(24, dtype=np.float64), "pH")
+
+
+def test_failed_latest_is_a_miss_and_refetches(monkeypatch):
+    calls = []
+
+    async def latest_state(device_id, site_id):
+        calls.append(device_id)
+        if len(calls) == 1:
+            raise RuntimeError("timeout")
+        return "estado"
+
+    monkeypatch.setattr(sp, "aget_latest_state", latest_state)
+    before = _counts()
+
+    async def run():
+        spec = sp.SpeculativePrefetch("esp", "lagoa", None, START, END)
+        await asyncio.sleep(0)
+        return await spec.latest()
+
+    assert asyncio.run(run()) == "estado"
+    assert calls == ["esp", "esp"]
+    assert _delta(before) == {"latest_misses": 1}
+
+
+def test_claim_range_hits_only_when_used(monkeypatch):
+    async def latest_state(device_id, site_id):
+        return None
+
+    async def telemetry_range(device_id, site_id, param, start, end):
+        return _series()
+
+    monkeypatch.setattr(sp, "aget_latest_state", latest_state)
+    monkeypatch.setattr(sp, "aget_telemetry_range", telemetry_range)
+    before = _counts()
+
+    async def run():
+        spec = sp.SpeculativePrefetch("esp", "lagoa", WaterParameter.PH, START, END)
+        # outro parâmetro ou janela maior: não serve e continua disponível
+        assert await spec.claim_range(WaterParameter.TEMPERATURE, START, END) is None
+        assert await spec.claim_range(WaterParameter.PH, START - timedelta(hours=1), END) is None
+        # janela contida: recortada
+        inner = await spec.claim_range(WaterParameter.PH, END - timedelta(hours=5), END)
+        assert await spec.latest() is None
+        spec.discard()
+        return inner
+
+    inner = asyncio.run(run())
+    assert list(inner.values) == [0, 1, 2, 3, 4, 5]
+    assert _delta(before) == {"range_hits": 1, "latest_hits": 1}
+
+
+def test_failed_or_discarded_range_is_a_miss(monkeypatch):
+    async def latest_state(device_id, site_id):
+        return None
+
+    async def failing_range(device_id, site_id, param, start, end):
+        raise RuntimeError("firestore fora do ar")
+
+    monkeypatch.setattr(sp, "aget_latest_state", latest_state)
+    monkeypatch.setattr(sp, "aget_telemetry_range", failing_range)
+    before = _counts()
+
+    async def run():
+        failed = sp.SpeculativePrefetch("esp", "lagoa", WaterParameter.PH, START, END)
+        assert await failed.claim_range(WaterParameter.PH, START, END) is None
+        failed.discard()
+        unused = sp.SpeculativePrefetch("esp", "lagoa", WaterParameter.PH, START, END)
+        unused.discard()
+
+    asyncio.run(run())
+    assert _delta(before) == {"range_misses": 2, "latest_misses": 2}
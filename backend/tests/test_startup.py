@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from benchmarks.bench_startup import heavy_modules_loaded
+
+
+def test_importing_main_skips_llm_and_firestore_stacks():
+    # processo novo: os testes anteriores já carregaram tudo neste
+    assert heavy_modules_loaded() == []
+
+
+def test_chains_are_built_once_under_concurrent_first_use(monkeypatch):
+    import app.llm.answer_agent as answer_agent
+    import app.llm.intent_agent as intent_agent
+
+    built = []
+
+    def build():
+        time.sleep(0.05)
+        built.append(object())
+        return built[-1]
+
+    monkeypatch.setattr(intent_agent, "_intent_chain", None)
+    monkeypatch.setattr(intent_agent, "build_intent_chain", build)
+    monkeypatch.setattr(answer_agent, "_general_help_chain", None)
+    monkeypatch.setattr(answer_agent, "build_general_help_chain", build)
+
+    got = []
+    threads = [
+        threading.Thread(target=lambda f=f: got.append(f()))
+        for f in [intent_agent.get_intent_chain, answer_agent.get_general_help_chain] * 8
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(built) == 2
+    assert {id(c) for c in got} == {id(c) for c in built}
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from benchmarks.fakes import FakeClient, FakeFirestore
+from benchmarks.synthetic import generate
+
+END = datetime(2025, 1, 10, 12, tzinfo=timezone.utc)
+
+
+def test_same_seed_same_readings():
+    a, b = generate(2, 3, 4000, seed=5, end=END), generate(2, 3, 4000, seed=5, end=END)
+    for x, y in zip(a, b):
+        assert x.device_id == y.device_id and x.gaps == y.gaps
+        assert np.array_equal(x.ts_ns, y.ts_ns)
+        assert np.array_equal(x.values, y.values, equal_nan=True)
+        assert x.documents(0, 5) == y.documents(0, 5)
+
+    # end só desloca os horários
+    (shifted,) = generate(1, 3, 2000, seed=5, end=END + timedelta(hours=1))
+    assert np.array_equal(shifted.ts_ns - a[0].ts_ns, np.full(2000, 3600 * 10**9))
+    assert np.array_equal(shifted.values, a[0].values, equal_nan=True)
+    assert not np.array_equal(generate(1, 3, 2000, seed=6, end=END)[0].values, a[0].values, equal_nan=True)
+
+
+def test_readings_are_split_sorted_and_never_empty():
+    devices = generate(3, 2, 10_000, end=END)
+    assert [len(d) for d in devices] == [3334, 3333, 3333]
+    start_ns = int((END - timedelta(days=2)).timestamp()) * 10**9
+    end_ns = int(END.timestamp()) * 10**9
+    for d in devices:
+        assert (np.diff(d.ts_ns) > 0).all()
+        assert start_ns <= d.ts_ns[0] and d.ts_ns[-1] <= end_ns
+        # medições ausentes, mas nenhum envio vazio
+        assert 0 < d.missing and not np.isnan(d.values).all(axis=1).any()
+        assert all(data["measurements"] for _, data in d.documents())
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_column_blocks_answer_like_plain_documents(descending):
+    (device,) = generate(1, 1, 1440, end=END)
+    blocks, plain = FakeFirestore(), FakeFirestore()
+    blocks.add_columns("telemetry", device)
+    for doc_id, data in device.documents():
+        plain.add("telemetry", doc_id, data)
+
+    def query(store):
+        return (
+            FakeClient(store).collection("telemetry")
+            .where("device_id", "==", device.device_id)
+            .where("site_id", "==", device.site_id)
+            .where("sent_at", ">=", END - timedelta(hours=6))
+            .where("sent_at", "<", END - timedelta(hours=1))
+            .order_by("sent_at", "DESCENDING" if descending else "ASCENDING")
+        )
+
+    full = [s.id for s in query(plain).get()]
+    assert len(full) > 100
+    assert [s.id for s in query(blocks).get()] == full
+    assert [s.id for s in query(blocks).limit_to_last(10).get()] == [s.id for s in query(plain).limit_to_last(10).get()]
+    # a leitura cobra só os documentos devolvidos
+    assert blocks.reads == len(full) + 10
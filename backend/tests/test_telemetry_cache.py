@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.models import WaterParameter
+from app.telemetry_cache import TelemetrySeriesCache, to_epoch_us
+
+PH = WaterParameter.PH
+NOW = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+
+
+class _Store:
+    """
+    Envios por minuto nas últimas 3 h; registra cada trecho pedido.
+    """
+
+    def __init__(self) -> None:
+        self.rows = [(NOW - timedelta(minutes=m), [(PH, 7.0 + m / 1000, "pH")]) for m in range(180, 0, -1)]
+        self.loads = []
+
+    def load(self, device_id, site_id, lo, hi):
+        self.loads.append((lo, hi))
+        return [r for r in self.rows if lo <= r[0] <= hi]
+
+    async def aload(self, device_id, site_id, lo, hi):
+        return self.load(device_id, site_id, lo, hi)
+
+    def expected(self, start, end):
+        return [v for t, ms in reversed(self.rows) if start <= t <= end for _, v, _ in ms]
+
+
+def _values(series):
+    return series.values.tolist()
+
+
+def test_loads_only_the_missing_older_part_and_the_delta():
+    store = _Store()
+    cache = TelemetrySeriesCache(loader=store.load, refresh_seconds=0)
+    h1, h2, h3 = (NOW - timedelta(hours=h) for h in (1, 2, 3))
+
+    assert _values(cache.get_range("d", "s", PH, h2, h1)) == store.expected(h2, h1)
+    assert store.loads == [(h2, h1)]
+
+    # mais antigo: só o trecho que falta; a borda já coberta não se repete
+    assert _values(cache.get_range("d", "s", PH, h3, h1)) == store.expected(h3, h1)
+    assert store.loads[1:] == [(h3, h2)]
+
+    # mais novo: só o delta depois da marca d'água
+    series = cache.get_range("d", "s", PH, h3, NOW)
+    assert _values(series) == store.expected(h3, NOW)
+    assert len(store.loads) == 3 and store.loads[2][0] == h1
+
+    # dentro da cobertura: nenhuma ida ao store
+    assert _values(cache.get_range("d", "s", PH, h2, h1)) == store.expected(h2, h1)
+    assert len(store.loads) == 3 and cache.stats()["firestore_loads"] == 3
+
+
+def test_recent_watermark_skips_the_delta():
+    store = _Store()
+    cache = TelemetrySeriesCache(loader=store.load, async_loader=store.aload, refresh_seconds=3600)
+    start = NOW - timedelta(hours=1)
+
+    cache.get_range("d", "s", PH, start, NOW)
+    asyncio.run(cache.aget_range("d", "s", PH, start, NOW + timedelta(minutes=5)))
+    assert len(store.loads) == 1
+
+
+def test_ingested_rows_ahead_of_the_watermark_are_not_duplicated():
+    store = _Store()
+    cache = TelemetrySeriesCache(loader=store.load, refresh_seconds=0)
+    h2, h1 = NOW - timedelta(hours=2), NOW - timedelta(hours=1)
+    # par fora do cache: nada é criado
+    assert cache.ingest("outro", "s", store.rows[-3:]) == 0
+
+    cache.get_range("d", "s", PH, h2, h1)
+    ahead = [r for r in store.rows if h1 < r[0] <= h1 + timedelta(minutes=10)]
+    older = [r for r in store.rows if r[0] < h2][-3:]
+    # além de covered_to: aplicadas na hora; antes de covered_from: ignoradas
+    assert cache.ingest("d", "s", ahead + older) == len(ahead)
+    cols = cache._series[("d", "s")]
+    assert cols.ahead == {to_epoch_us(r[0]) for r in ahead}
+
+    # o delta seguinte traz as mesmas leituras do store, que entram uma vez só
+    end = h1 + timedelta(minutes=30)
+    assert _values(cache.get_range("d", "s", PH, h2, end)) == store.expected(h2, end)
+    assert store.loads[-1][0] == h1
+    assert cols.ahead == set()
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from app.telemetry_downsample import downsample_series, lttb_indices, minmax_indices
+from app.telemetry_series import TelemetrySeries
+
+
+def _walk(n: int, seed: int = 1):
+    rnd = np.random.default_rng(seed)
+    # intervalos irregulares, como envios sob demanda
+    ts = 1_736_510_400 * 10**9 + np.cumsum(rnd.integers(1, 600, n)) * 10**9
+    return ts.astype(np.int64), np.cumsum(rnd.normal(0, 0.05, n)) + 7.0
+
+
+@pytest.mark.parametrize("max_points", [2, 3, 10, 500, 999])
+def test_lttb_keeps_max_points_and_both_ends(max_points):
+    ts, v = _walk(1000)
+    idx = lttb_indices(ts, v, max_points)
+    assert len(idx) == max_points
+    assert idx[0] == 0 and idx[-1] == len(v) - 1
+    assert (np.diff(idx) > 0).all()
+
+
+@pytest.mark.parametrize("max_points", [2, 3, 10, 500, 999])
+def test_minmax_stays_within_max_points_and_keeps_extremes(max_points):
+    ts, v = _walk(1000)
+    idx = minmax_indices(ts, v, max_points)
+    assert 0 < len(idx) <= max_points
+    assert (np.diff(idx) > 0).all()
+    assert v.argmin() in idx and v.argmax() in idx
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_short_series_pass_through_in_time_order(method):
+    ts, v = _walk(50)
+    series = TelemetrySeries(ts[::-1], v[::-1], "pH")
+    out = downsample_series(series, 50, method)
+    assert out.ts_ns.tolist() == ts.tolist() and out.values.tolist() == v.tolist()
+    assert len(downsample_series(TelemetrySeries.empty(), 10, method)) == 0
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError, match="método desconhecido"):
+        downsample_series(TelemetrySeries.empty(), 10, "mean")
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import app.telemetry_fleet as fleet
+from app.models import DeviceLatest, ParameterReading, WaterParameter
+
+PH, TEMP = WaterParameter.PH, WaterParameter.TEMPERATURE
+END = datetime(2025, 1, 10, 12, tzinfo=timezone.utc)
+START = END - timedelta(days=1)
+
+# device -> (site, resumo do pH no intervalo; None = sem leituras, Exception = falha)
+SHARDS = {
+    "a": ("lagoa", {"count": 10, "avg": 7.5, "min": 7.0, "max": 8.0}),
+    "b": ("lagoa", {"count": 30, "avg": 6.8, "min": 6.1, "max": 7.2}),
+    "c": ("rio", {"count": 20, "avg": 7.1, "min": 6.9, "max": 7.4}),
+    "vazio": ("lagoa", None),
+    "quebrado": ("lagoa", RuntimeError("quota")),
+    "lento": ("lagoa", asyncio.TimeoutError),
+}
+
+
+def _pair(device_id, site_id, params):
+    return DeviceLatest(
+        device_id=device_id,
+        site_id=site_id,
+        sent_at=max(params.values()),
+        parameters={p: ParameterReading(value=7.0, unit="pH", sent_at=t) for p, t in params.items()},
+    )
+
+
+@pytest.fixture
+def queried(settings, monkeypatch):
+    monkeypatch.setattr(settings, "FLEET_SHARD_TIMEOUT_SECONDS", 0.05)
+    calls = []
+
+    async def latest_states():
+        pairs = [_pair(dev, site, {PH: END}) for dev, (site, _) in SHARDS.items()]
+        # sem o parâmetro, ou sem envio dele desde start: fora sem consulta
+        pairs.append(_pair("sem-ph", "lagoa", {TEMP: END}))
+        pairs.append(_pair("parado", "lagoa", {PH: START - timedelta(minutes=1)}))
+        return pairs
+
+    async def summarize(dev, site, param, start, end):
+        calls.append(dev)
+        summary = SHARDS[dev][1]
+        if summary is asyncio.TimeoutError:
+            await asyncio.sleep(1)
+        if isinstance(summary, Exception):
+            raise summary
+        return summary and {**summary, "unit": "pH"}
+
+    async def trend(dev, site, param, start, end):
+        return None if dev == "b" else {"delta": SHARDS[dev][1]["max"] - SHARDS[dev][1]["min"]}
+
+    monkeypatch.setattr(fleet, "alist_latest_states", latest_states)
+    monkeypatch.setattr(fleet, "asummarize_range", summarize)
+    monkeypatch.setattr(fleet, "atrend_range", trend)
+    return calls
+
+
+def _rank(*args, **kwargs):
+    return asyncio.run(fleet.fleet_ranking(PH, START, END, *args, **kwargs))
+
+
+def test_ranking_orders_rows_and_reports_failed_and_skipped(queried):
+    out = _rank("avg")
+    assert [r["device_id"] for r in out["rows"]] == ["a", "c", "b"]
+    assert sorted(queried) == sorted(SHARDS)
+    assert out["skipped"] == 3  # sem-ph, parado, vazio
+    assert out["failed"] == [
+        {"device_id": "quebrado", "site_id": "lagoa", "error": "quota"},
+        {"device_id": "lento", "site_id": "lagoa", "error": "timeout (0.05 s)"},
+    ]
+    assert out["fleet"] == {"devices": 3, "count": 60, "avg": (75 + 6.8 * 30 + 142) / 60, "min": 6.1, "max": 8.0}
+    assert out["unit"] == "pH"
+
+    assert [r["device_id"] for r in _rank("min", descending=False, limit=2)["rows"]] == ["b", "c"]
+
+
+def test_site_filter_and_rows_without_value_last(queried):
+    out = _rank("trend", site_id="lagoa")
+    assert "c" not in queried
+    # b não tem tendência: fica no fim nas duas ordens
+    assert [(r["device_id"], r["value"]) for r in out["rows"]] == [("a", 1.0), ("b", None)]
+    assert [r["device_id"] for r in _rank("trend", site_id="lagoa", descending=False)["rows"]] == ["a", "b"]
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import math
+import statistics
+from datetime import datetime, timedelta, timezone
+
+from app.models import WaterParameter
+from app.telemetry_cache import TelemetrySeriesCache
+
+PH = WaterParameter.PH
+
+
+def _rows(start: datetime, values):
+    return [(start + timedelta(minutes=i), [(PH, v, "pH")]) for i, v in enumerate(values)]
+
+
+def _cache(rows):
+    def loader(device_id, site_id, lo, hi):
+        return [r for r in rows if lo <= r[0] <= hi]
+
+    return TelemetrySeriesCache(loader=loader, refresh_seconds=0)
+
+
+def test_non_finite_readings_are_left_out_of_aggregates():
+    start = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    values = [7.0 + (i % 10) / 10 for i in range(300)]
+    values[17], values[150] = math.inf, -math.inf
+    rows = _rows(start, values)
+    cache = _cache(rows)
+    end = start + timedelta(minutes=len(values))
+
+    summary = cache.summarize("d", "s", PH, start, end)
+
+    finite = [v for v in values if math.isfinite(v)]
+    assert summary["count"] == len(finite)
+    assert summary["avg"] == statistics.mean(finite)
+    assert summary["min"] == min(finite) and summary["max"] == max(finite)
+    # leituras novas pela ingestão seguem o mesmo caminho
+    later = end + timedelta(minutes=1)
+    cache.ingest("d", "s", [(later, [(PH, math.inf, "pH")]), (later + timedelta(minutes=1), [(PH, 8.0, "pH")])])
+    assert cache.extreme("d", "s", PH, start, later + timedelta(minutes=1), "max")["value"] == 8.0
+
+
+def test_rollup_aggregates_match_raw_points_on_misaligned_windows():
+    start = datetime(2024, 5, 1, 0, 0, 30, tzinfo=timezone.utc)
+    # valores repetidos: o instante do mín/máx tem que ser o da leitura mais recente
+    values = [round(7.0 + ((i * 37) % 23) / 10, 1) for i in range(3 * 1440)]
+    rows = _rows(start, values)
+    cache = _cache(rows)
+
+    for lo_min, hi_min in ((0, len(values) - 1), (7, 2000), (61, 1439 + 61), (1500, 1500), (90, 100)):
+        lo, hi = start + timedelta(minutes=lo_min), start + timedelta(minutes=hi_min)
+        window = values[lo_min:hi_min + 1]
+        summary = cache.summarize("d", "s", PH, lo, hi)
+        assert summary["count"] == len(window)
+        # soma exata: bate bit a bit com a varredura antiga (statistics.mean)
+        assert summary["avg"] == statistics.mean(window)
+        assert summary["start"] == lo and summary["end"] == hi
+        for mode, pick in (("max", max), ("min", min)):
+            ext = cache.extreme("d", "s", PH, lo, hi, mode)
+            expected = pick(window)
+            last = max(i for i, v in enumerate(window) if v == expected)
+            assert ext["value"] == expected and ext["sent_at"] == lo + timedelta(minutes=last)
+            assert ext["unit"] == "pH"
+
+
+def test_rollups_stay_small_next_to_raw_columns():
+    start = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    rows = [
+        (start + timedelta(minutes=i), [(p, 7.0, "u") for p in WaterParameter])
+        for i in range(60 * 1440)
+    ]
+    cache = _cache(rows)
+    cache.summarize("d", "s", PH, start, start + timedelta(days=60))
+
+    cols = cache._series[("d", "s")]
+    rollups = sum(r.nbytes for r in cols.rollups.values())
+    # 60 dias a 1 envio/min: o tier de 1 min fica vazio (um ponto por minuto) e
+    # os buckets de hora e dia são bem menores que as colunas
+    assert all(not r.tiers[-1] for r in cols.rollups.values())
+    assert rollups < 0.15 * (cols.nbytes - rollups)
+    assert cache.stats()["bytes"] < 8 * 1024 * 1024
+
+
+def test_dense_minutes_use_the_minute_tier():
+    start = datetime(2024, 5, 1, 0, 0, 7, tzinfo=timezone.utc)
+    # um envio a cada 10 s, em lotes que cortam os minutos ao meio
+    values = [round(7.0 + ((i * 13) % 17) / 100, 2) for i in range(6 * 360)]
+    rows = [(start + timedelta(seconds=10 * i), [(PH, v, "pH")]) for i, v in enumerate(values)]
+    cache = _cache(rows)
+    cache.summarize("d", "s", PH, start, start + timedelta(seconds=10 * 99))
+    for i in range(100, len(rows), 45):
+        cache.ingest("d", "s", rows[i:i + 45])
+    minute = cache._series[("d", "s")].rollups[PH].tiers[-1]
+    assert len(minute) == len({(start + timedelta(seconds=10 * i)).replace(second=0) for i in range(len(rows))})
+
+    for lo_s, hi_s in ((25, 10 * len(values) - 40), (3600 - 15, 7300), (95, 150)):
+        lo, hi = start + timedelta(seconds=lo_s), start + timedelta(seconds=hi_s)
+        window = [v for i, v in enumerate(values) if lo_s <= 10 * i <= hi_s]
+        summary = cache.summarize("d", "s", PH, lo, hi)
+        assert summary["count"] == len(window)
+        assert summary["avg"] == statistics.mean(window)
+        assert (summary["min"], summary["max"]) == (min(window), max(window))
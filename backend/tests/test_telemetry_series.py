@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import statistics
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.telemetry_series import (
+    TelemetrySeries,
+    compare_windows,
+    extreme_in_series,
+    latest_in_series,
+    stddev_in_series,
+    summarize_series,
+)
+from benchmarks.bench_series_stats import legacy_extreme_in_series, legacy_summarize_series, make_points
+
+
+@pytest.mark.parametrize("n", [1, 2, 1000])
+def test_numpy_stats_match_the_list_path(n):
+    points = make_points(n, seed=n)
+    series = TelemetrySeries.from_points(points)
+
+    old, new = legacy_summarize_series(points), summarize_series(series)
+    for key in ("start", "end", "count", "min", "max", "unit"):
+        assert new[key] == old[key]
+    assert new["avg"] == pytest.approx(old["avg"], rel=1e-12)
+    # a lista crua passa pelo mesmo caminho
+    assert summarize_series(points) == new
+
+    for mode in ("max", "min"):
+        assert extreme_in_series(series, mode) == legacy_extreme_in_series(points, mode)
+    if n > 1:
+        assert stddev_in_series(series) == pytest.approx(statistics.stdev(v for _, v, _ in points), rel=1e-12)
+
+
+def test_extreme_ties_keep_the_first_point_like_max_min():
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    points = [(t0 + timedelta(minutes=i), v, "pH") for i, v in enumerate([7.0, 8.0, 6.0, 8.0, 6.0])]
+    series = TelemetrySeries.from_points(points)
+
+    for mode in ("max", "min"):
+        assert extreme_in_series(series, mode) == legacy_extreme_in_series(points, mode)
+    assert extreme_in_series(series, "max")["sent_at"] == t0 + timedelta(minutes=1)
+    # série em ordem DESC (como vem do Firestore): a mais recente pelo horário
+    assert latest_in_series(points[::-1])[0] == t0 + timedelta(minutes=4)
+
+
+def test_empty_series():
+    empty = TelemetrySeries.empty()
+    assert summarize_series(empty) is None
+    assert summarize_series([]) is None
+    assert extreme_in_series(empty, "max") is None
+    assert latest_in_series(empty) is None
+    assert stddev_in_series(empty) is None
+
+
+def test_compare_windows_splits_one_series_at_the_split_instant():
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    split, end = t0 + timedelta(days=1), t0 + timedelta(days=2)
+    hours = [-1, 0, 12, 23, 24, 36, 48, 49]
+    values = [99.0, 6.0, 7.0, 8.0, 8.0, 9.0, 10.0, 99.0]
+    points = [(t0 + timedelta(hours=h), v, "pH") for h, v in zip(hours, values)]
+
+    cmp = compare_windows(points[::-1], t0, split, end)
+    # o instante do split é do período atual; start e end entram
+    prev, cur = cmp["previous"], cmp["current"]
+    assert (prev["count"], prev["avg"], prev["first"], prev["last"]) == (3, 7.0, 6.0, 8.0)
+    assert (cur["count"], cur["avg"], cur["delta"], cur["end"]) == (3, 9.0, 2.0, end)
+    assert cmp["change"] == 2.0 and cmp["pct_change"] == pytest.approx(2 / 7 * 100)
+
+    only_current = compare_windows(points[4:7], t0, split, end)
+    assert only_current["previous"] is None and only_current["change"] is None
+
+    zero = [(t0, 0.0, "pH"), (split, 1.0, "pH")]
+    assert compare_windows(zero, t0, split, end)["pct_change"] is None
+    assert compare_windows(points[:1] + points[-1:], t0, split, end) is None
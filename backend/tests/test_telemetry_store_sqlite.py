@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models import WaterParameter
+from app.telemetry_cache import TelemetrySeriesCache
+from app.telemetry_series import extreme_in_series, summarize_series
+from app.telemetry_store import TelemetryStore, telemetry_doc_id
+from app.telemetry_store_sqlite import SQLiteTelemetryStore
+from app.telemetry_trend import trend_in_series
+
+DEV, SITE = "esp", "lagoa"
+T0 = datetime(2025, 1, 10, 0, 3, 11, tzinfo=timezone.utc)
+PH, TEMP = WaterParameter.PH, WaterParameter.TEMPERATURE
+
+
+def _doc(i: int, ph: float, temp=None, device_id: str = DEV):
+    sent_at = T0 + timedelta(minutes=7 * i)
+    measurements = [{"parameter": "pH", "value": ph, "unit": "pH"}]
+    if temp is not None:
+        measurements.append({"parameter": "temperature", "value": temp, "unit": "°C"})
+    data = {"device_id": device_id, "site_id": SITE, "sent_at": sent_at, "measurements": measurements}
+    return telemetry_doc_id(device_id, SITE, int(sent_at.timestamp() * 1e6)), data
+
+
+@pytest.fixture
+def store(tmp_path):
+    """
+    3 dias, um envio a cada 7 min (fora do alinhamento de hora), temperatura
+    a cada 3 envios; gravado em lotes fora de ordem.
+    """
+    rnd = random.Random(11)
+    docs = [
+        _doc(i, round(7 + rnd.gauss(0, 0.3), 3), round(26 + rnd.gauss(0, 1), 2) if i % 3 == 0 else None)
+        for i in range(3 * 24 * 60 // 7)
+    ]
+    rnd.shuffle(docs)
+    s = SQLiteTelemetryStore(str(tmp_path / "telemetry.sqlite3"))
+    for i in range(0, len(docs), 97):
+        s.insert(docs[i:i + 97])
+    return s
+
+
+def _window():
+    # pontas no meio de uma hora, para os rollups usarem as bordas parciais
+    return T0 + timedelta(hours=5, minutes=22), T0 + timedelta(days=2, hours=3, minutes=41)
+
+
+def test_implements_protocol():
+    members = [n for n, _ in inspect.getmembers(TelemetryStore) if not n.startswith("_")]
+    assert members
+    for name in members:
+        assert hasattr(SQLiteTelemetryStore, name), name
+
+
+def test_range_rows_series_and_multi(store):
+    start, end = _window()
+    rows = store.range_rows(DEV, SITE, start, end)
+    sent = [r[0] for r in rows]
+    assert sent == sorted(sent) and start <= sent[0] and sent[-1] <= end
+    assert rows == asyncio.run(store.arange_rows(DEV, SITE, start, end))
+
+    series = store.range_series(DEV, SITE, PH, start, end)
+    assert len(series) == len(rows)
+    assert list(series.ts_ns) == sorted(series.ts_ns, reverse=True)
+    multi = store.range_multi(DEV, SITE, [PH, TEMP], start, end)
+    assert list(multi[PH].values) == list(series.values)
+    assert len(multi[TEMP]) == sum(1 for _, ms in rows if any(p == TEMP for p, _, _ in ms))
+    assert list(asyncio.run(store.arange_series(DEV, SITE, TEMP, start, end)).values) == list(multi[TEMP].values)
+
+    # intervalo inclusivo nas duas pontas
+    first = sent[0]
+    assert len(store.range_rows(DEV, SITE, first, first)) == 1
+
+
+@pytest.mark.parametrize("param", [PH, TEMP])
+def test_aggregates_match_series(store, param):
+    start, end = _window()
+    series = store.range_series(DEV, SITE, param, start, end)
+
+    summary, expected = store.summarize(DEV, SITE, param, start, end), summarize_series(series)
+    assert summary["count"] == expected["count"]
+    assert (summary["start"], summary["end"], summary["unit"]) == (expected["start"], expected["end"], expected["unit"])
+    for key in ("min", "max", "avg"):
+        assert summary[key] == pytest.approx(expected[key], rel=1e-12)
+    assert asyncio.run(store.asummarize(DEV, SITE, param, start, end)) == summary
+
+    for mode in ("max", "min"):
+        assert store.extreme(DEV, SITE, param, start, end, mode) == extreme_in_series(series, mode)
+
+    trend, expected = store.trend(DEV, SITE, param, start, end), trend_in_series(series)
+    assert trend["count"] == expected["count"]
+    assert trend["slope_per_hour"] == pytest.approx(expected["slope_per_hour"], rel=1e-9, abs=1e-12)
+    assert asyncio.run(store.atrend(DEV, SITE, param, start, end)) == trend
+
+    empty = (T0 - timedelta(days=2), T0 - timedelta(days=1))
+    assert store.summarize(DEV, SITE, param, *empty) is None
+    assert store.extreme(DEV, SITE, param, *empty, "max") is None
+
+
+def test_latest_keeps_each_parameter(store):
+    last = store.latest(DEV, SITE)
+    # o último envio (i = 616) não traz temperatura
+    assert last.sent_at == T0 + timedelta(minutes=7 * 616)
+    assert [m.parameter for m in last.measurements] == ["pH"]
+
+    state = store.latest_state(DEV, SITE)
+    assert state.parameters["ph"].sent_at == last.sent_at
+    assert state.parameters["temperature"].sent_at == T0 + timedelta(minutes=7 * 615)
+    assert asyncio.run(store.alatest_state(DEV, SITE)) == state
+    assert asyncio.run(store.alist_latest()) == [state]
+    assert store.latest("outro", SITE) is None and store.latest_state("outro", SITE) is None
+
+
+def test_insert_replaces_same_id(store):
+    start, end = T0, T0 + timedelta(days=3)
+    before = store.summarize(DEV, SITE, PH, start, end)
+
+    doc_id, data = _doc(10, 9.5)
+    assert store.insert([(doc_id, data), (doc_id, data)]) == 1
+    after = store.summarize(DEV, SITE, PH, start, end)
+    assert after["count"] == before["count"]
+    assert after["max"] == 9.5
+    assert store.extreme(DEV, SITE, PH, start, end, "max")["sent_at"] == data["sent_at"]
+
+    assert store.insert([]) == 0
+    assert asyncio.run(store.ainsert([_doc(0, 7.0, device_id="novo")])) == 1
+    assert store.latest("novo", SITE).measurements[0].value == 7.0
+    assert [s.device_id for s in asyncio.run(store.alist_latest())] == [DEV, "novo"]
+
+
+def test_watch_latest_only_newer(store):
+    seen = []
+    stop = store.watch_latest(DEV, SITE, seen.append)
+    assert [d.sent_at for d in seen] == [T0 + timedelta(minutes=7 * 616)]
+
+    store.insert([_doc(3, 7.1)])           # mais antigo: não avisa
+    store.insert([_doc(700, 7.2)])
+    assert [d.sent_at for d in seen[1:]] == [T0 + timedelta(minutes=7 * 700)]
+
+    stop()
+    store.insert([_doc(701, 7.3)])
+    assert len(seen) == 2
+    assert store.watch_index(lambda rows: None)() is None
+
+
+def test_non_finite_values_stay_out_of_aggregates(tmp_path):
+    s = SQLiteTelemetryStore(str(tmp_path / "telemetry.sqlite3"))
+    values = [7.0, float("inf"), 7.2, float("nan"), 7.4, float("-inf"), 7.6]
+    s.insert([_doc(i, v) for i, v in enumerate(values)])
+    start, end = T0, T0 + timedelta(hours=1)
+
+    summary = s.summarize(DEV, SITE, PH, start, end)
+    assert (summary["count"], summary["min"], summary["max"]) == (4, 7.0, 7.6)
+    assert summary["avg"] == pytest.approx(7.3, rel=1e-12)
+    assert s.trend(DEV, SITE, PH, start, end)["count"] == 4
+
+    # mesma resposta dos rollups do cache, que também ignoram NaN/inf
+    cache = TelemetrySeriesCache(loader=s.range_rows, max_bytes=1 << 20, refresh_seconds=3600)
+    cached = cache.summarize(DEV, SITE, PH, start, end)
+    assert (cached["count"], cached["min"], cached["max"]) == (4, 7.0, 7.6)
+    assert cached["avg"] == pytest.approx(summary["avg"], rel=1e-12)
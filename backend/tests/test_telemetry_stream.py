@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.models import Measurement, TelemetryDocument
+from app.telemetry_stream import TelemetryStreamHub
+from benchmarks.fakes import FakeSnapshotSource
+
+T0 = datetime(2025, 1, 10, 12, tzinfo=timezone.utc)
+
+
+def _doc(n: int) -> TelemetryDocument:
+    return TelemetryDocument(
+        id=f"d{n}",
+        device_id="esp",
+        site_id="lagoa",
+        sent_at=T0 + timedelta(seconds=n),
+        measurements=[Measurement(parameter="pH", value=7.0 + n / 100, unit="pH")],
+    )
+
+
+def test_fanout_to_1000_subscribers_with_a_slow_one():
+    source = FakeSnapshotSource()
+    hub = TelemetryStreamHub(source, coalesce_seconds=0, buffer_size=8)
+    events = 30
+
+    async def run():
+        subs = [hub.subscribe("esp", "lagoa") for _ in range(1000)]
+        # o último inscrito nunca lê durante a transmissão
+        fast, slow = subs[:-1], subs[-1]
+        received = [[] for _ in fast]
+
+        async def consume(sub, out):
+            while len(out) < events:
+                doc = await sub.next(timeout=5)
+                assert doc is not None
+                out.append(doc.id)
+
+        consumers = [asyncio.create_task(consume(s, out)) for s, out in zip(fast, received)]
+        for n in range(events):
+            # o listener do Firestore entrega de outra thread
+            await asyncio.to_thread(source.emit, "esp", "lagoa", _doc(n))
+            while hub.published <= n:
+                await asyncio.sleep(0)
+            # os rápidos consomem enquanto o lento continua parado
+            while any(s.pending for s in fast):
+                await asyncio.sleep(0)
+        await asyncio.wait_for(asyncio.gather(*consumers), timeout=5)
+
+        stats = hub.stats()
+        late = [(await slow.next(timeout=0)).id for _ in range(slow.pending)]
+        for sub in subs:
+            hub.unsubscribe(sub)
+        await asyncio.sleep(0.05)
+        return received, slow, late, stats
+
+    received, slow, late, stats = asyncio.run(run())
+
+    expected = [f"d{n}" for n in range(events)]
+    assert all(ids == expected for ids in received)
+    # o lento fica só com as últimas buffer_size leituras, sem segurar os outros
+    assert late == expected[-8:]
+    assert slow.dropped == events - 8
+    assert stats["dropped"] == events - 8
+    assert stats["watches"] == 1 and stats["subscribers"] == 1000
+    assert source.started == source.stopped == 1
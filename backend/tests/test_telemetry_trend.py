@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.models import WaterParameter
+from app.telemetry_cache import TelemetrySeriesCache, _SeriesColumns
+from app.telemetry_store_sqlite import SQLiteTelemetryStore
+from app.telemetry_trend import (
+    Moments,
+    PageHinkley,
+    change_point_in_series,
+    daily_means,
+    page_hinkley_params,
+    trend_in_series,
+)
+from benchmarks.bench_trend import DEVICE_ID, SITE_ID, make_ph, seed_store
+
+DAYS, DROP_DAY = 12, 9.5
+PH = WaterParameter.PH
+
+
+def _close(a: float, b: float, scale: float) -> bool:
+    return abs(a - b) <= 1e-9 * max(abs(b), scale)
+
+
+@pytest.fixture(scope="module")
+def data(tmp_path_factory):
+    """
+    pH por minuto caindo a partir de DROP_DAY, no SQLite, e a reta de
+    referência (np.polyfit) numa janela com pontas quebradas.
+    """
+    times, values = make_ph(DAYS, DROP_DAY)
+    ts_us = np.array([int(t.timestamp()) * 1_000_000 for t in times], dtype=np.int64)
+    start = times[0] + timedelta(minutes=3, seconds=17)
+    end = times[-1] - timedelta(minutes=95, seconds=40)
+    sel = (ts_us >= int(start.timestamp() * 1e6)) & (ts_us <= int(end.timestamp() * 1e6))
+    t_ref, v_ref = ts_us[sel] / 1e6, values[sel]
+    slope, intercept = np.polyfit(t_ref - t_ref[0], v_ref, 1)
+
+    store = SQLiteTelemetryStore(str(tmp_path_factory.mktemp("trend") / "telemetry.sqlite3"))
+    seed_store(store, times, values)
+    return {
+        "times": times, "start": start, "end": end, "t_ref": t_ref, "v_ref": v_ref,
+        "slope": slope, "fit_at": lambda dt: intercept + slope * (dt.timestamp() - t_ref[0]),
+        "store": store,
+    }
+
+
+def _check(tr, data) -> None:
+    assert tr["count"] == len(data["v_ref"])
+    assert _close(tr["slope_per_hour"], data["slope"] * 3600, 1e-12)
+    assert _close(tr["first"], data["fit_at"](tr["start"]), 1.0)
+    assert _close(tr["last"], data["fit_at"](tr["end"]), 1.0)
+
+
+def _series(data):
+    return data["store"].range_series(DEVICE_ID, SITE_ID, PH, data["start"], data["end"])
+
+
+def test_trend_in_series_matches_polyfit(data):
+    series = _series(data)
+    _check(trend_in_series(series), data)
+    _check(trend_in_series(type(series)(series.ts_ns[::-1], series.values[::-1], series.unit)), data)
+
+
+def test_cache_trend_matches_polyfit(data, monkeypatch):
+    store = data["store"]
+    cache = TelemetrySeriesCache(loader=store.range_rows, max_bytes=1 << 30, refresh_seconds=3600)
+    cache.summarize(DEVICE_ID, SITE_ID, PH, data["start"], data["end"])
+
+    # a reta sai dos buckets: só as bordas (menos de 1 h cada) são relidas
+    read = []
+    raw_points = _SeriesColumns.raw_points
+
+    def counted(self, param, lo, hi):
+        ts, values = raw_points(self, param, lo, hi)
+        read.append(len(ts))
+        return ts, values
+
+    monkeypatch.setattr(_SeriesColumns, "raw_points", counted)
+    _check(cache.trend(DEVICE_ID, SITE_ID, PH, data["start"], data["end"]), data)
+    assert sum(read) < 2 * 60
+
+
+def test_sqlite_rollup_trend_matches_polyfit(data):
+    _check(data["store"].trend(DEVICE_ID, SITE_ID, PH, data["start"], data["end"]), data)
+
+
+def test_moments_by_hour_match_polyfit(data):
+    t, v = data["t_ref"], data["v_ref"]
+    # um grupo por hora, como os buckets dos rollups
+    groups = [(t[i], v[i]) for i in np.split(np.arange(len(t)), np.flatnonzero(np.diff(t // 3600)) + 1)]
+    parts = [Moments.from_arrays(gt, gv) for gt, gv in groups]
+    columns = [np.array([getattr(m, f) for m in parts], dtype=np.float64) for f in Moments.__slots__]
+    combined = Moments.combine(*columns)
+    assert combined.n == len(t)
+    assert _close(combined.slope, data["slope"], 1e-12)
+    assert _close(combined.variance, float(np.var(v, ddof=1)), 1e-12)
+
+    merged = Moments()
+    for m in parts:
+        merged.merge_moments(m)
+    assert _close(merged.slope, data["slope"], 1e-12)
+
+    online = Moments()
+    for ti, vi in zip(t.tolist(), v.tolist()):
+        online.add(ti, vi)
+    assert _close(online.slope, data["slope"], 1e-12)
+    assert _close(online.variance, float(np.var(v, ddof=1)), 1e-12)
+
+
+def test_page_hinkley_finds_the_drop(data):
+    series = _series(data)
+    change = change_point_in_series(series, "down")
+    assert change is not None
+
+    # online (um valor por vez) == vetorizado, sobre as médias diárias
+    order = np.argsort(series.ts_ns)
+    day_ts, day_means = daily_means(series.ts_ns[order], series.values[order])
+    ph = PageHinkley(*page_hinkley_params(day_means), "down")
+    for value in day_means.tolist():
+        if ph.update(value):
+            break
+    assert ph.change_index is not None
+    assert day_ts[ph.change_index] / 1e9 == change["sent_at"].timestamp()
+
+    drop_at: datetime = data["times"][0] + timedelta(days=DROP_DAY)
+    assert abs((change["sent_at"] - drop_at).total_seconds()) < 24 * 3600
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import numpy as np
+import ormsgpack
+import pytest
+
+from app.models import WaterParameter
+from app.telemetry_wire import MAX_READINGS, WIRE_VERSION, batch_measurements, decode_batches, encode_batch
+
+T0 = 1736510400000
+
+
+def _group(**changes):
+    g = {"v": WIRE_VERSION, "d": "esp", "s": "lagoa", "t0": T0, "dt": [0, 60000], "p": [0], "x": [[712, 709]], "k": [2]}
+    g.update(changes)
+    return {k: v for k, v in g.items() if v is not None}
+
+
+def test_roundtrip_with_decimals_and_missing_values():
+    payload = encode_batch(
+        "esp", "lagoa", [T0, T0 + 60000, T0 + 120000],
+        {WaterParameter.PH: [7.12, None, 7.09], WaterParameter.TDS: [None, 310.0, 312.0]},
+        decimals={WaterParameter.PH: 2, WaterParameter.TDS: 0},
+        seq0=42,
+    )
+    (batch,) = decode_batches(payload)
+    assert (batch.device_id, batch.site_id, batch.seq0) == ("esp", "lagoa", 42)
+    assert batch.ts_us.tolist() == [T0 * 1000, (T0 + 60000) * 1000, (T0 + 120000) * 1000]
+    assert batch.values[WaterParameter.PH][0] == 7.12
+    assert np.isnan(batch.values[WaterParameter.PH][1])
+    # nil não vira medição no documento
+    assert [len(ms) for ms in batch_measurements(batch)] == [1, 1, 2]
+
+
+MALFORMED = [
+    (b"\xc1", "msgpack inválido"),
+    (ormsgpack.packb([]), "lote vazio"),
+    (ormsgpack.packb(_group(v=2)), "versão do formato"),
+    (ormsgpack.packb([_group(), "x"]), r"\[1\]: versão do formato"),
+    (ormsgpack.packb(_group(d="")), "device_id"),
+    (ormsgpack.packb(_group(t0=-1)), "t0"),
+    (ormsgpack.packb(_group(t0=True)), "t0"),
+    (ormsgpack.packb(_group(dt=[0, -1])), "dt"),
+    (ormsgpack.packb(_group(dt=[0, 1.5])), "dt"),
+    (ormsgpack.packb(_group(dt=[])), "dt"),
+    (ormsgpack.packb(_group(dt=[0, 2 ** 42])), "fora do intervalo"),
+    (ormsgpack.packb(_group(p=[0, 0], x=[[1, 2], [1, 2]], k=None)), "códigos de parâmetro"),
+    (ormsgpack.packb(_group(p=[9])), "códigos de parâmetro"),
+    (ormsgpack.packb(_group(x=[])), "uma coluna por parâmetro"),
+    (ormsgpack.packb(_group(k=[7])), "casa decimal"),
+    (ormsgpack.packb(_group(x=[["abc", 1]])), "apenas números"),
+    (ormsgpack.packb(_group(x=[[712]])), "deve ter 2 valores"),
+    (ormsgpack.packb(_group(x=[[712, float("inf")]], k=None)), "infinitos"),
+    (ormsgpack.packb(_group(x=[[712, None]])), "pelo menos uma medição"),
+    (ormsgpack.packb(_group(q="1")), "q deve ser inteiro"),
+]
+
+
+@pytest.mark.parametrize("payload, message", MALFORMED, ids=[m for _, m in MALFORMED])
+def test_malformed_payloads_raise_value_error(payload, message):
+    with pytest.raises(ValueError, match=message):
+        decode_batches(payload)
+
+
+def test_reading_limit_counts_every_group():
+    half = MAX_READINGS // 2 + 1
+    group = _group(dt=[1] * half, x=[[700] * half])
+    assert sum(b.size for b in decode_batches(ormsgpack.packb([group]))) == half
+    with pytest.raises(ValueError, match=str(MAX_READINGS)):
+        decode_batches(ormsgpack.packb([group, group]))